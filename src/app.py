@@ -1,16 +1,60 @@
-from dash import Dash, Input, Output, State
+from dash import Dash, Input, Output, Patch, State
+from dash.exceptions import PreventUpdate
 import numpy as np
 import plotly.graph_objects as go
 
 from data_loader import (
     find_neighbor_stars,
-    load_starset_data,
-    load_orbits
+    get_orbits,
+    get_starset_data,
+    merge_orbit_tracks,
+    select_visible_stars
 )
-from gcwork.starset import StarSet
+from gcwork.orbittracks import OrbitTrackStore
 from layout import app_layout
 
 
+def relayout_ranges(
+    relayout_data: dict,
+    figure: dict | None,
+    refresh_ranges: list[list[float]]
+) -> list[list[float]] | None:
+    """
+    x and y ranges of the star map after a pan/zoom (relayoutData), or
+    None if the event does not change the view. Autoscale goes back to
+    refresh_ranges, since autoranging the culled star trace would only
+    fit the stars already drawn. An axis left out of the event (e.g. a
+    zoom along one axis) keeps its range from the current figure.
+    """
+    layout = (figure or {}).get("layout", {})
+    ranges = []
+    changed = False
+    for axis, refresh_range in zip(["xaxis", "yaxis"], refresh_ranges):
+        if relayout_data.get(f"{axis}.autorange"):
+            axis_range = refresh_range
+            changed = True
+        elif (
+            f"{axis}.range[0]" in relayout_data
+            and f"{axis}.range[1]" in relayout_data
+        ):
+            axis_range = [
+                relayout_data[f"{axis}.range[0]"],
+                relayout_data[f"{axis}.range[1]"]
+            ]
+            changed = True
+        elif f"{axis}.range" in relayout_data:
+            axis_range = list(relayout_data[f"{axis}.range"])
+            changed = True
+        else:
+            axis_range = layout.get(axis, {}).get("range") or refresh_range
+        ranges.append(axis_range)
+
+    if not changed:
+        return None
+
+    return ranges
+
+
 class Dashboard:
 
     def __init__(self) -> None:
@@ -22,8 +66,53 @@ class Dashboard:
         self.app: Dash = Dash(assets_folder="../assets")
         self.app.layout = app_layout()
 
-        self.star_data: None | StarSet = None
-        self.orbit_data: None | tuple[list[any], list[any]] = None
+        self.orbit_tracks: OrbitTrackStore = OrbitTrackStore(
+            mass=4.e6, dist=8000.
+        )
+
+    def star_trace(
+        self, star_data: dict, rows: np.ndarray, enable_names: bool
+    ) -> dict:
+        """
+        Properties of the star map marker trace for the given rows of
+        the loaded star data
+        """
+        name = [star_data["name"][row] for row in rows]
+        x = [star_data["x"][row] for row in rows]
+        y = [star_data["y"][row] for row in rows]
+        mag = [star_data["mag"][row] for row in rows]
+
+        hover_text = [
+            f"Name: {n}<br>X: {xx}<br>Y: {yy}<br>Mag: {m}"
+            for n, xx, yy, m in zip(name, x, y, mag)
+        ]
+        is_sgra = [n == "SgrA" for n in name]
+
+        return {
+            "x": x,
+            "y": y,
+            "customdata": name,
+            "mode": "markers+text" if enable_names else "markers",
+            "text": name if enable_names else None,
+            "textposition": "top center",
+            "textfont": {
+                "size": 8,
+                "color": "grey",
+                "family": "Times New Roman"
+            },
+            "hovertext": hover_text,
+            "hoverinfo": "text",
+            "marker": {
+                "size": [np.exp(-(m-19.0)/2.5)*10.0 for m in mag],
+                "color": ["red" if s else "cyan" for s in is_sgra],
+                "symbol": ["star" if s else "circle" for s in is_sgra],
+                "opacity": [1 if s else 0.7 for s in is_sgra],
+                "line": {
+                    "color": "white",
+                    "width": 1
+                }
+            }
+        }
 
     def start(self) -> None:
 
@@ -53,63 +142,17 @@ class Dashboard:
             if not data_filepath:
                 return go.Figure() # TODO Add Error
 
-            self.star_data = load_starset_data(data_filepath)
+            star_data = get_starset_data(data_filepath)
             if enable_orbits:
-                self.orbit_data = load_orbits(orbit_filepath)
-
-            hover_text = [
-                f"Name: {name}<br>X: {x}<br>Y: {y}<br>Mag: {mag}"
-                for name, x, y, mag in zip(
-                    self.star_data['name'],
-                    self.star_data['x'],
-                    self.star_data['y'],
-                    self.star_data['mag']
-                )
-            ]
-            marker_size = [
-                np.exp(-(mag-19.0)/2.5)*10.0
-                for mag in self.star_data['mag']
-            ]
-            marker_color = [
-                "red" if name == "SgrA" else "cyan"
-                for name in self.star_data["name"]
-            ]
-            marker_symbol = [
-                "star" if name == "SgrA" else "circle"
-                for name in self.star_data["name"]
-            ]
-            marker_opacity = [
-                1 if name == "SgrA" else 0.7
-                for name in self.star_data["name"]
-            ]
+                orbit_data = get_orbits(orbit_filepath, store=self.orbit_tracks)
+
+            x_range = [center_x - range, center_x + range]
+            y_range = [center_y - range, center_y + range]
+            rows = select_visible_stars(star_data, x_range, y_range)
 
             fig_2d = go.Figure()
             fig_2d.add_trace(
-                go.Scattergl(
-                    x=self.star_data["x"],
-                    y=self.star_data["y"],
-                    customdata=self.star_data["name"],
-                    mode="markers+text" if enable_names else "markers",
-                    text=self.star_data["name"] if enable_names else None,
-                    textposition="top center",
-                    textfont={
-                        "size": 8,
-                        "color": "grey",
-                        "family": "Times New Roman"
-                    },
-                    hovertext=hover_text,
-                    hoverinfo="text",
-                    marker={
-                        "size": marker_size,
-                        "color": marker_color,
-                        "symbol": marker_symbol,
-                        "opacity": marker_opacity,
-                        "line": {
-                            "color": "white",
-                            "width": 1
-                        }
-                    }
-                )
+                go.Scattergl(**self.star_trace(star_data, rows, enable_names))
             )
             fig_2d.update_layout(
                 template="plotly_dark",
@@ -118,12 +161,12 @@ class Dashboard:
                 xaxis={
                     "scaleanchor": "y",
                     "scaleratio": 1,
-                    "range": [center_x - range, center_x + range],
+                    "range": x_range,
                     "color": "white",
                     "gridcolor": "rgba(0, 0, 0, 0.3)"
                 },
                 yaxis={
-                    "range": [center_y - range, center_y + range],
+                    "range": y_range,
                     "color": "white",
                     "gridcolor": "rgba(0, 0, 0, 0.3)"
                 },
@@ -146,20 +189,81 @@ class Dashboard:
             )
 
             if enable_orbits and orbit_filepath:
-                for orbit, name in zip(self.orbit_data[0], self.orbit_data[1]):
-                    orbit = np.array(orbit)
-                    fig_2d.add_trace(
-                        go.Scatter(
-                            x=orbit[:, 0],
-                            y=orbit[:, 1],
-                            mode="lines",
-                            opacity=0.4,
-                            hovertext=name,
-                            hoverinfo="text"
-                        )
+                orbit_x, orbit_y, orbit_text = merge_orbit_tracks(
+                    *orbit_data
+                )
+                fig_2d.add_trace(
+                    go.Scattergl(
+                        x=orbit_x,
+                        y=orbit_y,
+                        mode="lines",
+                        opacity=0.4,
+                        hovertext=orbit_text,
+                        hoverinfo="text"
                     )
+                )
 
-            return fig_2d, self.star_data["name"]
+            return fig_2d, star_data["name"]
+
+        @self.app.callback(
+            Output("star_map_2d", "figure", allow_duplicate=True),
+            Input("star_map_2d", "relayoutData"),
+            [State("star_map_2d", "figure"),
+            State("data_filepath", "value"),
+            State("map_range", "value"),
+            State("map_center_x", "value"),
+            State("map_center_y", "value"),
+            State("enable_names", "on")],
+            prevent_initial_call=True
+        )
+        def update_viewport(
+            relayout_data: dict,
+            figure: dict,
+            data_filepath: str,
+            range: float,
+            center_x: float,
+            center_y: float,
+            enable_names: bool
+        ) -> Patch:
+            """
+            On pan/zoom, resend only the star trace for the new view,
+            and the axis ranges so the figure keeps track of the view
+            """
+            if not data_filepath or not relayout_data:
+                raise PreventUpdate
+
+            star_data = get_starset_data(data_filepath)
+
+            if None in (range, center_x, center_y):
+                # Full field
+                x = np.asarray(star_data["x"], dtype=float)
+                y = np.asarray(star_data["y"], dtype=float)
+                refresh_ranges = [
+                    [float(np.nanmin(x)), float(np.nanmax(x))],
+                    [float(np.nanmin(y)), float(np.nanmax(y))]
+                ]
+            else:
+                refresh_ranges = [
+                    [center_x - range, center_x + range],
+                    [center_y - range, center_y + range]
+                ]
+
+            ranges = relayout_ranges(relayout_data, figure, refresh_ranges)
+            if ranges is None:
+                raise PreventUpdate
+            x_range, y_range = ranges
+
+            rows = select_visible_stars(star_data, x_range, y_range)
+
+            patched_figure = Patch()
+            trace = self.star_trace(star_data, rows, enable_names)
+            for key, value in trace.items():
+                patched_figure["data"][0][key] = value
+            for axis, axis_range in zip(["xaxis", "yaxis"], ranges):
+                patched_figure["layout"][axis]["range"] = axis_range
+                patched_figure["layout"][axis]["autorange"] = False
+
+            return patched_figure
 
         @self.app.callback(
             Output("star_reference_list", "value"),
@@ -173,10 +277,14 @@ class Dashboard:
         @self.app.callback(
             Output("neighbor_table", "data"),
             Input("star_reference_list", "value"),
+            State("data_filepath", "value"),
             prevent_initial_call=True
         )
-        def update_neighbor_table(star_name: str) -> None:
-            table_data = find_neighbor_stars(self.star_data, star_name)
+        def update_neighbor_table(star_name: str, data_filepath: str) -> None:
+            if not data_filepath:
+                raise PreventUpdate
+            star_data = get_starset_data(data_filepath)
+            table_data = find_neighbor_stars(star_data, star_name)
             return table_data
 
         self.app.run(
@@ -0,0 +1,107 @@
+import os
+import threading
+from collections import OrderedDict
+from typing import Any, Callable
+
+from gcwork import startable
+
+
+def file_identity(path: str, suffixes: list[str] = [""]) -> tuple:
+    """
+    Identity of the files behind a data set: (suffix, mtime, size) for
+    path + each suffix. Any change to one of the files gives a new
+    identity.
+    """
+    return tuple(
+        tuple(entry) for entry in startable.fingerprint(path, suffixes)
+    )
+
+
+class DataCache:
+    """
+    Thread-safe LRU cache of loaded data sets, shared by all callbacks
+    and sessions in one process.
+
+    Entries are keyed by (kind, absolute path, file identity), so an
+    edited file is reloaded on the next request and its old entry is
+    evicted once it is least recently used. At most max_entries
+    entries are kept. Concurrent requests for the same missing entry
+    wait for a single load instead of each parsing the files.
+    """
+
+    def __init__(self, max_entries: int = 8) -> None:
+        self.max_entries = max_entries
+        self._entries: OrderedDict[tuple, Any] = OrderedDict()
+        self._lock = threading.Lock()
+        self._loading: dict[tuple, threading.Lock] = {}
+
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    def get(
+        self,
+        kind: str,
+        path: str,
+        loader: Callable[[str], Any],
+        suffixes: list[str] = [""]
+    ) -> Any:
+        """
+        Cached loader(path). suffixes lists the files (path + suffix)
+        whose modification invalidates the entry.
+        """
+        key = (kind, os.path.abspath(path), file_identity(path, suffixes))
+
+        with self._lock:
+            if key in self._entries:
+                self._entries.move_to_end(key)
+                self.hits += 1
+                return self._entries[key]
+            load_lock = self._loading.setdefault(key, threading.Lock())
+
+        with load_lock:
+            # Another thread may have loaded it while we waited
+            with self._lock:
+                if key in self._entries:
+                    self._entries.move_to_end(key)
+                    self.hits += 1
+                    return self._entries[key]
+                self.misses += 1
+
+            try:
+                value = loader(path)
+            except Exception:
+                with self._lock:
+                    self._loading.pop(key, None)
+                raise
+
+            with self._lock:
+                self._entries[key] = value
+                self._entries.move_to_end(key)
+                while len(self._entries) > self.max_entries:
+                    self._entries.popitem(last=False)
+                    self.evictions += 1
+                self._loading.pop(key, None)
+
+        return value
+
+    def clear(self) -> None:
+        with self._lock:
+            self._entries.clear()
+
+    def stats(self) -> dict[str, int]:
+        """
+        Hit/miss/eviction counts and the current number of entries
+        """
+        with self._lock:
+            return {
+                "hits": self.hits,
+                "misses": self.misses,
+                "evictions": self.evictions,
+                "entries": len(self._entries),
+                "max_entries": self.max_entries
+            }
+
+
+# Shared by everything in this process
+DATA_CACHE = DataCache()
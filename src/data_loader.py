@@ -1,14 +1,17 @@
 import numpy as np
 
+from gcwork import startable
 from gcwork.starset import StarSet
-from gcwork import orbits
+from gcwork.orbittracks import OrbitTrackStore
+from data_cache import DATA_CACHE
+from star_index import StarIndex
 
 def load_starset_data(data_filepath: str) -> dict[str, list[float]]:
     """
     Load star position data from alignment files
     """
 
-    s = StarSet(data_filepath)
+    s = StarSet(data_filepath, cache=True)
 
     name = np.array(s.getArray('name')).tolist()
     x = np.array(s.getArray('x')).tolist()
@@ -33,79 +36,145 @@ def load_starset_data(data_filepath: str) -> dict[str, list[float]]:
         'vxe': vxe,
         'vye': vye,
         'mag': mag,
-        'nEpochs': nEpochs
+        'nEpochs': nEpochs,
+        'index': StarIndex(name, x, y)
     }
 
     return data
 
 def load_orbits(
-    orbits_file: str, tStart=1994., tEnd=2020., dt=0.01
+    orbits_file: str, tStart=1994., tEnd=2020.,
+    store: OrbitTrackStore | None = None
 ) -> tuple[list[any], list[any]]:
     """
-    Load orbit data from file
+    Load orbit tracks for the stars in an orbits.dat file. Tracks come
+    from the given OrbitTrackStore (a new one for tStart-tEnd if None),
+    so unchanged orbits are never recomputed.
     """
     if not orbits_file:
         return None, None, False
 
-    t = np.linspace(tStart, tEnd, int(np.ceil((tEnd - tStart) / dt)))
+    if store is None:
+        store = OrbitTrackStore(mass=4.e6, dist=8000., tStart=tStart, tEnd=tEnd)
 
-    if orbits_file is None:
-        tab = np.genfromtxt(orbits_file, dtype=str)
-    else:
-        tab = np.genfromtxt(orbits_file, dtype=str)
+    res, names = store.load(orbits_file)
 
-    res = []
-    names = []
-    for star in tab:
-        orb = orbits.Orbit()
-        orb.p = float(star[1])
-        orb.t0 = float(star[3])
-        orb.e = float(star[4])
-        orb.i = float(star[5])
-        orb.o = float(star[6])
-        orb.w = float(star[7])
+    return res, names
 
-        (x, v, a) = orb.kep2xyz(epochs=t, mass=4.e6, dist=8000.)
-        names.append(star[0])
-        res.append(x[:, 0:2].tolist())
+def get_starset_data(data_filepath: str) -> dict[str, list[float]]:
+    """
+    load_starset_data through the process-wide cache. The result is
+    shared between callbacks and sessions and must not be modified.
+    """
+    return DATA_CACHE.get(
+        "starset",
+        data_filepath,
+        load_starset_data,
+        suffixes=startable.ALIGN_SUFFIXES
+    )
+
+def get_orbits(
+    orbits_file: str,
+    store: OrbitTrackStore | None = None
+) -> tuple[list[any], list[any]]:
+    """
+    load_orbits through the process-wide cache
+    """
+    if not orbits_file:
+        return None, None, False
 
-    return res, names
+    return DATA_CACHE.get(
+        "orbits",
+        orbits_file,
+        lambda path: load_orbits(path, store=store)
+    )
 
 def find_neighbor_stars(
-    star_dataset: StarSet,
-    ref_star_name: str
+    star_dataset: dict[str, list],
+    ref_star_name: str,
+    num_neighbors: int = 250
 ) -> list[dict[str, str | float]]:
-    distance_dict = {}
-    table_data = []
-    i = 0
-
-    ref_star_idx = star_dataset["name"].index(ref_star_name)
-    ref_pos_x = star_dataset["x"][ref_star_idx]
-    ref_pos_y = star_dataset["y"][ref_star_idx]
-
-    for idx in range(len(star_dataset["x"])):
-        name = star_dataset["name"][idx]
-        if name == ref_star_name:
-            continue
-
-        dx = ref_pos_x - star_dataset["x"][idx]
-        dy = ref_pos_y - star_dataset["y"][idx]
-        distance = np.sqrt(dx**2 + dy**2)
-        distance_dict[name] = distance
-
-    sorted_distance_dict = {
-        name: dist for name, dist in sorted(
-            distance_dict.items(),
-            key=lambda item: item[1]
-        )
-    }
-
-    for name, dist in sorted_distance_dict.items():
-        table_data.append(
-            {"star": name, "distance": round(dist, 5)}
-        )
-        i += 1
-        if i >= 250:
-            break
+    """
+    Nearest neighbors of a star, closest first, using the spatial
+    index built by load_starset_data
+    """
+    index = star_dataset.get("index")
+    if index is None:
+        index = StarIndex(star_dataset["name"], star_dataset["x"], star_dataset["y"])
+
+    ref_star_idx = index.row(ref_star_name)
+    if ref_star_idx is None:
+        return []
+
+    rows, dists = index.query_nearest(
+        index.x[ref_star_idx],
+        index.y[ref_star_idx],
+        num_neighbors,
+        exclude=ref_star_idx
+    )
+
+    table_data = [
+        {"star": index.names[row], "distance": round(float(dist), 5)}
+        for row, dist in zip(rows, dists)
+    ]
 
     return table_data
+
+def select_visible_stars(
+    star_dataset: dict[str, list],
+    x_range: list[float],
+    y_range: list[float],
+    margin: float = 0.25,
+    max_stars: int = 4000
+) -> np.ndarray:
+    """
+    Rows of the stars to draw for a view of the star map. Stars inside
+    the view, widened on each side by margin times the view size, are
+    kept so that small pans do not show empty edges. If more than
+    max_stars are in view (zoomed out), only the brightest are kept.
+    SgrA is always kept.
+    """
+    index = star_dataset["index"]
+
+    x_min, x_max = min(x_range), max(x_range)
+    y_min, y_max = min(y_range), max(y_range)
+    dx = (x_max - x_min) * margin
+    dy = (y_max - y_min) * margin
+
+    rows = index.query_box(x_min - dx, x_max + dx, y_min - dy, y_max + dy)
+
+    if len(rows) > max_stars:
+        mag = np.asarray(star_dataset["mag"], dtype=float)[rows]
+        mag = np.where(np.isfinite(mag), mag, np.inf)
+        bright = rows[np.argpartition(mag, max_stars - 1)[:max_stars]]
+
+        sgra = index.row("SgrA")
+        if sgra is not None and sgra in rows and sgra not in bright:
+            bright = np.append(bright, sgra)
+        rows = bright
+
+    return np.sort(rows)
+
+def merge_orbit_tracks(
+    tracks: list[np.ndarray],
+    names: list[str]
+) -> tuple[np.ndarray, np.ndarray, list[str]]:
+    """
+    Join orbit tracks into single x and y arrays separated by NaN, so
+    all orbits can be drawn as one trace. Also returns the hover text
+    for each point (the star name).
+    """
+    if len(tracks) == 0:
+        return np.empty(0), np.empty(0), []
+
+    gap = np.full((1, 2), np.nan)
+    pieces = []
+    hover_text = []
+    for track, name in zip(tracks, names):
+        track = np.asarray(track, dtype=float)
+        pieces.extend([track, gap])
+        hover_text.extend([name] * (len(track) + 1))
+
+    xy = np.concatenate(pieces)
+
+    return xy[:, 0], xy[:, 1], hover_text
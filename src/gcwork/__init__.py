@@ -1,2 +1,2 @@
-__all__ = ["objects", "starset", "util", "young", "starTables"]
+__all__ = ["objects", "starset", "startable", "util", "young", "starTables"]
 
@@ -13,7 +13,11 @@ from gcreduce import gcutil
 from gcwork import starset
 from gcwork import starTables
 from gcwork import objects
+from gcwork import startable
+from gcwork import stagestore
 from gcwork.polyfit import accel
+from gcwork.polyfit import tracks
+from gcwork.polyfit import batchfit
 from scipy import stats
 #from gcutil import nmpfit_mos as nmpfit
 from stsci.tools import nmpfit
@@ -25,12 +29,40 @@ import pickle
 import pdb
 from astropy.table import Table
 import itertools
+import multiprocessing as mp
+from matplotlib.figure import Figure
+
+class _StageAttribute(object):
+    """Class attribute for a result of an accelClass analysis stage.
+    Reading it from a lazy accelClass runs the stage first (see
+    accelClass.runStage). Otherwise, and until the stage has set the
+    instance attribute, it reads as the class default."""
+    def __init__(self, stage, name, default):
+        self.stage = stage
+        self.name = name
+        self.default = default
+
+    def __get__(self, obj, objtype=None):
+        if obj is None or not obj.__dict__.get('lazy', False):
+            return self.default
+        obj.runStage(self.stage)
+        return obj.__dict__.get(self.name, self.default)
 
 class accelClass(starset.StarSet):
     """Object containing acceleration analysis. This class will
     inherit methods from the StarSet class
 
     CLASS METHODS:
+        chi2AddErr(testErr) - chi2 of the velocity fits for many
+        additive errors at once (used by testChi2Fit and testChi2FitXY).
+
+        closestPairDistances(srt, trange) - minimum distance between
+        every star and its closest stars according to the acceleration
+        fits.
+
+        closestSources(numSources) - indices of the closest stars to
+        every star at the fit epoch (KD-tree search).
+
         computeSpeckleAOVel(): compute the speckle and AO velocities individually and
         check the difference in the velocity vectors.
 
@@ -38,6 +70,9 @@ class accelClass(starset.StarSet):
         threshold distance. This function is helpful for trimming epochs when sources
         may be confused
 
+        findConfusedEpochs() - find the possibly confused epochs of all
+        stars at once from the loaded points (see removeConfusedEpochs).
+
         findMisMatch(starName = 'irs16NE', bootStrap=False) - check to
         see whether there are points that are mismatched in the star
         fit.
@@ -54,13 +89,24 @@ class accelClass(starset.StarSet):
         fitVelocity(time, x, xerr) - fit for a velocity and returns an mpfit
         object.
 
+        pairEpochDistance(ind1, ind2, trange, dist) - epochDistance()
+        for many pairs of stars.
+
+        pairMinDistance(ind1, ind2, trange) - minimum distance between
+        many pairs of stars according to the acceleration fits.
+
         plotchi2(removeConfused = False) - plot the chi2 distribution
         of the acceleration and velocity fits.
 
         removeConfusedEpochs(mkPointsFiles=False, runPolyfit=False) -
         make a copy of the points files into points_c/ and then trim
         out all epochs from each confused star. Can be set to produce
-        new points files and run polyfit on those
+        new points files and run polyfit on those. With inMemory=True
+        the loaded points are trimmed and refit without copying or
+        rereading the points files.
+
+        runStage(name) - compute (or load from the stage store) the
+        results of one of the analysis stages in accelClass.stages.
 
         testChiSqFitXY - look what additive error is necessary to add to
         the x and y coordinates
@@ -68,6 +114,17 @@ class accelClass(starset.StarSet):
         updateAccel() - update the acceleration calculations of radial
         and tangential acceleration
 
+        updateFits() - copy the velocity and acceleration fits of
+        starSet into the fit arrays (x, vx, ax, chi2x, ...)
+
+        writeTables() - write the accel.txt and linear.txt tables of
+        the fits
+
+    With lazy=True the stages (loading, fits, accelerations,
+    high order fits, nearest stars, non-physical accelerations and
+    neighbors) only run when their results are first read, and with
+    cache=True their results are kept on disk between sessions.
+
 
     HISTORY: 2009-03-11 - T. Do
              2010-04-05 - T. Do - added function to compute the additive
@@ -120,11 +177,68 @@ class accelClass(starset.StarSet):
     xFProb = []
     yFProb = []
 
+    # in-process polynomial fits of all orders in poly_orders (order ->
+    # polyfit.batchfit.PolyfitResult), made by fitHighOrderPoly()
+    hpolyX = None
+    hpolyY = None
+
+
+    # Analysis stages, in the order __init__ runs them:
+    # (name, method, stages it needs, parameters it depends on,
+    # attributes it sets). With lazy=True a stage only runs the first
+    # time one of its attributes is read. The results of every stage
+    # but 'load' can be kept in a stagestore.StageStore.
+    stages = [
+        ('load', '_stageLoad', [],
+         ['align', 'poly', 'points', 'computePoly'],
+         ['starSet']),
+        ('fits', '_stageFits', ['load'],
+         ['namesFile'],
+         ['names', 'mag', 'r2d', 'allEpochs', 'speckInd', 'aoInd',
+          'chiThreshold', 'maxEpochInd',
+          'x', 'y', 'xerr', 'yerr', 'vx', 'vy', 'vxe', 'vye',
+          'ax', 'ay', 'axe', 'aye', 't0',
+          'x_v', 'y_v', 'xe_v', 'ye_v', 'vx_v', 'vy_v', 'vxe_v', 'vye_v',
+          't0_v', 'chi2x', 'chi2y', 'chi2xv', 'chi2yv', 'nEpochs', 'epoch']),
+        ('accel', '_stageAccel', ['fits'],
+         ['sigma'],
+         ['ar', 'are', 'at', 'ate', 'atot', 'a2d', 'rarc', 'a2dsim',
+          'accelTable', 'xFProb', 'yFProb']),
+        ('highOrder', '_stageHighOrder', ['load', 'fits'],
+         ['poly_orders'],
+         ['hpolyX', 'hpolyY', 'Fx_poly', 'Fy_poly', 'chix_poly',
+          'chiy_poly', 'best_poly_order_pvalue']),
+        ('nearestStar', 'findNearestStar', ['fits', 'accel'],
+         [],
+         ['nearestStarName', 'nearestStarDist']),
+        ('nonPhysical', '_stageNonPhysical',
+         ['fits', 'accel', 'highOrder', 'nearestStar'],
+         ['sigma', 'epochsRequired', 'run_high_order_poly'],
+         ['goodAccel', 'physical', 'bad', 'nonPhysical',
+          'nearestNonPhysical']),
+        ('neighbors', 'findNearestNeighbors', ['fits', 'accel'],
+         ['confusionThreshold', 'confusionMagThreshold'],
+         ['neighbors', 'confusedSources', 'confusedSourcesInd']),
+        ]
 
     def __init__(self, rootDir='./', align='align/align_d_rms_1000_abs_t',
                  poly='polyfit_3_c/fit', points='points_3_c/', sigma=5,
                  namesFile = False, findAddErr = False, rmax=0.0,
-                 verbose=True, epochsRequired = 0, run_high_order_poly=False):
+                 verbose=True, epochsRequired = 0, run_high_order_poly=False,
+                 computePoly=False, lazy=False, cache=False, cacheDir=None):
+        """
+        Keywords: lazy - don't load or compute anything here. Every
+                  analysis stage (see stages) runs the first time one of
+                  its results is read, e.g. reading ar only loads the
+                  fits and computes the accelerations, without the
+                  neighbor searches. The accel and linear tables are
+                  then only written by writeTables().
+
+                  cache - keep the results of every stage on disk
+                  (under cacheDir, default ~/.cache/gcwork) and reuse
+                  them as long as the align, polyfit, points and
+                  epochsInfo files and the stage parameters are the same.
+        """
 
         # Load the align files into the class so other methods can use the info.
         self.rootDir = rootDir
@@ -134,6 +248,10 @@ class accelClass(starset.StarSet):
         self.sigma = sigma
         self.rmax = rmax  # maximum radius for chi-sq in additive error
         self.run_high_order_poly = run_high_order_poly
+        self.namesFile = namesFile
+        self.computePoly = computePoly
+        self.verbose = verbose
+        self.epochsRequired = epochsRequired
 
         # prefix for plots
         #self.plotPrefix = 'plots/'+os.path.split(os.path.dirname(rootDir))[1]+'_'
@@ -143,16 +261,138 @@ class accelClass(starset.StarSet):
         cc = objects.Constants()
         self.cc = cc
 
+        # scale factor for the errors in computing additive factor
+        self.errScaleFactor = 1.0
+
+        # higher order polynomial fits and f test
+        self.poly_orders = np.array([1,2,3,4,5])
+
+        # stage bookkeeping (see runStage)
+        self.lazy = lazy
+        self.stagesDone = {}
+        self._stagesRunning = []
+        self._inputFiles = None
+        self.stageStore = None
+        if cache:
+            options = repr([align, poly, points, computePoly])
+            self.stageStore = stagestore.StageStore(rootDir + align, options,
+                                                    cacheDir=cacheDir)
+
+        if not lazy:
+            for stage in self.stages:
+                ##only need to run this step once and then poly files are made
+                if stage[0] == 'highOrder' and not run_high_order_poly:
+                    continue
+                self.runStage(stage[0])
+
+        # self.findMismatch(bootStrap=True)
+        #if (len(self.speckInd) > 3):
+        #    self.computeSpeckleAOVel(requireAllEpochs=True)
+        #self.saveClass()
+        #self.testChi2Fit()
+
+        if findAddErr:
+            if len(self.speckInd) > 0:
+                data = 'speckle'
+            else:
+                data = 'ao'
+            # testErr should be in arcseconds
+            self.testChi2Fit(scaleFactor = self.errScaleFactor, data = data,
+                             testErr = np.arange(0.00005,0.0005,0.00001))
+
+        if not lazy:
+            self.writeTables()
+
+    def stageInfo(self, name):
+        """ (method, stages it needs, parameters, attributes) of a stage """
+        for stage in self.stages:
+            if stage[0] == name:
+                return stage[1:]
+        raise KeyError('no stage named ' + name)
+
+    def inputFiles(self):
+        """ fingerprints of the align, polyfit, points, epochsInfo and
+        names files, taken once per object """
+        if self._inputFiles is None:
+            root = self.rootDir
+            files = [startable.fingerprint(root + self.align),
+                     stagestore.fileFingerprint([root + self.poly + suffix for suffix in
+                                                 ['.linearFormal', '.lt0', '.accelFormal', '.t0']]),
+                     stagestore.dirFingerprint(root + self.points),
+                     stagestore.fileFingerprint([root + 'scripts/epochsInfo.txt'])]
+            if self.namesFile:
+                files.append(startable.fingerprint(self.namesFile))
+            self._inputFiles = files
+        return self._inputFiles
+
+    def stageKey(self, name):
+        """ key of a stage's results in the stage store: changes when
+        the input files, the stage parameters or the key of any stage
+        it needs changes """
+        (method, needs, params, attrs) = self.stageInfo(name)
+        parts = [name, self.inputFiles()]
+        parts += [(param, getattr(self, param)) for param in params]
+        parts += [self.stageKey(need) for need in needs]
+        return stagestore.stageKey(*parts)
+
+    def runStage(self, name):
+        """ Compute the results of an analysis stage, or load them from
+        the stage store, unless that was already done. Stages it needs
+        are run when their results are read (or, without lazy, because
+        __init__ runs the stages in order).
+        """
+        if (name in self.stagesDone) or (name in self._stagesRunning):
+            return
+        (method, needs, params, attrs) = self.stageInfo(name)
+
+        key = None
+        values = None
+        if self.stageStore is not None and name != 'load':
+            key = self.stageKey(name)
+            values = self.stageStore.load(name, key)
+
+        self._stagesRunning.append(name)
+        try:
+            if values is None:
+                getattr(self, method)()
+                if key is not None and self.stageStore is not None:
+                    values = dict([(attr, self.__dict__[attr]) for attr in attrs
+                                   if attr in self.__dict__])
+                    self.stageStore.save(name, key, values)
+            else:
+                if self.verbose:
+                    print( 'accelClass: loaded stage %s from the stage store' % name)
+                self.__dict__.update(values)
+        finally:
+            self._stagesRunning.remove(name)
+        self.stagesDone[name] = key
+
+    def _stageLoad(self):
+        rootDir = self.rootDir
+
         # Load up positional information from align.
-        s = starset.StarSet(rootDir + align)
-        s.loadPolyfit(rootDir + poly, arcsec=1, silent=True)
-        s.loadPolyfit(rootDir + poly, arcsec=1, accel=1, silent=True)
+        s = starset.StarSet(rootDir + self.align, cache=True)
+        if self.computePoly:
+            # Fit the points files here instead of reading the output
+            # of a polyfit run. Stars without points are trimmed, as
+            # loadPolyfit() does for stars missing from polyfit.
+            s.loadPoints(rootDir + self.points)
+            s.stars = [star for star in s.stars if star.pointsCnt > 0]
+            s.computePolyfit()
+            s.computePolyfit(accel=1)
+        else:
+            s.loadPolyfit(rootDir + self.poly, arcsec=1, silent=True)
+            s.loadPolyfit(rootDir + self.poly, arcsec=1, accel=1, silent=True)
 
-        # load the points files corresponding to the polyfit. Note
-        # that this points file might not be the same as the align
-        # file if some trimming of confused epochs is done.
-        s.loadPoints(rootDir + points)
+            # load the points files corresponding to the polyfit. Note
+            # that this points file might not be the same as the align
+            # file if some trimming of confused epochs is done.
+            s.loadPoints(rootDir + self.points)
 
+        self.starSet = s    # the original starset object
+
+    def _stageFits(self):
+        s = self.starSet
         names = s.getArray('name')
         mag = s.getArray('mag') * 1.0
 
@@ -160,9 +400,9 @@ class accelClass(starset.StarSet):
         # provide names for the larger align and should be aligned to
         # the reference epoch. DOESN'T WORK RIGHT NOW - trimmed list
         # different than original reference list.
-        if namesFile:
-            print( 'getting names from a different align: ', namesFile)
-            nameAlign = starset.StarSet(namesFile)
+        if self.namesFile:
+            print( 'getting names from a different align: ', self.namesFile)
+            nameAlign = starset.StarSet(self.namesFile)
             refNames = nameAlign.getArray('name')
 
             print( refNames[20:30])
@@ -171,53 +411,21 @@ class accelClass(starset.StarSet):
             # alignment
             names[0:len(refNames)-1] = refNames
 
-        # read accel fit result from poly file in mas/yr^2
-        x = s.getArray('fitXa.p')
-        y = s.getArray('fitYa.p')
-        xerr = s.getArray('fitXa.perr')
-        yerr = s.getArray('fitYa.perr')
-        vx = s.getArray('fitXa.v')
-        vy = s.getArray('fitYa.v')
-        vxe = s.getArray('fitXa.verr')
-        vye = s.getArray('fitYa.verr')
-        ax = s.getArray('fitXa.a')
-        ay = s.getArray('fitYa.a')
-        axe = s.getArray('fitXa.aerr')
-        aye = s.getArray('fitYa.aerr')
-        r2d = s.getArray('r2d')
-        chi2x = s.getArray('fitXa.chi2')
-        chi2y = s.getArray('fitYa.chi2')
-        t0 = s.getArray('fitXa.t0')
-
-        # read the linear fitting result
-        x_v = s.getArray('fitXv.p')
-        y_v = s.getArray('fitYv.p')
-        xe_v = s.getArray('fitXv.perr')
-        ye_v = s.getArray('fitYv.perr')
-        vx_v = s.getArray('fitXv.v')
-        vy_v = s.getArray('fitYv.v')
-        vxe_v = s.getArray('fitXv.verr')
-        vye_v = s.getArray('fitYv.verr')
-        chi2xv = s.getArray('fitXv.chi2')
-        chi2yv = s.getArray('fitYv.chi2')
-        t0_v = s.getArray('fitXv.t0')
+        # velocity and acceleration fits
+        self.updateFits()
 
         # set the chi-sq threshold to be three times the DOF for velocity fits
         #self.nEpochs = s.getArray('velCnt')
-        self.nEpochs = s.getArray('pointsCnt')
         self.chiThreshold = (np.max(self.nEpochs) - 3.0) * 3.0
 
         # index of stars with the maximum number of epochs detected
         self.maxEpochInd = np.where(self.nEpochs == np.max(self.nEpochs))[0]
 
-        # T0 for each of the acceleration fits
-        self.epoch = s.getArray('fitXa.t0')
-
         # All epochs sampled
         self.allEpochs = np.array(s.stars[0].years)
 
         # figure out which  epochs are speckle and AO
-        epochFile = rootDir+'scripts/epochsInfo.txt'
+        epochFile = self.rootDir+'scripts/epochsInfo.txt'
 
         if os.path.isfile(epochFile):
             # Load up epochsInfo.txt
@@ -235,7 +443,7 @@ class accelClass(starset.StarSet):
             speckInd = np.where((aoFlag == 0))[0]
             aoInd = np.where((aoFlag == 1))[0]
 
-            if verbose == True:
+            if self.verbose == True:
                 print( 'speckle epochs: ', self.allEpochs[speckInd])
                 print( 'AO epochs: ', self.allEpochs[aoInd])
             self.speckInd = speckInd
@@ -246,65 +454,26 @@ class accelClass(starset.StarSet):
 
         self.names = np.array(names)  # star names
         self.mag = mag  # magnitudes
-        self.cc = cc    # constants
-        self.x, self.y = x, y  # fited positions at T0
-        self.xerr, self.yerr = xerr, yerr # positional errors
-        self.vx, self.vy = vx, vy  # velocities
-        self.vxe, self.vye = vxe, vye  # velocity errors
-        self.ax, self.ay = ax, ay  # accelerations
-        self.axe, self.aye = axe, aye  # acceleration errors
-        self.t0 = t0 # acceleration t0
-
-        self.x_v, self.y_v = x_v, y_v # linear fitting position
-        self.xe_v, self.ye_v = xe_v, ye_v
-        self.vx_v, self.vy_v = vx_v, vy_v  # linear fitting velocities
-        self.vxe_v, self.vye_v = vxe_v, vye_v
-        self.t0_v = t0_v # acceleration t0
-
-        self.chi2x, self.chi2y = chi2x, chi2y   # acceleartion fit chi-square
-        self.chi2xv, self.chi2yv = chi2xv, chi2yv # velocity fit chi-square
-
-        self.r2d = r2d    # radial distance from Sgr A*
-        self.starSet = s    # the original starset object
-
-        self.nearestStarName = np.zeros(len(x), dtype='S13')
-        self.nearestStarDist = np.zeros(len(x), dtype=float)
-
-        # scale factor for the errors in computing additive factor
-        self.errScaleFactor = 1.0
+        self.r2d = s.getArray('r2d')    # radial distance from Sgr A*
 
+    def _stageAccel(self):
         # initialize the acceleration information
         self.updateAccel()
         self.computeFTest()  # compute the F test
 #        self.computeJerk()  # compute the jerk -- not functional yet
 #        self.computeFTestJerk()  # compute the F test 
 
-        # run higher order polynomial fit and f test
-        self.poly_orders = np.array([1,2,3,4,5])
-        ##only need to run this step once and then poly files are made
-        if run_high_order_poly:
-            self.run_ftest_hpoly(make_plot=False, p_crit=0.8) # run f test to find the best polynomial order
-
-        self.findNearestStar()
-        self.findNonPhysical(verbose=verbose, epochsRequired=epochsRequired)
-        self.findNearestNeighbors()
-
-        # self.findMismatch(bootStrap=True)
-        #if (len(self.speckInd) > 3):
-        #    self.computeSpeckleAOVel(requireAllEpochs=True)
-        #self.saveClass()
-        #self.testChi2Fit()
-
-        if len(self.speckInd) > 0:
-            data = 'speckle'
-        else:
-            data = 'ao'
-        if findAddErr:
-            # testErr should be in arcseconds
-            self.testChi2Fit(scaleFactor = self.errScaleFactor, data = data,
-                             testErr = np.arange(0.00005,0.0005,0.00001))
+    def _stageHighOrder(self):
+        # run f test to find the best polynomial order
+        self.run_ftest_hpoly(make_plot=False, p_crit=0.8)
 
+    def _stageNonPhysical(self):
+        self.findNonPhysical(verbose=self.verbose, epochsRequired=self.epochsRequired)
 
+    def writeTables(self):
+        """ Write the acceleration and linear fits of all stars to the
+        tables <poly>accel.txt and <poly>linear.txt, sorted by radius.
+        """
         # write all the data to a table
         t_write = Table()
         t_write['name'] = self.names.copy()
@@ -422,59 +591,71 @@ class accelClass(starset.StarSet):
                 format='ascii.fixed_width', delimiter=None, overwrite=True)
 
 
+    def updateFits(self):
+        """ Copy the velocity and acceleration fits (and pointsCnt) of
+        self.starSet into the arrays used by the other methods, e.g.
+        after the points were refit.
+        """
+        s = self.starSet
+
+        # read accel fit result from poly file in mas/yr^2
+        self.x, self.y = s.getArray('fitXa.p'), s.getArray('fitYa.p')  # fited positions at T0
+        self.xerr, self.yerr = s.getArray('fitXa.perr'), s.getArray('fitYa.perr') # positional errors
+        self.vx, self.vy = s.getArray('fitXa.v'), s.getArray('fitYa.v')  # velocities
+        self.vxe, self.vye = s.getArray('fitXa.verr'), s.getArray('fitYa.verr')  # velocity errors
+        self.ax, self.ay = s.getArray('fitXa.a'), s.getArray('fitYa.a')  # accelerations
+        self.axe, self.aye = s.getArray('fitXa.aerr'), s.getArray('fitYa.aerr')  # acceleration errors
+        self.t0 = s.getArray('fitXa.t0') # acceleration t0
+
+        # read the linear fitting result
+        self.x_v, self.y_v = s.getArray('fitXv.p'), s.getArray('fitYv.p') # linear fitting position
+        self.xe_v, self.ye_v = s.getArray('fitXv.perr'), s.getArray('fitYv.perr')
+        self.vx_v, self.vy_v = s.getArray('fitXv.v'), s.getArray('fitYv.v')  # linear fitting velocities
+        self.vxe_v, self.vye_v = s.getArray('fitXv.verr'), s.getArray('fitYv.verr')
+        self.t0_v = s.getArray('fitXv.t0') # linear t0
+
+        self.chi2x, self.chi2y = s.getArray('fitXa.chi2'), s.getArray('fitYa.chi2')   # acceleartion fit chi-square
+        self.chi2xv, self.chi2yv = s.getArray('fitXv.chi2'), s.getArray('fitYv.chi2') # velocity fit chi-square
+
+        self.nEpochs = s.getArray('pointsCnt')
+
+        # T0 for each of the acceleration fits
+        self.epoch = s.getArray('fitXa.t0')
+
     def updateAccel(self):
-        """ Updates the radial and tangential acceleration arrays.
+        """ Updates the radial and tangential acceleration arrays, and
+        self.accelTable, the polyfit.accel.classifyAccel() table of all
+        stars with the physical acceleration tests at self.sigma.
         """
         cc = self.cc
         x, y = self.x, self.y
-        vx, vy = self.vx, self.vy
         ax, ay = self.ax, self.ay
         axe, aye = self.axe, self.aye
 
-        # Lets do radial/tangential
-        r = np.sqrt(x**2 + y**2)
-        if ('Radial' in self.poly):
-            at = ax
-            ar = ay
-            ate = axe
-            are = aye
-        else:
-            ar = ((ax*x) + (ay*y)) / r
-            at = ((ax*y) - (ay*x)) / r
-            are = np.sqrt((axe*x)**2 + (aye*y)**2) / r
-            ate = np.sqrt((axe*y)**2 + (aye*x)**2) / r
+        table = accel.classifyAccel(x, y, ax, axe, ay, aye, sigma=self.sigma,
+                                    radial=('Radial' in self.poly))
 
         # Total acceleration
         atot = py.hypot(ax, ay)
-        atoterr = np.sqrt((ax*axe)**2 + (ay*aye)**2) / atot
 
         # Calculate the acceleration limit set by the projected radius
         # Convert into cm
-        r2d = r * cc.dist * cc.cm_in_au
         rarc =np.arange(0.01,10.0,0.01)
         rsim = rarc * cc.dist * cc.cm_in_au
 
         # acc1 in cm/s^2
-        a2d = -cc.G * cc.mass * cc.msun / r2d**2
         a2dsim = -cc.G * cc.mass * cc.msun / rsim**2
         # acc1 in km/s/yr
-        a2d *= cc.sec_in_yr / 1.0e5
-        # a2d *= 1000.0 / cc.asy_to_kms
         a2dsim *= cc.sec_in_yr / 1.0e5
         # a2dsim *= 1000.0 / cc.asy_to_kms
 
-        # convert between arcsec/yr^2 to km/s/yr
-        ar *= cc.asy_to_kms
-        are *= cc.asy_to_kms
-        at *= cc.asy_to_kms
-        ate *= cc.asy_to_kms
-
-        self.ar = ar      # radial acceleration
-        self.are = are    # radial acceleration error
-        self.at = at      # tangential acceleration
-        self.ate = ate    # tangential acceleration error
+        self.accelTable = table
+        self.ar = table['ar']      # radial acceleration
+        self.are = table['are']    # radial acceleration error
+        self.at = table['at']      # tangential acceleration
+        self.ate = table['ate']    # tangential acceleration error
         self.atot = atot  # total acceleration
-        self.a2d = a2d    # maximum acceleration for each star at the x, y position
+        self.a2d = table['a2d']    # maximum acceleration for each star at the x, y position
         self.rarc, self.a2dsim = rarc, a2dsim # radial distance vs. accel (z = 0)
 
     def minDistance(self, xfit1,yfit1,xfit2,yfit2,t1,t2,trange,pause=0):
@@ -484,51 +665,43 @@ class accelClass(starset.StarSet):
         xfit1 = [x0, vx, ax]
         yfit1 = [y0, vy, ay]
 
+        The minimum is found exactly over trange (see
+        gcwork.polyfit.tracks.minDistance).
+
         HISTORY: 2010-01-13 - T. Do
         """
-        time = np.arange(trange[0],trange[1]+1,0.01)
-        time1 = time-t1
-        time2 = time-t2
-        xpos1 = self.poly2(xfit1, time1)
-        ypos1 = self.poly2(yfit1, time1)
-        xpos2 = self.poly2(xfit2, time2)
-        ypos2 = self.poly2(yfit2, time2)
-
-        distance = np.sqrt((xpos1-xpos2)**2 + (ypos1 - ypos2)**2)
+        (dmin, tmin) = tracks.minDistance(xfit1, yfit1, xfit2, yfit2,
+                                          t1, t2, trange)
         if pause:
-            clf()
-            plot(xpos1,ypos1)
-            plot(xpos2,ypos2)
-        #print( time)
-        return np.amin(distance)
+            time = np.linspace(trange[0], trange[1], 500)
+            plt.clf()
+            plt.plot(self.poly2(xfit1, time-t1), self.poly2(yfit1, time-t1))
+            plt.plot(self.poly2(xfit2, time-t2), self.poly2(yfit2, time-t2))
+        return dmin[0]
 
     def epochDistance(self, xfit1,yfit1,xfit2,yfit2,t1,t2,trange,dist,pause=False):
         """ Given two sets of acceleration fits, and a threshold distance,
         compute the range of epochs in which the two stars are within
         that distance. Returns None if the two stars never gets that close.
         """
+        span = tracks.closeRange(xfit1, yfit1, xfit2, yfit2,
+                                 t1, t2, trange, dist)[0]
 
-        time = np.arange(trange[0],trange[1]+1,0.01)
-        time1 = time-t1
-        time2 = time-t2
-        xpos1 = self.poly2(xfit1, time1)
-        ypos1 = self.poly2(yfit1, time1)
-        xpos2 = self.poly2(xfit2, time2)
-        ypos2 = self.poly2(yfit2, time2)
-
-        distance = np.sqrt((xpos1-xpos2)**2 + (ypos1 - ypos2)**2)
-
-        good = np.where(distance <= dist)[0]
         if pause:
+            time = np.linspace(trange[0], trange[1], 500)
+            good = (time >= span[0]) & (time <= span[1])
+            xpos1 = self.poly2(xfit1, time-t1)
+            ypos1 = self.poly2(yfit1, time-t1)
+            xpos2 = self.poly2(xfit2, time-t2)
+            ypos2 = self.poly2(yfit2, time-t2)
             plt.clf()
             plt.plot(xpos1,ypos1)
             plt.plot(xpos2,ypos2)
             plt.plot(xpos1[good],ypos1[good],'bo')
             plt.plot(xpos2[good],ypos2[good],'go')
-        #print( time)
 
-        if (len(good) > 0):
-            return np.array([np.min(time[good]), np.max(time[good])])
+        if np.isfinite(span[0]):
+            return span
         else:
             return None
 
@@ -604,73 +777,107 @@ class accelClass(starset.StarSet):
         measurement is physical. Unphysical accelerations are defined as
         either: 1. Significant tangential acceleration 2. Significant
         positive radial acceleration 3. Negative acceleration greater than
-        the maximum allowed at the 2D position.
+        the maximum allowed at the 2D position. The tests are done at
+        self.sigma with polyfit.accel.classifyAccel().
 
         RETURN: status array where 1 is true [tangential, pos. radial, > max radial]
         """
+        table = accel.classifyAccel(x, y, ax, axe, ay, aye, sigma=self.sigma,
+                                    arcsec=arcsec)
+        status = np.column_stack((table['tangential'], table['posRadial'],
+                                  table['tooLarge'])).astype(float)
 
-        status = np.zeros(3)  # return array
-
-        # Lets do radial/tangential
-        r = np.sqrt(x**2 + y**2)
-        ar = ((ax*x) + (ay*y)) / r
-        at = ((ax*y) - (ay*x)) / r
-        are = np.sqrt((axe*x)**2 + (aye*y)**2) / r
-        ate = np.sqrt((axe*y)**2 + (aye*x)**2) / r
-
-        # Total acceleration
-        atot = py.hypot(ax, ay)
-        atoterr = np.sqrt((ax*axe)**2 + (ay*aye)**2) / atot
-
-        # Calculate the acceleration limit set by the projected radius
-
-        if arcsec:
-            #convert to mks
-            cc = objects.Constants()
-
-            # Convert into cm
-            r2d = r * cc.dist * cc.cm_in_au
-
-            rarc =np.arange(0.01,10.0,0.01)
-            rsim = rarc * cc.dist * cc.cm_in_au
-
-            # acc1 in cm/s^2
-            a2d = -cc.G * cc.mass * cc.msun / r2d**2
-            a2dsim = -cc.G * cc.mass * cc.msun / rsim**2
-
-            # acc1 in km/s/yr
-            a2d *= cc.sec_in_yr / 1.0e5
-            #a2d *= 1000.0 / cc.asy_to_kms
-
-            # convert between arcsec/yr^2 to km/s/yr
-            ar *= cc.asy_to_kms
-            are *= cc.asy_to_kms
-
-            at *= cc.asy_to_kms
-            ate *= cc.asy_to_kms
+        # print( some diagnostic info)
+        print( 'isPhsyical: ar, are, at, ate: ', table['ar'], table['are'],
+               table['at'], table['ate'])
+        if np.ndim(x) == 0:
+            return status[0]
+        return status
 
-            a2dsim *= cc.sec_in_yr / 1.0e5
-            #a2dsim *= 1000.0 / cc.asy_to_kms
 
-        # tests to see if the accelerations are physical
-        if (abs(at/ate) > self.sigma):
-            #print( 'significant tangential acceleration')
-            status[0] = 1
+    def closestSources(self, numSources):
+        """Indices of the numSources stars closest to each star at the
+        fit epoch, sorted by distance, as an (N, numSources) array. The
+        first column is the star itself.
 
-        #print( 'radial acceleration %f +- %f' % (ar, are))
-        #print( 'tangential acceleration %f +- %f' % (at, ate))
-        if ((ar - (self.sigma*are)) > 0):
-            #print( 'positive radial acceleration')
-            status[1] = 1
+        Stars without a finite fit position (e.g. too few points for
+        the fit) are left out of the search. Their rows, and the
+        columns past the last star found, hold the star itself.
+        """
+        xy = np.column_stack((self.x, self.y))
+        numSources = min(numSources, len(xy))
+        rows = np.arange(len(xy))
+        srt = np.repeat(rows[:,np.newaxis], numSources, axis=1)
+
+        good = rows[np.isfinite(xy).all(axis=1)]
+        if len(good) == 0:
+            return srt
+
+        (distances, idx) = spatial.cKDTree(xy[good]).query(xy[good],
+                                                          k=numSources)
+        idx = np.reshape(idx, (len(good), numSources))
+        # missing neighbors come back as index len(good)
+        found = idx < len(good)
+        srt[good] = np.where(found, good[np.minimum(idx, len(good)-1)],
+                             good[:,np.newaxis])
+        return srt
+
+    def closestPairDistances(self, srt, trange):
+        """Minimum distance over trange (acceleration fits) between
+        every star and the candidates in columns 1: of srt, as returned
+        by closestSources(). Pairs of a star with itself, or with a
+        star whose fit isn't finite, are at infinite distance.
+        """
+        rows = np.arange(len(srt))
+        fits = np.column_stack((self.x, self.y, self.vx, self.vy,
+                                self.ax, self.ay, self.epoch))
+        fitOk = np.isfinite(fits).all(axis=1)
+
+        cand = srt[:,1:]
+        pair = (cand != rows[:,np.newaxis]) & fitOk[:,np.newaxis] & fitOk[cand]
+
+        fitMin = np.zeros(cand.shape) + np.inf
+        if pair.any():
+            fitMin[pair] = self.pairMinDistance(np.where(pair)[0],
+                                                cand[pair], trange)
+        return fitMin
+
+    def pairFits(self, ind1, ind2):
+        """Acceleration fits of stars ind1 and ind2 (index arrays,
+        broadcast against each other) in the form used by
+        gcwork.polyfit.tracks: xfit1, yfit1, xfit2, yfit2, t1, t2.
+        """
+        (ind1, ind2) = np.broadcast_arrays(ind1, ind2)
+        i1 = ind1.ravel()
+        i2 = ind2.ravel()
 
-        if (ar + (self.sigma*are) < a2d):
-            #print( 'too large radial acceleration')
-            status[2] = 1
+        xfit = np.column_stack((self.x, self.vx, self.ax))
+        yfit = np.column_stack((self.y, self.vy, self.ay))
+        epoch = np.asarray(self.epoch)
 
-        # print( some diagnostic info)
-        print( 'isPhsyical: ar, are, at, ate: ', ar, are, at, ate)
-        return status
+        return (xfit[i1], yfit[i1], xfit[i2], yfit[i2], epoch[i1], epoch[i2])
 
+    def pairMinDistance(self, ind1, ind2, trange):
+        """Minimum distance between stars ind1 and ind2 (index arrays,
+        broadcast against each other) over trange, according to the
+        acceleration fits. Same as minDistance() for every pair.
+        """
+        shape = np.broadcast(ind1, ind2).shape
+        (fitMin, tMin) = tracks.minDistance(*self.pairFits(ind1, ind2),
+                                            trange=trange)
+        return fitMin.reshape(shape)
+
+    def pairEpochDistance(self, ind1, ind2, trange, dist):
+        """Range of epochs in which stars ind1 and ind2 (index arrays,
+        broadcast against each other) are within dist of each other,
+        according to the acceleration fits. Same as epochDistance() for
+        every pair, but returns [NaN, NaN] for pairs that never get
+        that close.
+        """
+        shape = np.broadcast(ind1, ind2).shape
+        span = tracks.closeRange(*self.pairFits(ind1, ind2),
+                                 trange=trange, dist=dist)
+        return span.reshape(shape + (2,))
 
     def findNearestStar(self):
         """Use the acceleration fits to find the nearest stars that
@@ -692,37 +899,21 @@ class accelClass(starset.StarSet):
         rarc, a2dsim = self.rarc, self.a2dsim
         epoch, allEpochs = self.epoch, self.allEpochs # self.epoch is fitXa.t0
 
-        nearestStar = np.zeros(len(x))  # distance to nearest star
-        nearestStarInd = np.zeros(len(x),'int32') # index of nearest star
-
         minEpoch = np.amin(allEpochs)
         maxEpoch = np.amax(allEpochs)
 
-        # look for the minium distance between all stars according to the fit
-        for ii in np.arange(0,len(x)):
-            distances = np.sqrt((x[ii] - x)**2 + (y[ii] - y)**2)
-            srt = distances.argsort()
-            distances = distances[srt]
-            #nearestStar[ii] = distances[1]
-
-            #loop over the 5 closest sources to see which one is closest
-            #print( names[ii])
-            fitMin = np.zeros(5)
-
-            for rr in np.arange(1,6):
-                #print( names[srt[rr]])
-
-                xfit1 = [x[ii],vx[ii],ax[ii]]
-                xfit2 = [x[srt[rr]],vx[srt[rr]],ax[srt[rr]]]
-                yfit1 = [y[ii],vy[ii],ay[ii]]
-                yfit2 = [y[srt[rr]],vy[srt[rr]],ay[srt[rr]]]
-                fitMin[rr-1] = self.minDistance(xfit1,yfit1,xfit2,yfit2,
-                                                epoch[ii],epoch[srt[rr]],[minEpoch,maxEpoch])
-
-            minInd = np.argmin(fitMin)
-            nearestStar[ii] = fitMin[minInd]
-            # add 1 to the index because the first star will be itself
-            nearestStarInd[ii] = srt[minInd+1]
+        # look for the minium distance between all stars according to
+        # the fit, among the 5 closest sources at t0. The first star in
+        # each row of srt will be itself. Stars without finite fits
+        # end up at an infinite distance.
+        srt = self.closestSources(6)
+        rows = np.arange(len(x))
+        fitMin = self.closestPairDistances(srt, [minEpoch,maxEpoch])
+
+        minInd = np.argmin(fitMin, axis=1)
+        nearestStar = fitMin[rows, minInd]
+        # add 1 to the index because the first star will be itself
+        nearestStarInd = srt[rows, minInd+1].astype('int32')
 
         self.nearestStarName = names[nearestStarInd]
         self.nearestStarDist = nearestStar
@@ -753,37 +944,21 @@ class accelClass(starset.StarSet):
         self.confusedSources = []
         self.confusedSourcesInd = []
 
-        nearestStar = np.zeros(len(x))  # distance to nearest star
-        nearestStarInd = np.zeros(len(x),'int32') # index of nearest star
-
         minEpoch = np.amin(allEpochs)
         maxEpoch = np.amax(allEpochs)
 
-        # look for the minium distance between all stars according to the fit
+        # look for the minium distance between all stars according to
+        # the fit, among the 30 closest sources at t0 (the first one is
+        # the star itself, at distance 0)
+        srt = self.closestSources(30)
+        fitMin = np.zeros(srt.shape)
+        fitMin[:,1:] = self.closestPairDistances(srt, [minEpoch,maxEpoch])
+
         for ii in np.arange(0,len(x)):
-            distances = np.sqrt((x[ii] - x)**2 + (y[ii] - y)**2)
-            srt = distances.argsort()
-            distances = distances[srt]
-            closeStarNames = names[srt[0:30]]
-            closeStarInds = srt[0:30]
+            closeStarNames = names[srt[ii]]
+            closeStarInds = srt[ii]
             # find the differences in magnitude between primary and neighbors
             magDiff = mag[closeStarInds] - mag[ii]
-            #nearestStar[ii] = distances[1]
-
-            #loop over the 10 closest sources to see which one is closest
-
-            fitMin = np.zeros(len(closeStarNames))
-
-            for rr in np.arange(1,len(closeStarNames)):
-                #print( names[srt[rr]])
-                xfit1 = [x[ii],vx[ii],ax[ii]]
-                xfit2 = [x[srt[rr]],vx[srt[rr]],ax[srt[rr]]]
-                yfit1 = [y[ii],vy[ii],ay[ii]]
-                yfit2 = [y[srt[rr]],vy[srt[rr]],ay[srt[rr]]]
-
-                fitMin[rr] = self.minDistance(xfit1,yfit1,xfit2,yfit2,
-                                             epoch[ii],epoch[srt[rr]],[minEpoch,maxEpoch])
-
 
             # find all the stars that will come within the threshold
             # (and exclude the star itself)
@@ -795,7 +970,7 @@ class accelClass(starset.StarSet):
             # magnitude star, but the 15th magnitude star will be
             # deemd confused by the 10th magnitude star
 
-            good = np.where((fitMin < threshold) & (fitMin > 0) & (magDiff < magThreshold))[0]
+            good = np.where((fitMin[ii] < threshold) & (fitMin[ii] > 0) & (magDiff < magThreshold))[0]
             if (len(good) > 0):
                 # record the name of the potential confused source
                 # those stars are crossing another stars within certain radius and mag difference
@@ -804,17 +979,14 @@ class accelClass(starset.StarSet):
                 self.confusedSources = np.concatenate((self.confusedSources, [names[ii]]))
                 self.confusedSourcesInd = np.concatenate((self.confusedSourcesInd, [ii]))
 
-                minInd = np.argmin(fitMin)
-
-
                 # fill in the arrays
                 if self.neighbors is None:
                     self.neighbors = {names[ii]:closeStarNames[good],
-                                      names[ii]+'_dist':fitMin[good],
+                                      names[ii]+'_dist':fitMin[ii,good],
                                       names[ii]+'_ind': closeStarInds[good]}
                 else:
                     self.neighbors[names[ii]] = closeStarNames[good]
-                    self.neighbors[names[ii]+'_dist'] = fitMin[good]
+                    self.neighbors[names[ii]+'_dist'] = fitMin[ii,good]
                     self.neighbors[names[ii]+'_ind'] = closeStarInds[good]
             else:
                 if self.neighbors is None:
@@ -826,8 +998,115 @@ class accelClass(starset.StarSet):
                     self.neighbors[names[ii]+'_dist'] = None
                     self.neighbors[names[ii]+'_ind'] = None
 
+    def findConfusedEpochs(self, rlim=0.5, nRange=None, nepochsLimit=10,
+                           fakeDir='polyfit_2_s/edge/'):
+        """ Find the possibly confused epochs of all stars at once, from
+        the points loaded in self.starSet (see StarSet.loadPoints()) and
+        the neighbors found by findNearestNeighbors().
+
+        This applies the test of removeConfusedEpochs() to every pair
+        of a star and its neighbor as array operations on the
+        (stars, epochs) points table: within the epochs in which the
+        two stars are closer than confusionThreshold, the epochs
+        where only one of them is detected are confused for that star.
+        Unlike removeConfusedEpochs(), all pairs are compared on the
+        original points, so the result doesn't depend on the order of
+        the stars.
+
+        Keywords: rlim - stars inside this radius (or with any point
+        inside it) are not checked against their neighbors
+
+        nRange - indices of the stars to check against their
+        neighbors (default: all)
+
+        nepochsLimit - both stars need at least this many points
+
+        fakeDir - directory with stars_fake.npy and the
+        star_<name>_fake.txt lists of fake sources around stars,
+        which are never counted as confusing those stars
+
+        Returns (confused, culprits): a (stars, epochs) bool array of
+        the confused points, and a dictionary with the names of the
+        stars that confused each star.
+        """
+        names = list(self.names)
+        s = self.starSet
+        r2d = self.r2d
+        neighbors = self.neighbors
+        epochLimits = np.array([np.min(self.allEpochs), np.max(self.allEpochs)])
+
+        pnt_t = s.getArrayFromAllEpochs('pnt_t').T
+        pnt_r = np.hypot(s.getArrayFromAllEpochs('pnt_x').T,
+                         s.getArrayFromAllEpochs('pnt_y').T)
+        detected = pnt_t > -1000
+        nPoints = s.getArray('pointsCnt')
+
+        # skip the stars with points inside rlim, since they could be
+        # on orbits instead of accelerating
+        inner = (detected & (pnt_r < rlim)).any(axis=1)
+        if nRange is None:
+            nRange = np.arange(len(names))
+
+        nameIndex = {}
+        for ii in range(len(names)):
+            nameIndex.setdefault(names[ii], ii)
+
+        pairs1 = []
+        pairs2 = []
+        for i in nRange:
+            if (r2d[i] < rlim) or (nPoints[i] == 0) or inner[i]:
+                continue
+            if neighbors[names[i]] is not None:
+                for star2 in neighbors[names[i]]:
+                    pairs1.append(i)
+                    pairs2.append(nameIndex[star2])
+        s1 = np.array(pairs1, dtype=int)
+        s2 = np.array(pairs2, dtype=int)
+
+        # the range of epochs when the two stars are confused
+        span = self.pairEpochDistance(s1, s2, epochLimits,
+                                      self.confusionThreshold)
+        close1 = detected[s1] & (pnt_t[s1] >= span[:,0:1]) & (pnt_t[s1] <= span[:,1:2])
+        close2 = detected[s2] & (pnt_t[s2] >= span[:,0:1]) & (pnt_t[s2] <= span[:,1:2])
+
+        # require both stars are detected in enough epochs
+        check = (nPoints[s1] >= nepochsLimit) & (nPoints[s2] >= nepochsLimit)
+
+        # don't remove epochs if one star is a fake source of the other
+        pri = np.load(fakeDir + 'stars_fake.npy')
+        fakes = {}
+        for pp in np.where(check)[0]:
+            for (star1, star2) in [(names[s1[pp]], names[s2[pp]]),
+                                   (names[s2[pp]], names[s1[pp]])]:
+                if star1 not in pri:
+                    continue
+                if star1 not in fakes:
+                    fake_t = Table.read(fakeDir + 'star_' + star1 + '_fake.txt',
+                                        format='ascii')
+                    fakes[star1] = set(np.array(fake_t['fake'], dtype=str))
+                if star2 in fakes[star1]:
+                    check[pp] = False
+
+        # epochs detected for one star but not the other
+        missing1 = close1 & ~close2 & check[:,np.newaxis]
+        missing2 = close2 & ~close1 & check[:,np.newaxis]
+
+        confused = np.zeros(detected.shape, dtype=bool)
+        np.logical_or.at(confused, s1, missing1)
+        np.logical_or.at(confused, s2, missing2)
+
+        # keep track of the culprit stars
+        culprits = {}
+        for (sa, sb, missing) in [(s1, s2, missing1), (s2, s1, missing2)]:
+            for pp in np.where(missing.any(axis=1))[0]:
+                culprits.setdefault(names[sa[pp]], []).append(names[sb[pp]])
+        for star in culprits:
+            culprits[star] = np.unique(culprits[star])
+
+        return (confused, culprits)
+
     def removeConfusedEpochs(self, mkPointsFiles = True, Points='points_3_c/', Poly='polyfit_3_c/', 
-            debug = False, runPolyfit=True, rlim=0.5):
+            debug = False, runPolyfit=True, rlim=0.5, inMemory=False):
         """ Take a look at the closest neighbors of all stars to
         figure out what epochs are possibly confused. The epochs that
         are found in one star but not the other are assumed to be
@@ -848,7 +1127,25 @@ class accelClass(starset.StarSet):
 
         runPolyfit - run poly fit on the points_c directory and put
         polyfit results in polyfit_c/
+
+        inMemory - find the confused epochs with findConfusedEpochs()
+        on the points already loaded, instead of reading and rewriting
+        the points files star by star. The confused points are dropped
+        from self.starSet, and only the points files of stars that
+        lost points are written to Points. The other files are linked
+        to the originals instead of copied (with mkPointsFiles=False
+        no points files are written at all, and epochsRemoved.txt in
+        the original points directory lists what was dropped). With
+        runPolyfit the cleaned points are refit in-process
+        (StarSet.computePolyfit()) instead of running polyfit, and the
+        fit arrays of this object are updated.
         """
+        if inMemory:
+            return self._removeConfusedEpochsInMemory(mkPointsFiles=mkPointsFiles,
+                                                      Points=Points, debug=debug,
+                                                      runPolyfit=runPolyfit,
+                                                      rlim=rlim)
+
         names = list(self.names)
         x = self.x
         y = self.y
@@ -898,6 +1195,25 @@ class accelClass(starset.StarSet):
         # donnot remove their epochs based on those fake sources
         pri = np.load('polyfit_2_s/edge/stars_fake.npy')
 
+        # get the range of epochs when each star and its neighbors are
+        # confused, for all the pairs at once
+        nameIndex = {}
+        for ii in range(len(names)):
+            nameIndex.setdefault(names[ii], ii)
+
+        pairs1 = []
+        pairs2 = []
+        for i in nRange:
+            if (r2d[i] >= rlim) and (neighbors[names[i]] is not None):
+                for star2 in neighbors[names[i]]:
+                    pairs1.append(i)
+                    pairs2.append(nameIndex[star2])
+
+        spans = self.pairEpochDistance(np.array(pairs1, dtype=int),
+                                       np.array(pairs2, dtype=int),
+                                       epochLimits, self.confusionThreshold)
+        epochRanges = dict(zip(zip(pairs1, pairs2), spans))
+
         for i in nRange:
             if r2d[i] < rlim:
                 continue
@@ -953,18 +1269,10 @@ class accelClass(starset.StarSet):
                         if len(tab2) > 0:
                             epochs2 = tab2['epoch']
 
-                            # get the range of epochs when they were confused
+                            # the range of epochs when they were confused
                             s1 = i
-                            s2 = names.index(star2)  # index of close neighbor
-
-                            xfit1 = [x[s1],vx[s1],ax[s1]]
-                            xfit2 = [x[s2],vx[s2],ax[s2]]
-                            yfit1 = [y[s1],vy[s1],ay[s1]]
-                            yfit2 = [y[s2],vy[s2],ay[s2]]
-                            epochRange = self.epochDistance(xfit1, yfit1, xfit2, yfit2,
-                                                            self.epoch[s1], self.epoch[s2],
-                                                            epochLimits, self.confusionThreshold)
-
+                            s2 = nameIndex[star2]  # index of close neighbor
+                            epochRange = epochRanges[(s1, s2)]
 
                             good1 = np.where((epochs1 >= epochRange[0]) & (epochs1 <= epochRange[1]))[0]
                             good2 = np.where((epochs2 >= epochRange[0]) & (epochs2 <= epochRange[1]))[0]
@@ -1119,6 +1427,119 @@ class accelClass(starset.StarSet):
             cmd += ' -jackknife -points '+self.rootDir+ Points + ' -o '+self.rootDir+Poly+'fit'
             os.system(cmd)
 
+    def _removeConfusedEpochsInMemory(self, mkPointsFiles=True, Points='points_3_c/',
+                                      debug=False, runPolyfit=True, rlim=0.5):
+        """ removeConfusedEpochs(inMemory=True) """
+        names = list(self.names)
+        s = self.starSet
+        oldDir = os.path.split(self.rootDir+self.points)[0]
+        newDir = self.rootDir+Points
+
+        if debug:
+            nRange = np.arange(10)
+            checkind = np.where(np.array(names) == 'S0-2')[0]
+            nRange = np.append(checkind,nRange)
+            print( nRange)
+        else:
+            nRange = None
+
+        (confused, culprits) = self.findConfusedEpochs(rlim=rlim, nRange=nRange)
+
+        # the epochs (as in the points files) that will be removed
+        pnt_t = s.getArrayFromAllEpochs('pnt_t').T
+        confused &= (pnt_t > -1000)
+        changed = np.where(confused.any(axis=1))[0]
+        epochsRemoved = {}
+        for ss in changed:
+            epochsRemoved[names[ss]] = np.unique(pnt_t[ss, confused[ss]])
+        print( 'removing %d epochs from %d stars' % (confused.sum(), len(changed)))
+
+        if mkPointsFiles:
+            # make a new directory
+            if os.path.isdir(newDir):
+                print( 'removing exisiting points_c directory: '+newDir)
+                shutil.rmtree(newDir,ignore_errors=True)
+            os.makedirs(newDir)
+            workDir = newDir+'/'
+
+            # link to the unchanged files
+            skip = set(['epochsRemoved.txt', 'confusingSources.txt'])
+            for ss in changed:
+                skip.add(names[ss] + '.points')
+                skip.add(names[ss] + '.phot')
+            for fileName in os.listdir(oldDir):
+                if fileName in skip:
+                    continue
+                src = os.path.abspath(os.path.join(oldDir, fileName))
+                dst = os.path.join(workDir, fileName)
+                try:
+                    os.symlink(src, dst)
+                except OSError:
+                    if os.path.isdir(src):
+                        shutil.copytree(src, dst)
+                    else:
+                        shutil.copy2(src, dst)
+
+            # write out the points files of the stars that lost points
+            for ss in changed:
+                self._writeTrimmedPoints(oldDir + '/' + names[ss], workDir + names[ss],
+                                         epochsRemoved[names[ss]])
+        else:
+            workDir = oldDir+'/'
+
+        # output a file with the epochs removed
+        print( 'writing: '+ workDir+'epochsRemoved.txt')
+        output = open(workDir+'epochsRemoved.txt','w')
+        for ss in changed:
+            epochStr = ' '.join(np.array(epochsRemoved[names[ss]],dtype='str'))+'\n'
+            output.write(names[ss] + ' ' + epochStr)
+        output.close()
+
+        # output a file with the stars that caused another star to be confused
+        print( 'writing: '+ workDir+'confusingSources.txt')
+        output = open(workDir+'confusingSources.txt','w')
+        for star in sorted(culprits.keys()):
+            epochStr = ' '.join(np.array(culprits[star],dtype='str'))+'\n'
+            output.write(star + ' ' + epochStr)
+        output.close()
+
+        # drop the confused points from the points table. The stage
+        # results no longer follow from the files on disk, so they
+        # can't be stored anymore.
+        s.trimPoints(confused)
+        self.stageStore = None
+
+        # refit the cleaned points
+        if runPolyfit:
+            s.computePolyfit()
+            s.computePolyfit(accel=1)
+            self.updateFits()
+            self.updateAccel()
+            self.computeFTest()
+
+        return (confused, culprits)
+
+    def _writeTrimmedPoints(self, oldRoot, newRoot, epochs):
+        """ Copy the .points and .phot files of a star without the
+        rows of the given epochs (the first row of each epoch in the
+        .points file, and the same rows of the .phot file). The other
+        lines are copied as they are.
+        """
+        lines = open(oldRoot + '.points').readlines()
+        pntEpochs = np.array([float(line.split()[0]) for line in lines])
+        bad = set([np.where(pntEpochs == ee)[0][0] for ee in epochs
+                   if (pntEpochs == ee).any()])
+
+        for suffix in ['.points', '.phot']:
+            lines = open(oldRoot + suffix).readlines()
+            lines = [lines[rr] for rr in range(len(lines)) if rr not in bad]
+            # as in starTables.write_points(), a single point is dropped too
+            if len(lines) <= 1:
+                lines = []
+            output = open(newRoot + suffix, 'w')
+            output.writelines(lines)
+            output.close()
+
     def plot_confused_sources(self, input_points, output_points, output_poly='polyfit_3_c/'):
         """
         plot the histogram of confused sources as a function of mag and radius
@@ -1304,47 +1725,47 @@ class accelClass(starset.StarSet):
             plt.close()
 
    
-    def run_ftest_hpoly(self, make_plot=False, p_crit=0.8):
-        # run f test to find the best polynomial order
-        # find the first order that makes 1-p smaller than 0.8
-        poly_orders = self.poly_orders
-        Fx = np.zeros((len(poly_orders)-1, len(self.nEpochs)))
-        Fy = np.zeros((len(poly_orders)-1, len(self.nEpochs)))
-        chix = np.zeros((len(poly_orders), len(self.nEpochs)))
-        chiy = np.zeros((len(poly_orders), len(self.nEpochs)))
-
-        # calculate the F test value for all orders
-        for i in range(len(poly_orders)-1):
-            Fx[i], Fy[i], chix[i], chiy[i], chix[i+1], chiy[i+1] = self.calculate_f_poly(poly_orders[i], poly_orders[i+1])
-        self.Fx_poly = Fx
-        self.Fy_poly = Fy
+    def run_ftest_hpoly(self, make_plot=False, p_crit=0.8, processes=None):
+        """
+        Find the best polynomial order of every star with F tests
+        between successive orders in self.poly_orders, for all stars
+        and orders at once: the first order whose fit is not improved
+        (1-p < p_crit in both x and y) by the next order.
+
+        Sets Fx_poly, Fy_poly ((orders-1, stars) arrays of 1-p),
+        chix_poly, chiy_poly ((orders, stars) chi2) and
+        best_poly_order_pvalue.
+
+        @kwparam make_plot: False, True for plots of all stars, or a
+            list of star indices to plot (see plot_f_hpoly_stars)
+        @kwparam processes: number of processes making the plots
+        """
+        # fit all the orders to the points at once
+        self.fitHighOrderPoly()
+
+        # chi2 of every order and star, and the F test from each order
+        # to the next one
+        poly_orders = np.asarray(self.poly_orders)
+        n_par = poly_orders + 1
+        chix = np.array([self.hpolyX[order].chi2 for order in poly_orders])
+        chiy = np.array([self.hpolyY[order].chi2 for order in poly_orders])
+        nEpochs = np.asarray(self.nEpochs)
+
+        self.Fx_poly = self.p_value(chix[:-1], chix[1:], nEpochs,
+                                    n_par[:-1,np.newaxis], n_par[1:,np.newaxis])
+        self.Fy_poly = self.p_value(chiy[:-1], chiy[1:], nEpochs,
+                                    n_par[:-1,np.newaxis], n_par[1:,np.newaxis])
         self.chix_poly = chix
         self.chiy_poly = chiy
 
-        ## find the best fit order
-        ## based on the local  minimum
-        #best_order = np.zeros(len(self.nEpochs))
-        #for i in range(len(best_order)):
-        #    best_order[i] = 1
-        #    f = F[:,i]
-        #    f0 = f[0]
-        #    j = 1
-        #    while j<poly_orders.max()-1 and f[j] < f0:
-        #        f0 = f[j]
-        #        best_order[i] += 1
-        #        j += 1
-        #self.best_poly_order = best_order
-
         # based on 1-p value
-        best_order_pvalue = np.zeros(len(self.nEpochs))
-        for i in range(len(self.nEpochs)):
-            best_order_pvalue[i] = self.find_best_order(i, p_crit)
-        self.best_poly_order_pvalue = best_order_pvalue
+        self.best_poly_order_pvalue = self.find_best_orders(p_crit)
 
         # make plot and calculate best order
-        if make_plot:
-            for i in range(len(self.nEpochs)):
-                self.plot_f_hpoly(i)
+        if make_plot is True:
+            self.plot_f_hpoly_stars(processes=processes)
+        elif make_plot is not False and make_plot is not None:
+            self.plot_f_hpoly_stars(make_plot, processes=processes)
 
         # summarize the distribution of polynomial order
         idx_1order = np.where(self.best_poly_order_pvalue==1)[0]
@@ -1355,28 +1776,32 @@ class accelClass(starset.StarSet):
         print('%d can be fit by 2nd order' %(len(idx_2order)))
         print('%d need be fit by higher order' %(len(idx_high)))
 
+    def find_best_orders(self, p_crit, Fx=None, Fy=None):
+        """
+        Best polynomial order of every star from the F tests between
+        successive orders (default: self.Fx_poly and self.Fy_poly).
 
-    def find_best_order(self, idx, p_crit):
-        """find the best order of polynomial fit using F test"""
-        # read in chi2 at different order
-        orders = self.poly_orders
-        chix = self.chix_poly[:, idx]
-        chiy = self.chiy_poly[:, idx]
-        n_epochs = self.nEpochs[idx]
+        Going from order X to X+1, 1-p > p_crit in x or y means the fit
+        is improving, so we go to X+1. The best order is the first X for
+        which neither x nor y improves, or the highest order.
 
-        # calculate Number of parameters at different order 
-        n_par = orders+1
+        @return (stars,) float array of orders
+        """
+        if Fx is None:
+            Fx = self.Fx_poly
+        if Fy is None:
+            Fy = self.Fy_poly
+        orders = np.asarray(self.poly_orders)
 
-        # loop through all the orders: from order X to X+1, calculate f=1-p from f test
-        # if f > 0.5, meaning it's improving from X to X+1, so we go to X+1
-        # repeat this step until f < 0.5, record X as the best fit order
+        stop = (np.asarray(Fx) < p_crit) & (np.asarray(Fy) < p_crit)
+        best = np.where(stop.any(axis=0), np.argmax(stop, axis=0), len(orders) - 1)
 
-        i = 0
-        for i in range(len(orders)-1):
-            if (self.p_value(chix[i], chix[i+1], n_epochs, n_par[i], n_par[i+1]) < p_crit) \
-                    and (self.p_value(chiy[i], chiy[i+1], n_epochs, n_par[i], n_par[i+1]) < p_crit):
-                return orders[i]
-        return orders[i+1]
+        return orders[best].astype(float)
+
+    def find_best_order(self, idx, p_crit):
+        """find the best order of polynomial fit of star idx using F test"""
+        return self.find_best_orders(p_crit, Fx=self.Fx_poly[:, idx:idx+1],
+                                     Fy=self.Fy_poly[:, idx:idx+1])[0]
  
         # the other method
         # loop through all the orders: from order X to X+1, calculate f=1-p from f test
@@ -1415,25 +1840,24 @@ class accelClass(starset.StarSet):
         dof2 = n_data - n_par2
         f_ratio = (chi1/dof1) / (chi2/dof2)
         p = stats.f.sf(f_ratio, dof1, dof2)
-        idx = np.where(p>1)[0]
-        for i in idx:
-            p[i] = 1/p[i]
+        p = np.where(p>1, 1/p, p)
         return (1-p)
         
-    def calculate_f_poly(self, order1, order2):
-        # read chi2
-        poly1 = 'polyfit_5_high_order' + str(order1) +'/fit'
-        poly2 = 'polyfit_5_high_order' + str(order2) +'/fit'
-        t1 = Table.read(poly1 + '.accelFormal', format='ascii')
-        t2 = Table.read(poly2 + '.accelFormal', format='ascii')
+    def fitHighOrderPoly(self):
+        """Fit polynomials of all orders in self.poly_orders to the
+        points of every star (see StarSet.fitPoints) and keep them in
+        self.hpolyX and self.hpolyY (dictionaries of order ->
+        polyfit.batchfit.PolyfitResult)."""
+        (self.hpolyX, self.hpolyY) = self.starSet.fitPoints(self.poly_orders)
 
-        if len(t1) != len(t2):
-            sys.exit("not same number of stars for 2nd and 3rd polynomial fit")
+    def calculate_f_poly(self, order1, order2):
+        if self.hpolyX is None:
+            self.fitHighOrderPoly()
 
-        chix_1 =  t1['chiSqX']
-        chiy_1 =  t1['chiSqY']
-        chix_2 =  t2['chiSqX']
-        chiy_2 =  t2['chiSqY']
+        chix_1 = self.hpolyX[order1].chi2
+        chiy_1 = self.hpolyY[order1].chi2
+        chix_2 = self.hpolyX[order2].chi2
+        chiy_2 = self.hpolyY[order2].chi2
 
         # calcualte degree of freedom
         nEpochs =  self.nEpochs
@@ -1446,117 +1870,101 @@ class accelClass(starset.StarSet):
         return Fx, Fy, chix_1, chiy_1, chix_2, chiy_2
 
     def plot_f_hpoly(self, idx):
-        # plot the ftest result
-        #best_order = self.best_poly_order[idx]
-        best_order_pvalue = self.best_poly_order_pvalue[idx]
-        poly_orders = self.poly_orders
-        norders = len(poly_orders)
-        name = self.names[idx]
-        Fx_poly = self.Fx_poly[:,idx]
-        Fy_poly = self.Fy_poly[:,idx]
-        chix = self.chix_poly[:, idx]
-        chiy = self.chiy_poly[:, idx]
-
-        # plot how F test value changes
-        plt.figure(figsize=(20,10))
-        plt.subplot2grid((norders, 3), (0,0), rowspan=norders)
-        plt.plot(poly_orders[:-1], Fx_poly, 'g-', label='x')
-        plt.plot(poly_orders[:-1], Fy_poly, 'b-', label='y')
-        #plt.plot(poly_orders[:-1][int(best_order-1)], F_poly[int(best_order-1)], 'bo', label='best fit from local minimum')
-        plt.axvline(x=poly_orders[int(best_order_pvalue-1)], color='r', ls='--')
-        #if int(best_order_pvalue) == poly_orders.max():
-        #    #plt.plot(poly_orders[int(best_order_pvalue-1)], Fx_poly.min(), 'ro', label='best fit from 1-p value')
-        #else:
-        #    #plt.plot(poly_orders[int(best_order_pvalue-1)], Fx_poly[int(best_order_pvalue-1)], 'ro', label='best fit from 1-p value')
-        #    #plt.plot(poly_orders[int(best_order_pvalue-1)], Fy_poly[int(best_order_pvalue-1)], 'ro', label='best fit from 1-p value')
-        plt.xlabel('poly order')
-        plt.ylabel('1-p')
-        plt.legend()
-        plt.title('%s' %name)
-        plt.gca().ticklabel_format(useOffset=False)
-        plt.xticks(poly_orders)
-        plt.tight_layout()
-
-        # plot how polynomial fit looks like
-        t_points = Table.read('points_4_trim/' + name + '.points', format='ascii')
-        time = t_points['col1']
-        x = t_points['col2']
-        y = t_points['col3']
-        xe = t_points['col4']
-        ye = t_points['col5']
-
-        x_subplots = []
-        y_subplots = []
-        for i in range(len(poly_orders)):
-            order = poly_orders[i]
-            xfit, yfit = self.fit_poly(order, idx)
-
-
-            axx = plt.subplot2grid((norders, 3), (i,1))
-            plt.errorbar(time, x-xfit, yerr = xe, fmt='.', label='order=%d' %order)
-            plt.hlines(0, xmin=time.min(), xmax=time.max())
-            plt.legend()
-            plt.annotate('chi2=%d' %chix[i], color='r', xy=(0.5, 0.5), xycoords='axes fraction')
-            x_subplots.append(axx)
-
-            axy = plt.subplot2grid((norders, 3), (i,2))
-            plt.errorbar(time, y-yfit, fmt='.', yerr = ye)
-            plt.hlines(0, xmin=time.min(), xmax=time.max())
-            plt.annotate('chi=%d' %chiy[i], color='r', xy=(0.5, 0.5), xycoords='axes fraction')
-            y_subplots.append(axy)
-
-        axx.set_xlabel('year')
-        x_subplots[0].set_title('x-xfit (arcsec)')
-        axx.get_shared_x_axes().join(x_subplots[0], x_subplots[1], x_subplots[2], x_subplots[3], x_subplots[4])
-        for x_subplot in x_subplots[:-1]:
-            x_subplot.set_xticklabels([]) 
-
-        axy.set_xlabel('year')
-        y_subplots[0].set_title('y-yfit (arcsec)')
-        axy.get_shared_x_axes().join(y_subplots[0], y_subplots[1], y_subplots[2], y_subplots[3], y_subplots[4])
-        for y_subplot in y_subplots[:-1]:
-            y_subplot.set_xticklabels([]) 
-
-        plt.tight_layout()
-        plt.subplots_adjust(hspace=0)
-        plt.savefig('plots/poly/' + name + '.png', format='png')
-
-        plt.close()
+        """Plot the F test of star idx and its fits of every order to
+        plots/poly/<name>.png."""
+        self.plot_f_hpoly_stars([idx], processes=1)
 
+    def plot_f_hpoly_stars(self, stars=None, processes=None,
+                           plotDir='plots/poly/'):
+        """
+        Plot the F tests of many stars (default: all) and their fits of
+        every order, one plotDir/<name>.png per star. The fits are
+        evaluated for all stars at once, and the plots are made by a
+        pool of processes (see plotFTestPoly).
+
+        @kwparam stars: list of star indices
+        @kwparam processes: number of processes (default: number of CPUs,
+            1 to plot in this process)
+        """
+        if self.hpolyX is None:
+            self.fitHighOrderPoly()
+        if stars is None:
+            stars = np.arange(len(self.names))
+        stars = np.atleast_1d(np.asarray(stars, dtype=int))
+        if not os.path.exists(plotDir):
+            os.makedirs(plotDir)
+
+        # points of the stars, (stars, epochs)
+        def points(varName):
+            return self.starSet.getArrayFromAllEpochs(varName)[:, stars].T
+        time = points('pnt_t')
+        x = points('pnt_x')
+        y = points('pnt_y')
+        xe = points('pnt_xe')
+        ye = points('pnt_ye')
+        found = (time > -1000) & (x > -1000) & (y > -1000)
+
+        # residuals from the fits of every order
+        orders = self.poly_orders
+        xres = np.array([x - self.hpolyX[order].evaluate(time, rows=stars)
+                         for order in orders])
+        yres = np.array([y - self.hpolyY[order].evaluate(time, rows=stars)
+                         for order in orders])
+
+        jobs = []
+        for (ii, idx) in enumerate(stars):
+            use = found[ii]
+            jobs.append(dict(name=self.names[idx], orders=orders,
+                             Fx=self.Fx_poly[:,idx], Fy=self.Fy_poly[:,idx],
+                             chix=self.chix_poly[:,idx], chiy=self.chiy_poly[:,idx],
+                             bestOrder=self.best_poly_order_pvalue[idx],
+                             time=time[ii,use], xres=xres[:,ii,use],
+                             yres=yres[:,ii,use], xe=xe[ii,use], ye=ye[ii,use],
+                             outFile=os.path.join(plotDir, self.names[idx] + '.png')))
+
+        if processes == 1 or len(jobs) == 1:
+            for job in jobs:
+                plotFTestPoly(**job)
+            return
+
+        pool = mp.Pool(processes=processes)
+        results = [pool.apply_async(plotFTestPoly, kwds=job) for job in jobs]
+        for result in results:
+            result.get()
+        pool.close()
+        pool.join()
+
+    def starPoints(self, idx):
+        """Time, x, y, xerr and yerr of the points of star idx (from
+        the points files loaded into self.starSet)."""
+        star = self.starSet.stars[idx]
+        pnt = np.array([[e.pnt_t, e.pnt_x, e.pnt_y, e.pnt_xe, e.pnt_ye]
+                        for e in star.e])
+        found = (pnt[:,0] > -1000) & (pnt[:,1] > -1000) & (pnt[:,2] > -1000)
+        pnt = pnt[found]
+        return pnt[:,0], pnt[:,1], pnt[:,2], pnt[:,3], pnt[:,4]
 
     def fit_poly(self, order, idx):
-        poly = 'polyfit_5_high_order' + str(order) + '/fit'
-        # read in t0 info
-        t0 = Table.read(poly+'.t0', format='ascii')
-        t0x = t0['t0X'][idx]
-        t0y = t0['t0Y'][idx]
-
-        # calculate dt 
-        name = self.names[idx]
-        t_points = Table.read('points_4_trim/' + name + '.points', format='ascii')
-        years = t_points['col1']
-        dtx = years - t0x
-        dty = years - t0y
-
-        # read in polynomial fit
-        t = Table.read(poly+'.accelFormal', format='ascii')
-        ndata = len(t)
-        fitx = np.zeros(len(years))
-        fity = np.zeros(len(years))
-
-        # calculate fit result
-        for i in range(order+1):
-            fitx += t['a_x' + str(i)][idx] * (dtx**i) / math.factorial(i)
-            fity += t['a_y' + str(i)][idx] * (dty**i) / math.factorial(i)
+        if self.hpolyX is None:
+            self.fitHighOrderPoly()
+
+        # calculate fit result at the points epochs
+        years = self.starPoints(idx)[0]
+        fitx = self.hpolyX[order].evaluate(years, rows=[idx])[0]
+        fity = self.hpolyY[order].evaluate(years, rows=[idx])[0]
 
         return fitx, fity
 
 
 
 
-    def findNonPhysical(self, plotDist = False, epochsRequired=0.0, verbose=True):
+    def findNonPhysical(self, plotDist = False, epochsRequired=0.0, verbose=True,
+                        sigAcc=5, sigTan=3, sigMax=3, rmin=0.5):
         """
         Print out a list of stars that have non-physical accelerations.
+        The stars are selected from self.accelTable with
+        polyfit.accel.selectAccel() (see there for sigAcc, sigTan,
+        sigMax and rmin).
 
         Return: returns a list of star names that are unphysical
         """
@@ -1599,30 +2007,35 @@ class accelClass(starset.StarSet):
         f.write('Found {0} Stars\n'.format(len(at)))
         f.write('Found {0} Orbital stars\n'.format(len(np.where(r2d<=0.5)[0])))
 
+        (accelerating, physical, nonPhysical) = accel.selectAccel(self.accelTable, r2d,
+                                                                  sigAcc=sigAcc, sigTan=sigTan,
+                                                                  sigMax=sigMax, rmin=rmin)
+        cuts = {'acc': sigAcc, 'tan': sigTan, 'max': sigMax, 'r': rmin}
+
         # first define all accelerating sources:
-        idx_acc = np.where(((abs(at/ate)>5) | (abs(ar/are)>5)) & (r2d>0.5))[0]
+        idx_acc = np.where(accelerating)[0]
         idx_radius = r2d[idx_acc].argsort()
         idx_acc = idx_acc[idx_radius]
         if verbose == True:
             print('Found {0} Significant Acc'.format(len(idx_acc)))
-            print('( Significant Acc are: abs(ar/are) > 5 OR abs(at/ate)>5 AND r>0.5as)\n')
+            print('( Significant Acc are: abs(ar/are) > {acc:g} OR abs(at/ate)>{acc:g} AND r>{r:g}as)\n'.format(**cuts))
             f.write('Found {0} Significant Acc\n'.format(len(idx_acc)))
-            f.write('( Significant Acc are: abs(ar/are) > 5 OR abs(at/ate)>5 AND r>0.5as)\n \n')
+            f.write('( Significant Acc are: abs(ar/are) > {acc:g} OR abs(at/ate)>{acc:g} AND r>{r:g}as)\n \n'.format(**cuts))
 
         # then physical acc
-        idx_phy = np.where((ar/are<-5) & (abs(at/ate)<3) & ((a2d-ar)/are<3) & (r2d>0.5))[0]  
+        idx_phy = np.where(physical)[0]
         idx_radius = r2d[idx_phy].argsort()
         idx_phy = idx_phy[idx_radius]
         if verbose == True:
             print('Found {0} Significant Physcial Acc stars'.format(len(idx_phy)))
-            print('(Significant Physical Acc are: ar/are < -5 AND abs(at/ate)<3 AND (amax-ar)/are<3 AND r>0.5as)')
+            print('(Significant Physical Acc are: ar/are < -{acc:g} AND abs(at/ate)<{tan:g} AND (amax-ar)/are<{max:g} AND r>{r:g}as)'.format(**cuts))
             print(names[idx_phy], '\n')
             f.write('Found {0} Significant Physical Acc stars\n'.format(len(idx_phy)))
-            f.write('(Significant Physical Acc are: ar/are < -5 AND abs(at/ate)<3 AND (amax-ar)/are<3) AND r>0.5as\n')
+            f.write('(Significant Physical Acc are: ar/are < -{acc:g} AND abs(at/ate)<{tan:g} AND (amax-ar)/are<{max:g}) AND r>{r:g}as\n'.format(**cuts))
             f.write(str(names[idx_phy]) + '\n\n')
        
         # the rest will be nonphysical acc
-        idx_nonphy = np.setdiff1d(idx_acc, idx_phy)
+        idx_nonphy = np.where(nonPhysical)[0]
         idx_radius = r2d[idx_nonphy].argsort()
         idx_nonphy = idx_nonphy[idx_radius]
         if verbose == True:
@@ -2115,70 +2528,42 @@ class accelClass(starset.StarSet):
     #    return yfitLin
 
     def bootstrapVel(self, xInput, yInput, xerrInput, yerrInput, yearsInput,
-                     t0, n = 500, fraction = 0.05, iterate = False):
+                     t0, n = 500, fraction = 0.05, iterate = False, seed = None):
         """ Do a half-sample bootstrap of the velocity fits to
         determine if there are incorrect points.
 
+        All n half-samples are drawn as one array and their weighted
+        linear fits are solved together in closed form (see
+        polyfit.batchfit.fitDraws).
+
         KEYWORDS: n = 500 - number of bootstraps to do
                   fraction = 0.05 - fraction of times a point is detected
                                     to be kept
+                  seed = None - seed (or numpy.random.Generator) for
+                                reproducible draws
         """
-        xStack = np.zeros(n)
-        yStack = np.zeros(n)
-        velx = np.zeros(n)
-        velxErr = np.zeros(n)
-        velxChi2 = np.zeros(n)
-        vely = np.zeros(n)
-        velyErr = np.zeros(n)
-        velyChi2 = np.zeros(n)
-        drawStack = np.zeros((len(xInput)/2, n))
+        rng = np.random.default_rng(seed)
 
         # degree of freedom for each half sample boot strap
-        bootStrapDOF = len(xInput)/2.0 - 2.0
+        bootStrapDOF = len(xInput)//2 - 2.0
         chiThreshold = bootStrapDOF*3.0
         print( 'boot strap chi2 threshold: ', chiThreshold)
-        xMedianErr = realmedian.realMedian(xerrInput)
-        yMedianErr = realmedian.realMedian(yerrInput)
-
-        for i in range(n):
-            # draw N/2 indices without replacement
-            draw = random.sample(np.arange(len(xInput)), len(xInput)/2)
-            drawStack[:,i] = draw
-            x = xInput[draw]
-            y = yInput[draw]
-
-            # make all the errors the median error (won't really work
-            # because this will make points that are badly measured
-            # have low errors)
-
-            # xerr = np.zeros(len(xInput)/2)+xMedianErr
-            # yerr = np.zeros(len(xInput)/2)+yMedianErr
-
-            xerr = xerrInput[draw]
-            yerr = yerrInput[draw]
-
-            years = yearsInput[draw]-t0
-            #print( '%f xerr' % i)
-            #print( x)
-            #print( xerr)
-            #print( years)
-            xfit = self.fitVelocity(years, x, xerr)
-            yfit = self.fitVelocity(years, y, yerr)
-
-            dof = len(x) - len(xfit.params)
-            xredChiSq = xfit.fnorm
-            yredChiSq = yfit.fnorm
-
-            #print( xfit.params)
-            xStack[i] = xfit.params[0]
-            yStack[i] = yfit.params[0]
-            velx[i] = xfit.params[1]
-            #velxErr[i] = xfit.perror[1]
-
-            velxChi2[i] = xredChiSq
-            vely[i] = yfit.params[1]
-            #velyErr[i] = yfit.perror[1]
-            velyChi2[i] = yredChiSq
+
+        # draw N/2 indices without replacement, n times
+        draws = batchfit.halfSamples(len(xInput), n, seed=rng)
+        drawStack = draws.T
+
+        # velocity fits to all the draws at once
+        years = yearsInput - t0
+        xfit = batchfit.fitDraws(years, xInput, xerrInput, [1], draws, t0=0.0)[1]
+        yfit = batchfit.fitDraws(years, yInput, yerrInput, [1], draws, t0=0.0)[1]
+
+        xStack = xfit.coeffs[:,0]
+        yStack = yfit.coeffs[:,0]
+        velx = xfit.coeffs[:,1]
+        vely = yfit.coeffs[:,1]
+        velxChi2 = xfit.chi2
+        velyChi2 = yfit.chi2
 
         # compute the tangential and radial directions to the velocity
         xMed = realmedian.realMedian(xStack)
@@ -2186,9 +2571,9 @@ class accelClass(starset.StarSet):
         r = np.sqrt(xMed**2 + yMed**2)
         vr = ((velx*xMed) + (vely*yMed))/r
         vt = ((velx*yMed) - (vely*xMed))/r
-        clf()
+        py.clf()
 
-        subplot(231)
+        py.subplot(231)
         mVr = np.mean(vr)
         sVr = np.std(vr)
         mVt = np.mean(vt)
@@ -2196,31 +2581,31 @@ class accelClass(starset.StarSet):
 
         binWidth = (np.max(vr) - np.min(vr))/20.0  # make sure there are at least 10 bins
 
-        nbins, bins, patches1 = hist(vr, bins = np.arange(np.min(vr), np.max(vr), binWidth))
-        xlabel('Vr')
-        ylabel('N stars')
-        subplot(232)
+        nbins, bins, patches1 = py.hist(vr, bins = np.arange(np.min(vr), np.max(vr), binWidth))
+        py.xlabel('Vr')
+        py.ylabel('N stars')
+        py.subplot(232)
         binWidth = (np.max(vt) - np.min(vt))/20.0
         #nbins, bins, patches1 = hist(vt, bins = np.arange(mVt - sVt*10.0, mVt+sVt*10.0, 0.0001))
-        nbins, bins, patches1 = hist(vt, bins = np.arange(np.min(vt), np.max(vt), binWidth))
-        xlabel('Vt')
-        ylabel('N stars')
-        subplot(233)
+        nbins, bins, patches1 = py.hist(vt, bins = np.arange(np.min(vt), np.max(vt), binWidth))
+        py.xlabel('Vt')
+        py.ylabel('N stars')
+        py.subplot(233)
         print( 'min chi2 x: %6.3f, max chi2 x: %6.3f' % (np.min(velxChi2), np.max(velxChi2)))
-        nbins, bins, patches1 = hist(velxChi2, bins = np.arange(0, self.chiThreshold, self.chiThreshold/30.0))
-        xlabel('X Vel. Chi-Sq')
-        ylabel('N Stars')
-        subplot(234)
-        nbins, bins, patches1 = hist(velyChi2, bins = np.arange(0, self.chiThreshold, self.chiThreshold/30.0))
+        nbins, bins, patches1 = py.hist(velxChi2, bins = np.arange(0, self.chiThreshold, self.chiThreshold/30.0))
+        py.xlabel('X Vel. Chi-Sq')
+        py.ylabel('N Stars')
+        py.subplot(234)
+        nbins, bins, patches1 = py.hist(velyChi2, bins = np.arange(0, self.chiThreshold, self.chiThreshold/30.0))
         print( 'min chi2 y: %6.3f, max chi2 y: %6.3f' % (np.min(velyChi2), np.max(velyChi2)))
-        xlabel('Y Vel. Chi-Sq')
-        ylabel('N Stars')
-        subplot(235)
+        py.xlabel('Y Vel. Chi-Sq')
+        py.ylabel('N Stars')
+        py.subplot(235)
         good = np.where((velxChi2 < chiThreshold) & (velyChi2 < chiThreshold))[0]
         subStack = drawStack[:,good]
-        nbins, bins, patches = hist(subStack.flatten(),bins = np.arange(len(xInput)+1))
-        xlabel('Epoch')
-        ylabel('Times Used')
+        nbins, bins, patches = py.hist(subStack.flatten(),bins = np.arange(len(xInput)+1))
+        py.xlabel('Epoch')
+        py.ylabel('Times Used')
         print( bins)
         py.xticks(np.arange(len(xInput)), yearsInput, rotation = 45)
         #nbins, bins, patches1 = hist(velyChi2, bins = np.arange(0, 100, 0.5))
@@ -2244,33 +2629,35 @@ class accelClass(starset.StarSet):
         years = np.delete(yearsInput, bad)-t0
         print( years)
         print( x)
-        xfit = self.fitVelocity(years, x, xerr)
-        yfit = self.fitVelocity(years, y, yerr)
-        subplot(236)
+        xfits = batchfit.fitOrders(years, x[np.newaxis], xerr[np.newaxis], [1, 2], t0=0.0)
+        yfits = batchfit.fitOrders(years, y[np.newaxis], yerr[np.newaxis], [1, 2], t0=0.0)
+        xfit = xfits[1]
+        yfit = yfits[1]
+        py.subplot(236)
         py.errorbar(xInput, yInput, xerrInput, yerrInput, fmt='ro')
         py.errorbar(x,y,xerr,yerr,fmt='o')
-        plot(self.line(xfit.params,years),self.line(yfit.params,years))
-        xlabel('RA offset (arcsec)')
-        ylabel('DEC offset (arcsec)')
-        velChi2x = xfit.fnorm
-        velChi2y = yfit.fnorm
-        print( 'xfit', xfit.params)
-        print( 'xfit error: ', xfit.perror)
-        print( 'xfit chi2: ', xfit.fnorm)
-        print( 'yfit', yfit.params)
-        print( 'yfit error: ', yfit.perror)
-        print( 'yfit chi2: ', yfit.fnorm)
-        xfit = self.fitAccel(years, x, xerr)
-        yfit = self.fitAccel(years, y, yerr)
+        py.plot(self.line(xfit.coeffs[0],years),self.line(yfit.coeffs[0],years))
+        py.xlabel('RA offset (arcsec)')
+        py.ylabel('DEC offset (arcsec)')
+        velChi2x = xfit.chi2[0]
+        velChi2y = yfit.chi2[0]
+        print( 'xfit', xfit.coeffs[0])
+        print( 'xfit error: ', xfit.coeffErr[0])
+        print( 'xfit chi2: ', xfit.chi2[0])
+        print( 'yfit', yfit.coeffs[0])
+        print( 'yfit error: ', yfit.coeffErr[0])
+        print( 'yfit chi2: ', yfit.chi2[0])
+        xfit = xfits[2]
+        yfit = yfits[2]
         print( 'acceleration fits:')
-        print( 'xfit', xfit.params)
-        print( 'xfit error: ', xfit.perror)
-        print( 'xfit chi2: ', xfit.fnorm)
-        print( 'yfit', yfit.params)
-        print( 'yfit error: ', yfit.perror)
-        print( 'yfit chi2: ', yfit.fnorm)
-        accelChi2x = xfit.fnorm
-        accelChi2y = yfit.fnorm
+        print( 'xfit', xfit.coeffs[0])
+        print( 'xfit error: ', xfit.coeffErr[0])
+        print( 'xfit chi2: ', xfit.chi2[0])
+        print( 'yfit', yfit.coeffs[0])
+        print( 'yfit error: ', yfit.coeffErr[0])
+        print( 'yfit chi2: ', yfit.chi2[0])
+        accelChi2x = xfit.chi2[0]
+        accelChi2y = yfit.chi2[0]
 
         # the F-test for which model to prefer
         fValue = ((velChi2x - accelChi2x)/1.0)/(accelChi2x/(len(x)-3.0))
@@ -2282,7 +2669,7 @@ class accelClass(starset.StarSet):
 
         if iterate:
             self.bootstrapVel(x, y, xerr, yerr, years+t0,
-                         t0, n = 500, fraction = 0.05, iterate = False)
+                         t0, n = n, fraction = 0.05, iterate = False, seed = rng)
 
 
 
@@ -2608,34 +2995,14 @@ class accelClass(starset.StarSet):
         self.plotSpeckleAOVel()
         return
 
-    def chi2DistFit(self, p, direction = 'x', returnChi2 = False, maxChi2 = None,
-                    scaleFactor = 1.0, data = 'both', removeConfused = True):
-        """ function to fit the chi2 distribution of velocities to
-        figure out the additive error that needs to be included to
-        bring the chi2 distribution in line with the expected. Will only
-        consider stars that are detected in all epochs.
-
-        Input: p - additive error parameter
-               x - bin locations
-               y - theoretical chi2 curve
-
-        Keywords: direction - 'x' (def), 'y', or 'both' to calculate the chi2 in
-                  either direction or combine both.
-
-                  returnChi2 - return the chi2
-                  values instead of the difference between chi2 and
-                  model
+    def addErrStars(self, removeConfused = True):
+        """ indices of the stars used to compute the additive error:
+        stars detected in all epochs, within self.rmin - self.rmax
+        (if rmax > 0) and self.magmin - self.magmax (if magmax > 0).
 
-                  maxChi2 - the maximum chi2 value to create the
-                  histogram. Defaults to 3 times the number of epochs
-
-                  removeConfused - look at the self.confusedStars array and not
-                  include them in the fit
-
-                  self.rmax - the maximum radius to compute the additive
-                  error. Default rmax = 0 for the entire range.
+        Keywords: removeConfused - leave out the stars in
+                  self.confusedSourcesInd
         """
-        names = self.names
         maxEpochInd = self.maxEpochInd
         mag = self.mag
 
@@ -2660,19 +3027,37 @@ class accelClass(starset.StarSet):
             maxEpochInd = np.intersect1d(goodMag, maxEpochInd)
             print( 'limiting magnitude to those brighter than %f, n stars: %f' % (self.magmax,len(maxEpochInd)))
 
-        n = len(maxEpochInd)
+        return maxEpochInd
 
-        # keep track of which stars were used to compute the additive error
-        self.addErrStarsInd = maxEpochInd
+    def chi2AddErr(self, testErr, direction = 'x', scaleFactor = 1.0,
+                   data = 'both', removeConfused = True):
+        """ chi2 of the velocity fits of the stars from addErrStars()
+        for every additive error in testErr, all at once. The epochs
+        and positions are the same for every additive error, so only
+        the weights change: the fits for all errors are one stacked
+        batchfit.fitOrders() call.
 
-        chi2x = np.zeros(n)
-        chi2y = np.zeros(n)
+        Input: testErr - additive errors (arcsec). Negative values
+               subtract the error in quadrature instead.
 
-        # allow for the possibility of subtracting some error
-        if p[0] < 0:
-            sign = -1.0
-        else:
-            sign = 1.0
+        Keywords: direction - 'x' (def), 'y', or 'both' (x and y
+                  chi2 values side by side)
+
+                  scaleFactor - the positional errors are divided by
+                  this factor
+
+                  data - 'both', 'speckle' or 'ao' epochs
+
+        Output: (len(testErr), nStars) array of chi2 values
+                (nStars x 2 for direction = 'both'), and the number
+                of epochs used
+        """
+        testErr = np.atleast_1d(np.asarray(testErr, dtype=float))
+        names = self.names
+        maxEpochInd = self.addErrStars(removeConfused = removeConfused)
+
+        # keep track of which stars were used to compute the additive error
+        self.addErrStarsInd = maxEpochInd
 
         # make sure if there are no speckle data that we set the flag to AO only
         if len(self.speckInd) == 0:
@@ -2684,91 +3069,153 @@ class accelClass(starset.StarSet):
             epochInd = self.speckInd
         elif (data == 'ao'):
             epochInd = self.aoInd
+        epochInd = np.asarray(epochInd, dtype=int)
 
         print( 'using error scale factor: ', scaleFactor)
-
-        # remove confused sources
         print( ','.join(names[maxEpochInd]))
 
-        # go through good stars and compute the chi2 values
-        for i in range(n):
-            ind = maxEpochInd[i]
-
-            # Grab the x and y points from align
-            xpts = -self.starSet.stars[ind].getArrayAllEpochs('x')[epochInd]
-            ypts = self.starSet.stars[ind].getArrayAllEpochs('y')[epochInd]
-
-            # Grab the x and y positional errors from align
-            # Scale the positional errors if specified.
-            xerr_p = self.starSet.stars[ind].getArrayAllEpochs('xerr_p')[epochInd] / scaleFactor
-            xerr_a = self.starSet.stars[ind].getArrayAllEpochs('xerr_a')[epochInd]
-
-            yerr_p = self.starSet.stars[ind].getArrayAllEpochs('yerr_p')[epochInd] / scaleFactor
-            yerr_a = self.starSet.stars[ind].getArrayAllEpochs('yerr_a')[epochInd]
+        # (nStars, nEpochs) arrays of the good stars
+        s = self.starSet
+        def epochArray(varName):
+            arr = s.getArrayFromAllEpochs(varName)
+            return np.asarray(arr)[epochInd][:,maxEpochInd].T
+
+        years = self.allEpochs[epochInd]
+        pts = []
+        errs = []
+        if (direction == 'x') or (direction == 'both'):
+            pts.append(-epochArray('x'))
+            errs.append(epochArray('xerr_p')**2 / scaleFactor**2 +
+                        epochArray('xerr_a')**2)
+        if (direction == 'y') or (direction == 'both'):
+            pts.append(epochArray('y'))
+            errs.append(epochArray('yerr_p')**2 / scaleFactor**2 +
+                        epochArray('yerr_a')**2)
+        pts = np.concatenate(pts)
+        errs = np.concatenate(errs)
+
+        # add the new error in quadrature, for all errors at once
+        addErr2 = np.sign(testErr) * testErr**2
+        err = np.sqrt(errs[np.newaxis,:,:] + addErr2[:,np.newaxis,np.newaxis])
+
+        # the chi2 of a linear fit does not depend on t0
+        numStars = len(pts)
+        fit = batchfit.fitPolynomials(years, np.tile(pts, (len(testErr), 1)),
+                                      err.reshape(-1, len(years)), 1, t0=0.0)
+        chi2 = fit.chi2.reshape(len(testErr), numStars)
+
+        return (chi2, len(years))
+
+    def chi2HistDiff(self, chi2, nEpochs, maxChi2 = None):
+        """ difference between the histogram of chi2 values and the
+        theoretical chi2 distribution for a linear fit to nEpochs
+        points, in units of the Poisson error of each bin. chi2 can
+        hold several sets of chi2 values, one per row.
+
+        Keywords: maxChi2 - the maximum chi2 value of the histogram.
+                  Defaults to 3 times the number of epochs
+
+        Output: (nRows, nBins) array (or (nBins,) for 1D chi2)
+        """
+        chi2 = np.asarray(chi2, dtype=float)
+        if chi2.ndim == 1:
+            return self.chi2HistDiff(chi2[np.newaxis], nEpochs, maxChi2)[0]
+
+        if maxChi2 is None:
+            maxChi2 = nEpochs * 3
+        dof = nEpochs - 2.0
+        width = maxChi2 / 30.0
+        bins = np.arange(0, maxChi2, width)
+        numBins = len(bins) - 1
+
+        # np.histogram of every row: half-open bins except the last one
+        binInd = np.searchsorted(bins, chi2, side='right') - 1
+        binInd[chi2 == bins[-1]] = numBins - 1
+        use = (binInd >= 0) & (binInd < numBins)
+        rowInd = np.broadcast_to(np.arange(len(chi2))[:,np.newaxis], chi2.shape)
+        nStars = np.bincount(rowInd[use] * numBins + binInd[use],
+                             minlength=len(chi2) * numBins)
+        nStars = nStars.reshape(len(chi2), numBins).astype(float)
+
+        # use pdf difference
+        chi2Theory = stats.chi2.pdf(bins, dof)[np.newaxis,:] * \
+                     nStars.sum(axis=1)[:,np.newaxis] * width
+        err = np.sqrt(nStars)
+        err[nStars == 0] = 1.0
+        diff = (nStars - chi2Theory[:,0:-1]) / err
+        return diff
+
+    def bestAddErr(self, testErr, chi2):
+        """ best additive error from the chi2 values of chi2HistDiff()
+        for each error in testErr, and the errors for which the chi2
+        is within 1 of the minimum (linearly interpolated between the
+        test errors, and clipped to the range of testErr).
+
+        Output: (best, lower, upper)
+        """
+        testErr = np.asarray(testErr, dtype=float)
+        chi2 = np.asarray(chi2, dtype=float)
+        best = np.nanargmin(chi2)
+        level = chi2[best] + 1.0
+
+        def crossing(ind):
+            # first test error from best along ind with chi2 above level
+            for ii in range(1, len(ind)):
+                if chi2[ind[ii]] > level:
+                    (i0, i1) = (ind[ii-1], ind[ii])
+                    frac = (level - chi2[i0]) / (chi2[i1] - chi2[i0])
+                    return testErr[i0] + frac * (testErr[i1] - testErr[i0])
+            return testErr[ind[-1]]
+
+        lower = crossing(np.arange(best, -1, -1))
+        upper = crossing(np.arange(best, len(testErr)))
+        return (testErr[best], lower, upper)
 
-            # add the two errors in quadrature and add the new error
-            xerr = np.sqrt(xerr_p**2 + xerr_a**2 + sign*p[0]**2)
-            yerr = np.sqrt(yerr_p**2 + yerr_a**2 + sign*p[0]**2)
+    def chi2DistFit(self, p, direction = 'x', returnChi2 = False, maxChi2 = None,
+                    scaleFactor = 1.0, data = 'both', removeConfused = True):
+        """ function to fit the chi2 distribution of velocities to
+        figure out the additive error that needs to be included to
+        bring the chi2 distribution in line with the expected. Will only
+        consider stars that are detected in all epochs.
 
-            years = np.array(self.starSet.stars[ind].years)[epochInd]
-            if (data == 'both'):
-                t0 = self.starSet.stars[ind].fitXa.t0    # use the same T0 as polyfit
-            else:
-                # compute TO with weighted mean epoch by x positional error
-                t0 = np.sum(years/xerr**2)/np.sum(1.0/xerr**2)
+        Input: p - additive error parameter
 
+        Keywords: direction - 'x' (def), 'y', or 'both' to calculate the chi2 in
+                  either direction or combine both.
 
-            # go through each star and compute the velocity as well as the errors
-            if (direction == 'x') or (direction == 'both'):
-                functargsX = {'x': years - t0, 'y': xpts, 'err': xerr}
-                guessX = [np.mean(xpts), (np.amax(xpts) - np.amin(xpts)) / (np.amax(years) - np.amin(years))]
-                xfitLin = nmpfit.mpfit(self.fitLin, guessX, functkw=functargsX, quiet=1)
-                chi2x[i] = xfitLin.fnorm
+                  returnChi2 - return the chi2
+                  values instead of the difference between chi2 and
+                  model
 
-            if (direction == 'y') or (direction == 'both'):
-                functargsY = {'x':years - t0, 'y':ypts, 'err': yerr}
-                guessY = [np.mean(xpts),(np.amax(xpts) - np.amin(xpts))/(np.amax(years) - np.amin(years))]
-                yfitLin = nmpfit.mpfit(self.fitLin, guessY, functkw=functargsY,quiet=1)
-                chi2y[i] = yfitLin.fnorm
+                  maxChi2 - the maximum chi2 value to create the
+                  histogram. Defaults to 3 times the number of epochs
 
+                  removeConfused - look at the self.confusedStars array and not
+                  include them in the fit
 
-        # put both together if doing both directions
-        if (direction == 'both'):
-            chi2_final = np.concatenate((chi2x, chi2y))
+                  self.rmax - the maximum radius to compute the additive
+                  error. Default rmax = 0 for the entire range.
 
+        To test many additive errors, chi2AddErr() and chi2HistDiff()
+        do all of them at once.
+        """
+        (chi2, nEpochs) = self.chi2AddErr(p[0:1], direction = direction,
+                                          scaleFactor = scaleFactor, data = data,
+                                          removeConfused = removeConfused)
         if returnChi2:
-            return chi2_final
+            return chi2[0]
         else:
-            if maxChi2 is None:
-                maxChi2 = len(years) * 3
-            dof = len(years) - 2.0
-            # use pdf difference
-            width = maxChi2 / 30.0
-            nStars, bins, patches = py.hist(chi2_final, bins=np.arange(0,maxChi2, width), color='b')
-            chiInd = bins
-            chi2Theory = stats.chi2.pdf(chiInd, dof) * np.sum(nStars) * width
-            py.clf()
-            py.plot(chiInd, chi2Theory)
-            py.plot(bins[0:-1], nStars,'go')
-            good = np.where(nStars != 0)[0]
-            bad = np.where(nStars == 0)[0]
-            err = np.sqrt(nStars)
-            err[bad] = 1.0
-            diff = np.zeros(len(nStars))
-            diff = (nStars - chi2Theory[0:-1]) / err
-            return diff
-
-
+            return self.chi2HistDiff(chi2[0], nEpochs, maxChi2 = maxChi2)
 
     def testChi2Fit(self, testErr = None, scaleFactor = 1.0, data = 'both'):
         """
         test the chi2DistFit function by going through a series
-        ofadditive factors to minimize the chi2
+        ofadditive factors to minimize the chi2. The best additive
+        errors and their ranges (see bestAddErr()) are stored in
+        self.errAddBestX and self.errAddBestY.
         """
         if testErr is None:
             testErr = np.arange(0.00001,0.001,0.00001)
-        chi2x = np.zeros(len(testErr))
-        chi2y = np.zeros(len(testErr))
 
         # record the number of degree of freedom in the test
         if (data == 'speckle'):
@@ -2778,33 +3225,37 @@ class accelClass(starset.StarSet):
         else:
             self.errAddDof = len(self.allEpochs)-2.0
 
-        for ii in range(len(testErr)):
-            fit = self.chi2DistFit(np.array([testErr[ii]]), direction = 'x',
-                                   scaleFactor = scaleFactor, data = data)
-            chi2x[ii] = np.sum(fit**2)
-            print( 'additive error factor: %f chi2: %f' % (testErr[ii],chi2x[ii]))
+        (chi2, nEpochs) = self.chi2AddErr(testErr, direction = 'both',
+                                          scaleFactor = scaleFactor, data = data)
+        numStars = chi2.shape[1] // 2
+        chi2x = np.sum(self.chi2HistDiff(chi2[:,:numStars], nEpochs)**2, axis=1)
+        chi2y = np.sum(self.chi2HistDiff(chi2[:,numStars:], nEpochs)**2, axis=1)
 
         for ii in range(len(testErr)):
-            fit = self.chi2DistFit(np.array([testErr[ii]]), direction = 'y',
-                                   scaleFactor = scaleFactor, data = data)
-            chi2y[ii] = np.sum(fit**2)
-            print( 'additive error factor: %f chi2: %f' % (testErr[ii],chi2y[ii]))
+            print( 'additive error factor: %f chi2 x: %f y: %f' % (testErr[ii],chi2x[ii],chi2y[ii]))
 
-        clf()
-        plot(testErr, chi2x, 'bo', label ='x')
-        plot(testErr, chi2y, 'go', label = 'y')
-        xlabel('Additive Factor (arcsec)')
-        ylabel('Chi Sq. Difference')
-        legend()
+        self.errAddBestX = self.bestAddErr(testErr, chi2x)
+        self.errAddBestY = self.bestAddErr(testErr, chi2y)
+        print( 'best additive error x: %f (%f - %f)' % self.errAddBestX)
+        print( 'best additive error y: %f (%f - %f)' % self.errAddBestY)
+
+        py.clf()
+        py.plot(testErr, chi2x, 'bo', label ='x')
+        py.plot(testErr, chi2y, 'go', label = 'y')
+        py.xlabel('Additive Factor (arcsec)')
+        py.ylabel('Chi Sq. Difference')
+        py.legend()
         self.errAdd = testErr
         self.errAddChi2x = chi2x
         self.errAddChi2y = chi2y
-        savefig(self.plotPrefix+'additive_error_test.png')
+        py.savefig(self.plotPrefix+'additive_error_test.png')
 
 
     def testChi2FitXY(self, testErr = None, scaleFactor = None, data = 'both'):
         """ test the chi2DistFit function by going through a series
-        ofadditive factors to minimize the chi2 over BOTH directions
+        ofadditive factors to minimize the chi2 over BOTH directions.
+        The best additive error and its range (see bestAddErr()) are
+        stored in self.errAddBestXY.
         """
 
         if scaleFactor is None:
@@ -2813,9 +3264,6 @@ class accelClass(starset.StarSet):
         if testErr is None:
             testErr = np.arange(0.00001,0.0005,0.00001)
 
-        chi2x = np.zeros(len(testErr))
-        chi2y = np.zeros(len(testErr))
-
         # record the number of degree of freedom in the test
         if (data == 'speckle'):
             self.errAddDof = len(self.speckInd)-2.0
@@ -2825,12 +3273,15 @@ class accelClass(starset.StarSet):
             self.errAddDof = len(self.allEpochs)-2.0
 
         # use pdf chi2
+        (chi2, nEpochs) = self.chi2AddErr(testErr, direction = 'both',
+                                          scaleFactor = scaleFactor, data = data)
+        chi2x = np.sum(self.chi2HistDiff(chi2, nEpochs)**2, axis=1)
         for ii in np.arange(len(testErr)):
-            fit = self.chi2DistFit(np.array([testErr[ii]]), direction='both',
-                                   scaleFactor=scaleFactor, data=data)
-            chi2x[ii] = np.sum(fit**2)
             print( 'additive error factor: %f chi2: %f' % (testErr[ii],chi2x[ii]))
 
+        self.errAddBestXY = self.bestAddErr(testErr, chi2x)
+        print( 'best additive error: %f (%f - %f)' % self.errAddBestXY)
+
         py.clf()
         py.plot(testErr, chi2x, 'bo', label ='x')
         py.xlabel('Additive Factor (arcsec)')
@@ -3419,7 +3870,7 @@ class accelClass(starset.StarSet):
         # open a file
         f = open(filename,'wb')
         print( 'saving file: '+filename)
-        cPickle.dump(self,f,-1)
+        pickle.dump(self,f,-1)
         f.close()
 
 
@@ -3568,6 +4019,72 @@ class accelClass(starset.StarSet):
 
 
 
+# Make the results of the analysis stages lazy attributes
+for (_stage, _method, _needs, _params, _attrs) in accelClass.stages:
+    for _attr in _attrs:
+        setattr(accelClass, _attr,
+                _StageAttribute(_stage, _attr, accelClass.__dict__.get(_attr)))
+
+
+def plotFTestPoly(name, orders, Fx, Fy, chix, chiy, bestOrder,
+                  time, xres, yres, xe, ye, outFile):
+    """
+    Plot the F test between successive polynomial orders of one star
+    (1-p vs. order) and the residuals of its fits of every order.
+    Used by accelClass.plot_f_hpoly_stars; it only takes arrays, so it
+    can run in a pool of processes.
+
+    @param Fx, Fy: 1-p from each order to the next one
+    @param chix, chiy: chi2 of each order
+    @param time, xe, ye: epochs and errors of the points
+    @param xres, yres: (orders, points) residuals from each fit
+    """
+    norders = len(orders)
+    fig = Figure(figsize=(20,10))
+    grid = fig.add_gridspec(norders, 3)
+
+    # plot how F test value changes
+    ax = fig.add_subplot(grid[:,0])
+    ax.plot(orders[:-1], Fx, 'g-', label='x')
+    ax.plot(orders[:-1], Fy, 'b-', label='y')
+    ax.axvline(x=bestOrder, color='r', ls='--')
+    ax.set_xlabel('poly order')
+    ax.set_ylabel('1-p')
+    ax.legend()
+    ax.set_title('%s' %name)
+    ax.ticklabel_format(useOffset=False)
+    ax.set_xticks(orders)
+
+    # plot how polynomial fit looks like
+    axx = axy = None
+    for i in range(norders):
+        axx = fig.add_subplot(grid[i,1], sharex=axx)
+        axx.errorbar(time, xres[i], yerr=xe, fmt='.', label='order=%d' %orders[i])
+        axx.legend()
+        axx.annotate('chi2=%.0f' %chix[i], color='r', xy=(0.5, 0.5), xycoords='axes fraction')
+
+        axy = fig.add_subplot(grid[i,2], sharex=axy)
+        axy.errorbar(time, yres[i], yerr=ye, fmt='.')
+        axy.annotate('chi2=%.0f' %chiy[i], color='r', xy=(0.5, 0.5), xycoords='axes fraction')
+
+        if len(time) > 0:
+            axx.hlines(0, xmin=time.min(), xmax=time.max())
+            axy.hlines(0, xmin=time.min(), xmax=time.max())
+        if i == 0:
+            axx.set_title('x-xfit (arcsec)')
+            axy.set_title('y-yfit (arcsec)')
+        if i < norders - 1:
+            axx.tick_params(labelbottom=False)
+            axy.tick_params(labelbottom=False)
+
+    axx.set_xlabel('year')
+    axy.set_xlabel('year')
+
+    fig.tight_layout()
+    fig.subplots_adjust(hspace=0)
+    fig.savefig(outFile, format='png')
+
+
 def KsChi2Test(alignErr, refStars = None,
               magBoundary = None, direction='both',
               maxChi2 = None, nbin_ks=60, nbin_chi2=10):
@@ -271,20 +271,15 @@ def generate_Orbits(align_root, orbits_file=None,tStart=1994. , tEnd=2020. , dt=
         tab = np.genfromtxt(orbits_file, dtype=str)
 #tab = np.genfromtxt('/u/ahees/ahees_server/align_2017_01_23/orbits.dat', dtype=None)
 
-    res = []
-    names = []
-    for star in tab:
-        orb = orbits.Orbit()
-        orb.p  = float(star[1])
-        orb.t0 = float(star[3])
-        orb.e  = float(star[4])
-        orb.i  = float(star[5])
-        orb.o  = float(star[6])
-        orb.w  = float(star[7])
-
-        (x,v,a) = orb.kep2xyz(epochs=t,mass=4.e6,dist=8000.) #possible to change mass and R0 here if needed, current values are hardcoded in gcwork.objects.Constants
-        names.append(star[0])
-        res.append(x[:,0:2])
+    tab = np.atleast_2d(tab)
+    elem = tab[:,[1,3,4,5,6,7]].astype(float)
+
+    #possible to change mass and R0 here if needed, current values are hardcoded in gcwork.objects.Constants
+    (x,v,a) = orbits.kep2xyzBatch(elem[:,0], elem[:,1], elem[:,2],
+                                  elem[:,3], elem[:,4], elem[:,5],
+                                  epochs=t,mass=4.e6,dist=8000.)
+    names = list(tab[:,0])
+    res = list(x[:,:,0:2])
 
     return res,names
 
@@ -74,7 +74,8 @@ def make_postage_stamps(center_stars, align_name,
     else:
         # Open starset object, and load in array of positions
         warnings.simplefilter('ignore', UserWarning)
-        starset_obj = starset.StarSet('{0}align/{1}'.format(align_dir, align_base_name))
+        starset_obj = starset.StarSet('{0}align/{1}'.format(align_dir, align_base_name),
+                                      cache=True)
         starset_obj.loadPoints('{0}/{1}/'.format(align_dir, align_points_dir))
 
         star_names = np.array(starset_obj.getArray('name'))
@@ -598,7 +599,8 @@ def make_postage_stamps_dr(
     else:
         # Open starset object, and load in array of positions
         warnings.simplefilter('ignore', UserWarning)
-        starset_obj = starset.StarSet('{0}align/{1}'.format(align_dir, align_base_name))
+        starset_obj = starset.StarSet('{0}align/{1}'.format(align_dir, align_base_name),
+                                      cache=True)
         starset_obj.loadPoints('{0}/{1}/'.format(align_dir, align_points_dir))
 
         star_names = np.array(starset_obj.getArray('name'))
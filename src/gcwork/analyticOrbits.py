@@ -6,6 +6,7 @@ import asciidata
 import pickle, time, random, pdb
 import histogram2d as hist2d
 import os
+import multiprocessing as mp
 from matplotlib.mlab import griddata
 import scipy.integrate
 from gcutil import nmpfit_sy as mpfit
@@ -13,7 +14,11 @@ from gcwork import objects
 from gcwork import orbits
 from gcwork import young
 from gcwork import plot_disk_healpix
+from gcwork import healpix
 from gcwork import util
+from gcwork import orbitmc
+from gcwork import diskdensity
+from gcwork.orbitmc import acc2z, acc2zErr, z2acc
 import healpy
 
 class StarOrbits(object):
@@ -519,7 +524,8 @@ class StarOrbitsMC(object):
         # End NEW
 
 
-    def run(self, mcMassRo=None, zfrom='acc', mExtended=None, verbose=True, makeplot=False):
+    def run(self, mcMassRo=None, zfrom='acc', mExtended=None, verbose=True,
+            makeplot=False, seed=None):
         """
         Perform a Monte Carlo analysis on the data to determine the
         probability distribution for the orbital parameters and the
@@ -528,6 +534,11 @@ class StarOrbitsMC(object):
         used in conjunction with other stars to derive the best fit
         plane.
 
+        All trials are drawn at once as arrays. Trials that break the
+        bound orbit criteria (or whose acceleration falls outside of
+        the allowed range) are re-drawn, and only those, until every
+        trial is accepted (see orbitmc.sampleTrials).
+
         This StarOrbitsMC object (and all results of the Monte Carlo)
         are stored in a pickle file in analyticOrbits/<star>.mc.dat.
         You can re-load this pickle file using:
@@ -538,11 +549,18 @@ class StarOrbitsMC(object):
         Input Options:
         mcMassRo -- (def=None) Set to file name containing pickled
                     bhPotential.BHprops() object.
-        zfrom    -- Set to 'acc' (def), 'all', or 'plane':
+        zfrom    -- Set to 'acc' (def), 'all', 'all2', 'uni_acc',
+                    'uni_acc_limit' or 'acc2':
                     acc: derive z from polyfit acceleration
                     all: derive z from all possible bound orbits (uniform acc)
                     all2: derive z from all possible bound orbits (uniform z)
-                    plane: derive z from plane (hardcoded plane i/Omega)
+                    uni_acc: uniform acc between amin and amax
+                    uni_acc_limit: uniform acc between the 3 sigma
+                               lower limit on the acceleration and amax
+                    acc2: derive z from the polyfit acceleration and
+                          its error
+        seed     -- seed or numpy.random.Generator for the random draws
+                    (def=None, fresh entropy)
 
         Available variables are:
         i,e,w,o,p,t0,ph -- Orbital parameters.
@@ -556,367 +574,44 @@ class StarOrbitsMC(object):
         name -- Star Name
         pdf -- 2D Probability Density Function for i and o
         """
-        
-        ##########
-        #
-        # First we need to create a collection of a-values whose
-        # histogram is distributed according to the probability
-        # prob(a) set by the measured polyfit a and sigma_a.
-        # We can then select from this collection
-        # when doing the monte carlo.
-        #
-        ##########
+        if zfrom not in orbitmc.zfromModes:
+            raise ValueError('StarOrbitsMC.run: zfrom=%s is not supported' % zfrom)
 
         if (verbose):
-            print 'START: ', time.ctime(time.time())
-
-        cc = objects.Constants()
+            print('START: %s' % time.ctime(time.time()))
 
-        # Make all our random number generators. We will need
-        # 7 all together (x, y, vx, vy, vz, ax, ay)
-        # --added another generator for the case of using a z prior
-        gens = create_generators(8, self.ntrials*1000)
-        xgen = gens[0]
-        ygen = gens[1]
-        vxgen = gens[2]
-        vygen = gens[3]
-        vzgen = gens[4]
-        axgen = gens[5]
-        aygen = gens[6]
-        zgen = gens[7]
+        rng = np.random.default_rng(seed)
 
         self._initVariables()
         self._initTransform()
 
-        ##########
-        #
-        # Monte Carlo.
-        #
-        ##########
-        for zz in range(int(self.ntrials/2.0)):
-            if ( ((zz % 5000) == 0) & (verbose == True)):
-                print 'PDF Trial %d: ' % (zz*2), \
-                      time.ctime(time.time()), self.i[zz-1]
-            
-            #if (isnan(self.i[zz-1]) == 1):
-            #    pdb.set_trace()
-
-            # Set temp values for our while loop
-            amin = -1.0
-            amax = -2.0
-            aminLoopCount = 0
-
-            # We need to make sure we always satisfy the
-            # bound condition. We do this by checking that
-            # amin (set by r2d) < amax (set by v=vesc), where
-            # all accels are negative.
-            while(amin >= amax): # not bound; keep checking for bound condition
-                aminLoopCount += 1
-                
-                # Occasionally we get cases where the randomly selected
-                # velocity exceeds the escape velocity for the randomly
-                # selected distance. We need to throw out these cases.
-                if ((aminLoopCount % 100) == 2 and verbose):
-                    r = sqrt(x**2 + y**2)             # arcsec
-                    rcgs = r * dist * cc.cm_in_au
-                    
-                    print 'Random pos/vel break bound orbit criteria: zz=%d, %s' % \
-                          (zz, self.name)
-                    print '\tamin = %7.3f  amax = %7.3f' % (amin, amax)
-                    print '\tvel = %7.3f    escape = %7.3f' % \
-                          (sqrt(vx**2 + vy**2 + vz**2),
-                           sqrt(2.0 * GM / rcgs) / 1.0e5)
-                    print '\tvx = %3d  vy = %3d  vz = %3d' % \
-                          (vx, vy, vz)
-                    print '\tmass = %7.3e' % (mass * cc.msun)
-
-                    if (isnan(sqrt(2.0 * GM / rcgs) / 1.0e5) == 1):
-                        print dist
-                
-                # Sample our monte carlo variables
-                x = xgen.gauss(self.x_dat, self.xerr_dat)     # asec (+x west)
-                y = ygen.gauss(self.y_dat, self.yerr_dat)     # asec (+y north)
-                vx = vxgen.gauss(self.vx_dat, self.vxerr_dat) # asec/yr
-                vy = vygen.gauss(self.vy_dat, self.vyerr_dat) # asec/yr
-                vz = vzgen.gauss(self.vz_dat, self.vzerr_dat) # km/s
-                
-                if mExtended != None:
-                    (mass, dist, x0, y0) = self._getPotential(mcMassRo, zz, mExtended, x, y)
-                else:
-                    (mass, dist, x0, y0) = self._getPotential(mcMassRo, zz)
-
-                GM = cc.G * mass * cc.msun        # cgs
-                
-                (x, y) = util.rPix2Arc(x, y, self.trans)     # asec (+x east, +y north)
-                (vx, vy) = util.vPix2Arc(vx, vy, self.trans) # asec/yr
-
-                # Convert velocities in km/s
-                asy_to_kms = dist * cc.cm_in_au / (1.0e5 * cc.sec_in_yr)
-                vx *= asy_to_kms
-                vy *= asy_to_kms
-
-                # At this point:
-                #   all positions are in arcsec and
-                #   all velocities are in km/s
-
-                # Catch the case of too high velocities
-                vtot = sqrt(vx**2 + vy**2 + vz**2)
-                rho = sqrt(x**2 + y**2)
-                vtotcgs = vtot * 1.0e5
-                rhocgs = rho * dist * cc.cm_in_au
-
-                if (vtotcgs**2 > (2.0 * GM / rhocgs)):
-                    amin = -1.0
-                    amax = -2.0
-                    continue
-
-                # Determine the maximum allowed acceleration (where a < 0)
-                # set by assuming a bound orbit.
-                amax = self._calcMaxAcc(x, y, vx, vy, vz, GM, dist, cc)
-
-                # Determine the minimum allowed acceleration (where a < 0)
-                # set by the minimum radius = 2D projected radius.
-                amin = self._calcMinAcc(x, y, GM, dist, cc)
-
-                # new:
-                # in case we have to use accel limits, make sure we don't
-                # pull values that lead to amax being less than the accel limits
-                if zfrom == 'uni_acc_limit':
-                    ax = self.ax_dat
-                    ay = self.ay_dat
-                    axe = self.axerr_dat
-                    aye = self.ayerr_dat
-
-                    (ax, ay, axe, aye) = util.verrPix2Arc(ax, ay, axe, aye, self.trans)
-                    ax *= 1000.0  # mas/yr^2
-                    ay *= 1000.0  # mas/yr^2
-                    axe *= 1000.0  # mas/yr^2
-                    aye *= 1000.0  # mas/yr^2
-
-                    # Convert into radial and tangential
-                    (ar_dat, at_dat, are_dat, ate_dat) = \
-                             util.xy2circErr(-self.x_dat, self.y_dat, ax, ay,
-                                             self.xerr_dat, self.yerr_dat, axe, aye)
-                    alimit = ar_dat - (self.sigma * are_dat)
-                    amin = alimit
-                    if amin > amax:
-                        # This is bad. Go back and resample
-                        print 'Accel lower limit is greater than max accel. Must resample.'
-                        print zz, aminLoopCount
-
-                        amin = -1.0
-                        amax = -2.0
-                        continue
-                    # end new
-
-
-                # Convert accelerations from mas/yr^2
-                # into line of sight distances in arcsec
-                zmax = acc2z(x, y, amax, dist, mass)
-
-                if (isnan(zmax) == 1):
-                    print 'zmax = 0 for ', self.name
-                    zmax = 0.0001
-            #print 'sampled: ', amin, amax
-
-            # Sample the accelerations in the plane of the sky
-            # according to the distribution given by polyfit.
-            # We need to check to see if this acceleration satisfies
-            # a bound orbit. Search until we find a good one.
-            arGood = False
-            loopCnt = 0
-            while (arGood == False):
-
-                if (zfrom == 'acc'):
-                    # Start NEW:
-                    # We will use acceleration info only if the star passes the
-                    # F test for accelerations (over velocities)
-
-                    def sample_gaussian(self):
-                        # Sample from Gaussian centered on our acceleration measurement
-                        ax = axgen.gauss(self.ax_dat, self.axerr_dat)  # arcsec/yr^2
-                        ay = aygen.gauss(self.ay_dat, self.ayerr_dat)  # arcsec/yr^2
-                        
-                        # Convert into mas/yr^2  
-                        (ax, ay) = util.vPix2Arc(ax, ay, self.trans)
-                        ax *= 1000.0
-                        ay *= 1000.0
-                        
-                        # Convert into radial and tangential
-                        (ar, at) = util.xy2circ(x, y, ax, ay)
-
-                        return (ar, at)
-
-                    if (zz == 0):
-                        print '***Acceleration Info***'
-                        print 'Significant acceleration'
-                        print 'F statistic implies we should use acceleration info from polyfit.'
-
-                    ar, at = sample_gaussian(self)
-
-                    # End NEW
-
-                elif (zfrom == 'uni_acc'):
-                    if (zz == 0):
-                        print 'Acceleration consistent w/ zero and with amin'
-                        #print 'F statistic implies acceleration fit is not warranted'
-                        print 'Sample from uniform acceleration between amin and amax'
-                    ar = axgen.uniform(amin, amax)
-
-                elif (zfrom == 'uni_acc_limit'):
-                    if (zz == 0):
-                        print 'Acceleration constraints: lower limit > amin'
-                        print 'Sample from uniform acceleration between the 3 sigma lower limit and amax'
-
-                    # This case essentially ignores amin, since we have tighter constraints
-                    # using the 3 sigma lower limit on the acceleration
-
-                    ax = self.ax_dat
-                    ay = self.ay_dat
-                    axe = self.axerr_dat
-                    aye = self.ayerr_dat
-
-                    (ax, ay, axe, aye) = util.verrPix2Arc(ax, ay, axe, aye, self.trans)
-                    ax *= 1000.0  # mas/yr^2, +x to east (correct sense)
-                    ay *= 1000.0  # mas/yr^2
-                    axe *= 1000.0  # mas/yr^2
-                    aye *= 1000.0  # mas/yr^2
-
-                    # Convert into radial and tangential
-                    # NOTE: since we're calling util.xy2circErr, must pass everything
-                    # in with +x to east
-                    (ar_dat, at_dat, are_dat, ate_dat) = \
-                             util.xy2circErr(-self.x_dat, self.y_dat, ax, ay,
-                                             self.xerr_dat, self.yerr_dat, axe, aye)
-                    alimit = ar_dat - (self.sigma * are_dat)
-                    amin = alimit
-
-                    ar = axgen.uniform(amin, amax)
-                    #print 'sampling from: ', alimit, amax
-                    
-                    #print 'Sampled ar = %8.3f' % ar
-
-                elif (zfrom == 'acc2'):
-                    ax = self.ax_dat
-                    ay = self.ay_dat
-                    axe = self.axerr_dat
-                    aye = self.ayerr_dat
-
-                    (ax, ay, axe, aye) = util.verrPix2Arc(ax, ay, axe, aye,
-                                                          self.trans)
-                    ax *= 1000.0  # mas/yr^2
-                    ay *= 1000.0  # mas/yr^2
-                    axe *= 1000.0  # mas/yr^2
-                    aye *= 1000.0  # mas/yr^2
-                    
-                    (ar, at, are, ate) = util.xy2circErr(x, y,
-                                                         ax, ay,
-                                                         0.0, 0.0,
-                                                         axe, aye)
-                    if (ar > amax):
-                        ar = amax-0.00001
-                    elif (ar < amin):
-                        ar = amin+0.00001
-
-                    (z_dat, zerr_dat) = acc2zErr(x, y, ar, are, dist, mass)
-
-                    if (zerr_dat > zmax):
-                        # Really large errors... pull from
-                        # a uniform distribution of z
-                        z = axgen.uniform(0.0, zmax)
-                        if (zz == 0):
-                            print 'Switched to Uniform Z'
-                    else:
-                        z = axgen.gauss(z_dat, zerr_dat)
-
-                    if ((z < 0) or (z >= zmax)):
-                        # This is BAD. Indicate to the catcher loop
-                        # below by setting acc to an unacceptable value.
-                        ar = 0.0
-                    else:
-                        # Convert uniform z into accelerations
-                        ar = z2acc(x, y, z, dist, mass)
-
-                    if (zz == 0):
-                        print 'a = %7.4f +/- %6.5f mas/yr^2' % (ar, are)
-                        print 'z = %6.2f +/- %5.2f arcsec' % (z_dat, zerr_dat)
-                        print 'amin = %7.4f  amax = %7.4f  zmax = %7.4f' % \
-                              (amin, amax, zmax)
-
-                elif (zfrom == 'zprior'):
-                    # Sample from a power law in z
-                    # with power law = -0.375
-                    slope = -0.375
-                    u = zgen.uniform(1e-5, 1.0)
-                    yy = u**(1/(slope+1.0)) 
-                    rScale = 20.0
-
-                elif (zfrom == 'all'):
-                    # Get uniform acceleration
-                    ar = axgen.uniform(amin, amax)
-                elif (zfrom == 'all2'):
-                    # Get uniform z distance
-                    z = axgen.uniform(0.0, zmax)
-
-                    # Convert uniform z into accelerations
-                    ar = z2acc(x, y, z, dist, mass)
-
-                loopCnt += 1
-                if ((loopCnt % 500) == 0 and verbose):
-                    print 'Having problems getting enough accelerations within'
-                    print 'the range for zz = %d (%7.3f - %7.3f) vs. %7.3f ' \
-                          % (zz, amin , amax, ar)
-
-                if (ar > amin and ar < amax):
-                    arGood = True
-
-                # Debugging:
-                #print '***DEBUG:  Range of accels for zz = %d (%7.3f - %7.3f) vs. accel sampled from Gaussian:  %7.3f ' \
-                #              % (zz, amin, amax, ar)
-
-
-            # Now convert our acceleration into a z-value. We will 
-            # have to do both the positive and negative solutions.
-            z = acc2z(x, y, ar, dist, mass)
-
-            ##########
-            # POSITIVE Z-value
-            ##########
-            zidx = zz
-            try:
-                self._runOrbit(zidx, x, y, z, vx, vy, vz, ar,
-                               mass, dist, x0, y0)
-            except ValueError, e:
-                print 'Problem calculating orbits for POSITIVE %d' % zz
-                print e
-                continue
-
-            ##########
-            # NEGATIVE Z-value
-            ##########
-            zidx = zz + (self.ntrials/2)
-            try:
-                self._runOrbit(zidx, x, y, -z, vx, vy, vz, ar,
-                               mass, dist, x0, y0)
-            except ValueError, e:
-                print 'Problem calculating orbits for NEGATIVE %d' % zz
-                print e
-                continue
-
-        # Fix the bigOmega range
-        #idxp = (where(zf >= 0))[0]
-        #idxn = (where(zf < 0))[0]
-        #o_lo_p = o[idxp].min()
-        #o_hi_p = o[idxp].max()
-        #o_lo_n = o[idxn].min()
-        #o_hi_n = o[idxn].max()
-        #if ((abs(o_lo_p - o_hi_p) > 180) or
-        #    (abs(o_lo_n - o_hi_n) > 180)):
-        #    idx = (where(o > 180))[0]
-        #    o[idx] -= 360.0
+        nhalf = int(self.ntrials / 2.0)
+        trials = np.arange(nhalf)
+
+        # Bound positions, velocities, potential and accelerations of
+        # every trial, along with the positive z solution.
+        mc = orbitmc.sampleTrials(self, nhalf, rng, mcMassRo=mcMassRo,
+                                  zfrom=zfrom, mExtended=mExtended,
+                                  verbose=verbose)
+        ar = mc['ar']
+        z = mc['z']
+
+        ok = self._runOrbits(trials, mc['x'], mc['y'], z,
+                             mc['vx'], mc['vy'], mc['vz'], ar,
+                             mc['mass'], mc['dist'], mc['x0'], mc['y0'])
+        if (ok == False).any():
+            print('Problem calculating orbits for POSITIVE trials: %s' % trials[ok == False])
+
+        # NEGATIVE z-values (only for trials with a POSITIVE orbit)
+        neg = trials[ok]
+        ok = self._runOrbits(neg + nhalf, mc['x'][ok], mc['y'][ok], -z[ok],
+                             mc['vx'][ok], mc['vy'][ok], mc['vz'][ok], ar[ok],
+                             mc['mass'][ok], mc['dist'][ok], mc['x0'][ok], mc['y0'][ok])
+        if (ok == False).any():
+            print('Problem calculating orbits for NEGATIVE trials: %s' % neg[ok == False])
 
         if (verbose):
-            print 'FINISH: ', time.ctime(time.time())
+            print('FINISH: %s' % time.ctime(time.time()))
 
         self.trans = None
 
@@ -971,10 +666,10 @@ class StarOrbitsMC(object):
         # Monte Carlo.
         #
         ##########
+        trials = []
         for zz in range(int(self.ntrials)):
             if ((zz % 5000) == 0):
-                print 'PDF Trial %d: ' % (zz), \
-                      time.ctime(time.time()), self.i[zz-1]
+                print 'PDF Trial %d: ' % (zz), time.ctime(time.time())
             
             # Set temp values for our while loop
             amin = -1.0
@@ -1062,13 +757,13 @@ class StarOrbitsMC(object):
             ##########
             # POSITIVE Z-value
             ##########
-            try:
-                self._runOrbit(zz, x, y, z, vx, vy, vz, ar,
-                               mass, dist, x0, y0)
-            except ValueError, e:
-                print 'Problem calculating orbits for %d' % zidx
-                print e
-                continue
+            trials.append([zz, x, y, z, vx, vy, vz, ar, mass, dist, x0, y0])
+
+        # Orbits of all trials at once
+        trials = array(trials, dtype=float)
+        ok = self._runOrbits(trials[:,0].astype(int), *trials[:,1:].T)
+        if (ok == False).any():
+            print('Problem calculating orbits for %s' % trials[ok == False,0].astype(int))
 
         if (verbose):
             print 'FINISH: ', time.ctime(time.time())
@@ -1174,23 +869,10 @@ class StarOrbitsMC(object):
         This corresponds to the largest allowed line of sight
         distance. 
         """
-        r = sqrt(x**2 + y**2)             # arcsec
-        rcgs = r * dist * cc.cm_in_au
-        vcgs = sqrt(vx**2 + vy**2 + vz**2) * 1.0e5
-        amax_cgs = -rcgs * vcgs**6 / (8.0 * GM**2)
-        amax = amax_cgs * 1000.0 * cc.sec_in_yr**2
-        amax /= (cc.cm_in_au * dist)      # mas/yr^2
-
-        return amax
+        return orbitmc.maxAcc(x, y, vx, vy, vz, GM, dist, cc)
 
     def _calcMinAcc(self, x, y, GM, dist, cc):
-        r = sqrt(x**2 + y**2)             # arcsec
-        rcgs = r * dist * cc.cm_in_au
-        amin_cgs = -GM / rcgs**2
-        amin = amin_cgs * 1000.0 * cc.sec_in_yr**2
-        amin /= (cc.cm_in_au * dist)      # mas/yr^2
-
-        return amin
+        return orbitmc.minAcc(x, y, GM, dist, cc)
 
     def _calcMinAccErr(self, x, y, GM, dist, cc):
         r = sqrt(x**2 + y**2)             # arcsec
@@ -1235,6 +917,31 @@ class StarOrbitsMC(object):
         self.x0[zidx] = x0
         self.y0[zidx] = y0
 
+    def _runOrbits(self, zidx, x, y, z, vx, vy, vz, ar, mass, dist, x0, y0):
+        """
+        Orbital elements of many trials at once (see _runOrbit and
+        orbits.xyz2kepBatch), stored at the indices zidx.
+
+        @return bool array, False for trials whose orbit could not be
+            calculated (unbound) and that are left empty
+        """
+        rvec = array([x, y, z], dtype=float).T
+        vvec = array([vx, vy, vz], dtype=float).T
+
+        orb = orbits.xyz2kepBatch(rvec, vvec, None, None, self.refTime,
+                                  mass=mass, dist=dist)
+        ok = orb.bound
+        zidx = asarray(zidx)[ok]
+
+        for name in ['i', 'e', 'evec', 'w', 'o', 'p', 't0', 'ph']:
+            getattr(self, name)[zidx] = getattr(orb, name)[ok]
+        for (name, val) in [('x', x), ('y', y), ('z', z), ('vx', vx),
+                            ('vy', vy), ('vz', vz), ('ar', ar), ('m', mass),
+                            ('r0', dist), ('x0', x0), ('y0', y0)]:
+            getattr(self, name)[zidx] = asarray(val)[ok]
+
+        return ok
+
 
 
     def makePdfHealpix(self, nside=64, makeplot=False):
@@ -1251,13 +958,8 @@ class StarOrbitsMC(object):
 	incl = self.i * math.pi / 180.0
 	omeg = self.o * math.pi / 180.0
 
-	#hidx = healpix.ang2pix_ring(nside, incl, omeg)
-	hidx = healpy.ang2pix(nside, incl, omeg)
-
 	# Star's PDF
-	pdf = zeros(npix, dtype=float)
-        for hh in hidx:
-            pdf[hh] += 1.0
+	pdf = healpix.makeMap(nside, incl, omeg)
 	pdf /= self.ntrials
 
         if (makeplot):
@@ -2138,6 +1840,7 @@ class Disk(object):
         oAll = None
         nstars = len(self.names)
         names_all = []
+        loaded = zeros(nstars, dtype=bool)
         for ss in range(nstars):
             name = self.names[ss]
 
@@ -2152,10 +1855,6 @@ class Disk(object):
                 _f.close()
                 print 'Adding %15s (%d) to disk' % (name, len(mc.i))
     
-                # Marginalize the PDF for this star onto just
-                # incl (i) and PA to ascending node (o).
-                pdf = mc.makePdfHealpix(nside=self.nside)
-    
                 # Store the monte carlo results as (i, o) pairs.
                 if (iAll == None):
                     self.pdftrials = len(mc.i)
@@ -2166,9 +1865,7 @@ class Disk(object):
                 # same for a single trial across all stars.
                 iAll[ss,:] = mc.i
                 oAll[ss,:] = mc.o
-
-                self.iomap[0] += pdf
-                self.ioCntMap[0] += (pdf / pdf.max())
+                loaded[ss] = True
 
                 # save the names that were used
                 names_all = np.concatenate([names_all, [name]])
@@ -2179,162 +1876,92 @@ class Disk(object):
         iAll *= math.pi / 180.0
         oAll *= math.pi / 180.0
 
+        # Marginalize the PDFs of all stars onto just
+        # incl (i) and PA to ascending node (o).
+        pdfs = healpix.makeMaps(self.nside, iAll[loaded], oAll[loaded])
+        pdfs /= self.pdftrials
+        self.iomap[0] += pdfs.sum(axis=0)
+        self.ioCntMap[0] += (pdfs / pdfs.max(axis=1)[:, newaxis]).sum(axis=0)
+
         if return_r2d:
             return iAll, oAll, self.r2d, names_all
         else:
             return iAll, oAll
 
     def densityPDF(self, iAll, oAll, neighbors=[4,5,6,7], aperture=False,
-                   sampleWR=None):
+                   sampleWR=None, processes=None, chunkSize=100):
         """
-        Map out the PDF for the density of normal vectors
+        Map out the PDF for the density of normal vectors.
+
+        The trials are split into chunks of chunkSize trials that are
+        run by a pool of processes (processes=1 runs them here, see
+        diskdensity.densityMaps). The maps of each trial for the
+        third neighbor (and the aperture maps) are written to the
+        disk_nn_results / disk_ap_results files as float32 densities
+        per square degree, in trial order.
         """
         nstars = iAll.shape[0]
-        print nstars, type(nstars)
+        print('%d stars' % nstars)
         #trials = 62000
         #trials = 100000
         trials = 99998
-        npdfs = len(neighbors)
 
         pixIdx = arange(self.npix, dtype=int)
         (ipix, opix) = healpy.pix2ang(self.nside, pixIdx)
         #(ipix, opix) = healpix.pix2ang_ring(self.nside, pixIdx)
-        sinip = sin(ipix)
-        cosip = cos(ipix)
-
-        siniAll = sin(iAll)
-        cosiAll = cos(iAll)
-
-        onesNpix = ones(self.npix, dtype=float)
-        onesNstars = ones(nstars, dtype=float)
-        factor = 2.0 * math.pi * (180.0 / math.pi)**2
 
+        angCut = None
         if (aperture == True):
             # We will be using nearest neighbor and aperture densities.
-            # Pre-calc some stuff for the aperture densities.
             #angCut = 0.1745  # radians (10 deg )
             angCut = 0.1047  # radians (6 deg )
-            angCutArea = factor * (1 - cos(angCut)) # area in deg^2
             
         if (trials > self.pdftrials):
-            print 'Must have more PDF trials than disk trials'
+            print('Must have more PDF trials than disk trials')
         
-        # Compute the PDF for the density at each pixel along
-        # with the weighted average density at each pixel.
-        neighborMap = zeros((npdfs, self.npix), dtype=float)
-        neighborMapStd = zeros((npdfs, self.npix), dtype=float)
-
-        # Keep track of the peak density and position for each trial
-        peakDensity = zeros((npdfs, trials), dtype=float)
-        peakIncli = zeros((npdfs, trials), dtype=float)
-        peakOmega = zeros((npdfs, trials), dtype=float)
-
-        if (aperture == True):
-            # Also record maps from aperture density calculation
-            apertureMap = zeros(self.npix, dtype=float)
-            apertureMapStd = zeros(self.npix, dtype=float)
-            
-            # Keep track of the peak density and position for each trial
-            peakDensityAp = zeros(trials, dtype=float)
-            peakIncliAp = zeros(trials, dtype=float)
-            peakOmegaAp = zeros(trials, dtype=float)
-
+        # Check for bad things
+        iAll = iAll[:, :trials]
+        oAll = oAll[:, :trials]
+        bad = np.isnan(iAll) | np.isnan(oAll)
+        for ii in np.flatnonzero(bad.any(axis=0)):
+            print('%d %s' % (ii, np.flatnonzero(bad[:, ii])))
+
+        _out2 = None
         if sampleWR != None:
             _out1 = open('%s/%s/sample_wr/disk_nn_results_%s.txt' % \
-                         (self.mcdir, self.outdir, sampleWR), 'w')
+                         (self.mcdir, self.outdir, sampleWR), 'wb')
             if aperture == True:
                 _out2 = open('%s/%s/sample_wr/disk_ap_results_%s.txt' % \
-                             (self.mcdir, self.outdir, sampleWR), 'w')
+                             (self.mcdir, self.outdir, sampleWR), 'wb')
         else:
             _out1 = open('%s/%s/disk_nn_results.txt' % \
-                         (self.mcdir, self.outdir), 'w')
+                         (self.mcdir, self.outdir), 'wb')
             if aperture == True:
                 _out2 = open('%s/%s/disk_ap_results.txt' % \
-                             (self.mcdir, self.outdir), 'w')
-
-        print 'Running MC to obtain density map.'
-
-        # temp
-        import Numeric
-        # end temp
-        
-        for ii in range(trials):
-            if ((ii % 100) == 0):
-                print 'Trial %d' % ii, time.ctime(time.time())
-            
-            # Randomly select an (i,o) pair out of each star's
-            # marginalized PDF.
-            incl = iAll[:, ii]
-            omeg = oAll[:, ii]
-            sini = siniAll[:, ii]
-            cosi = cosiAll[:, ii]
-            
-            # Check for bad things
-            idx = (where((incl == float('nan')) |
-                         (omeg == float('nan'))))[0]
-            if (len(idx) > 0):
-                print ii, idx
-                    
-            # Find densities
-            #omegSq = Numeric.outerproduct(omeg, onesNpix)
-            #opixSq = Numeric.outerproduct(onesNstars, opix)
-            omegSq = np.outer(omeg, onesNpix)
-            opixSq = np.outer(onesNstars, opix)
-            cosodiff = cos(opixSq - omegSq)
+                             (self.mcdir, self.outdir), 'wb')
 
-            #sinSq = Numeric.outerproduct(sini, sinip)
-            #cosSq = Numeric.outerproduct(cosi, cosip)
-            sinSq = np.outer(sini, sinip)
-            cosSq = np.outer(cosi, cosip)
+        print('Running MC to obtain density map.')
+        res = diskdensity.densityMaps(iAll, oAll, ipix, opix, neighbors,
+                                      angCut=angCut, processes=processes,
+                                      chunkSize=chunkSize, nnOut=_out1,
+                                      apOut=_out2)
 
-            # Angular offset from each pixel for all stars (radians)
-            angOff = arccos( (sinSq * cosodiff) + cosSq )
-            angOff.sort(axis=0)
+        neighborMap = res['neighborSum']
+        neighborMapStd = res['neighborSumSq']
+        peakDensity = res['peakDensity']
+        peakIncli = ipix[res['peakPix']]
+        peakOmega = opix[res['peakPix']]
 
-            # Density per square degree from nearest neighbor
-            # Solid angle is 2 * pi * (1 - cos theta)
-            for nn in range(npdfs):
-                # Nearest neighbor algorithm
-                nth = neighbors[nn]
-                densityMap = nth / (factor*(1.0 - cos(angOff[nth-1,:])))
-                maxPix = densityMap.argmax()
-
-                neighborMap[nn,:] += densityMap
-                neighborMapStd[nn,:] += densityMap**2
-                peakDensity[nn,ii] = densityMap[maxPix]
-                peakOmega[nn,ii] = opix[maxPix]
-                peakIncli[nn,ii] = ipix[maxPix]
-
-                # Save to an output file
-                if (nn == 2):
-                    #fubar = array(densityMap * 10**5, dtype=int16)
-                    fubar = array(densityMap * 10**5, dtype=int64)
-                    fubar.tofile(_out1)
-                    fubar = None
-
-                #pickle.dump(densityMap, nnFiles[nn])
+        if (aperture == True):
+            apertureMap = res['apertureSum']
+            apertureMapStd = res['apertureSumSq']
+            peakDensityAp = res['peakDensityAp']
+            peakIncliAp = ipix[res['peakPixAp']]
+            peakOmegaAp = opix[res['peakPixAp']]
 
-            if (aperture == True):
-                # Aperture density:
-                densityMapAp = zeros(self.npix, dtype=float32)
-                pidx = (where(angOff < angCut))[1]
-                ifreq = (stats.itemfreq(pidx)).astype('int')
-                for pix, cnt in ifreq:
-                    densityMapAp[pix] = cnt / angCutArea
-
-                maxPix = densityMapAp.argmax()
-
-                apertureMap += densityMapAp
-                apertureMapStd += densityMapAp**2
-                peakDensityAp[ii] = apertureMap[maxPix]
-                peakOmegaAp[ii] = opix[maxPix]
-                peakIncliAp[ii] = ipix[maxPix]
-                
-                # Save to an output file
-                #fubar = array(densityMapAp * 10**5, dtype=int16)
-                fubar = array(densityMapAp * 10**5, dtype=int64)
-                fubar.tofile(_out2)
-                fubar = None
+        _out1.close()
+        if (aperture == True):
+            _out2.close()
 
         neighborMap /= trials
         neighborMapStd = sqrt( (neighborMapStd / trials) - neighborMap**2 )
@@ -2345,7 +1972,7 @@ class Disk(object):
             apertureMapStd = sqrt( (apertureMapStd / trials) - apertureMap**2 )
 
             # Save the i/o density maps
-            print 'Making density map'
+            print('Making density map')
             apertureMap.tofile('%s/%s/disk.aperture.dat' % \
                                (self.mcdir, self.outdir))
             apertureMapStd.tofile('%s/%s/disk.apertureStd.dat' % \
@@ -2362,7 +1989,8 @@ class Disk(object):
     def densityPDFpp(self, iAll, oAll, neighbors=[4,5,6,7], aperture=True):
         """
         Parallel Processing Version:
-        Map out the PDF for the density of normal vectors
+        Map out the PDF for the density of normal vectors. Each engine
+        runs its share of the trials through diskdensity.densityChunk.
         """
         import ipython1.kernel.api as kernel
         ipc = kernel.RemoteController(('127.0.0.1', 10105))
@@ -2378,200 +2006,85 @@ class Disk(object):
         pixIdx = arange(self.npix, dtype=int)
         (ipix, opix) = healpy.pix2ang(self.nside, pixIdx)
         #(ipix, opix) = healpix.pix2ang_ring(self.nside, pixIdx)
-        sinip = sin(ipix)
-        cosip = cos(ipix)
-
-        siniAll = sin(iAll)
-        cosiAll = cos(iAll)
-
-        onesNpix = ones(self.npix, dtype=float)
-        onesNstars = ones(nstars, dtype=float)
-        factor = 2.0 * math.pi * (180.0 / math.pi)**2
 
+        angCut = None
         if (aperture == True):
             # We will be using nearest neighbor and aperture densities.
-            # Pre-calc some stuff for the aperture densities.
             #angCut = 0.1745  # radians (10 deg )
             angCut = 0.1047  # radians (6 deg )
-            angCutArea = factor * (1 - cos(angCut)) # area in deg^2
             
         if (trials > self.pdftrials):
-            print 'Must have more PDF trials than disk trials'
+            print('Must have more PDF trials than disk trials')
         
-        # Compute the PDF for the density at each pixel along
-        # with the weighted average density at each pixel.
-        neighborMap = zeros((npdfs, self.npix), dtype=float)
-        neighborMapStd = zeros((npdfs, self.npix), dtype=float)
-
-        # Also record maps from aperture density calculation
-        apertureMap = zeros(self.npix, dtype=float)
-        apertureMapStd = zeros(self.npix, dtype=float)
-
         for ii in nodeIDs:
             ipc.push(ii, _out1 = open('%s/parallel/disk_nn_results_%d.txt' %
-                                      (self.mcdir, ii), 'w'))
-            ipc.push(ii, _out2 = open('%s/parallel/disk_ap_results_%d.txt' %
-                                      (self.mcdir, ii), 'w'))
-
-        ipc.pushAll( sinip )
-        ipc.pushAll( cosip )
-        ipc.pushAll( ipix )
-        ipc.pushAll( opix )
-        ipc.pushAll( factor )
-        ipc.pushAll( npdfs )
-        ipc.pushAll( neighbors )
-        ipc.pushAll( angCut )
-        ipc.pushAll( angCutArea )
-        ipc.pushAll( iAll )
-        ipc.pushAll( oAll )
-        ipc.pushAll( siniAll )
-        ipc.pushAll( cosiAll )
-        ipc.pushAll( onesNpix )
-        ipc.pushAll( oneNstars )
-        ipc.pushAll( neighborMap )
-        ipc.pushAll( neighborMapStd )
-        ipc.pushAll( apertureMap )
-        ipc.pushAll( apertureMapStd )
+                                      (self.mcdir, ii), 'wb'))
+            if (aperture == True):
+                ipc.push(ii, _out2 = open('%s/parallel/disk_ap_results_%d.txt' %
+                                          (self.mcdir, ii), 'wb'))
+
+        ipc.pushAll(ipix=ipix, opix=opix, neighbors=neighbors, angCut=angCut,
+                    iAll=iAll[:, :trials], oAll=oAll[:, :trials])
 
         rngTrials = range(trials)
 
         node_run = """
-        trialCnt = len(rngTrials)
-
-        # Keep track of the peak density and position for each trial
-        peakDensity = zeros((npdfs, trialCnt), dtype=float)
-        peakIncli = zeros((npdfs, trialCnt), dtype=float)
-        peakOmega = zeros((npdfs, trialCnt), dtype=float)
-        
-        # Keep track of the peak density and position for each trial
-        peakDensityAp = zeros(trialCnt, dtype=float)
-        peakIncliAp = zeros(trialCnt, dtype=float)
-        peakOmegaAp = zeros(trialCnt, dtype=float)
-
-        for i in range(len(rngTrials)):
-            ii = rngTrials[i]
-            
-            if ((ii % 100) == 0):
-                print 'Trial %d' % ii, time.ctime(time.time())
-            
-            # Randomly select an (i,o) pair out of each star's
-            # marginalized PDF.
-            incl = iAll[:, ii]
-            omeg = oAll[:, ii]
-            sini = siniAll[:, ii]
-            cosi = cosiAll[:, ii]
-            
-            # Check for bad things
-            idx = (where((incl == float('nan')) |
-                         (omeg == float('nan'))))[0]
-            if (len(idx) > 0):
-                print ii, idx
-                    
-            # Find densities
-            #omegSq = outerproduct(omeg, onesNpix)
-            #opixSq = outerproduct(onesNstars, opix)
-            omegSq = outer(omeg, onesNpix)
-            opixSq = outer(onesNstars, opix)
-            cosodiff = cos(opixSq - omegSq)
-
-            #sinSq = outerproduct(sini, sinip)
-            #cosSq = outerproduct(cosi, cosip)
-            sinSq = outer(sini, sinip)
-            cosSq = outer(cosi, cosip)
-
-            # Angular offset from each pixel for all stars (radians)
-            angOff = arccos( (sinSq * cosodiff) + cosSq )
-            angOff.sort(axis=0)
-
-            # Density per square degree from nearest neighbor
-            # Solid angle is 2 * pi * (1 - cos theta)
-            for nn in range(npdfs):
-                # Nearest neighbor algorithm
-                nth = neighbors[nn]
-                densityMap = nth / (factor*(1.0 - cos(angOff[nth-1,:])))
-                maxPix = densityMap.argmax()
-
-                neighborMap[nn,:] += densityMap
-                neighborMapStd[nn,:] += densityMap**2
-                peakDensity[nn,i] = densityMap[maxPix]
-                peakOmega[nn,i] = opix[maxPix]
-                peakIncli[nn,i] = ipix[maxPix]
-
-                # Save to an output file
-                if (nn == 2):
-                    #fubar = array(densityMap * 10**5, dtype=int16)
-                    fubar = array(densityMap * 10**5, dtype=int64)
-                    fubar.tofile(_out1)
-                    fubar = None
-
-            # Aperture density:
-            densityMapAp = zeros(len(densityMap, dtype=float32)
-            pidx = (where(angOff < angCut))[1]
-            ifreq = (stats.itemfreq(pidx)).astype('int')
-            for pix, cnt in ifreq:
-                densityMapAp[pix] = cnt / angCutArea
-
-            maxPix = densityMapAp.argmax()
-
-            apertureMap += densityMapAp
-            apertureMapStd += densityMapAp**2
-            peakDensityAp[ii] = apertureMap[maxPix]
-            peakOmegaAp[ii] = opix[maxPix]
-            peakIncliAp[ii] = ipix[maxPix]
-            
-            # Save to an output file
-            #fubar = array(densityMapAp * 10**5, dtype=int16)
-            fubar = array(densityMapAp * 10**5, dtype=int64)
-            fubar.tofile(_out2)
-            fubar = None
-            """
-
-        ipc.pushAll('node_run')
+from gcwork import diskdensity
+diskdensity.densityInit(ipix, opix, neighbors, angCut)
+res = diskdensity.densityChunk((iAll[:, rngTrials], oAll[:, rngTrials]))
+
+neighborMap = res['neighborSum']
+neighborMapStd = res['neighborSumSq']
+peakDensity = res['peakDensity'].T
+peakIncli = ipix[res['peakPix']].T
+peakOmega = opix[res['peakPix']].T
+if len(neighbors) > 2:
+    res['nnMaps'].tofile(_out1)
+_out1.close()
+
+if angCut != None:
+    apertureMap = res['apertureSum']
+    apertureMapStd = res['apertureSumSq']
+    peakDensityAp = res['peakDensityAp']
+    peakIncliAp = ipix[res['peakPixAp']]
+    peakOmegaAp = opix[res['peakPixAp']]
+    res['apMaps'].tofile(_out2)
+    _out2.close()
+"""
+
+        ipc.pushAll(node_run=node_run)
         ipc.scatterAll('rngTrials', rngTrials)
 
-        print 'Running MC to obtain density map.'
+        print('Running MC to obtain density map.')
         ipc.executeAll('exec node_run')
 
-        all_neighborMap = ipc.gatherAll('neighborMap')
-        all_neighborMapStd = ipc.gatherAll('neighborMapStd')
-        all_peakDensity = ipc.gatherAll('peakDensity')
-        all_peakIncli = ipc.gatherAll('peakIncli')
-        all_peakOmega = ipc.gatherAll('peakOmega')
-
-        all_apertureMap = ipc.gatherAll('apertureMap')
-        all_apertureMapStd = ipc.gatherAll('apertureMapStd')
-        all_peakDensityAp = ipc.gatherAll('peakDensityAp')
-        all_peakIncliAp = ipc.gatherAll('peakIncliAp')
-        all_peakOmegaAp = ipc.gatherAll('peakOmegaAp')
-
-        print all_neighborMap.shape
-        print all_peakDensity.shape
-
-        neighborMap = total(all_neighborMap, axis=0)
-        neighborMapStd = total(all_neighborMapStd, axis=0)
-        apertureMap = total(all_apertureMap, axis=0)
-        apertureMapStd = total(all_apertureMapStd, axis=0)
-
-        peakDensity = concatenate(all_peakDensity)
-        peakIncli = concatenate(all_peakIncli)
-        peakOmega = concatenate(all_peakOmega)
-        peakDensityAp = concatenate(all_peakDensityAp)
-        peakIncliAp = concatenate(all_peakIncliAp)
-        peakOmegaAp = concatenate(all_peakOmegaAp)
+        # Trials are gathered along the first axis
+        neighborMap = ipc.gatherAll('neighborMap').sum(axis=0)
+        neighborMapStd = ipc.gatherAll('neighborMapStd').sum(axis=0)
+        peakDensity = concatenate(ipc.gatherAll('peakDensity')).T
+        peakIncli = concatenate(ipc.gatherAll('peakIncli')).T
+        peakOmega = concatenate(ipc.gatherAll('peakOmega')).T
 
         neighborMap /= trials
         neighborMapStd = sqrt( (neighborMapStd / trials) - neighborMap**2 )
 
-        apertureMap /= trials
-        apertureMapStd = sqrt( (apertureMapStd / trials) - apertureMap**2 )
+        if (aperture == True):
+            apertureMap = ipc.gatherAll('apertureMap').sum(axis=0)
+            apertureMapStd = ipc.gatherAll('apertureMapStd').sum(axis=0)
+            peakDensityAp = concatenate(ipc.gatherAll('peakDensityAp'))
+            peakIncliAp = concatenate(ipc.gatherAll('peakIncliAp'))
+            peakOmegaAp = concatenate(ipc.gatherAll('peakOmegaAp'))
+
+            apertureMap /= trials
+            apertureMapStd = sqrt( (apertureMapStd / trials) - apertureMap**2 )
                      
-        # Save the i/o density maps
-        print 'Making density map'
-        apertureMap.tofile('%s/parallel/disk.aperture.dat' % (self.mcdir))
-        apertureMapStd.tofile('%s/parallel/disk.apertureStd.dat' % (self.mcdir))
-        peakDensityAp.tofile('%s/parallel/disk.peakDensityAp.dat' % (self.mcdir))
-        peakIncliAp.tofile('%s/parallel/disk.peakIncliAp.dat' % (self.mcdir))
-        peakOmegaAp.tofile('%s/parallel/disk.peakOmegaAp.dat' % (self.mcdir))
+            # Save the i/o density maps
+            print('Making density map')
+            apertureMap.tofile('%s/parallel/disk.aperture.dat' % (self.mcdir))
+            apertureMapStd.tofile('%s/parallel/disk.apertureStd.dat' % (self.mcdir))
+            peakDensityAp.tofile('%s/parallel/disk.peakDensityAp.dat' % (self.mcdir))
+            peakIncliAp.tofile('%s/parallel/disk.peakIncliAp.dat' % (self.mcdir))
+            peakOmegaAp.tofile('%s/parallel/disk.peakOmegaAp.dat' % (self.mcdir))
 
         return (neighborMap, neighborMapStd, peakDensity, peakIncli, peakOmega)
 
@@ -2790,12 +2303,12 @@ class simulate_flat_disk(object):
         # Monte Carlo.
         #
         ##########
+        trials = []
         #for zz in range(int(self.ntrials/2.0)):
         for zz in range(int(self.ntrials)):
             if ( ((zz % 5000) == 0) & (verbose == True)):
                 #print 'PDF Trial %d: ' % (zz*2), \
-                print 'PDF Trial %d: ' % (zz), \
-                      time.ctime(time.time()), self.i[zz-1]
+                print 'PDF Trial %d: ' % (zz), time.ctime(time.time())
 
             # Set temp values for our while loop
             vgood = False
@@ -2865,13 +2378,13 @@ class simulate_flat_disk(object):
                     vgood = True
 
             z = self.zdisk
-            zidx = zz
-            try:
-                self._runOrbit(zidx, x, y, z, vx, vy, vz, mass, dist, x0, y0)
-            except ValueError, e:
-                print 'Problem calculating orbits for %d' % zz
-                print e
-                continue
+            trials.append([zz, x, y, z, vx, vy, vz, mass, dist, x0, y0])
+
+        # Orbits of all trials at once
+        trials = array(trials, dtype=float)
+        ok = self._runOrbits(trials[:,0].astype(int), *trials[:,1:].T)
+        if (ok == False).any():
+            print('Problem calculating orbits for %s' % trials[ok == False,0].astype(int))
 
         if (verbose):
             print 'FINISH: ', time.ctime(time.time())
@@ -3000,6 +2513,31 @@ class simulate_flat_disk(object):
         self.x0[zidx] = x0
         self.y0[zidx] = y0
 
+    def _runOrbits(self, zidx, x, y, z, vx, vy, vz, mass, dist, x0, y0):
+        """
+        Orbital elements of many trials at once (see _runOrbit and
+        orbits.xyz2kepBatch), stored at the indices zidx.
+
+        @return bool array, False for trials whose orbit could not be
+            calculated (unbound) and that are left empty
+        """
+        rvec = array([x, y, z], dtype=float).T
+        vvec = array([vx, vy, vz], dtype=float).T
+
+        orb = orbits.xyz2kepBatch(rvec, vvec, None, None, self.refTime,
+                                  mass=mass, dist=dist)
+        ok = orb.bound
+        zidx = asarray(zidx)[ok]
+
+        for name in ['i', 'e', 'evec', 'w', 'o', 'p', 't0', 'ph']:
+            getattr(self, name)[zidx] = getattr(orb, name)[ok]
+        for (name, val) in [('x', x), ('y', y), ('z', z), ('vx', vx),
+                            ('vy', vy), ('vz', vz), ('m', mass),
+                            ('r0', dist), ('x0', x0), ('y0', y0)]:
+            getattr(self, name)[zidx] = asarray(val)[ok]
+
+        return ok
+
     def makePdfHealpix(self, nside=64, makeplot=False):
 	"""
 	Make a 2D histogram of the inclination and PA to the 
@@ -3013,12 +2551,8 @@ class simulate_flat_disk(object):
 	incl = self.i * math.pi / 180.0
 	omeg = self.o * math.pi / 180.0
 
-	hidx = healpy.ang2pix(nside, incl, omeg)
-
 	# Star's PDF
-	pdf = zeros(npix, dtype=float)
-        for hh in hidx:
-            pdf[hh] += 1.0
+	pdf = healpix.makeMap(nside, incl, omeg)
 	pdf /= self.ntrials
 
         if (makeplot):
@@ -3413,90 +2947,6 @@ def plane2z(x, y, idisk=130.2, odisk=96.3):
     return z
 
 
-def acc2z(x, y, ar, dist, mass):
-    """
-    Change acceleration (in the plane of the sky) from mas/yr^2 to
-    line of sight distance in arcsec.
-
-    Input:
-    x - x position in arcsec
-    y - y position in arcsec
-    ar - plane of the sky acc in mas/yr^2
-    dist - Ro in pc
-    mass - in solar masses
-    """
-    cc = objects.Constants()
-    GM = mass * cc.msun * cc.G
-
-    # Convert acceleration into CGS
-    arcgs = ar * dist * cc.cm_in_au / (cc.sec_in_yr**2 * 1000.0)
-
-    # Convert into z-distance
-    r = sqrt(x**2 + y**2)             # arcsec
-    rcgs = r * dist * cc.cm_in_au
-    tmp1 = (GM * rcgs / -arcgs)**(2.0/3.0)
-    zcgs = sqrt(tmp1 - rcgs**2)
-    z = zcgs / (cc.cm_in_au * dist)
-
-    return z
-
-def acc2zErr(x, y, ar, arerr, dist, mass):
-    """
-    Change acceleration (in the plane of the sky) from mas/yr^2 to
-    line of sight distance in arcsec.
-
-    Input:
-    x - x position in arcsec
-    y - y position in arcsec
-    ar - plane of the sky acc in mas/yr^2
-    arerr - error in ar
-    dist - Ro in pc
-    mass - in solar masses
-    """
-    cc = objects.Constants()
-    GM = mass * cc.msun * cc.G
-
-    # Convert acceleration into CGS
-    arcgs = ar * dist * cc.cm_in_au / (cc.sec_in_yr**2 * 1000.0)
-    arerrcgs = arerr * dist * cc.cm_in_au / (cc.sec_in_yr**2 * 1000.0)
-
-    # Convert into z-distance
-    r = sqrt(x**2 + y**2)             # arcsec
-    rcgs = r * dist * cc.cm_in_au
-    tmp1 = (GM * rcgs / -arcgs)**(2.0/3.0)
-    zcgs = sqrt(tmp1 - rcgs**2)
-    z = zcgs / (cc.cm_in_au * dist)
-
-    zerrcgs = abs(arerrcgs * tmp1 / (3.0 * zcgs * arcgs))
-    zerr = zerrcgs / (cc.cm_in_au * dist)
-
-    return (z, zerr)
-
-def z2acc(x, y, z, dist, mass):
-    """
-    Change line of sight distance in arcsec to
-    acceleration (in the plane of the sky) in mas/yr^2.
-
-    Input:
-    x - x position in arcsec
-    y - y position in arcsec
-    z - z position in arcsec
-    dist - Ro in pc
-    mass - in solar masses
-    """
-    cc = objects.Constants()
-    GM = mass * cc.msun * cc.G
-
-    # Convert distance into CGS
-    r = sqrt(x**2 + y**2)             # arcsec
-    zcgs = z * dist * cc.cm_in_au
-    rcgs = r * dist * cc.cm_in_au
-
-    arcgs = -GM * rcgs / (rcgs**2 + zcgs**2)**(3.0/2.0)
-    ar = arcgs * cc.sec_in_yr**2 * 1000.0 / (dist * cc.cm_in_au)
-
-    return ar
-    
 def merge(ob1, ob2):
     """
     Merge two starset objects. Useful for merging the objects from
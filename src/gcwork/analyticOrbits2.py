@@ -12,6 +12,7 @@ from gcwork import objects
 from gcwork import orbits
 from gcwork import young
 from gcwork import plot_disk_healpix
+from gcwork import healpix
 from gcwork import util
 import healpy
 
@@ -1096,13 +1097,8 @@ class StarOrbitsMC(object):
 	incl = self.i * math.pi / 180.0
 	omeg = self.o * math.pi / 180.0
 
-	#hidx = healpix.ang2pix_ring(nside, incl, omeg)
-	hidx = healpy.ang2pix(nside, incl, omeg)
-
 	# Star's PDF
-	pdf = zeros(npix, dtype=float)
-        for hh in hidx:
-            pdf[hh] += 1.0
+	pdf = healpix.makeMap(nside, incl, omeg)
 	pdf /= self.ntrials
 
         if (makeplot):
@@ -0,0 +1,204 @@
+"""
+Density maps of orbital plane normal vectors on the sky, as used by
+analyticOrbits.Disk.densityPDF().
+
+Each Monte Carlo trial picks one (i, Omega) per star. For every
+HEALPix pixel the density is n / (solid angle out to the n-th
+nearest star normal), and, for the aperture densities, the number
+of star normals within angCut of the pixel per square degree.
+
+    res = diskdensity.densityMaps(iAll, oAll, ipix, opix, [4,5,6,7])
+    res['neighborSum'] / trials  -- mean density maps (deg^-2)
+"""
+import math
+import time
+import multiprocessing as mp
+import numpy as np
+from scipy import spatial
+
+
+# Set up in each process that runs densityChunk (see densityInit)
+_density = {}
+
+def normalVectors(incl, omeg):
+    """
+    Unit vectors (..., 3) of the directions (incl, Omega) in radians.
+    The chord between two of them is 2 sin(angle / 2), so nearest
+    neighbors on the sphere are nearest neighbors in 3D.
+    """
+    sini = np.sin(incl)
+    vec = np.empty(np.shape(incl) + (3,), dtype=float)
+    vec[..., 0] = sini * np.cos(omeg)
+    vec[..., 1] = sini * np.sin(omeg)
+    vec[..., 2] = np.cos(incl)
+    return vec
+
+def densityInit(ipix, opix, neighbors, angCut=None):
+    """
+    Pixel centers (incl, Omega in radians) of the HEALPix map,
+    the nearest neighbors to use for the densities and the radius
+    of the aperture densities (radians, None for no apertures).
+    """
+    _density.clear()
+    _density['pixVec'] = normalVectors(ipix, opix)
+    _density['neighbors'] = list(neighbors)
+    _density['angCut'] = angCut
+
+def densityChunk(chunk):
+    """
+    Density maps of the normal vectors for a chunk of trials: the
+    (nstars, trials) inclinations and Omegas (radians), one (i, o)
+    pair per star for each trial. Call densityInit() first.
+
+    For each trial the star normals go into a KD-tree (3D unit
+    vectors), which gives the n-th nearest star and the number of
+    stars within the aperture of every pixel without an
+    (nstars x npix) table of offsets.
+
+    Returns the sums (and sums of squares) of the nearest neighbor
+    and aperture density maps over the trials, the peak density and
+    peak pixel of every trial and the maps of each trial for the
+    third neighbor and the apertures, as float32.
+    """
+    (incl, omeg) = chunk
+    pixVec = _density['pixVec']
+    neighbors = _density['neighbors']
+    angCut = _density['angCut']
+
+    (nstars, ntrials) = incl.shape
+    npix = pixVec.shape[0]
+    npdfs = len(neighbors)
+    factor = 2.0 * math.pi * (180.0 / math.pi)**2
+
+    res = {}
+    res['neighborSum'] = np.zeros((npdfs, npix), dtype=float)
+    res['neighborSumSq'] = np.zeros((npdfs, npix), dtype=float)
+    res['peakDensity'] = np.zeros((npdfs, ntrials), dtype=float)
+    res['peakPix'] = np.zeros((npdfs, ntrials), dtype=int)
+    if npdfs > 2:
+        res['nnMaps'] = np.zeros((ntrials, npix), dtype=np.float32)
+    if angCut is not None:
+        angCutArea = factor * (1 - math.cos(angCut)) # area in deg^2
+        chordCut = 2.0 * math.sin(angCut / 2.0)
+        res['apertureSum'] = np.zeros(npix, dtype=float)
+        res['apertureSumSq'] = np.zeros(npix, dtype=float)
+        res['peakDensityAp'] = np.zeros(ntrials, dtype=float)
+        res['peakPixAp'] = np.zeros(ntrials, dtype=int)
+        res['apMaps'] = np.zeros((ntrials, npix), dtype=np.float32)
+
+    # (ntrials, nstars, 3) unit normal vectors of the stars
+    starVec = normalVectors(incl.T, omeg.T)
+    nth = np.array(neighbors, dtype=float)
+    cols = np.array(neighbors, dtype=int) - 1
+
+    for ii in range(ntrials):
+        tree = spatial.cKDTree(starVec[ii])
+
+        # Chord to the n-th nearest star of each pixel, (npix, npdfs)
+        (chord, idx) = tree.query(pixVec, k=max(neighbors))
+        chord = chord.reshape(npix, -1)[:, cols]
+
+        # Density per square degree from nearest neighbor
+        # Solid angle is 2 * pi * (1 - cos theta) = pi * chord^2
+        densityMaps = nth / (0.5 * factor * chord**2)
+        maxPix = densityMaps.argmax(axis=0)
+
+        res['neighborSum'] += densityMaps.T
+        res['neighborSumSq'] += densityMaps.T**2
+        res['peakDensity'][:, ii] = densityMaps[maxPix, np.arange(npdfs)]
+        res['peakPix'][:, ii] = maxPix
+
+        if npdfs > 2:
+            res['nnMaps'][ii] = densityMaps[:, 2]
+
+        if angCut is not None:
+            # Aperture density: number of stars within angCut
+            counts = tree.query_ball_point(pixVec, chordCut, return_length=True)
+            densityMapAp = counts / angCutArea
+            maxPix = densityMapAp.argmax()
+
+            res['apertureSum'] += densityMapAp
+            res['apertureSumSq'] += densityMapAp**2
+            res['peakDensityAp'][ii] = densityMapAp[maxPix]
+            res['peakPixAp'][ii] = maxPix
+            res['apMaps'][ii] = densityMapAp
+
+    return res
+
+def densityMaps(iAll, oAll, ipix, opix, neighbors, angCut=None,
+                processes=None, chunkSize=100, nnOut=None, apOut=None,
+                verbose=True):
+    """
+    Density maps of all (nstars, trials) trials. The trials are split
+    into chunks of chunkSize trials that are run by a pool of
+    processes (processes=1 runs them here) through densityChunk().
+
+    @param iAll, oAll: (nstars, trials) inclinations and Omegas (rad)
+    @param ipix, opix: pixel centers of the map (rad)
+    @param neighbors: the n-th nearest neighbors to map
+    @kwparam angCut: aperture radius (rad), None for no apertures
+    @kwparam nnOut, apOut: open files for the maps of each trial (the
+        third neighbor and the apertures), as float32 densities per
+        square degree in trial order
+    @return dictionary with the summed maps (neighborSum,
+        neighborSumSq, apertureSum, apertureSumSq) and, for every
+        trial, the peak densities (peakDensity, peakDensityAp) and
+        their pixels (peakPix, peakPixAp)
+    """
+    trials = iAll.shape[1]
+    npdfs = len(neighbors)
+    npix = len(ipix)
+
+    out = {}
+    out['neighborSum'] = np.zeros((npdfs, npix), dtype=float)
+    out['neighborSumSq'] = np.zeros((npdfs, npix), dtype=float)
+    out['peakDensity'] = np.zeros((npdfs, trials), dtype=float)
+    out['peakPix'] = np.zeros((npdfs, trials), dtype=int)
+    if angCut is not None:
+        out['apertureSum'] = np.zeros(npix, dtype=float)
+        out['apertureSumSq'] = np.zeros(npix, dtype=float)
+        out['peakDensityAp'] = np.zeros(trials, dtype=float)
+        out['peakPixAp'] = np.zeros(trials, dtype=int)
+
+    # Trials of each chunk; the chunks are small enough that only
+    # a few (trials x npix) buffers are alive in each process.
+    chunks = [(iAll[:, tt:tt+chunkSize], oAll[:, tt:tt+chunkSize])
+              for tt in range(0, trials, chunkSize)]
+    setup = (ipix, opix, neighbors, angCut)
+
+    if processes == 1:
+        densityInit(*setup)
+        results = (densityChunk(chunk) for chunk in chunks)
+    else:
+        pool = mp.Pool(processes=processes, initializer=densityInit,
+                       initargs=setup)
+        results = pool.imap(densityChunk, chunks)
+
+    tt = 0
+    for res in results:
+        if verbose and ((tt % 1000) < chunkSize):
+            print('Trial %d %s' % (tt, time.ctime(time.time())))
+        nt = res['peakDensity'].shape[1]
+
+        out['neighborSum'] += res['neighborSum']
+        out['neighborSumSq'] += res['neighborSumSq']
+        out['peakDensity'][:, tt:tt+nt] = res['peakDensity']
+        out['peakPix'][:, tt:tt+nt] = res['peakPix']
+        if (nnOut is not None) and (npdfs > 2):
+            res['nnMaps'].tofile(nnOut)
+
+        if angCut is not None:
+            out['apertureSum'] += res['apertureSum']
+            out['apertureSumSq'] += res['apertureSumSq']
+            out['peakDensityAp'][tt:tt+nt] = res['peakDensityAp']
+            out['peakPixAp'][tt:tt+nt] = res['peakPixAp']
+            if apOut is not None:
+                res['apMaps'].tofile(apOut)
+
+        tt += nt
+
+    if processes != 1:
+        pool.close()
+        pool.join()
+
+    return out
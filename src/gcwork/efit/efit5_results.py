@@ -4,6 +4,8 @@ import math
 import matplotlib.pyplot as plt
 import pandas as pd
 import multiprocessing as mp
+from gcwork import kepler
+from gcwork.kepler import EccAnomalyError
 
 J2000=51544.5 # in MJD
 AU2KM=149597870.700
@@ -124,19 +126,11 @@ def eccentric_anamoly(e, M):
         Output
         ------
         the eccentric anomaly E, solution of  E-e sin(E)=M
+        (scalars or arrays, see gcwork.kepler.eccentricAnomaly)
         """
-    NMAX=100
-
-    E = M + e * math.sin(M) + e*e*math.sin(2.*M)/2.
-    error = E - e * math.sin(E) - M
-    i=0
-    while(math.fabs(error) > 1.e-10):
-        i=i+1
-        E -= error / (1 - e * math.cos(E))
-        error = E - e * math.sin(E) - M
-        if i==NMAX:
-            msg = 'eccentric_anomaly from efit5_results: Could not converge for e = %f and M =%f' % (e,M)
-            raise EccAnomalyError(msg)
+    E = kepler.eccentricAnomaly(M, e)
+    if np.ndim(E) == 0:
+        return float(E)
     return E
 
 
@@ -300,15 +294,12 @@ class star:
         e = self.chain['e']
         if np.size(e)==1:
             e=e[0]*np.ones(M.shape)
-        E = np.zeros(len(M))
-        for i in range(len(M)):
-            E[i] = eccentric_anamoly(e[i], M[i])
+        E = eccentric_anamoly(e, M)
 
         if self.BH.model != 'Kepler' : #Romer time delay
             z = self.chain['TI_C'] * (np.cos(E) - self.chain['e']) + self.chain['TI_H'] * np.sin(E)*self.chain['se2'] # in AU
             M -= 2.*math.pi*z/CAUYR /self.chain['P']
-            for i in range(len(M)):
-                E[i] = eccentric_anamoly(e[i], M[i])
+            E = eccentric_anamoly(e, M)
 
         return E
             
@@ -585,9 +576,7 @@ class star:
         if not self.TI_computed:
             self.set_TI()
         M = 2.*math.pi*(t-self.chain['T0'])/self.chain['P']
-        E = np.zeros(len(M))
-        for i in range(len(M)):
-            E[i] = eccentric_anamoly(self.chain['e'][i], M[i])
+        E = eccentric_anamoly(self.chain['e'], M)
         X  = np.cos(E) - self.chain['e']
         Y  = np.sin(E)*self.chain['se2']
         VX = -2.*math.pi*np.sin(E)/(1.-self.chain['e']*np.cos(E))/self.chain['P']
@@ -610,10 +599,7 @@ class star:
             
             '''
         M = 2.*math.pi*(t-self.chain['T0'])/self.chain['P']
-        E = np.zeros(len(M))
-        for i in range(len(M)):
-            
-            E[i] = eccentric_anamoly(self.chain['e'][i], M[i])
+        E = eccentric_anamoly(self.chain['e'], M)
         return np.fabs( 3.*M*(self.chain['e']+np.cos(E)) + 2.*(-2.+self.chain['e']**2+self.chain['e']*np.cos(E))*np.sin(E) )
 
 
@@ -624,9 +610,7 @@ class star:
             
             '''
         M = 2.*math.pi*(t-self.chain['T0'])/self.chain['P']
-        E = np.zeros(len(M))
-        for i in range(len(M)):
-            E[i] = eccentric_anamoly(self.chain['e'][i], M[i])
+        E = eccentric_anamoly(self.chain['e'], M)
         return np.fabs(  (  np.sin(E)*(self.chain['e']**2*np.cos(2.*E) + 3.*self.chain['e']**2-2. ) + np.cos(E)*(6.*M - 2.*self.chain['e']*np.sin(E)) ) / ( self.chain['se2']*((-1.+self.chain['e']*np.cos(E))**3) )  )
 
     def get_observable_prior(self):
@@ -1312,9 +1296,3 @@ def multiprocess_astro_residuals(star,efit_obj,dt=.05,CL=[0.68],processes=4):
 def multiprocess_RV_residuals(star,efit_obj,dt=.05,CL=[0.68],processes=4):
     print('WARNING: use star.RV_residuals(dt,CL,processes) instead of this function who is no longer working')
     star.RV_residuals(dt,CL,processes)
-          
-
-class EccAnomalyError(Exception):
-    def __init__(self, message):
-        self.message = message
-
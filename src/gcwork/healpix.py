@@ -3,6 +3,13 @@ import numpy
 
 
 """
+The ang2pix/pix2ang functions and the map builders below work on
+whole arrays at once (RING scheme, same pixels as healpy), e.g. the
+(i, Omega) PDFs of many stars from their Monte Carlo trials:
+
+    pdfs = healpix.makeMaps(64, incl, omeg) / ntrials   # (nstars, npix)
+    (rows, pix, vals) = healpix.makeSparseMaps(64, incl, omeg)
+
 ; -----------------------------------------------------------------------------
 ;
 ;  Copyright (C) 1997-2005  Krzysztof M. Gorski, Eric Hivon, Anthony J. Banday
@@ -75,152 +82,7 @@ x-1]
 ;*******************************************************************************
 **
 """
-    npix = nside2npix(nside)
-
-    np0 = len(theta)
-    np1 = len(phi) 
-
-    if (np0 != np1):
-        print 'inconsistent theta and phi'
-
-    if ((min(theta) < 0.0) or (max(theta) > math.pi)):
-        print 'theta out of range'
-
-    ipring = numpy.zeros(np0, dtype=numpy.long)
-
-    nside  = long(nside)
-    pion2 = math.pi * 0.5
-    twopi = math.pi * 2.0
-    nl2   = 2*nside
-    nl4   = 4*nside
-    ncap  = nl2*(nside-1)
-    
-    cth0 = 2.0/3.0
-    
-    cth_in = numpy.cos(theta)
-    phi_in = phi % twopi
-    phi_in = phi + numpy.where(phi <= 0.0, 1, 0)*twopi
-
-    # Equatorial Strip
-    pix_eqt = (numpy.where((cth_in <= cth0) & (cth_in > -cth0)))[0]
-    n_eqt = len(pix_eqt)
-
-    if (n_eqt > 0):
-        tt = phi_in[pix_eqt] / pion2
-
-        # Increasing edge line index
-        jp = numpy.array(nside * (0.5 + tt - cth_in[pix_eqt]*0.75), dtype=numpy.long)
-        # Decreasing edge line index
-        jm = numpy.array(nside*(0.5 + tt + cth_in[pix_eqt]*0.75), dtype=numpy.long)
-        
-        # in {1,2n+1} (ring number counted from z=2/3)
-        ir = (nside + 1) + jp - jm
-        # k=1 if ir even, and 0 otherwise
-        k =  numpy.where( (ir % 2) == 0, 1, 0 )   
-        
-        # in {1,4n}
-        ip = ( ( jp+jm+k + (1-nside) ) / 2 ) + 1 
-        ip = ip - nl4*numpy.where(ip > nl4, 1, 0)
-
-        ipring[pix_eqt] = ncap + nl4*(ir-1) + ip - 1
-        
-        cth0 = 2.0/3.0
-
-        cth_in = numpy.cos(theta)
-        phi_in = phi % twopi
-        phi_in = phi + numpy.where(phi < 0.0, 1, 0)*twopi
-        
-    # equatorial strip
-    pix_eqt = (numpy.where((cth_in <= cth0) & (cth_in > -cth0)) )[0]
-    n_eqt = len(pix_eqt)
-      
-    if (n_eqt > 0):
-        tt = phi_in[pix_eqt] / pion2
-        # increasing edge line index
-        jp = numpy.array(nside*(0.50 + tt - cth_in[pix_eqt]*0.75), dtype=numpy.long) 
-        # decreasing edge line index
-        jm = numpy.array(nside*(0.50 + tt + cth_in[pix_eqt]*0.75), dtype=numpy.long) 
-        
-        # in {1,2n+1} (ring number counted from z=2/3)
-        ir = (nside + 1) + jp - jm
-        # k=1 if ir even, and 0 otherwise
-        k =  numpy.where( (ir % 2) == 0, 1, 0)
-        
-        # in {1,4n}
-        ip = ( ( jp+jm+k + (1-nside) ) / 2 ) + 1 
-        ip = ip - nl4*numpy.where(ip > nl4, 1, 0)
-        
-        ipring[pix_eqt] = ncap + nl4*(ir-1) + ip - 1
-        tt = 0
-        jp = 0
-        jm = 0
-        ir = 0
-        k = 0
-        ip = 0
-        pix_eqt = 0
-
-    # north caps
-    pix_np  = (numpy.where(cth_in >  cth0))[0]
-    n_np = len(pix_np)
-    
-    if (n_np > 0):
-        tt = phi_in[pix_np] / pion2
-        tp = tt % 1.0
-        tmp = numpy.sqrt( 3.0*(1.0 - abs(cth_in[pix_np])) )
-
-        # increasing edge line index
-        jp = numpy.array( nside * tp         * tmp, dtype=numpy.long )
-        # decreasing edge line index
-        jm = numpy.array( nside * (1.0 - tp) * tmp, dtype=numpy.long ) 
-        
-        ir = jp + jm + 1         # ring number counted from the closest pole
-        ip = numpy.array( tt * ir, dtype=numpy.long ) + 1 # in {1,4*ir}
-        ir4 = 4*ir
-        ip = ip - ir4*numpy.where(ip > ir4, 1, 0)
-        
-        ipring[pix_np] =  2*ir*(ir-1) + ip - 1
-        tt = 0
-        tp = 0
-        tmp =0
-        jp = 0
-        jm = 0
-        ir = 0
-        ip = 0
-        ir4 = 0
-        pix_np = 0
-        
-
-    # south pole
-    pix_sp  = (numpy.where(cth_in <= -cth0))[0]
-    n_sp = len(pix_sp)
-    
-    if (n_sp > 0):
-        tt = phi_in[pix_sp] / pion2
-        tp = tt % 1.0
-        tmp = numpy.sqrt( 3.0*(1.0 - abs(cth_in[pix_sp])) )
-
-        # increasing edge line index
-        jp = numpy.array( nside * tp         * tmp, dtype=numpy.long )
-        # decreasing edge line index
-        jm = numpy.array( nside * (1.0 - tp) * tmp, dtype=numpy.long )  
-        
-        ir = jp + jm + 1         # ring number counted from the closest pole
-        ip = numpy.array( tt * ir, dtype=numpy.long ) + 1 # in {1,4*ir}
-        ir4 = 4*ir
-        ip = ip - ir4*numpy.where(ip > ir4, 1, 0)
-
-        ipring[pix_sp] = npix - 2*ir*(ir+1) + ip - 1
-        tt = 0
-        tp = 0
-        tmp = 0
-        jp = 0
-        jm = 0
-        ir = 0
-        ip = 0
-        ir4 = 0
-        pix_sp = 0
-
-    return ipring
+    return ang2pix(nside, theta, phi)
 
 def pix2ang_ring(nside, ipix):
     """
@@ -261,93 +123,7 @@ def pix2ang_ring(nside, ipix):
 ;****************************************************************************************
     """
 
-    npix = nside2npix(nside)
-
-    nside = long(nside)
-    nl2 = 2*nside
-    nl3 = 3*nside
-    nl4 = 4*nside
-    ncap = nl2*(nside-1)
-    nsup = nl2*(5*nside+1)
-    fact1 = 1.5*nside
-    fact2 = (3.0*nside)*nside
-    np = len(ipix)
-    theta = numpy.zeros(np, dtype=numpy.float)
-    phi   = numpy.zeros(np, dtype=numpy.float)
-
-    min_pix = ipix.min()
-    max_pix = ipix.max()
-    if (min_pix < 0):
-        print 'pixel index : %10d' % min_pix
-        print 'is out of range : %2d %8d' % (0, npix-1)
-
-    if (max_pix > npix-1):
-        print 'pixel index : %10d' % max_pix
-        print 'is out of range : %2d %8d' % (0,npix-1)
-
-
-    # north polar cap
-    pix_np = (numpy.where(ipix < ncap))[0]
-    n_np = len(pix_np)   
-    if (n_np > 0): 
-       ip = numpy.array(ipix[pix_np] + 1.0, dtype=numpy.long)
-
-       # counted from NORTH pole, starting at 1
-       iring = numpy.array(numpy.sqrt( (ip/2.0) - numpy.sqrt(ip/2) ) + 1, dtype=numpy.long)
-       iphi  = numpy.array(ip - ( 2*iring*(iring-1) ), dtype=numpy.long)
-
-       theta[pix_np] = numpy.arccos( 1.0 - iring**2 / fact2 )
-       phi[pix_np]   = (iphi - 0.5) * math.pi/(2.0*iring)
-       ip = 0
-       iring = 0
-       iphi = 0    # free memory
-       pix_np = 0  # free memory
-
-
-    # equatorial strip
-    pix_eq = (numpy.where((ipix >= ncap) & (ipix < nsup)))[0]
-    n_eq = len(pix_eq)
-
-    if (n_eq > 0):
-        # counted from NORTH pole
-        ip    = numpy.array(ipix[pix_eq] - ncap, dtype=numpy.long)
-        iring = numpy.array((ip / nl4) + nside, dtype=numpy.long)
-        iphi  = ( ip % nl4 ) + 1
-        
-        # 1 if iring is odd, 1/2 otherwise
-        fodd  = 0.5 * (1 + ((iring+nside) % 2)) 
-
-        theta[pix_eq] = numpy.arccos( (nl2 - iring) / fact1 )
-        phi[pix_eq]   = (iphi - fodd) * math.pi/(2.0*nside)
-        ip = 0
-        iring = 0
-        iphi = 0    # free memory
-        pix_eq = 0  # free memory
-
-
-    # south polar cap
-    pix_sp = (numpy.where(ipix >= nsup))[0]
-    n_sp = len(pix_sp)   
-
-    if ((n_np + n_sp + n_eq) != np):
-        print 'Error!'
-
-    if (n_sp > 0):
-       ip =  numpy.array(npix - ipix[pix_sp], dtype=numpy.long)
-       # counted from SOUTH pole, starting at 1
-       iring = numpy.array(numpy.sqrt( (ip/2.0) - numpy.sqrt(ip/2) ) + 1, dtype=numpy.long)
-       iphi  = 4*iring + 1 - (ip - 2*iring*(iring-1))
-
-       theta[pix_sp] = numpy.arccos( -1.0 + iring**2 / fact2 )
-       phi[pix_sp]   = (iphi - 0.5) * math.pi/(2.0*iring)
-
-       # free memory
-       ip = 0
-       iring = 0
-       iphi = 0
-       pix_sp = 0
-
-    return (theta, phi)
+    return pix2ang(nside, ipix)
 
 
 def nside2npix(nside):
@@ -367,6 +143,203 @@ def nside2npix(nside):
     ;     v1.1, EH, Caltech, 2002-08-16 : uses !Healpix structure
     ;-
     """
-    npix = 12 * long(nside)**2
+    npix = 12 * int(nside)**2
 
     return npix
+
+
+def _isqrt(v):
+    """Integer square root of an int64 array."""
+    s = numpy.sqrt(v).astype(numpy.int64)
+    s -= (s * s > v)
+    s += ((s + 1) * (s + 1) <= v)
+    return s
+
+def ang2pix(nside, theta, phi):
+    """
+    RING scheme pixel of each point, for arrays of any shape.
+
+    @param nside: map resolution (npix = 12 * nside**2)
+    @param theta: colatitude in radians, in [0, pi] (0 : north pole)
+    @param phi: azimuth in radians (taken modulo 2 pi)
+    @return int64 array of pixel numbers in [0, npix-1]
+    """
+    theta = numpy.asarray(theta, dtype=float)
+    phi = numpy.asarray(phi, dtype=float)
+    nside = int(nside)
+    npix = nside2npix(nside)
+    ncap = 2 * nside * (nside - 1)
+    nl4 = 4 * nside
+
+    z = numpy.cos(theta)
+    za = numpy.abs(z)
+    tt = numpy.mod(phi, 2.0 * math.pi) / (0.5 * math.pi)  # in [0,4)
+
+    # Equatorial strip
+    temp1 = nside * (0.5 + tt)
+    temp2 = nside * z * 0.75
+    jp = (temp1 - temp2).astype(numpy.int64)   # increasing edge line index
+    jm = (temp1 + temp2).astype(numpy.int64)   # decreasing edge line index
+    ir = (nside + 1) + jp - jm                 # in {1,2n+1}
+    kshift = 1 - (ir & 1)
+    ip = ((jp + jm - nside + kshift + 1) // 2) % nl4
+    pixEq = ncap + nl4 * (ir - 1) + ip
+
+    # Polar caps, sqrt(3 (1 - |z|)) from sin(theta) close to the poles
+    tp = tt - numpy.floor(tt)
+    sth = numpy.sqrt(3.0 / (1.0 + za)) * numpy.sin(theta)
+    tmp = nside * numpy.where(za > 0.99, sth,
+                              numpy.sqrt(3.0 * (1.0 - za)))
+    jp = (tp * tmp).astype(numpy.int64)
+    jm = ((1.0 - tp) * tmp).astype(numpy.int64)
+    ir = jp + jm + 1                           # ring counted from the pole
+    ip = (tt * ir).astype(numpy.int64) % (4 * ir)
+    pixCap = numpy.where(z > 0, 2 * ir * (ir - 1) + ip,
+                         npix - 2 * ir * (ir + 1) + ip)
+
+    return numpy.where(za <= 2.0 / 3.0, pixEq, pixCap)
+
+def pix2ang(nside, ipix):
+    """
+    Centers of RING scheme pixels, for arrays of any shape.
+
+    @param nside: map resolution (npix = 12 * nside**2)
+    @param ipix: pixel numbers in [0, npix-1]
+    @return (theta, phi) in radians
+    """
+    ipix = numpy.asarray(ipix, dtype=numpy.int64)
+    nside = int(nside)
+    npix = nside2npix(nside)
+    ncap = 2 * nside * (nside - 1)
+    nl4 = 4 * nside
+
+    north = ipix < ncap
+    south = ipix >= npix - ncap
+
+    # Polar caps, rings counted from the nearest pole starting at 1
+    ip = numpy.where(south, npix - ipix, ipix + 1)
+    iring = (1 + _isqrt(2 * ip - 1)) >> 1
+    iphi = ip - 2 * iring * (iring - 1)
+    iphi = numpy.where(south, 4 * iring + 1 - iphi, iphi)
+
+    # 1 - cos(theta) = iring**2 / (3 nside**2)
+    thetaCap = 2.0 * numpy.arcsin(numpy.minimum(iring / (math.sqrt(6.0) * nside),
+                                                1.0))
+    thetaCap = numpy.where(south, math.pi - thetaCap, thetaCap)
+    phiCap = (iphi - 0.5) * math.pi / (2.0 * iring)
+
+    # Equatorial strip, rings counted from the north pole
+    ip = ipix - ncap
+    iring = (ip // nl4) + nside
+    iphi = (ip % nl4) + 1
+    fodd = numpy.where((iring + nside) & 1, 1.0, 0.5)
+    thetaEq = numpy.arccos(numpy.clip((2 * nside - iring) * 2.0 / (3.0 * nside),
+                                      -1.0, 1.0))
+    phiEq = (iphi - fodd) * math.pi / (2.0 * nside)
+
+    cap = north | south
+    theta = numpy.where(cap, thetaCap, thetaEq)
+    phi = numpy.where(cap, phiCap, phiEq)
+
+    return (theta, phi)
+
+def _binPoints(nside, theta, phi, weights):
+    """
+    Flattened (row * npix + pixel) index and weight of every finite
+    point of (nmaps, npoints) arrays of angles.
+    """
+    theta = numpy.atleast_2d(numpy.asarray(theta, dtype=float))
+    phi = numpy.broadcast_to(numpy.asarray(phi, dtype=float), theta.shape)
+    npix = nside2npix(nside)
+
+    good = numpy.isfinite(theta) & numpy.isfinite(phi)
+    rows = numpy.nonzero(good)[0]
+    index = ang2pix(nside, theta[good], phi[good]) + npix * rows
+
+    if weights is not None:
+        weights = numpy.broadcast_to(numpy.asarray(weights, dtype=float),
+                                     theta.shape)[good]
+
+    return (index, weights, theta.shape[0])
+
+def makeMaps(nside, theta, phi, weights=None):
+    """
+    HEALPix maps (RING scheme) of many sets of points at once, e.g.
+    the Monte Carlo (i, Omega) trials of all stars. Each map holds the
+    number of points in each pixel, or the sum of their weights.
+    Points with NaN angles are skipped.
+
+    @param nside: map resolution (npix = 12 * nside**2)
+    @param theta: (nmaps, npoints) colatitudes in radians
+    @param phi: (nmaps, npoints) azimuths in radians
+    @kwparam weights: (nmaps, npoints) weight of each point
+    @return (nmaps, npix) float array
+    """
+    npix = nside2npix(nside)
+    (index, weights, nmaps) = _binPoints(nside, theta, phi, weights)
+    maps = numpy.bincount(index, weights=weights, minlength=nmaps * npix)
+
+    return maps.reshape((nmaps, npix)).astype(float)
+
+def makeMap(nside, theta, phi, weights=None):
+    """
+    HEALPix map (RING scheme) of a set of points: the number of
+    points in each pixel, or the sum of their weights. See makeMaps().
+
+    @return (npix,) float array
+    """
+    return makeMaps(nside, numpy.ravel(theta)[numpy.newaxis, :],
+                    numpy.ravel(phi)[numpy.newaxis, :],
+                    weights=_ravelWeights(weights))[0]
+
+def makeSparseMaps(nside, theta, phi, weights=None):
+    """
+    Same as makeMaps(), but only the non-empty pixels are returned,
+    which is much smaller for PDFs concentrated in a few pixels.
+
+    @return (rows, pix, values): map number, pixel number and value
+        of every non-empty pixel, sorted by map and pixel
+    """
+    npix = nside2npix(nside)
+    (index, weights, nmaps) = _binPoints(nside, theta, phi, weights)
+    (index, inverse) = numpy.unique(index, return_inverse=True)
+    values = numpy.bincount(inverse.ravel(), weights=weights,
+                            minlength=len(index))
+
+    return (index // npix, index % npix, values.astype(float))
+
+def makeSparseMap(nside, theta, phi, weights=None):
+    """
+    Same as makeMap(), but only the non-empty pixels are returned.
+
+    @return (pix, values) of every non-empty pixel
+    """
+    (rows, pix, values) = makeSparseMaps(nside,
+                                         numpy.ravel(theta)[numpy.newaxis, :],
+                                         numpy.ravel(phi)[numpy.newaxis, :],
+                                         weights=_ravelWeights(weights))
+    return (pix, values)
+
+def sparseToMaps(nside, rows, pix, values, nmaps=None):
+    """
+    (nmaps, npix) maps from the output of makeSparseMaps().
+    """
+    npix = nside2npix(nside)
+    if nmaps is None:
+        nmaps = int(numpy.max(rows)) + 1 if len(rows) > 0 else 0
+
+    maps = numpy.zeros((nmaps, npix), dtype=float)
+    maps[rows, pix] = values
+    return maps
+
+def sparseToMap(nside, pix, values):
+    """
+    (npix,) map from the output of makeSparseMap().
+    """
+    return sparseToMaps(nside, numpy.zeros(len(pix), dtype=int), pix, values,
+                        nmaps=1)[0]
+
+def _ravelWeights(weights):
+    if weights is None:
+        return None
+    return numpy.ravel(weights)[numpy.newaxis, :]
@@ -0,0 +1,259 @@
+"""
+Vectorized solver for Kepler's equation, E - e sin(E) = M.
+
+Used by orbits.Orbit.eccen_anomaly() and efit5_results, so every
+orbit model shares one engine. Run this module to benchmark it
+against the previous Orbit.eccen_anomaly():
+
+    python -m gcwork.kepler
+"""
+import math
+import time
+import numpy as np
+
+
+class EccAnomalyError(Exception):
+    def __init__(self, message):
+        self.message = message
+
+
+def eccentricAnomaly(M, e, thresh=1e-10, maxIter=50):
+    """
+    Solve Kepler's equation for arrays of mean anomalies and
+    eccentricities (any shapes that broadcast together, so a batch
+    of orbits with different eccentricities can be solved at once).
+
+    A Mikkola (1987) starter is refined with Newton-Raphson steps on
+    whole arrays; each step only touches the elements that have not
+    yet converged to abs(E - e sin(E) - M) <= thresh.
+
+    @param M: mean anomalies (rad)
+    @param e: eccentricities, 0 <= e < 1
+    @return E: eccentric anomalies (rad), on the same branch as M
+        (i.e. not range reduced)
+    """
+    M = np.asarray(M, dtype=float)
+    e = np.asarray(e, dtype=float)
+    (M, e) = np.broadcast_arrays(M, e)
+    shape = M.shape
+    M = M.ravel()
+    e = e.ravel()
+
+    # Range reduction of M to -pi <= mx <= pi
+    twopi = 2.0 * math.pi
+    offset = twopi * np.round(M / twopi)
+    mx = M - offset
+
+    # Mikkola starter
+    aux = (4.0 * e) + 0.5
+    alpha = (1.0 - e) / aux
+    beta = mx / (2.0 * aux)
+    z = np.cbrt(beta + np.copysign(np.sqrt(beta**2 + alpha**3), beta))
+    z = np.where(z == 0.0, 1.0, z)
+
+    s0 = z - alpha / z
+    s1 = s0 - (0.078 * s0**5) / (1.0 + e)
+    e0 = mx + e * ((3.0 * s1) - (4.0 * s1**3))
+
+    # Fourth-order correction to the starter
+    se0 = np.sin(e0)
+    ce0 = np.cos(e0)
+    f = e0 - (e * se0) - mx
+    f1 = 1.0 - (e * ce0)
+    f2 = e * se0
+    f3 = e * ce0
+    f4 = -f2
+    u1 = -f / f1
+    u2 = -f / (f1 + 0.5*f2*u1)
+    u3 = -f / (f1 + 0.5*f2*u2 + (1.0/6.0)*f3*u2*u2)
+    u4 = -f / (f1 + 0.5*f2*u3 + (1.0/6.0)*f3*u3*u3 + (1.0/24.0)*f4*u3**3)
+    E = e0 + u4
+
+    # Newton-Raphson on whatever has not converged yet
+    idx = np.arange(len(E))
+    for ii in range(maxIter):
+        Ei = E[idx]
+        ei = e[idx]
+        fe = Ei - ei*np.sin(Ei) - mx[idx]
+
+        todo = np.abs(fe) > thresh
+        if not todo.any():
+            break
+        idx = idx[todo]
+        Ei = Ei[todo]
+        ei = ei[todo]
+        E[idx] = Ei - fe[todo] / (1.0 - ei*np.cos(Ei))
+    else:
+        bad = idx[0]
+        msg = 'eccentricAnomaly: Could not converge for e = %f and M = %f' % \
+              (e[bad], M[bad])
+        raise EccAnomalyError(msg)
+
+    return (E + offset).reshape(shape)
+
+
+def _eccenAnomalyPrevious(m, ecc, thresh=1e-10):
+    """
+    Copy of the body of orbits.Orbit.eccen_anomaly() before it used
+    eccentricAnomaly() (array starter, then a Newton loop for each
+    element that is not yet solved). Only kept as the reference for
+    benchmark(); ecc must be a single value.
+    """
+    m = np.asarray(m, dtype=float)
+
+    # Range reduction of m to -pi < m <= pi
+    mx = m.copy()
+
+    ## ... m > pi
+    zz = (np.where(mx > math.pi))[0]
+    mx[zz] = mx[zz] % (2.0 * math.pi)
+    zz = (np.where(mx > math.pi))[0]
+    mx[zz] = mx[zz] - (2.0 * math.pi)
+
+    # ... m < -pi
+    zz = (np.where(mx <= -math.pi))[0]
+    mx[zz] = mx[zz] % (2.0 * math.pi)
+    zz = (np.where(mx <= -math.pi))[0]
+    mx[zz] = mx[zz] + (2.0 * math.pi)
+
+    # Bail out for circular orbits...
+    if (ecc == 0.0):
+        return mx
+
+    aux   = (4.0 * ecc) + 0.50
+    alpha = (1.0 - ecc) / aux
+
+    beta = mx/(2.0*aux)
+    aux = np.sqrt(beta**2 + alpha**3)
+
+    z=beta+aux
+    zz=(np.where(z <= 0.0))[0]
+    z[zz]=beta[zz]-aux[zz]
+
+    test=abs(z)**0.3333333333333333
+
+    z =  test.copy()
+    zz = (np.where(z < 0.0))[0]
+    z[zz] = -z[zz]
+
+    s0=z-alpha/z
+    s1 = s0-(0.0780 * s0**5) / (1.0 + ecc)
+    e0 = mx + ecc*((3.0 * s1) - (4.0 * s1**3))
+
+    se0=np.sin(e0)
+    ce0=np.cos(e0)
+
+    f  = e0 - (ecc*se0) - mx
+    f1 = 1.0 - (ecc*ce0)
+    f2 = ecc*se0
+    f3 = ecc*ce0
+    f4 = -1.0 * f2
+    u1 = -1.0 * f/f1
+    u2 = -1.0 * f/(f1 + 0.50*f2*u1)
+    u3 = -1.0 * f/(f1 + 0.50*f2*u2
+             + 0.166666666666670*f3*u2*u2)
+    u4 = -1.0 * f/(f1 + 0.50*f2*u3
+             + 0.166666666666670*f3*u3*u3
+             + 0.0416666666666670*f4*u3**3)
+
+    eccanom=e0+u4
+
+    zz = (np.where(eccanom >= 2.00*math.pi))[0]
+    eccanom[zz]=eccanom[zz]-2.00*math.pi
+    zz = (np.where(eccanom < 0.0))[0]
+    eccanom[zz]=eccanom[zz]+2.00*math.pi
+
+    # Newton-Raphson for the elements that are not yet solved
+    mmm = mx.copy()
+    ndx = (np.where(mmm < 0.))[0]
+    mmm[ndx] += (2.0 * math.pi)
+    diff = eccanom - ecc*np.sin(eccanom) - mmm
+
+    ndx = (np.where(abs(diff) > 1e-10))[0]
+    for i in ndx:
+        fe = eccanom[i]-ecc*math.sin(eccanom[i])-mmm[i]
+        fs = 1.0 - ecc*math.cos(eccanom[i])
+        oldval=eccanom[i]
+        eccanom[i]=oldval-fe/fs
+
+        loopCount = 0
+        while (abs(oldval-eccanom[i]) > thresh):
+            fe = eccanom[i]-ecc*math.sin(eccanom[i])-mmm[i]
+            fs = 1.0 - ecc*math.cos(eccanom[i])
+            oldval=eccanom[i]
+            eccanom[i]=oldval-fe/fs
+            loopCount += 1
+
+            if (loopCount > 10**6):
+                msg = 'eccen_anomaly: Could not converge for e = %f' % ecc
+                raise EccAnomalyError(msg)
+
+        while (eccanom[i] >=  math.pi):
+            eccanom[i] = eccanom[i] - (2.0 * math.pi)
+
+        while (eccanom[i] < -math.pi ):
+            eccanom[i] = eccanom[i] + (2.0 * math.pi)
+
+    return eccanom
+
+
+def _wrap(dE):
+    """Differences of angles reduced to -pi <= dE < pi."""
+    return (dE + math.pi) % (2.0 * math.pi) - math.pi
+
+
+def benchmark(eccs=[0.0, 0.3, 0.6, 0.88, 0.97, 0.995],
+              sizes=[10, 1000, 100000], numOrbits=1000, numEpochs=100,
+              repeat=3, seed=0):
+    """
+    Time eccentricAnomaly() against the previous Orbit.eccen_anomaly()
+    and check that they agree (modulo 2 pi).
+
+    First for one orbit at a time, over a range of eccentricities and
+    array sizes. Mean anomalies are drawn uniformly, with half of them
+    within 0.1 rad of periapse, where the previous solver falls back
+    to its per-element Newton loop most often. Then for numOrbits
+    orbits with different eccentricities (up to the largest of eccs)
+    at numEpochs epochs each, which the previous solver could only do
+    one orbit at a time.
+    """
+    rng = np.random.default_rng(seed)
+
+    def _time(func):
+        times = []
+        for rr in range(repeat):
+            t1 = time.perf_counter()
+            E = func()
+            times.append(time.perf_counter() - t1)
+        return (min(times), E)
+
+    print( '%6s %8s %12s %12s %8s %10s' %
+           ('ecc', 'size', 'prev (s)', 'vector (s)', 'speedup', 'max diff'))
+    for ecc in eccs:
+        for size in sizes:
+            M = rng.uniform(-math.pi, math.pi, size)
+            M[:size//2] = rng.uniform(-0.1, 0.1, size//2)
+
+            (tPrev, E1) = _time(lambda: _eccenAnomalyPrevious(M, ecc))
+            (tVec, E2) = _time(lambda: eccentricAnomaly(M, ecc))
+            diff = np.abs(_wrap(E1 - E2)).max()
+
+            print( '%6.3f %8d %12.2e %12.2e %8.1f %10.1e' %
+                   (ecc, size, tPrev, tVec, tPrev / tVec, diff))
+
+    # Many orbits at once
+    e = rng.uniform(0.0, max(eccs), numOrbits)
+    M = rng.uniform(-math.pi, math.pi, (numOrbits, numEpochs))
+
+    (tPrev, E1) = _time(lambda: np.array([_eccenAnomalyPrevious(M[oo], e[oo])
+                                          for oo in range(numOrbits)]))
+    (tVec, E2) = _time(lambda: eccentricAnomaly(M, e[:, np.newaxis]))
+    diff = np.abs(_wrap(E1 - E2)).max()
+
+    print( '%6s %8s %12.2e %12.2e %8.1f %10.1e' %
+           ('mixed', '%dx%d' % (numOrbits, numEpochs),
+            tPrev, tVec, tPrev / tVec, diff))
+
+
+if __name__ == '__main__':
+    benchmark()
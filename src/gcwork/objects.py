@@ -289,6 +289,142 @@ class Epoch(object):
               doc="3D alignment error")
 
 
+class _ColumnProxy(object):
+    """Mixin for objects whose attributes live in StarTable columns.
+
+    Attribute reads fall back to the column named _prefix + name at
+    index _idx; writes to an existing column go straight into the
+    array so StarSet.getArray() sees them. Anything else is stored
+    on the instance as usual.
+    """
+    def _bind(self, table, kind, idx, prefix=''):
+        d = self.__dict__
+        d['_table'] = table
+        d['_kind'] = kind
+        d['_idx'] = idx
+        d['_prefix'] = prefix
+
+    def __getattr__(self, name):
+        # Only called when normal lookup fails.
+        if name.startswith('_'):
+            raise AttributeError(name)
+        d = self.__dict__
+        if '_table' not in d:
+            raise AttributeError(name)
+        cols = getattr(d['_table'], d['_kind'])
+        key = d['_prefix'] + name
+        if key not in cols:
+            raise AttributeError(name)
+        return cols[key][d['_idx']].item()
+
+    def __setattr__(self, name, value):
+        d = self.__dict__
+        if '_table' in d:
+            table = d['_table']
+            key = d['_prefix'] + name
+            cols = getattr(table, d['_kind'])
+            if key in cols:
+                table.setValue(cols, key, d['_idx'], value)
+                return
+        object.__setattr__(self, name, value)
+
+
+class StarProxy(_ColumnProxy, Star):
+    """Star backed by one row of a StarTable. Epochs and align fits
+    are only turned into objects when they are accessed."""
+    def __init__(self, table, row):
+        self._bind(table, 'star', row)
+        self.__dict__['_row'] = row
+        self.__dict__['e'] = EpochList(table, row)
+
+    def __getattr__(self, name):
+        # Fit properties on Star read the name-mangled attribute.
+        if name.startswith('_Star__fit'):
+            d = self.__dict__
+            fitName = name[len('_Star__'):]
+            if '_table' in d and d['_table'].hasFit(fitName):
+                fit = FitProxy.make(d['_table'], fitName, d['_row'])
+                d[name] = fit
+                return fit
+        return _ColumnProxy.__getattr__(self, name)
+
+    def __setattr__(self, name, value):
+        # Star.setFit*() assigns a fresh Fit; copy it into the columns.
+        if name.startswith('_Star__fit') and '_table' in self.__dict__:
+            table = self.__dict__['_table']
+            fitName = name[len('_Star__'):]
+            if table.hasFit(fitName):
+                for key in FitProxy.keys(table, fitName):
+                    table.setValue(table.star, fitName + '.' + key,
+                                   self._row, getattr(value, key))
+                self.__dict__.pop(name, None)
+                return
+        _ColumnProxy.__setattr__(self, name, value)
+
+
+class EpochProxy(_ColumnProxy, Epoch):
+    """Epoch backed by one (star, epoch) cell of a StarTable."""
+    def __init__(self, table, row, ee):
+        self._bind(table, 'epoch', (row, ee))
+        self.__dict__['t'] = float(table.years[ee])
+
+
+class EpochList(object):
+    """Lazy list of EpochProxy objects for one star. Epochs are
+    created on first access and then kept, so attributes set on
+    them persist."""
+    def __init__(self, table, row):
+        self._table = table
+        self._row = row
+        self._epochs = {}
+
+    def __len__(self):
+        return self._table.numEpochs
+
+    def __getitem__(self, ee):
+        if isinstance(ee, slice):
+            return [self[ii] for ii in range(*ee.indices(len(self)))]
+        if ee < 0:
+            ee += len(self)
+        if ee < 0 or ee >= len(self):
+            raise IndexError('epoch index out of range')
+        try:
+            return self._epochs[ee]
+        except KeyError:
+            ep = EpochProxy(self._table, self._row, ee)
+            self._epochs[ee] = ep
+            return ep
+
+    def __iter__(self):
+        for ee in range(len(self)):
+            yield self[ee]
+
+
+class FitProxy(_ColumnProxy, Fit):
+    "Linear fit backed by the dotted star columns of a StarTable."
+    def __init__(self, table, fitName, row):
+        self._bind(table, 'star', row, prefix=fitName + '.')
+
+    def keys(cls, table, fitName):
+        keys = ['t0', 'p', 'perr', 'v', 'verr']
+        if (fitName + '.a') in table.star:
+            keys += ['a', 'aerr']
+        return keys
+    keys = classmethod(keys)
+
+    def make(cls, table, fitName, row):
+        if (fitName + '.a') in table.star:
+            return AccelFitProxy(table, fitName, row)
+        return FitProxy(table, fitName, row)
+    make = classmethod(make)
+
+
+class AccelFitProxy(_ColumnProxy, AccelFit):
+    "Acceleration fit backed by the dotted star columns of a StarTable."
+    def __init__(self, table, fitName, row):
+        self._bind(table, 'star', row, prefix=fitName + '.')
+
+
 class Transform(object):
     "Information for coordinate transformations."
     
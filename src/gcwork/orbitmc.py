@@ -0,0 +1,454 @@
+"""
+Batched Monte Carlo sampling of the unknown line of sight distance
+of a star, as used by analyticOrbits.StarOrbitsMC.run().
+
+Every trial is drawn at once as arrays. Trials that break the bound
+orbit criteria (or whose acceleration falls outside of the allowed
+range) are re-drawn, and only those, until every trial is accepted.
+
+The star is any object with the measured kinematics as read off by
+StarOrbitsMC (x_dat, y_dat, vx_dat, vy_dat, vz_dat, ax_dat, ay_dat
+and their *err_dat errors, in pixel units of star.trans), plus name,
+sigma and an objects.Transform trans:
+
+    rng = np.random.default_rng(seed)
+    mc = orbitmc.sampleTrials(star, ntrials, rng, zfrom='acc')
+    mc['z']  -- (ntrials,) line of sight distances (arcsec)
+"""
+import math
+import numpy as np
+from gcwork import objects
+from gcwork import util
+
+
+zfromModes = ('acc', 'acc2', 'uni_acc', 'uni_acc_limit', 'all', 'all2')
+
+
+def sampleTrials(star, num, rng, mcMassRo=None, zfrom='acc', mExtended=None,
+                 verbose=True):
+    """
+    Draw num trials of the star's 3D position and velocity, along
+    with the potential, that are consistent with a bound orbit.
+
+    @param star: StarOrbitsMC (or alike) with the measured kinematics
+    @param num: number of trials
+    @param rng: numpy.random.Generator for the random draws
+    @kwparam mcMassRo: 'germ', None or a pickled bhPotential.BHprops()
+        object with mass and Ro draws (see potentials())
+    @kwparam zfrom: how to get the accelerations, see
+        StarOrbitsMC.run()
+    @kwparam mExtended: None, 'trippe' or an object with rho0 draws
+    @return dictionary of (num,) arrays x, y, z (arcsec, +x east),
+        vx, vy, vz (km/s), ar (mas/yr^2), mass, dist, x0 and y0
+    """
+    if zfrom not in zfromModes:
+        raise ValueError('sampleTrials: zfrom=%s is not supported' % zfrom)
+
+    trials = np.arange(num)
+
+    # Positions, velocities and potential of every trial that
+    # satisfy the bound orbit criteria.
+    mc = sampleBound(star, trials, rng, mcMassRo, zfrom, mExtended, verbose)
+
+    # Sample the accelerations in the plane of the sky (within
+    # the range allowed for a bound orbit) for every trial.
+    mc['ar'] = sampleAcc(star, mc, rng, zfrom, verbose)
+
+    # Now convert our acceleration into a z-value (positive solution)
+    mc['z'] = acc2z(mc['x'], mc['y'], mc['ar'], mc['dist'], mc['mass'])
+
+    return mc
+
+def accData(star):
+    """
+    Measured plane of the sky acceleration in mas/yr^2, both
+    (ax, ay, axe, aye) (+x east) and the radial component
+    (ar, at, are, ate) at the measured position.
+    """
+    pt = util.PixTransform(star.trans)
+    (ax, ay, axe, aye) = pt.acceleration(star.ax_dat, star.ay_dat,
+                                         star.axerr_dat, star.ayerr_dat)
+    ax *= 1000.0  # mas/yr^2, +x to east (correct sense)
+    ay *= 1000.0  # mas/yr^2
+    axe *= 1000.0  # mas/yr^2
+    aye *= 1000.0  # mas/yr^2
+
+    # NOTE: since we're calling util.xy2circErr, must pass everything
+    # in with +x to east
+    radial = util.xy2circErr(-star.x_dat, star.y_dat, ax, ay,
+                             star.xerr_dat, star.yerr_dat, axe, aye)
+    return ((ax, ay, axe, aye), radial)
+
+def sampleBound(star, trials, rng, mcMassRo, zfrom, mExtended, verbose):
+    """
+    Draw positions, velocities and the potential for the given
+    trials, re-drawing the trials that break the bound orbit
+    criteria: v < v_esc at the projected radius, and
+    amin (set by r2d) < amax (set by v=vesc), where all accels
+    are negative.
+
+    @return dictionary of arrays x, y (arcsec, +x east), vx, vy, vz
+        (km/s), mass, dist, x0, y0, amin, amax and zmax (one per trial)
+    """
+    cc = objects.Constants()
+
+    names = ['x', 'y', 'vx', 'vy', 'vz', 'mass', 'dist', 'x0', 'y0',
+             'amin', 'amax', 'zmax']
+    mc = dict([(name, np.zeros(len(trials), dtype=float)) for name in names])
+
+    if zfrom == 'uni_acc_limit':
+        # Don't pull values that lead to amax being less than
+        # the 3 sigma lower limit on the acceleration
+        (ar_dat, at_dat, are_dat, ate_dat) = accData(star)[1]
+        alimit = ar_dat - (star.sigma * are_dat)
+
+    todo = np.arange(len(trials))
+    loopCount = 0
+    while len(todo) > 0:
+        loopCount += 1
+        num = len(todo)
+
+        # Sample our monte carlo variables
+        x = rng.normal(star.x_dat, star.xerr_dat, num)     # asec (+x west)
+        y = rng.normal(star.y_dat, star.yerr_dat, num)     # asec (+y north)
+        vx = rng.normal(star.vx_dat, star.vxerr_dat, num)  # asec/yr
+        vy = rng.normal(star.vy_dat, star.vyerr_dat, num)  # asec/yr
+        vz = rng.normal(star.vz_dat, star.vzerr_dat, num)  # km/s
+
+        (mass, dist, x0, y0) = potentials(mcMassRo, trials[todo],
+                                          mExtended, x, y)
+        GM = cc.G * mass * cc.msun        # cgs
+
+        # Sgr A* position of every trial
+        star.trans.sgra = [x0, y0]
+        pt = util.PixTransform(star.trans)
+        (x, y) = pt.position(x, y)      # asec (+x east, +y north)
+        (vx, vy) = pt.velocity(vx, vy)  # asec/yr
+
+        # Convert velocities in km/s
+        asy_to_kms = dist * cc.cm_in_au / (1.0e5 * cc.sec_in_yr)
+        vx *= asy_to_kms
+        vy *= asy_to_kms
+
+        # At this point:
+        #   all positions are in arcsec and
+        #   all velocities are in km/s
+
+        # Catch the case of too high velocities
+        vtotcgs = np.sqrt(vx**2 + vy**2 + vz**2) * 1.0e5
+        rhocgs = np.sqrt(x**2 + y**2) * dist * cc.cm_in_au
+        unbound = vtotcgs**2 > (2.0 * GM / rhocgs)
+
+        # Maximum allowed acceleration (where a < 0) set by assuming
+        # a bound orbit, and minimum allowed acceleration set by the
+        # minimum radius = 2D projected radius.
+        amax = maxAcc(x, y, vx, vy, vz, GM, dist, cc)
+        amin = minAcc(x, y, GM, dist, cc)
+        if zfrom == 'uni_acc_limit':
+            amin = np.zeros(num) + alimit
+
+        good = (unbound == False) & ((amin >= amax) == False)
+
+        if verbose and (good == False).any():
+            print('Random pos/vel break bound orbit criteria: ' \
+                  'loop %d, %d of %d trials, %s' % \
+                  (loopCount, (good == False).sum(), num, star.name))
+        if zfrom == 'uni_acc_limit' and ((good == False) & (amin > amax)).any():
+            # This is bad. Go back and resample
+            print('Accel lower limit is greater than max accel. Must resample.')
+
+        keep = todo[good]
+        for (name, val) in [('x', x), ('y', y), ('vx', vx), ('vy', vy),
+                            ('vz', vz), ('mass', mass), ('dist', dist),
+                            ('x0', x0), ('y0', y0), ('amin', amin),
+                            ('amax', amax)]:
+            mc[name][keep] = val[good]
+        todo = todo[good == False]
+
+    # Convert accelerations from mas/yr^2
+    # into line of sight distances in arcsec
+    mc['zmax'] = acc2z(mc['x'], mc['y'], mc['amax'], mc['dist'], mc['mass'])
+    bad = np.isnan(mc['zmax'])
+    if bad.any():
+        print('zmax = 0 for %s (%d trials)' % (star.name, bad.sum()))
+        mc['zmax'][bad] = 0.0001
+
+    return mc
+
+def sampleAcc(star, mc, rng, zfrom, verbose):
+    """
+    Draw the plane of the sky acceleration (mas/yr^2) of every
+    trial in mc (see sampleBound), re-drawing the trials whose
+    acceleration does not satisfy a bound orbit (amin < ar < amax).
+    """
+    num = len(mc['x'])
+    ar = np.zeros(num, dtype=float)
+
+    if (zfrom == 'acc'):
+        # We will use acceleration info only if the star passes the
+        # F test for accelerations (over velocities)
+        print('***Acceleration Info***')
+        print('Significant acceleration')
+        print('F statistic implies we should use acceleration info from polyfit.')
+        pt = util.PixTransform(star.trans)
+    elif (zfrom == 'uni_acc'):
+        print('Acceleration consistent w/ zero and with amin')
+        print('Sample from uniform acceleration between amin and amax')
+    elif (zfrom == 'uni_acc_limit'):
+        # This case essentially ignores amin, since we have tighter
+        # constraints using the 3 sigma lower limit on the acceleration
+        print('Acceleration constraints: lower limit > amin')
+        print('Sample from uniform acceleration between the 3 sigma lower limit and amax')
+    elif (zfrom == 'acc2'):
+        ((ax, ay, axe, aye), radial) = accData(star)
+        (ar_dat, at_dat, are, ate) = util.xy2circErr(mc['x'], mc['y'],
+                                                     ax, ay, 0.0, 0.0,
+                                                     axe, aye)
+        ar_dat = np.where(ar_dat > mc['amax'], mc['amax'] - 0.00001,
+                          np.where(ar_dat < mc['amin'], mc['amin'] + 0.00001,
+                                   ar_dat))
+        (z_dat, zerr_dat) = acc2zErr(mc['x'], mc['y'], ar_dat, are,
+                                     mc['dist'], mc['mass'])
+
+        # Really large errors... pull from a uniform distribution of z
+        uniZ = zerr_dat > mc['zmax']
+        if uniZ[0]:
+            print('Switched to Uniform Z')
+        print('a = %7.4f +/- %6.5f mas/yr^2' % (ar_dat[0], are[0]))
+        print('z = %6.2f +/- %5.2f arcsec' % (z_dat[0], zerr_dat[0]))
+        print('amin = %7.4f  amax = %7.4f  zmax = %7.4f' % \
+              (mc['amin'][0], mc['amax'][0], mc['zmax'][0]))
+
+    todo = np.arange(num)
+    loopCnt = 0
+    while len(todo) > 0:
+        x = mc['x'][todo]
+        y = mc['y'][todo]
+        amin = mc['amin'][todo]
+        amax = mc['amax'][todo]
+        zmax = mc['zmax'][todo]
+        dist = mc['dist'][todo]
+        mass = mc['mass'][todo]
+
+        if (zfrom == 'acc'):
+            # Sample from Gaussian centered on our acceleration measurement
+            ax = rng.normal(star.ax_dat, star.axerr_dat, len(todo))  # arcsec/yr^2
+            ay = rng.normal(star.ay_dat, star.ayerr_dat, len(todo))  # arcsec/yr^2
+
+            # Convert into mas/yr^2
+            (ax, ay) = pt.acceleration(ax, ay)
+            ax *= 1000.0
+            ay *= 1000.0
+
+            # Convert into radial and tangential
+            (art, at) = util.xy2circ(x, y, ax, ay)
+
+        elif (zfrom in ('uni_acc', 'uni_acc_limit', 'all')):
+            # Get uniform acceleration
+            art = rng.uniform(amin, amax)
+
+        elif (zfrom == 'acc2'):
+            z = np.where(uniZ[todo],
+                         rng.uniform(0.0, zmax),
+                         rng.normal(z_dat[todo], zerr_dat[todo]))
+
+            # Convert z into accelerations. Bad z values get an
+            # unacceptable acceleration, to be drawn again.
+            badZ = (z < 0) | (z >= zmax)
+            art = np.where(badZ, 0.0, z2acc(x, y, z, dist, mass))
+
+        elif (zfrom == 'all2'):
+            # Get uniform z distance
+            z = rng.uniform(0.0, zmax)
+
+            # Convert uniform z into accelerations
+            art = z2acc(x, y, z, dist, mass)
+
+        loopCnt += 1
+        good = (art > amin) & (art < amax)
+        if ((loopCnt % 500) == 0 and verbose and (good == False).any()):
+            print('Having problems getting enough accelerations within')
+            print('the range for %d trials (e.g. %7.3f - %7.3f)' % \
+                  ((good == False).sum(), amin[good == False][0],
+                   amax[good == False][0]))
+
+        ar[todo[good]] = art[good]
+        todo = todo[good == False]
+
+    return ar
+
+def potentials(mcMassRo, trials, mExtended=None, x=None, y=None):
+    """
+    Mass (solar masses), Ro (pc) and Sgr A* position for each of the
+    given trials. With an extended mass, x and y are the positions
+    drawn for the trials.
+
+    @param mcMassRo: None for the default potential, 'germ', or an
+        object with m, r0, x0 and y0 arrays indexed by trial
+    @param trials: trial indices
+    @kwparam mExtended: None, 'trippe' (Trippe et al. 2008) or an
+        object with rho0 draws (Schoedel et al. 2009)
+    @return (mass, dist, x0, y0), one per trial
+    """
+    num = len(trials)
+    mass = np.zeros(num, dtype=float)
+    dist = np.zeros(num, dtype=float)
+    x0 = np.zeros(num, dtype=float)
+    y0 = np.zeros(num, dtype=float)
+
+    if (mcMassRo is not None):
+        if (mcMassRo == 'germ'):
+            mass += 3.61e6          # solar masses
+            dist += 7620.0          # pc
+            x0 += -0.001
+            y0 += -0.005
+        else:
+            mass += mcMassRo.m[trials]  # solar masses
+            dist += mcMassRo.r0[trials] # pc
+            x0 += mcMassRo.x0[trials]   # pixels
+            y0 += mcMassRo.y0[trials]   # pixels
+
+        if (mExtended is not None):
+            r2d = np.sqrt(x**2 + y**2) * dist / 206265. # pc
+
+            # Now sample the extended mass, if needed. The integrals
+            # of the mass density profiles out to r2d are analytic.
+            if (mExtended == 'trippe'):
+                # Include extended mass distribution from Trippe et al. (2008)
+                rho0 = 2.1e6    # solar masses/pc^3
+                Rb_as = 8.9     # break radius; arcsec
+                Rb = Rb_as * dist / 206265. # pc
+
+                # int_0^r2d r**2 / (1 + (r / Rb)**2) dr
+                Mext = Rb**2 * (r2d - Rb * np.arctan(r2d / Rb))
+            else:
+                # Include extended mass distribution from Schoedel et al. (2009)
+                gamma = 1.0     # mass density power law
+                rm = 5.0        # pc
+
+                # Sample from rho0
+                rho0 = mExtended.rho0[trials]
+
+                # int_0^r2d (r / rm)**(-gamma) * r**2 dr
+                Mext = rm**gamma * r2d**(3.0 - gamma) / (3.0 - gamma)
+
+            mass += 4.0 * math.pi * rho0 * Mext
+
+    else:
+        mass += 4.1e6           # solar masses
+        dist += 7960.0          # pc
+        x0 += -0.001            # arcsec (+ to West)
+        y0 += -0.005            # arcsec (+ to North)
+
+    return (mass, dist, x0, y0)
+
+def maxAcc(x, y, vx, vy, vz, GM, dist, cc):
+    """
+    Maximum acceleration (where v = escape velocity).
+    This corresponds to the largest allowed line of sight
+    distance.
+    """
+    r = np.sqrt(x**2 + y**2)          # arcsec
+    rcgs = r * dist * cc.cm_in_au
+    vcgs = np.sqrt(vx**2 + vy**2 + vz**2) * 1.0e5
+    amax_cgs = -rcgs * vcgs**6 / (8.0 * GM**2)
+    amax = amax_cgs * 1000.0 * cc.sec_in_yr**2
+    amax /= (cc.cm_in_au * dist)      # mas/yr^2
+
+    return amax
+
+def minAcc(x, y, GM, dist, cc):
+    """
+    Minimum acceleration, for a star at its 2D projected radius.
+    """
+    r = np.sqrt(x**2 + y**2)          # arcsec
+    rcgs = r * dist * cc.cm_in_au
+    amin_cgs = -GM / rcgs**2
+    amin = amin_cgs * 1000.0 * cc.sec_in_yr**2
+    amin /= (cc.cm_in_au * dist)      # mas/yr^2
+
+    return amin
+
+def acc2z(x, y, ar, dist, mass):
+    """
+    Change acceleration (in the plane of the sky) from mas/yr^2 to
+    line of sight distance in arcsec.
+
+    Input:
+    x - x position in arcsec
+    y - y position in arcsec
+    ar - plane of the sky acc in mas/yr^2
+    dist - Ro in pc
+    mass - in solar masses
+    """
+    cc = objects.Constants()
+    GM = mass * cc.msun * cc.G
+
+    # Convert acceleration into CGS
+    arcgs = ar * dist * cc.cm_in_au / (cc.sec_in_yr**2 * 1000.0)
+
+    # Convert into z-distance
+    r = np.sqrt(x**2 + y**2)          # arcsec
+    rcgs = r * dist * cc.cm_in_au
+    tmp1 = (GM * rcgs / -arcgs)**(2.0/3.0)
+    zcgs = np.sqrt(tmp1 - rcgs**2)
+    z = zcgs / (cc.cm_in_au * dist)
+
+    return z
+
+def acc2zErr(x, y, ar, arerr, dist, mass):
+    """
+    Change acceleration (in the plane of the sky) from mas/yr^2 to
+    line of sight distance in arcsec.
+
+    Input:
+    x - x position in arcsec
+    y - y position in arcsec
+    ar - plane of the sky acc in mas/yr^2
+    arerr - error in ar
+    dist - Ro in pc
+    mass - in solar masses
+    """
+    cc = objects.Constants()
+    GM = mass * cc.msun * cc.G
+
+    # Convert acceleration into CGS
+    arcgs = ar * dist * cc.cm_in_au / (cc.sec_in_yr**2 * 1000.0)
+    arerrcgs = arerr * dist * cc.cm_in_au / (cc.sec_in_yr**2 * 1000.0)
+
+    # Convert into z-distance
+    r = np.sqrt(x**2 + y**2)          # arcsec
+    rcgs = r * dist * cc.cm_in_au
+    tmp1 = (GM * rcgs / -arcgs)**(2.0/3.0)
+    zcgs = np.sqrt(tmp1 - rcgs**2)
+    z = zcgs / (cc.cm_in_au * dist)
+
+    zerrcgs = abs(arerrcgs * tmp1 / (3.0 * zcgs * arcgs))
+    zerr = zerrcgs / (cc.cm_in_au * dist)
+
+    return (z, zerr)
+
+def z2acc(x, y, z, dist, mass):
+    """
+    Change line of sight distance in arcsec to
+    acceleration (in the plane of the sky) in mas/yr^2.
+
+    Input:
+    x - x position in arcsec
+    y - y position in arcsec
+    z - z position in arcsec
+    dist - Ro in pc
+    mass - in solar masses
+    """
+    cc = objects.Constants()
+    GM = mass * cc.msun * cc.G
+
+    # Convert distance into CGS
+    r = np.sqrt(x**2 + y**2)          # arcsec
+    zcgs = z * dist * cc.cm_in_au
+    rcgs = r * dist * cc.cm_in_au
+
+    arcgs = -GM * rcgs / (rcgs**2 + zcgs**2)**(3.0/2.0)
+    ar = arcgs * cc.sec_in_yr**2 * 1000.0 / (dist * cc.cm_in_au)
+
+    return ar
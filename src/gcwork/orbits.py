@@ -5,6 +5,8 @@ from numpy import *
 from gcwork import starset
 from gcwork import objects
 from gcwork import util
+from gcwork import kepler
+from gcwork.kepler import EccAnomalyError
 
 import pdb
 
@@ -498,9 +500,8 @@ class Orbit(object):
 
     
         # Calculate accleration
-        for ii in range(ecnt):
-            rmag_cm = sqrt( (r[ii,:]**2).sum() ) * cc.cm_in_au
-            a[ii,:] = -GM * r[ii,:] * cc.cm_in_au / rmag_cm**3
+        rmag_cm = sqrt( (r**2).sum(axis=1) ) * cc.cm_in_au
+        a[:,:] = -GM * r * cc.cm_in_au / rmag_cm[:,newaxis]**3
 
         #Computation from relativistic redshift - added by A. Hees 04/2016
         if relRedshift:
@@ -528,119 +529,18 @@ class Orbit(object):
     def eccen_anomaly(self, m, ecc, thresh=1e-10):
         """
         m - a numpy array of mean anomalies
-        ecc - the eccentricity of the orbit (single float value from 0-1)
-        """
-        # set default values
+        ecc - the eccentricity of the orbit (single float value from 0-1,
+              or an array of eccentricities matching m)
 
-        if (ecc < 0. or ecc >= 1.):
+        Returns the eccentric anomalies in the range 0 <= E < 2 pi.
+        The solving is done by kepler.eccentricAnomaly().
+        """
+        if ((asarray(ecc) < 0.).any() or (asarray(ecc) >= 1.).any()):
             print('Eccentricity must be 0<= ecc. < 1')
-            
-        #
-        # Range reduction of m to -pi < m <= pi
-        #
-        mx = m.copy()
-
-        ## ... m > pi
-        zz = (where(mx > math.pi))[0]
-        mx[zz] = mx[zz] % (2.0 * math.pi)
-        zz = (where(mx > math.pi))[0]
-        mx[zz] = mx[zz] - (2.0 * math.pi)
-
-        # ... m < -pi
-        zz = (where(mx <= -math.pi))[0]
-        mx[zz] = mx[zz] % (2.0 * math.pi)
-        zz = (where(mx <= -math.pi))[0]
-        mx[zz] = mx[zz] + (2.0 * math.pi)
-
-        #
-        # Bail out for circular orbits...
-        #
-        if (ecc == 0.0):
-            return mx
-
-        aux   = (4.0 * ecc) + 0.50
-        alpha = (1.0 - ecc) / aux
-
-        beta = mx/(2.0*aux)
-        aux = sqrt(beta**2 + alpha**3)
-   
-        z=beta+aux
-        zz=(where(z <= 0.0))[0]
-        z[zz]=beta[zz]-aux[zz]
-
-        test=abs(z)**0.3333333333333333
-
-        z =  test.copy()
-        zz = (where(z < 0.0))[0]
-        z[zz] = -z[zz]
-
-        s0=z-alpha/z
-        s1 = s0-(0.0780 * s0**5) / (1.0 + ecc)
-        e0 = mx + ecc*((3.0 * s1) - (4.0 * s1**3))
-
-        se0=sin(e0)
-        ce0=cos(e0)
-
-        f  = e0 - (ecc*se0) - mx
-        f1 = 1.0 - (ecc*ce0)
-        f2 = ecc*se0
-        f3 = ecc*ce0
-        f4 = -1.0 * f2
-        u1 = -1.0 * f/f1
-        u2 = -1.0 * f/(f1 + 0.50*f2*u1)
-        u3 = -1.0 * f/(f1 + 0.50*f2*u2
-                 + 0.166666666666670*f3*u2*u2)
-        u4 = -1.0 * f/(f1 + 0.50*f2*u3
-                 + 0.166666666666670*f3*u3*u3
-                 + 0.0416666666666670*f4*u3**3)
-
-        eccanom=e0+u4
-
-        zz = (where(eccanom >= 2.00*math.pi))[0]
-        eccanom[zz]=eccanom[zz]-2.00*math.pi
-        zz = (where(eccanom < 0.0))[0]
-        eccanom[zz]=eccanom[zz]+2.00*math.pi
-
-        # Now get more precise solution using Newton Raphson method
-        # for those times when the Kepler equation is not yet solved
-        # to better than 1e-10
-        # (modification J. Wilms)
-
-        mmm = mx.copy()
-        ndx = (where(mmm < 0.))[0]
-        mmm[ndx] += (2.0 * math.pi)
-        diff = eccanom - ecc*sin(eccanom) - mmm
-
-        ndx = (where(abs(diff) > 1e-10))[0]
-        for i in ndx:
-            # E-e sinE-M
-            fe = eccanom[i]-ecc*sin(eccanom[i])-mmm[i]
-            # f' = 1-e*cosE
-            fs = 1.0 - ecc*cos(eccanom[i])
-            oldval=eccanom[i]
-            eccanom[i]=oldval-fe/fs
-
-            loopCount = 0
-            while (abs(oldval-eccanom[i]) > thresh):
-                # E-e sinE-M
-                fe = eccanom[i]-ecc*sin(eccanom[i])-mmm[i]
-                # f' = 1-e*cosE
-                fs = 1.0 - ecc*cos(eccanom[i])
-                oldval=eccanom[i]
-                eccanom[i]=oldval-fe/fs
-                loopCount += 1
-                
-                if (loopCount > 10**6):
-                    msg = 'eccen_anomaly: Could not converge for e = %f' % ecc
-                    raise EccAnomalyError(msg)
-
-            while (eccanom[i] >=  math.pi):
-                eccanom[i] = eccanom[i] - (2.0 * math.pi)
-                
-            while (eccanom[i] < -math.pi ):
-                eccanom[i] = eccanom[i] + (2.0 * math.pi)
-
-        return eccanom
+
+        eccanom = kepler.eccentricAnomaly(m, ecc, thresh=thresh)
+
+        return eccanom % (2.0 * math.pi)
 
     def oal2xy(self, epochs, mass=None, dist=None, accel=False):
         """
@@ -755,6 +655,421 @@ class Orbit(object):
         return (x, y)
 
 
-class EccAnomalyError(Exception):
-    def __init__(self, message):
-        self.message = message
+
+def kep2xyzBatch(p, t0, e, i, o, w, epochs, mass=None, dist=None):
+    """
+    Propagate K Keplerian orbits over T epochs in one vectorized pass.
+    Equivalent to calling Orbit.kep2xyz() once per orbit (without the
+    GROrbit and relRedshift options), e.g. for drawing every orbit in
+    orbits.dat:
+
+    tab = genfromtxt('orbits.dat', dtype=str)
+    (r, v, a) = orbits.kep2xyzBatch(tab[:,1].astype(float),
+                                    tab[:,3].astype(float), ...,
+                                    epochs=t, mass=4.e6, dist=8000.)
+
+    Input:
+    p, t0, e, i, o, w -- arrays (length K) of the period [yr], time of
+                         periapse [yr], eccentricity, inclination [deg],
+                         angle of the ascending node [deg] and argument
+                         of periapse [deg]
+    epochs -- array of T epochs shared by all orbits, or a (K, T) array
+              with a separate set of epochs for each orbit
+    mass, dist -- black hole mass [Msun] and distance [pc], scalars or
+                  (K,) arrays; default to objects.Constants
+
+    Output (each an array of shape (K, T, 3)):
+    r -- radius vector [arcsec]
+    v -- velocity vector [mas/yr]
+    a -- acceleration vector [mas/yr^2]
+    """
+    cc = objects.Constants()
+
+    if mass is not None:
+        cc.mass = mass
+    if dist is not None:
+        cc.dist = dist
+
+    # Orbital elements (and per-orbit mass and distance) as (K, 1)
+    # columns so they broadcast over epochs
+    mass = asarray(cc.mass, dtype=float)
+    dist = asarray(cc.dist, dtype=float)
+    if mass.ndim > 0:
+        mass = mass[:,newaxis]
+    if dist.ndim > 0:
+        dist = dist[:,newaxis]
+
+    GM = mass * cc.msun * cc.G #cm^3/s^2
+
+    p = atleast_1d(asarray(p, dtype=float))[:,newaxis]
+    t0 = atleast_1d(asarray(t0, dtype=float))[:,newaxis]
+    e = atleast_1d(asarray(e, dtype=float))[:,newaxis]
+    incl = radians(atleast_1d(asarray(i, dtype=float)))[:,newaxis]
+    bigOm = radians(atleast_1d(asarray(o, dtype=float)))[:,newaxis]
+    om = radians(atleast_1d(asarray(w, dtype=float)))[:,newaxis]
+
+    epochs = asarray(epochs, dtype=float)
+    if epochs.ndim == 1:
+        epochs = epochs[newaxis,:]
+
+    if ((e < 0.).any() or (e >= 1.).any()):
+        print('Eccentricity must be 0<= ecc. < 1')
+
+    # meanMotion in radians per year
+    meanMotion = 2.0 * math.pi / p
+
+    # Semi-major axis in AU
+    axis = (p**2 * mass)**(1.0/3.0)
+
+    ecc_sqrt = sqrt(1.0 - e**2)
+
+    # Mean and eccentric anomaly, shape (K, T)
+    M = meanMotion * (epochs - t0)
+    E = kepler.eccentricAnomaly(M, e)
+
+    cos_E = cos(E)
+    sin_E = sin(E)
+
+    Edot = meanMotion / (1.0 - (e * cos_E))
+
+    X = cos_E - e
+    Y = ecc_sqrt * sin_E
+
+    # Thiele-Innes Constants, shape (K, 1)
+    cos_bigOm = cos(bigOm)
+    sin_bigOm = sin(bigOm)
+    cos_i = cos(incl)
+    sin_i = sin(incl)
+    cos_om = cos(om)
+    sin_om = sin(om)
+
+    conA = axis * (cos_om * cos_bigOm  - sin_om * sin_bigOm * cos_i)
+    conB = axis * (cos_om * sin_bigOm  + sin_om * cos_bigOm * cos_i)
+    conC = axis * (sin_om * sin_i)
+    conF = axis * (-sin_om * cos_bigOm - cos_om * sin_bigOm * cos_i)
+    conG = axis * (-sin_om * sin_bigOm + cos_om * cos_bigOm * cos_i)
+    conH = axis * (cos_om * sin_i)
+
+    r = stack([(conB * X) + (conG * Y),
+               (conA * X) + (conF * Y),
+               (conC * X) + (conH * Y)], axis=-1)
+
+    v = stack([Edot * ((-conB * sin_E) + (conG * ecc_sqrt * cos_E)),
+               Edot * ((-conA * sin_E) + (conF * ecc_sqrt * cos_E)),
+               Edot * ((-conC * sin_E) + (conH * ecc_sqrt * cos_E))], axis=-1)
+
+    # Calculate accleration
+    rmag_cm = sqrt( (r**2).sum(axis=-1) ) * cc.cm_in_au
+    a = -GM[...,newaxis] * r * cc.cm_in_au / rmag_cm[...,newaxis]**3
+
+    # Unit conversions
+    # r  from AU     to arcsec
+    # v  from AU/yr  to mas/yr
+    # a  from cm/s^2 to mas/yr^2
+    dist = dist[...,newaxis]
+    r /= dist
+    v *= 1000.0 / dist
+    a *= 1000.0 * cc.sec_in_yr**2 / (cc.cm_in_au * dist)
+
+    return (r, v, a)
+
+
+def _dot(a, b):
+    return (a * b).sum(axis=-1)
+
+def xyz2kepBatch(r, v, re, ve, epoch, mass=None, dist=None):
+    """
+    Convert N position and velocity vectors (with errors) to Keplerian
+    elements in one vectorized pass. Equivalent to calling
+    Orbit.xyz2kep() once per vector, e.g. for every trial of a Monte
+    Carlo:
+
+    orb = orbits.xyz2kepBatch(r, v, None, None, refTime,
+                              mass=mass, dist=dist)
+    orb.i, orb.o, orb.w   -- (N,) arrays (deg)
+
+    Input:
+    r -- (N, 3) position vectors (arcsec)
+    v -- (N, 3) velocity vectors (km/s)
+    re, ve -- (N, 3) errors on r and v, or None for no errors
+    epoch -- epoch(s) at which r and v were observed, scalar or (N,)
+    mass, dist -- black hole mass [Msun] and distance [pc], scalars or
+                  (N,) arrays; default to objects.Constants
+
+    Output:
+    An Orbit whose elements (i, e, w, o, p, t0, ph, a) and their
+    errors are (N,) arrays and whose vectors (hvec, evec, ovec and
+    their errors) are (N, 3) arrays, in the same units as
+    Orbit.xyz2kep(). The Thiele-Innes constants are left out.
+    Unbound orbits, for which Orbit.xyz2kep() raises a ValueError,
+    get NaN elements; orb.bound is False for them.
+    """
+    cc = objects.Constants()
+
+    if mass is not None:
+        cc.mass = asarray(mass, dtype=float)
+    if dist is not None:
+        cc.dist = asarray(dist, dtype=float)
+
+    GM = cc.msun * cc.mass * cc.G
+
+    r = atleast_2d(asarray(r, dtype=float))
+    v = atleast_2d(asarray(v, dtype=float))
+    if re is None:
+        re = zeros(r.shape, dtype=float)
+    if ve is None:
+        ve = zeros(v.shape, dtype=float)
+    re = atleast_2d(asarray(re, dtype=float))
+    ve = atleast_2d(asarray(ve, dtype=float))
+    epoch = asarray(epoch, dtype=float)
+
+    # (N,) values as columns, to scale the (N, 3) vectors
+    col = lambda val: asarray(val)[...,newaxis]
+
+    # Convert position from arcsec to cm
+    r = r * col(cc.dist * cc.cm_in_au)
+    re = re * col(cc.dist * cc.cm_in_au)
+
+    # Convert velocity from km/s to cm/s
+    v = v * 1.0e5
+    ve = ve * 1.0e5
+
+    # Stars without errors give 0/0 in some of the errors, which
+    # come out as NaN just as in Orbit.xyz2kep().
+    with errstate(divide='ignore', invalid='ignore'):
+
+        r_mag = sqrt(_dot(r, r))
+        v_mag = sqrt(_dot(v, v))
+        re_mag = sqrt(_dot(r*re, r*re)) / r_mag
+        ve_mag = sqrt(_dot(v*ve, v*ve)) / v_mag
+
+        ### --- Now everything should be in CGS ---###
+
+        # Check for unbound orbits... we don't handle those here
+        bound = (v_mag > sqrt(2.0 * GM / r_mag)) == False
+
+        # Angular momentum vector
+        h = cross(r, v)
+        h_mag = sqrt(_dot(h, h))
+
+        he = zeros(h.shape, dtype=float64)
+        he[:,0] =  (re[:,1]*v[:,2])**2 + (r[:,1]*ve[:,2])**2
+        he[:,0] += (re[:,2]*v[:,1])**2 + (r[:,2]*ve[:,1])**2
+        he[:,1] =  (re[:,0]*v[:,2])**2 + (r[:,0]*ve[:,2])**2
+        he[:,1] += (re[:,2]*v[:,0])**2 + (r[:,2]*ve[:,0])**2
+        he[:,2] =  (re[:,0]*v[:,1])**2 + (r[:,0]*ve[:,1])**2
+        he[:,2] += (re[:,1]*v[:,0])**2 + (r[:,1]*ve[:,0])**2
+
+        he = sqrt(he)
+        he_mag = sqrt(_dot(h*he, h*he)) / h_mag
+
+        # Inclination
+        u = -h[:,2] / h_mag
+        incl = degrees(arccos(u))
+
+        dudx = h[:,2] * (v[:,1]*h[:,2] - v[:,2]*h[:,1]) / h_mag**3
+        dudx = dudx - (v[:,1]/h_mag)
+        dudy = h[:,2] * (v[:,2]*h[:,0] - v[:,0]*h[:,2]) / h_mag**3
+        dudy = dudy + (v[:,0]/h_mag)
+        dudz = h[:,2] * (v[:,0]*h[:,1] - v[:,1]*h[:,0]) / h_mag**3
+        dudvx = h[:,2] * (r[:,2]*h[:,1] - r[:,1]*h[:,2]) / h_mag**3
+        dudvx = dudvx + (r[:,1]/h_mag)
+        dudvy = h[:,2] * (r[:,0]*h[:,2] - r[:,2]*h[:,0]) / h_mag**3
+        dudvy = dudvy - (r[:,0]/h_mag)
+        dudvz = h[:,2] * (r[:,1]*h[:,0] - r[:,0]*h[:,1]) / h_mag**3
+
+        incl_err = (dudvx*ve[:,0])**2 + (dudvy*ve[:,1])**2 + (dudvz*ve[:,2])**2
+        incl_err += (dudx*re[:,0])**2 + (dudy*re[:,1])**2 + (dudz*re[:,2])**2
+        incl_err = incl_err / (1.0 - u**2) # derivative of acos
+        incl_err = degrees(sqrt(incl_err))
+
+        # eccentricity
+        e = (cross(v, h) / col(GM)) - (r / col(r_mag))
+        e_mag = sqrt(_dot(e, e))
+
+        # Derivatives of the eccentricity vector, (N, 3) each
+        GMc = col(GM)
+        r_mag3 = col(r_mag**3)
+        dedx = stack([(v[:,1]**2 + v[:,2]**2) / GM
+                      + (r[:,0]**2 / r_mag**3) - (1.0 / r_mag),
+                      (-v[:,0]*v[:,1] / GM) + (r[:,0]*r[:,1] / r_mag**3),
+                      (-v[:,0]*v[:,2] / GM) + (r[:,0]*r[:,2] / r_mag**3)],
+                     axis=-1)
+
+        dedy = stack([(-v[:,1]*v[:,0] / GM) + (r[:,1]*r[:,1] / r_mag**3),
+                      ((v[:,0]**2 + v[:,2]**2) / GM)
+                      + (r[:,1]**2 / r_mag**3) - (1.0 / r_mag),
+                      (-v[:,1]*v[:,2] / GM) + (r[:,1]*r[:,2] / r_mag**3)],
+                     axis=-1)
+
+        dedz = stack([(-v[:,2]*v[:,0] / GM) + (r[:,2]*r[:,0] / r_mag**3),
+                      (-v[:,2]*v[:,1] / GM) + (r[:,2]*r[:,1] / r_mag**3),
+                      ((v[:,0]**2 + v[:,1]**2) / GM)
+                      + (r[:,2]**2 / r_mag**3) - (1.0 / r_mag)], axis=-1)
+
+        dedvx = stack([-(v[:,1]*r[:,1] + v[:,2]*r[:,2]),
+                       (2.0*v[:,0]*r[:,1] - v[:,1]*r[:,0]),
+                       (2.0*v[:,0]*r[:,2] - v[:,2]*r[:,0])], axis=-1) / GMc
+
+        dedvy = stack([(2.0*v[:,1]*r[:,0] - v[:,0]*r[:,1]),
+                       -(v[:,0]*r[:,0] + v[:,2]*r[:,2]),
+                       (2.0*v[:,1]*r[:,2] - v[:,2]*r[:,1])], axis=-1) / GMc
+
+        dedvz = stack([(2.0*v[:,2]*r[:,0] - v[:,0]*r[:,2]),
+                       (2.0*v[:,2]*r[:,1] - v[:,1]*r[:,2]),
+                       -(v[:,0]*r[:,0] + v[:,1]*r[:,1])], axis=-1) / GMc
+
+        ee_mag = (_dot(dedx, e) * re[:,0] / e_mag)**2
+        ee_mag += (_dot(dedy, e) * re[:,1] / e_mag)**2
+        ee_mag += (_dot(dedz, e) * re[:,2] / e_mag)**2
+        ee_mag += (_dot(dedvx, e) * ve[:,0] / e_mag)**2
+        ee_mag += (_dot(dedvy, e) * ve[:,1] / e_mag)**2
+        ee_mag += (_dot(dedvz, e) * ve[:,2] / e_mag)**2
+
+        ee = zeros(e.shape, dtype=float64)
+        ee[:,0] = (v[:,1]*he[:,2])**2 + (ve[:,1]*h[:,2])**2
+        ee[:,0] += (v[:,2]*he[:,1])**2 + (ve[:,2]*h[:,1])**2
+
+        ee[:,1] = (v[:,2]*he[:,0])**2 + (ve[:,2]*h[:,0])**2
+        ee[:,1] += (v[:,0]*he[:,2])**2 + (ve[:,0]*h[:,2])**2
+
+        ee[:,2] = (v[:,0]*he[:,1])**2 + (ve[:,0]*h[:,1])**2
+        ee[:,2] += (v[:,1]*he[:,0])**2 + (ve[:,1]*h[:,0])**2
+
+        ee /= GMc**2
+        ee += (r / col(r_mag))**2 * ((re / r)**2 + col(re_mag / r_mag)**2)
+        ee = sqrt(ee)
+
+        # Line of nodes vector
+        Om = cross(array([0.0, 0.0, 1.0]), h)
+        Om_mag = sqrt(_dot(Om, Om))
+
+        Ome = stack([he[:,1], he[:,2], zeros(len(he))], axis=-1)
+
+        # bigOmega = PA to the ascending node
+        bigOm = degrees(arctan2(Om[:,0], Om[:,1]))
+
+        bigOme =  v[:,2]**2 * _dot(re*h, re*h)
+        bigOme += r[:,2]**2 * _dot(ve*h, ve*h)
+        bigOme /= Om_mag**4
+        bigOme = degrees( sqrt(bigOme) )
+
+        # omega = angle from bigOmega to periapse
+        cos_om = _dot(Om / col(Om_mag), e / col(e_mag))
+        omega = degrees( arccos(cos_om) )
+
+        # dot product of Om and e
+        Om_e = _dot(Om, e)
+
+        dodx = -(Om_e * Om[:,0] * v[:,2]) / (e_mag * Om_mag**3)
+        dodx += ((e[:,0]*v[:,2]) + _dot(Om, dedx)) / (e_mag * Om_mag)
+        dodx -= (Om_e * _dot(e, dedx)) / (e_mag**3 * Om_mag)
+
+        dody = -(Om_e*Om[:,1]*v[:,2]) / (e_mag * Om_mag**3)
+        dody += ((e[:,1]*v[:,2]) + _dot(Om, dedy)) / (e_mag * Om_mag)
+        dody -= (Om_e * _dot(e, dedy)) / (e_mag**3 * Om_mag)
+
+        dodz = (Om_e * _dot(Om, v)) / (e_mag * Om_mag**3)
+        dodz += (((-e[:,0]*v[:,0]) + (-e[:,1]*v[:,1]) + _dot(Om, dedz))
+                 / (e_mag*Om_mag))
+        dodz -= (Om_e * _dot(e, dedz)) / (e_mag**3 * Om_mag**3)
+
+        dodvx = (Om_e*Om[:,0]*r[:,2]) / (e_mag * Om_mag**3)
+        dodvx += ((-e[:,0]*r[:,2]) + _dot(Om, dedvx)) / (e_mag * Om_mag)
+        dodvx -= (Om_e * _dot(e, dedvx)) / (e_mag**3 * Om_mag)
+
+        dodvy = (Om_e*Om[:,1]*r[:,2]) / (e_mag * Om_mag**3)
+        dodvy += ((-e[:,1]*r[:,2]) + _dot(Om, dedvy)) / (e_mag * Om_mag)
+        dodvy -= (Om_e * _dot(e, dedvy)) / (e_mag**3 * Om_mag)
+
+        dodvz = (-Om_e * _dot(Om, r)) / (e_mag * Om_mag**3)
+        dodvz += (((e[:,0]*r[:,0]) + (e[:,1]*r[:,1]) + _dot(Om, dedvz))
+                  / (e_mag*Om_mag))
+        dodvz -= (Om_e * _dot(e, dedvz)) / (e_mag**3 * Om_mag)
+
+        omega_err = (dodvx*ve[:,0])**2 + (dodvy*ve[:,1])**2 + (dodvz*ve[:,2])**2
+        omega_err += (dodx*re[:,0])**2 + (dody*re[:,1])**2 + (dodz*re[:,2])**2
+        omega_err = omega_err / (1.0 - cos_om**2)
+        omega_err = degrees(sqrt(omega_err))
+
+        omega_err = where(omega_err > 180.0, 179.999, omega_err)
+        omega = where(e[:,2] < 0, 360.0 - omega, omega)
+
+        # Semi major axis
+        tmp = (2.0 / r_mag) - (v_mag**2 / GM)
+        tmp = where(tmp == 0, 0.00001, tmp)
+        a = 1.0 / tmp
+
+        ae = (_dot(r * re / r_mag3, r * re / r_mag3)
+              + _dot(v * ve / GMc, v * ve / GMc))
+        ae = sqrt(ae) * 2.0 * a**2
+
+        # Period
+        a_AU = a / cc.cm_in_au
+        ae_AU = ae / cc.cm_in_au
+
+        p = sqrt((a_AU / cc.mass) * a_AU**2)
+        pe = (3.0/2.0) * p * ae_AU / a_AU
+
+        #----------
+        # Thiele-Innes Constants
+        #----------
+        cos_om = cos( radians(omega) )
+        sin_om = sin( radians(omega) )
+        cos_bigOm = cos( radians(bigOm) )
+        sin_bigOm = sin( radians(bigOm) )
+        cos_i = cos( radians(incl) )
+        sin_i = sin( radians(incl) )
+
+        conA = a * (cos_om * cos_bigOm  - sin_om * sin_bigOm * cos_i)
+        conB = a * (cos_om * sin_bigOm  + sin_om * cos_bigOm * cos_i)
+        conF = a * (-sin_om * cos_bigOm - cos_om * sin_bigOm * cos_i)
+        conG = a * (-sin_om * sin_bigOm + cos_om * cos_bigOm * cos_i)
+
+        # Eccentric Anomaly
+        cos_E = (r[:,1]*conG - r[:,0]*conF) / (conA*conG - conF*conB)
+        cos_E += e_mag
+        sin_E = (r[:,0]*conA - r[:,1]*conB) / (conA*conG - conF*conB)
+        sin_E /= sqrt(1.0 - e_mag**2)
+        eccA = arctan2(sin_E, cos_E)
+
+        # Eccentric Anomaly
+        eccAe = (r_mag / (e_mag * a))**2 * ((re_mag / r_mag)**2 + (ae / a)**2)
+        eccAe += (tmp * ee_mag / e_mag)**2
+        eccAe /= (1.0 - tmp**2)
+        eccAe = sqrt(eccAe)
+
+        # Time of periapse passage
+        tmp = p / (2.0 * math.pi)
+        t0 = tmp * (eccA - e_mag*sin_E)
+        t0 = epoch - t0
+
+        t0e3 = (tmp * (eccA - e_mag*sin_E) * pe / p)**2
+        t0e3 = t0e3 + (tmp * (1 - e_mag*cos_E) * eccAe)**2
+        t0e3 = t0e3 + (tmp * sin_E * ee_mag)**2
+        t0e3 = sqrt(t0e3)
+        t0e = t0e3
+
+        phase = abs(epoch - t0) * 2.0 / p
+        phaseErr = sqrt((2.0*t0e/p)**2 + (phase*pe/p)**2)
+
+        # Fix bigOmega
+        bigOm = where(bigOm < 0.0, bigOm + 360.0, bigOm)
+
+    # Orbital Parameters
+    orb = Orbit()
+    orb.bound = bound
+    elements = [('w', omega), ('we', omega_err), ('o', bigOm), ('oe', bigOme),
+                ('i', incl), ('ie', incl_err), ('e', e_mag), ('ee', ee_mag),
+                ('p', p), ('pe', pe), ('t0', t0), ('t0e', t0e),
+                ('ph', phase), ('phe', phaseErr), ('a', a)]
+    for (name, val) in elements:
+        setattr(orb, name, where(bound, val, nan))
+
+    # Vectors useful for later calculations
+    vectors = [('hvec', h), ('hevec', he), ('evec', e), ('eevec', ee),
+               ('ovec', Om), ('oevec', Ome)]
+    for (name, val) in vectors:
+        setattr(orb, name, where(col(bound), val, nan))
+
+    return orb
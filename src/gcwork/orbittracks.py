@@ -0,0 +1,193 @@
+"""
+Orbit tracks (projected x, y paths on the sky) for plotting the orbits
+in an orbits.dat file.
+
+Tracks are sampled uniformly in eccentric anomaly instead of in time,
+which puts more points around periapse, where a star moves fastest.
+It also puts fewer points along the slow outer parts of long-period
+orbits. Each track is stored on disk under a key built from its orbital
+elements, the black hole mass and distance, and the sampling, so it is
+only computed once:
+
+    store = orbittracks.OrbitTrackStore(mass=4.e6, dist=8000.)
+    (tracks, names) = store.load('orbits.dat')
+"""
+import os
+import math
+import hashlib
+import numpy as np
+from gcwork import objects
+from gcwork import kepler
+from gcwork import startable
+
+# Bump whenever the track sampling or the stored layout changes.
+TRACK_VERSION = 1
+
+
+def adaptiveTrack(p, t0, e, i, o, w, tStart=1994., tEnd=2020.,
+                  mass=None, dist=None, pointsPerOrbit=360, minPoints=16):
+    """
+    Projected track of an orbit between tStart and tEnd, sampled
+    uniformly in eccentric anomaly. The track is cut off after one
+    revolution, since after that it only retraces itself.
+
+    @param p: period (yr)
+    @param t0: time of periapse (yr)
+    @param e: eccentricity
+    @param i: inclination (deg)
+    @param o: angle to the ascending node, bigOmega (deg)
+    @param w: argument of periapse, omega (deg)
+    @kwparam mass: Black hole mass in solar mass units
+                   (default pulled from Constants).
+    @kwparam dist: Black hole distance in parsec
+                   (default pulled from Constants).
+    @kwparam pointsPerOrbit: number of points for a full revolution
+    @kwparam minPoints: fewest points in any track
+
+    @return (t, xy): epochs (yr) of the samples and a (N, 2) array of
+        the x and y positions (arcsec)
+    """
+    cc = objects.Constants()
+    if mass is not None:
+        cc.mass = mass
+    if dist is not None:
+        cc.dist = dist
+
+    meanMotion = 2.0 * math.pi / p
+    M0 = meanMotion * (tStart - t0)
+    M1 = meanMotion * (tEnd - t0)
+    M1 = min(M1, M0 + 2.0 * math.pi)
+
+    (E0, E1) = kepler.eccentricAnomaly([M0, M1], e)
+    nPoints = int(math.ceil(pointsPerOrbit * (E1 - E0) / (2.0 * math.pi)))
+    nPoints = max(nPoints + 1, minPoints)
+
+    # Sample in E and invert Kepler's equation analytically for t,
+    # so no iterative solve is needed per point.
+    E = np.linspace(E0, E1, nPoints)
+    cos_E = np.cos(E)
+    sin_E = np.sin(E)
+    t = t0 + (E - e * sin_E) / meanMotion
+
+    X = cos_E - e
+    Y = math.sqrt(1.0 - e**2) * sin_E
+
+    # Semi-major axis in AU
+    axis = (p**2 * cc.mass)**(1.0/3.0)
+
+    # Thiele-Innes Constants (only the ones for the plane of the sky)
+    cos_bigOm = math.cos(math.radians(o))
+    sin_bigOm = math.sin(math.radians(o))
+    cos_i = math.cos(math.radians(i))
+    cos_om = math.cos(math.radians(w))
+    sin_om = math.sin(math.radians(w))
+
+    conA = axis * (cos_om * cos_bigOm  - sin_om * sin_bigOm * cos_i)
+    conB = axis * (cos_om * sin_bigOm  + sin_om * cos_bigOm * cos_i)
+    conF = axis * (-sin_om * cos_bigOm - cos_om * sin_bigOm * cos_i)
+    conG = axis * (-sin_om * sin_bigOm + cos_om * cos_bigOm * cos_i)
+
+    xy = np.empty((nPoints, 2), dtype=float)
+    xy[:,0] = (conB * X) + (conG * Y)
+    xy[:,1] = (conA * X) + (conF * Y)
+
+    # AU to arcsec
+    xy /= cc.dist
+
+    return (t, xy)
+
+
+def readOrbits(orbitsFile):
+    """
+    Read an orbits.dat file (name, P, A, t0, e, i, Omega, omega, ...).
+
+    @return (names, elements): list of star names and a (K, 6) array of
+        (p, t0, e, i, o, w) for each star
+    """
+    tab = np.atleast_2d(np.genfromtxt(orbitsFile, dtype=str))
+    names = tab[:,0].tolist()
+    elements = tab[:,[1,3,4,5,6,7]].astype(float)
+
+    return (names, elements)
+
+
+class OrbitTrackStore(object):
+    """
+    Adaptive orbit tracks, kept in memory and in
+    <cacheDir>/orbits/<key>.npy. The key is built from the orbital
+    elements, mass, distance, time range and sampling, so the cached
+    tracks stay valid when orbits.dat is edited. Only rows that are new
+    or that changed are recomputed.
+
+    After each load(), numComputed holds the number of tracks that had
+    to be computed (0 if everything came from the store).
+    """
+    def __init__(self, mass=None, dist=None, tStart=1994., tEnd=2020.,
+                 pointsPerOrbit=360, cacheDir=None):
+        cc = objects.Constants()
+        self.mass = float(mass if mass is not None else cc.mass)
+        self.dist = float(dist if dist is not None else cc.dist)
+        self.tStart = float(tStart)
+        self.tEnd = float(tEnd)
+        self.pointsPerOrbit = int(pointsPerOrbit)
+
+        if cacheDir is None:
+            cacheDir = startable.defaultCacheDir()
+        self.cacheDir = os.path.join(cacheDir, 'orbits')
+
+        self.tracks = {}
+        self.numComputed = 0
+
+    def trackKey(self, elements):
+        """Key for the track of one set of (p, t0, e, i, o, w)."""
+        key = [TRACK_VERSION] + [float(x) for x in elements]
+        key += [self.mass, self.dist, self.tStart, self.tEnd,
+                self.pointsPerOrbit]
+        key = ' '.join([repr(x) for x in key])
+        return hashlib.md5(key.encode()).hexdigest()
+
+    def getTrack(self, elements):
+        """
+        The (N, 2) track for one set of (p, t0, e, i, o, w), from
+        memory, from disk, or computed and saved.
+        """
+        key = self.trackKey(elements)
+        if key in self.tracks:
+            return self.tracks[key]
+
+        fileName = os.path.join(self.cacheDir, key + '.npy')
+        try:
+            xy = np.load(fileName)
+        except (OSError, ValueError):
+            (t, xy) = adaptiveTrack(*elements, tStart=self.tStart,
+                                    tEnd=self.tEnd, mass=self.mass,
+                                    dist=self.dist,
+                                    pointsPerOrbit=self.pointsPerOrbit)
+            self.numComputed += 1
+            self._save(fileName, xy)
+
+        self.tracks[key] = xy
+        return xy
+
+    def _save(self, fileName, xy):
+        try:
+            os.makedirs(self.cacheDir, exist_ok=True)
+            tmpName = '%s.tmp%d.npy' % (fileName[:-4], os.getpid())
+            np.save(tmpName, xy)
+            os.replace(tmpName, fileName)
+        except OSError as e:
+            print( 'OrbitTrackStore: could not write %s: %s' % (fileName, e))
+
+    def load(self, orbitsFile):
+        """
+        Tracks for every star in an orbits.dat file.
+
+        @return (tracks, names): list of (N, 2) arrays of x and y
+            (arcsec), and the list of star names
+        """
+        (names, elements) = readOrbits(orbitsFile)
+
+        self.numComputed = 0
+        tracks = [self.getTrack(row) for row in elements]
+
+        return (tracks, names)
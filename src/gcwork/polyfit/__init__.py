@@ -1,2 +1,2 @@
-__all__ = ["accel"]
+__all__ = ["accel", "batchfit", "tracks"]
 
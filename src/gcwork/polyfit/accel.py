@@ -7,6 +7,7 @@ from gcwork import starset
 from gcwork import objects
 from gcwork import young
 from gcwork import starTables
+from gcwork.polyfit import tracks
 from scipy import stats
 import pdb
 import random
@@ -806,24 +807,21 @@ def minDistance(xfit1,yfit1,xfit2,yfit2,t0,trange,pause=0):
     distance between them by using the acceleration fits. 
     xfit1 = [x0, vx, ax]
     yfit1 = [y0, vy, ay]
+
+    Both fits are at epoch t0. The minimum is found exactly over
+    trange (see gcwork.polyfit.tracks.minDistance).
     
     HISTORY: 2010-01-13 - T. Do
     """
-    time = np.arange(trange[0]-t0,trange[1]-t0+1,0.1)
-    xpos1 = poly2(xfit1, time)
-    ypos1 = poly2(yfit1, time)
-    xpos2 = poly2(xfit2, time)
-    ypos2 = poly2(yfit2, time)
-
-    distance = np.sqrt((xpos1-xpos2)**2 + (ypos1 - ypos2)**2)
+    (dmin, tmin) = tracks.minDistance(xfit1, yfit1, xfit2, yfit2,
+                                      t0, t0, trange)
     if pause:
+        time = np.linspace(trange[0]-t0, trange[1]-t0, 500)
         clf()
-        plot(xpos1,ypos1)
-        plot(xpos2,ypos2)
-        #print( time)
+        plot(poly2(xfit1, time), poly2(yfit1, time))
+        plot(poly2(xfit2, time), poly2(yfit2, time))
         show()
-        #pdb.set_trace()
-    return np.amin(distance)
+    return dmin[0]
     
 def nonPhysical(rootDir='./', align='align/align_d_rms_1000_abs_t',
                 poly='polyfit_d/fit', points='points_d/', sigma=5,
@@ -1381,74 +1379,153 @@ def accelCheck(x,xerr,y,yerr,time, t0 = 0, n = 4, name = None):
 ##     else:
 ##         show()
     
+def classifyAccel(x, y, ax, axe, ay, aye, sigma=3, arcsec=True, radial=False):
+    """
+    Radial and tangential accelerations, the line of sight distances
+    they allow for a star bound to Sgr A*, and the tests of whether
+    they are physical, for many stars at once. Unphysical accelerations
+    are defined as either: 1. Significant tangential acceleration
+    2. Significant positive radial acceleration 3. Negative acceleration
+    greater than the maximum allowed at the 2D position.
+
+    @param x, y: positions (arcsec), scalars or (N,) arrays
+    @param ax, axe, ay, aye: accelerations and errors in x and y
+    @kwparam sigma: significance of the tests
+    @kwparam arcsec: the accelerations are in arcsec/yr^2 and are
+        converted to km/s/yr. Otherwise they must be in km/s/yr already.
+    @kwparam radial: ax, ay are already the tangential and radial
+        accelerations (polyfits of 'Radial' align output)
+
+    @return (N,) structured array with the fields
+        r           - projected radius (arcsec)
+        ar, are     - radial acceleration and error (km/s/yr)
+        at, ate     - tangential acceleration and error (km/s/yr)
+        atot, atoterr - total acceleration and error (km/s/yr)
+        a2d         - largest allowed radial acceleration at r (z = 0)
+        arSig, atSig - ar/are and at/ate
+        amaxSig     - (a2d - ar)/are
+        zmin, zmax  - range of line of sight distances (arcsec) for
+                      which the radial acceleration is within sigma of
+                      a bound orbit (zmax = inf if ar may be 0)
+        tangential  - significant tangential acceleration
+        posRadial   - significant positive radial acceleration
+        tooLarge    - radial acceleration larger than allowed
+        nonPhysical - any of the three
+    """
+    cc = objects.Constants()
+    x = np.atleast_1d(np.asarray(x, dtype=float))
+    y = np.atleast_1d(np.asarray(y, dtype=float))
+    ax = np.atleast_1d(np.asarray(ax, dtype=float))
+    ay = np.atleast_1d(np.asarray(ay, dtype=float))
+    axe = np.atleast_1d(np.asarray(axe, dtype=float))
+    aye = np.atleast_1d(np.asarray(aye, dtype=float))
+
+    with np.errstate(divide='ignore', invalid='ignore'):
+        # Lets do radial/tangential
+        r = np.sqrt(x**2 + y**2)
+        if radial:
+            (at, ar, ate, are) = (ax, ay, axe, aye)
+        else:
+            ar = ((ax*x) + (ay*y)) / r
+            at = ((ax*y) - (ay*x)) / r
+            are = np.sqrt((axe*x)**2 + (aye*y)**2) / r
+            ate = np.sqrt((axe*y)**2 + (aye*x)**2) / r
+
+        # Total acceleration
+        atot = np.hypot(ax, ay)
+        atoterr = np.sqrt((ax*axe)**2 + (ay*aye)**2) / atot
+
+        # Calculate the acceleration limit set by the projected
+        # radius: in cm/s^2, then in km/s/yr
+        r2d = r * cc.dist * cc.cm_in_au
+        a2d = -cc.G * cc.mass * cc.msun / r2d**2
+        a2d *= cc.sec_in_yr / 1.0e5
+
+        if arcsec:
+            # convert between arcsec/yr^2 to km/s/yr
+            ar = ar * cc.asy_to_kms
+            are = are * cc.asy_to_kms
+            at = at * cc.asy_to_kms
+            ate = ate * cc.asy_to_kms
+            atot = atot * cc.asy_to_kms
+            atoterr = atoterr * cc.asy_to_kms
+
+        # ar(z) = a2d * r^3 / (r^2 + z^2)^1.5, so the least and most
+        # negative radial accelerations give the largest and smallest z
+        def zFromAccel(a):
+            z = r * np.sqrt((a2d / a)**(2.0/3.0) - 1.0)
+            z = np.where(a >= 0, np.inf, z)
+            return np.where(a <= a2d, 0.0, z)
+
+        zmin = zFromAccel(ar - sigma*are)
+        zmax = zFromAccel(ar + sigma*are)
+
+        table = np.zeros(len(r), dtype=[('r', float), ('ar', float), ('are', float),
+                                        ('at', float), ('ate', float),
+                                        ('atot', float), ('atoterr', float),
+                                        ('a2d', float), ('arSig', float),
+                                        ('atSig', float), ('amaxSig', float),
+                                        ('zmin', float), ('zmax', float),
+                                        ('tangential', bool), ('posRadial', bool),
+                                        ('tooLarge', bool), ('nonPhysical', bool)])
+        table['r'] = r
+        table['ar'], table['are'] = ar, are
+        table['at'], table['ate'] = at, ate
+        table['atot'], table['atoterr'] = atot, atoterr
+        table['a2d'] = a2d
+        table['arSig'] = ar / are
+        table['atSig'] = at / ate
+        table['amaxSig'] = (a2d - ar) / are
+        table['zmin'], table['zmax'] = zmin, zmax
+
+        # tests to see if the accelerations are physical
+        table['tangential'] = abs(at/ate) > sigma
+        table['posRadial'] = (ar - (sigma*are)) > 0
+        table['tooLarge'] = ar + (sigma*are) < a2d
+    table['nonPhysical'] = table['tangential'] | table['posRadial'] | table['tooLarge']
+
+    return table
+
+def selectAccel(table, r2d=None, sigAcc=5.0, sigTan=3.0, sigMax=3.0, rmin=0.5):
+    """
+    Select the significantly accelerating stars of a classifyAccel()
+    table, and split them into physical and non-physical ones. Only
+    uses the table, so different thresholds are quick to try.
+
+    Significant: abs(ar/are) > sigAcc OR abs(at/ate) > sigAcc
+    Physical: ar/are < -sigAcc AND abs(at/ate) < sigTan AND
+        (amax - ar)/are < sigMax
+    Non-physical: significant but not physical
+    Both only count stars beyond rmin.
+
+    @kwparam r2d: projected radii used for the rmin cut (default: the
+        r column of the table)
+    @return (accelerating, physical, nonPhysical) bool arrays
+    """
+    if r2d is None:
+        r2d = table['r']
+    with np.errstate(invalid='ignore'):
+        far = r2d > rmin
+        accelerating = ((abs(table['atSig']) > sigAcc) |
+                        (abs(table['arSig']) > sigAcc)) & far
+        physical = ((table['arSig'] < -sigAcc) & (abs(table['atSig']) < sigTan) &
+                    (table['amaxSig'] < sigMax) & far)
+    return (accelerating, physical, accelerating & ~physical)
+
 def isPhysical(x, y, ax, axe, ay, aye, arcsec = None, sigma = 3):
     """
     Return a True or False depending on whether the acceleration
     measurement is physical. Unphysical accelerations are defined as
     either: 1. Significant tangential acceleration 2. Significant
     positive radial acceleration 3. Negative acceleration greater than
-    the maximum allowed at the 2D position.
+    the maximum allowed at the 2D position. See classifyAccel() for
+    the arguments; for arrays of stars the result has one row per star.
 
     RETURN: status array where 1 is true [tangential, pos. radial, > max radial]
     """
-    
-    status = np.zeros(3)
-    # Lets do radial/tangential
-    r = np.sqrt(x**2 + y**2)
-    ar = ((ax*x) + (ay*y)) / r
-    at = ((ax*y) - (ay*x)) / r
-    are = np.sqrt((axe*x)**2 + (aye*y)**2) / r
-    ate = np.sqrt((axe*y)**2 + (aye*x)**2) / r
-
-    # Total acceleration
-    atot = py.hypot(ax, ay)
-    atoterr = np.sqrt((ax*axe)**2 + (ay*aye)**2) / atot
-
-    # Calculate the acceleration limit set by the projected radius
-
-    if arcsec:
-        #convert to mks
-        cc = objects.Constants()
-        
-        # Convert into cm
-        r2d = r * cc.dist * cc.cm_in_au
-
-        rarc =np.arange(0.01,10.0,0.01)
-        rsim = rarc * cc.dist * cc.cm_in_au
-    
-        # acc1 in cm/s^2
-        a2d = -cc.G * cc.mass * cc.msun / r2d**2
-        a2dsim = -cc.G * cc.mass * cc.msun / rsim**2
-        
-        # acc1 in km/s/yr
-    
-        a2d *= cc.sec_in_yr / 1.0e5
-
-        #a2d *= 1000.0 / cc.asy_to_kms
-
-        # convert between arcsec/yr^2 to km/s/yr
-        ar *= cc.asy_to_kms
-        are *= cc.asy_to_kms
-
-        at *= cc.asy_to_kms
-        ate *= cc.asy_to_kms
-
-        a2dsim *= cc.sec_in_yr / 1.0e5
-        #a2dsim *= 1000.0 / cc.asy_to_kms
-
-    # tests to see if the accelerations are physical
-    if (abs(at/ate) > sigma):
-        #print( 'significant tangential acceleration')
-        status[0] = 1
-
-    #print( 'radial acceleration %f +- %f' % (ar, are))
-    #print( 'tangential acceleration %f +- %f' % (at, ate))
-    if ((ar - (sigma*are)) > 0):
-        #print( 'positive radial acceleration')
-        status[1] = 1
-
-    if (ar + (sigma*are) < a2d):
-        #print( 'too large radial acceleration')
-        status[2] = 1
-
+    table = classifyAccel(x, y, ax, axe, ay, aye, sigma=sigma, arcsec=arcsec)
+    status = np.column_stack((table['tangential'], table['posRadial'],
+                              table['tooLarge'])).astype(float)
+    if np.ndim(x) == 0:
+        return status[0]
     return status
@@ -0,0 +1,221 @@
+"""
+Weighted polynomial fits of star positions vs. time, for all stars at
+once. This does the same job as an external polyfit run (the
+.linearFormal/.accelFormal + .lt0/.t0 files), but in process:
+
+    res = batchfit.fitPolynomials(t, x, xerr, 2)
+    res.coeffs[:,2]     - x accelerations (2nd derivative at t0)
+
+Coefficients follow the polyfit convention of derivatives at t0, i.e.
+the model is sum_k coeffs[k] * (t - t0)**k / k!
+
+The normal equations of every star are built from weighted moments of
+the epochs and solved as one stacked array, and fitOrders() reuses the
+same moments for every polynomial order. halfSamples() and fitDraws()
+do the same for the bootstrap draws of a single star.
+"""
+import math
+import numpy as np
+from scipy import stats
+
+
+class PolyfitResult(object):
+    """Fit results for N stars and a polynomial of the given order.
+
+    order    - polynomial order
+    t0       - (N,) reference epoch of each fit
+    coeffs   - (N, order+1) position, velocity, acceleration, ... at t0
+    coeffErr - (N, order+1) 1 sigma errors on coeffs
+    cov      - (N, order+1, order+1) covariance matrices of coeffs
+    chi2     - (N,) chi-square of each fit
+    nPoints  - (N,) number of points used
+    dof      - (N,) nPoints - (order+1)
+    q        - (N,) probability of a chi2 at least this large
+
+    Stars with fewer than order+1 points have NaN coefficients.
+    """
+    def __init__(self, order, t0, coeffs, cov, chi2, nPoints):
+        self.order = order
+        self.t0 = t0
+        self.coeffs = coeffs
+        self.cov = cov
+        self.coeffErr = np.sqrt(np.diagonal(cov, axis1=1, axis2=2))
+        self.chi2 = chi2
+        self.nPoints = nPoints
+        self.dof = nPoints - (order + 1)
+
+        self.q = np.full(len(chi2), np.nan)
+        ok = (self.dof > 0) & np.isfinite(chi2)
+        self.q[ok] = stats.chi2.sf(chi2[ok], self.dof[ok])
+
+    def getChi2red(self):
+        dof = np.where(self.dof > 0, self.dof, np.nan)
+        return self.chi2 / dof
+    chi2red = property(fget=getChi2red, doc="Reduced chi-square")
+
+    def evaluate(self, t, rows=None):
+        """Model positions at epochs t, (T,) or (N, T). Returns (N, T),
+        or only the given rows (stars) if rows is set."""
+        if rows is None:
+            rows = slice(None)
+        t0 = self.t0[rows]
+        return _evaluate(self.coeffs[rows], np.atleast_2d(t) - t0[:,np.newaxis])
+
+
+def _evaluate(coeffs, dt):
+    # Horner's scheme for sum_k coeffs[:,k] * dt**k / k!
+    order = coeffs.shape[1] - 1
+    model = np.zeros(dt.shape) + coeffs[:,order:order+1]
+    for k in range(order - 1, -1, -1):
+        model = model * dt / (k + 1) + coeffs[:,k:k+1]
+    return model
+
+def _prepare(t, x, xerr, mask):
+    """Broadcast the inputs to (N, T) and turn the errors into
+    weights, with zero weight for every point that is not used."""
+    x = np.asarray(x, dtype=float)
+    xerr = np.asarray(xerr, dtype=float)
+    t = np.broadcast_to(np.asarray(t, dtype=float), x.shape)
+
+    if mask is None:
+        mask = np.ones(x.shape, dtype=bool)
+    mask = mask & np.isfinite(t) & np.isfinite(x) & np.isfinite(xerr)
+    mask &= (xerr > 0)
+
+    w = np.zeros(x.shape, dtype=float)
+    w[mask] = 1.0 / xerr[mask]**2
+
+    return (t, np.where(mask, x, 0.0), w, mask)
+
+def weightedT0(t, xerr, mask=None):
+    """
+    Polyfit's reference epoch for each star: the error-weighted mean
+    time of its points, which decorrelates position and velocity.
+
+    @param t: epochs, (T,) or (N, T)
+    @param xerr: positional errors, (N, T)
+    @param mask: (N, T) bool array of points to use (default: all
+        points with finite values and xerr > 0)
+    @return t0: (N,) array, NaN for stars without points
+    """
+    (t, x, w, mask) = _prepare(t, np.zeros(np.shape(xerr)), xerr, mask)
+    return _weightedT0(t, w)
+
+def _weightedT0(t, w):
+    sumW = w.sum(axis=1)
+    sumWT = (w * np.where(w > 0, t, 0.0)).sum(axis=1)
+    t0 = np.full(len(sumW), np.nan)
+    t0[sumW > 0] = sumWT[sumW > 0] / sumW[sumW > 0]
+    return t0
+
+def fitOrders(t, x, xerr, orders, t0=None, mask=None):
+    """
+    Fit polynomials of several orders to the positions of N stars.
+
+    @param t: epochs, (T,) shared by all stars or (N, T)
+    @param x: positions, (N, T)
+    @param xerr: positional errors, (N, T)
+    @param orders: list of polynomial orders (e.g. [1, 2, 3])
+    @kwparam t0: (N,) reference epochs (default: weightedT0())
+    @kwparam mask: (N, T) bool array of points to use (default: all
+        points with finite values and xerr > 0)
+    @return dictionary of order -> PolyfitResult
+    """
+    (t, x, w, mask) = _prepare(t, x, xerr, mask)
+    numStars = x.shape[0]
+    nPoints = mask.sum(axis=1)
+
+    if t0 is None:
+        t0 = _weightedT0(t, w)
+    t0 = np.broadcast_to(np.asarray(t0, dtype=float), (numStars,)).copy()
+
+    # Fit in dt / scale so the normal matrices stay well conditioned
+    # for high orders, then scale back to derivatives at t0.
+    dt = np.where(mask, t - np.where(np.isfinite(t0), t0, 0.0)[:,np.newaxis], 0.0)
+    scale = np.abs(dt).max(axis=1)
+    scale[scale == 0] = 1.0
+    u = dt / scale[:,np.newaxis]
+
+    # Weighted moments sum(w u^j) and sum(w x u^k) for all orders
+    maxOrder = max(orders)
+    uPow = np.ones_like(u)
+    moments = np.empty((numStars, 2 * maxOrder + 1))
+    rhs = np.empty((numStars, maxOrder + 1))
+    for j in range(2 * maxOrder + 1):
+        moments[:,j] = (w * uPow).sum(axis=1)
+        if j <= maxOrder:
+            rhs[:,j] = (w * x * uPow).sum(axis=1)
+        uPow = uPow * u
+
+    results = {}
+    for order in orders:
+        nc = order + 1
+        kk = np.arange(nc)
+        normal = moments[:, kk[:,np.newaxis] + kk[np.newaxis,:]]
+
+        good = (nPoints >= nc) & np.isfinite(t0)
+        cov = np.full((numStars, nc, nc), np.nan)
+        if good.any():
+            try:
+                cov[good] = np.linalg.inv(normal[good])
+            except np.linalg.LinAlgError:
+                cov[good] = np.linalg.pinv(normal[good])
+
+        coeffs = np.einsum('nkl,nl->nk', cov, rhs[:,:nc])
+
+        # Back from the u^k basis to derivatives at t0
+        factor = np.array([math.factorial(k) for k in kk], dtype=float)
+        factor = factor / scale[:,np.newaxis]**kk
+        coeffs = coeffs * factor
+        cov = cov * factor[:,:,np.newaxis] * factor[:,np.newaxis,:]
+
+        resid = np.where(mask, x - _evaluate(coeffs, dt), 0.0)
+        chi2 = (w * resid**2).sum(axis=1)
+        chi2[~good] = np.nan
+
+        results[order] = PolyfitResult(order, t0, coeffs, cov, chi2, nPoints)
+
+    return results
+
+def fitPolynomials(t, x, xerr, order, t0=None, mask=None):
+    """
+    Fit a polynomial of the given order to the positions of N stars.
+    See fitOrders() for the arguments.
+
+    @return PolyfitResult
+    """
+    return fitOrders(t, x, xerr, [order], t0=t0, mask=mask)[order]
+
+def halfSamples(numPoints, n, seed=None):
+    """
+    Index sets for a half-sample bootstrap: n draws of numPoints//2
+    different points each, all drawn at once.
+
+    @param numPoints: number of points to draw from
+    @param n: number of draws
+    @kwparam seed: seed or numpy.random.Generator, for reproducible draws
+    @return (n, numPoints//2) int array, one draw per row
+    """
+    rng = np.random.default_rng(seed)
+    keys = rng.random((n, numPoints))
+    return np.argsort(keys, axis=1)[:, :numPoints // 2]
+
+def fitDraws(t, x, xerr, orders, draws, t0=None):
+    """
+    Fit polynomials to many subsets of the points of one star at once,
+    e.g. the draws of a bootstrap.
+
+    @param t: (T,) epochs of the star
+    @param x: (T,) positions
+    @param xerr: (T,) positional errors
+    @param orders: list of polynomial orders
+    @param draws: (n, m) array of point indices, one subset per row
+    @kwparam t0: reference epoch, scalar or (n,) (default: weightedT0()
+        of each subset)
+    @return dictionary of order -> PolyfitResult with one row per draw
+    """
+    draws = np.asarray(draws, dtype=int)
+    t = np.asarray(t, dtype=float)[draws]
+    x = np.asarray(x, dtype=float)[draws]
+    xerr = np.asarray(xerr, dtype=float)[draws]
+    return fitOrders(t, x, xerr, orders, t0=t0)
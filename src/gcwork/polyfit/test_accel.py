@@ -0,0 +1,127 @@
+import numpy as np
+from gcwork import objects
+from gcwork.polyfit import accel
+
+
+def old_components(x, y, ax, axe, ay, aye, arcsec):
+    """The per-star arithmetic of the original scalar isPhysical. It
+    only computed a2d when arcsec was set (and raised a NameError
+    otherwise), so here a2d is in km/s/yr either way."""
+    cc = objects.Constants()
+    r = np.sqrt(x**2 + y**2)
+    ar = ((ax*x) + (ay*y)) / r
+    at = ((ax*y) - (ay*x)) / r
+    are = np.sqrt((axe*x)**2 + (aye*y)**2) / r
+    ate = np.sqrt((axe*y)**2 + (aye*x)**2) / r
+
+    r2d = r * cc.dist * cc.cm_in_au
+    a2d = -cc.G * cc.mass * cc.msun / r2d**2
+    a2d *= cc.sec_in_yr / 1.0e5
+    if arcsec:
+        ar *= cc.asy_to_kms
+        are *= cc.asy_to_kms
+        at *= cc.asy_to_kms
+        ate *= cc.asy_to_kms
+    return (r, ar, are, at, ate, a2d)
+
+
+def old_is_physical(x, y, ax, axe, ay, aye, arcsec, sigma):
+    (r, ar, are, at, ate, a2d) = old_components(x, y, ax, axe, ay, aye,
+                                                arcsec)
+    status = np.zeros(3)
+    if (abs(at/ate) > sigma):
+        status[0] = 1
+    if ((ar - (sigma*are)) > 0):
+        status[1] = 1
+    if (ar + (sigma*are) < a2d):
+        status[2] = 1
+    return status
+
+
+def make_accels(n=400, seed=0, arcsec=True):
+    rng = np.random.default_rng(seed)
+    x = rng.uniform(-3, 3, n)
+    y = rng.uniform(-3, 3, n)
+    r = np.hypot(x, y)
+    # mostly bound radial accelerations, some tangential ones, of
+    # every significance
+    scale = 1.0 / objects.Constants().asy_to_kms if arcsec else 1.0
+    aMax = 12.0 / r**2 * scale
+    arTrue = -rng.uniform(0, 1.5, n) * aMax
+    atTrue = rng.normal(0, 0.3, n) * aMax
+    ax = (arTrue * x + atTrue * y) / r
+    ay = (arTrue * y - atTrue * x) / r
+    axe = rng.uniform(0.01, 1, n) * aMax
+    aye = rng.uniform(0.01, 1, n) * aMax
+    ax += rng.normal(0, 3, n) * axe
+    ay += rng.normal(0, 3, n) * aye
+
+    # zero errors, one axis or both, on some stars
+    axe[::17] = 0.0
+    aye[::23] = 0.0
+    axe[5::29] = 0.0
+    aye[5::29] = 0.0
+    ax[5::58] = 0.0
+    ay[5::58] = 0.0
+    # a star on Sgr A*
+    x[7] = y[7] = 0.0
+    return (x, y, ax, axe, ay, aye)
+
+
+def test_classify_vs_is_physical():
+    for arcsec in [True, None]:
+        data = make_accels(arcsec=arcsec)
+        for sigma in [3, 5]:
+            with np.errstate(divide='ignore', invalid='ignore'):
+                table = accel.classifyAccel(*data, sigma=sigma, arcsec=arcsec)
+                old = np.array([old_is_physical(*star, arcsec=arcsec,
+                                                sigma=sigma)
+                                for star in zip(*data)])
+
+            new = np.column_stack((table['tangential'], table['posRadial'],
+                                   table['tooLarge']))
+            assert np.array_equal(new, old.astype(bool)), (arcsec, sigma)
+            assert np.array_equal(table['nonPhysical'], old.any(axis=1))
+            # every flag is hit, and missed
+            assert old.any(axis=0).all() and not old.all(axis=0).any()
+
+            with np.errstate(divide='ignore', invalid='ignore'):
+                status = accel.isPhysical(*data, sigma=sigma, arcsec=arcsec)
+                scalar = accel.isPhysical(*[v[3] for v in data], sigma=sigma,
+                                          arcsec=arcsec)
+            assert np.array_equal(status, old)
+            assert np.array_equal(scalar, old[3])
+
+
+def test_select_vs_find_non_physical():
+    for arcsec in [True, None]:
+        data = make_accels(n=600, seed=1, arcsec=arcsec)
+        with np.errstate(divide='ignore', invalid='ignore'):
+            table = accel.classifyAccel(*data, arcsec=arcsec)
+            (r2d, ar, are, at, ate, a2d) = old_components(*data, arcsec=arcsec)
+
+            # the selections of the original findNonPhysical
+            idx_acc = np.where(((abs(at/ate)>5) | (abs(ar/are)>5)) &
+                               (r2d>0.5))[0]
+            idx_phy = np.where((ar/are<-5) & (abs(at/ate)<3) &
+                               ((a2d-ar)/are<3) & (r2d>0.5))[0]
+            idx_nonphy = np.setdiff1d(idx_acc, idx_phy)
+
+        (accelerating, physical, nonPhysical) = accel.selectAccel(table)
+        assert np.array_equal(np.where(accelerating)[0], idx_acc)
+        assert np.array_equal(np.where(physical)[0], idx_phy)
+        assert np.array_equal(np.where(nonPhysical)[0], idx_nonphy)
+        assert len(idx_phy) > 0 and len(idx_nonphy) > 0
+
+        # other thresholds and the radii passed in
+        with np.errstate(divide='ignore', invalid='ignore'):
+            idx_acc = np.where(((abs(at/ate)>3) | (abs(ar/are)>3)) &
+                               (r2d>1.0))[0]
+            idx_phy = np.where((ar/are<-3) & (abs(at/ate)<2) &
+                               ((a2d-ar)/are<1) & (r2d>1.0))[0]
+        (accelerating, physical, nonPhysical) = accel.selectAccel(
+            table, r2d=r2d, sigAcc=3, sigTan=2, sigMax=1, rmin=1.0)
+        assert np.array_equal(np.where(accelerating)[0], idx_acc)
+        assert np.array_equal(np.where(physical)[0], idx_phy)
+        assert np.array_equal(np.where(nonPhysical)[0],
+                              np.setdiff1d(idx_acc, idx_phy))
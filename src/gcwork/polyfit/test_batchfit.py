@@ -0,0 +1,61 @@
+import math
+import numpy as np
+from gcwork.polyfit import batchfit
+
+
+def make_stars(numStars=30, numEpochs=25, seed=0):
+    rng = np.random.default_rng(seed)
+    t = np.sort(rng.uniform(1995.0, 2020.0, numEpochs))
+    xerr = rng.uniform(0.5e-3, 2e-3, (numStars, numEpochs))
+    x = (rng.normal(0, 1, (numStars, 1))
+         + rng.normal(0, 0.01, (numStars, 1)) * (t - 2008.0)
+         + rng.normal(0, 1e-4, (numStars, 1)) * (t - 2008.0)**2
+         + rng.normal(0, 1, (numStars, numEpochs)) * xerr)
+    return (t, x, xerr)
+
+
+def test_fit_orders_vs_polyfit():
+    (t, x, xerr) = make_stars()
+    mask = np.ones(x.shape, dtype=bool)
+    mask[::4, ::3] = False
+    results = batchfit.fitOrders(t, x, xerr, [1, 2, 3], mask=mask)
+
+    for order, res in results.items():
+        factorial = np.array([math.factorial(k) for k in range(order + 1)])
+        for ss in range(len(x)):
+            use = mask[ss]
+            dt = t[use] - res.t0[ss]
+            (poly, cov) = np.polyfit(dt, x[ss, use], order,
+                                     w=1.0 / xerr[ss, use], cov='unscaled')
+
+            # polyfit: highest power first, in plain powers of dt
+            assert np.allclose(res.coeffs[ss], poly[::-1] * factorial,
+                               rtol=1e-7, atol=1e-12)
+            assert np.allclose(res.coeffErr[ss],
+                               np.sqrt(np.diag(cov))[::-1] * factorial,
+                               rtol=1e-6)
+
+            model = np.polyval(poly, dt)
+            chi2 = (((x[ss, use] - model) / xerr[ss, use])**2).sum()
+            assert np.isclose(res.chi2[ss], chi2, rtol=1e-6)
+            assert res.nPoints[ss] == use.sum()
+
+
+def test_weighted_t0():
+    (t, x, xerr) = make_stars()
+    t0 = batchfit.weightedT0(t, xerr)
+    w = 1.0 / xerr**2
+    assert np.allclose(t0, (w * t).sum(axis=1) / w.sum(axis=1))
+
+
+def test_fit_draws_vs_single_fits():
+    (t, x, xerr) = make_stars(numStars=1)
+    draws = batchfit.halfSamples(len(t), 20, seed=1)
+    assert draws.shape == (20, len(t) // 2)
+    assert all(len(set(draw)) == len(draw) for draw in draws)
+
+    res = batchfit.fitDraws(t, x[0], xerr[0], [2], draws)[2]
+    for dd, draw in enumerate(draws):
+        one = batchfit.fitPolynomials(t[draw], x[0, draw][np.newaxis],
+                                      xerr[0, draw][np.newaxis], 2)
+        assert np.allclose(res.coeffs[dd], one.coeffs[0])
@@ -0,0 +1,68 @@
+import math
+import numpy as np
+from gcwork.polyfit import tracks
+
+
+def make_pairs(numPairs=200, seed=0):
+    rng = np.random.default_rng(seed)
+    fits = []
+    for ff in range(4):
+        fit = np.empty((numPairs, 3))
+        fit[:,0] = rng.normal(0, 0.05, numPairs)      # arcsec
+        fit[:,1] = rng.normal(0, 0.01, numPairs)      # arcsec/yr
+        fit[:,2] = rng.normal(0, 1e-3, numPairs)      # arcsec/yr^2
+        fits.append(fit)
+    t1 = rng.uniform(2000.0, 2015.0, numPairs)
+    t2 = rng.uniform(2000.0, 2015.0, numPairs)
+    return fits + [t1, t2]
+
+
+def grid_distance(xfit1, yfit1, xfit2, yfit2, t1, t2, t):
+    def track(fit, t0):
+        dt = t[np.newaxis,:] - t0[:,np.newaxis]
+        return sum(fit[:,k:k+1] * dt**k / math.factorial(k)
+                   for k in range(fit.shape[1]))
+    return np.hypot(track(xfit1, t1) - track(xfit2, t2),
+                    track(yfit1, t1) - track(yfit2, t2))
+
+
+def test_min_distance_vs_grid():
+    pairs = make_pairs()
+    trange = [1995.0, 2020.0]
+    (dmin, tmin) = tracks.minDistance(*pairs, trange)
+
+    t = np.linspace(trange[0], trange[1], 50001)
+    dist = grid_distance(*pairs, t)
+    rows = np.arange(len(dmin))
+
+    # never above the grid minimum, and the grid gets arbitrarily close
+    assert (dmin <= dist.min(axis=1) + 1e-12).all()
+    assert np.allclose(dmin, dist.min(axis=1), atol=1e-6)
+    assert ((tmin >= trange[0]) & (tmin <= trange[1])).all()
+    assert np.allclose(grid_distance(*pairs, tmin)[rows, rows], dmin)
+
+
+def test_close_range_vs_grid():
+    pairs = make_pairs(seed=1)
+    trange = [1995.0, 2020.0]
+    dist = 0.05
+    span = tracks.closeRange(*pairs, trange, dist)
+
+    t = np.linspace(trange[0], trange[1], 20001)
+    close = grid_distance(*pairs, t) <= dist
+    step = t[1] - t[0]
+
+    for pp in range(len(span)):
+        if not close[pp].any():
+            assert np.isnan(span[pp]).all()
+            continue
+        assert abs(span[pp,0] - t[close[pp]][0]) <= step
+        assert abs(span[pp,1] - t[close[pp]][-1]) <= step
+
+
+def test_poly_roots():
+    roots = tracks.polyRoots([[-6.0, 11.0, -6.0, 1.0],   # 1, 2, 3
+                              [-4.0, 0.0, 1.0, 0.0]])    # -2, 2
+    assert np.allclose(np.sort(roots[0].real), [1.0, 2.0, 3.0])
+    assert np.allclose(np.sort(roots[1,:2].real), [-2.0, 2.0])
+    assert np.isnan(roots[1,2])
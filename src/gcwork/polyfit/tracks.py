@@ -0,0 +1,237 @@
+"""
+Separations between the fitted sky tracks of pairs of stars.
+
+A track is the polynomial x(t), y(t) from a polyfit, given by its
+coefficients [x0, vx, ax, ...] and [y0, vy, ay, ...] (derivatives at
+the fit epoch t0, so x(t) = sum_k x_k (t - t0)**k / k!). All functions
+take arrays of pairs, so the separations of every star and its
+neighbors are found in a few array operations:
+
+    (dmin, tmin) = tracks.minDistance(xfit1, yfit1, xfit2, yfit2,
+                                      t1, t2, [1995., 2010.])
+    span = tracks.closeRange(xfit1, yfit1, xfit2, yfit2,
+                             t1, t2, [1995., 2010.], 0.1)
+
+Nothing is sampled in time: the squared separation of two tracks is a
+polynomial in t, so its minimum follows from the roots of its
+derivative, and the epochs at which it crosses a threshold are roots
+of the polynomial itself.
+"""
+import math
+import numpy as np
+
+
+def _pairArrays(xfit1, yfit1, xfit2, yfit2, t1, t2):
+    """Coefficients as (N, K+1) arrays and fit epochs as (N,) arrays."""
+    fits = [np.atleast_2d(np.asarray(fit, dtype=float))
+            for fit in (xfit1, yfit1, xfit2, yfit2)]
+    numPairs = max([len(fit) for fit in fits] + [np.size(t1), np.size(t2)])
+    numCoeffs = max([fit.shape[1] for fit in fits])
+
+    # Pad lower order fits with zeros so all tracks have the same order
+    fits = [np.pad(fit, ((0, 0), (0, numCoeffs - fit.shape[1])))
+            for fit in fits]
+    fits = [np.broadcast_to(fit, (numPairs, numCoeffs)) for fit in fits]
+    t1 = np.broadcast_to(np.asarray(t1, dtype=float), (numPairs,))
+    t2 = np.broadcast_to(np.asarray(t2, dtype=float), (numPairs,))
+
+    return fits + [t1, t2]
+
+def _shiftPoly(fit, t0, tref, scale):
+    """
+    Ascending power coefficients in u = (t - tref) / scale of the
+    tracks sum_k fit[:,k] (t - t0)**k / k!.
+    """
+    numCoeffs = fit.shape[1]
+    s = (tref - t0)[:,np.newaxis]
+
+    coeffs = np.zeros(fit.shape, dtype=float)
+    for j in range(numCoeffs):
+        for k in range(j, numCoeffs):
+            coeffs[:,j:j+1] += fit[:,k:k+1] * s**(k-j) / math.factorial(k-j)
+        coeffs[:,j] *= scale**j / math.factorial(j)
+
+    return coeffs
+
+def _polyMul(a, b):
+    """Products of the rows of two sets of ascending power coefficients."""
+    prod = np.zeros((a.shape[0], a.shape[1] + b.shape[1] - 1), dtype=float)
+    for i in range(a.shape[1]):
+        prod[:,i:i+b.shape[1]] += a[:,i:i+1] * b
+    return prod
+
+def polyRoots(coeffs, tol=1e-13):
+    """
+    Roots of many polynomials at once, from the eigenvalues of their
+    companion matrices.
+
+    @param coeffs: (N, d+1) ascending power coefficients
+    @kwparam tol: leading coefficients smaller than tol times the
+        largest coefficient of their polynomial are taken to be zero
+    @return (N, d) complex array of roots, padded with NaN for
+        polynomials of lower degree (and for rows with NaN coefficients)
+    """
+    coeffs = np.atleast_2d(np.asarray(coeffs, dtype=float))
+    (num, numCoeffs) = coeffs.shape
+    roots = np.full((num, numCoeffs - 1), np.nan, dtype=complex)
+
+    size = np.abs(coeffs).max(axis=1)
+    nonzero = np.abs(coeffs) > tol * size[:,np.newaxis]
+    degree = numCoeffs - 1 - np.argmax(nonzero[:,::-1], axis=1)
+    degree[~nonzero.any(axis=1)] = 0
+
+    for d in range(1, numCoeffs):
+        rows = np.flatnonzero(degree == d)
+        if len(rows) == 0:
+            continue
+        monic = coeffs[rows,:d] / coeffs[rows,d:d+1]
+
+        companion = np.zeros((len(rows), d, d), dtype=float)
+        companion[:,np.arange(1, d),np.arange(d-1)] = 1.0
+        companion[:,:,d-1] = -monic
+        roots[rows,:d] = np.linalg.eigvals(companion)
+
+    return roots
+
+def _separation(xfit1, yfit1, xfit2, yfit2, t1, t2, trange):
+    """
+    x and y offsets between N pairs of tracks as polynomials in
+    u = (t - tref) / scale, where u runs from -1 to 1 over trange.
+
+    @return (dx, dy, tref, scale)
+    """
+    (xfit1, yfit1, xfit2, yfit2, t1, t2) = _pairArrays(xfit1, yfit1,
+                                                       xfit2, yfit2, t1, t2)
+    tref = 0.5 * (trange[0] + trange[1])
+    scale = max(0.5 * (trange[1] - trange[0]), 1.0e-3)
+
+    dx = _shiftPoly(xfit1, t1, tref, scale) - _shiftPoly(xfit2, t2, tref, scale)
+    dy = _shiftPoly(yfit1, t1, tref, scale) - _shiftPoly(yfit2, t2, tref, scale)
+
+    return (dx, dy, tref, scale)
+
+def _polyVal(coeffs, u):
+    """Horner's scheme for the rows of coeffs at u, (N,) or (N, M)."""
+    u = np.asarray(u, dtype=float)
+    if u.ndim == 1:
+        return _polyVal(coeffs, u[:,np.newaxis])[:,0]
+
+    val = np.zeros(u.shape) + coeffs[:,-1:]
+    for k in range(coeffs.shape[1] - 2, -1, -1):
+        val = val * u + coeffs[:,k:k+1]
+    return val
+
+def _distance(dx, dy, u):
+    return np.hypot(_polyVal(dx, u), _polyVal(dy, u))
+
+def minDistance(xfit1, yfit1, xfit2, yfit2, t1, t2, trange):
+    """
+    Minimum separation of N pairs of tracks between trange[0] and
+    trange[1], and the epoch at which it occurs. The minimum is either
+    at one end of the range or at a root of the derivative of the
+    squared separation, so it is exact (no sampling in time).
+
+    @param xfit1: (N, K+1) or (K+1,) [x0, vx, ax, ...] of the first stars
+    @param yfit1: (N, K+1) or (K+1,) [y0, vy, ay, ...] of the first stars
+    @param xfit2: (N, K+1) or (K+1,) [x0, vx, ax, ...] of the second stars
+    @param yfit2: (N, K+1) or (K+1,) [y0, vy, ay, ...] of the second stars
+    @param t1: (N,) fit epochs of the first stars
+    @param t2: (N,) fit epochs of the second stars
+    @param trange: [tmin, tmax] range of epochs
+
+    @return (dmin, tmin): (N,) arrays of the minimum separations and
+        the epochs of closest approach (NaN for pairs with NaN fits)
+    """
+    (dx, dy, tref, scale) = _separation(xfit1, yfit1, xfit2, yfit2,
+                                        t1, t2, trange)
+    uRange = [(trange[0] - tref) / scale, (trange[1] - tref) / scale]
+
+    # The real parts of complex roots are harmless extra candidates
+    sep = _polyMul(dx, dx) + _polyMul(dy, dy)
+    ustat = polyRoots(sep[:,1:] * np.arange(1, sep.shape[1])).real
+    ustat = np.where(np.isfinite(ustat), np.clip(ustat, *uRange), uRange[0])
+
+    u = np.concatenate((np.full((len(dx), 1), uRange[0]),
+                        np.full((len(dx), 1), uRange[1]), ustat), axis=1)
+    distance = _distance(dx, dy, u)
+
+    rows = np.arange(len(dx))
+    best = np.argmin(distance, axis=1)
+    dmin = distance[rows, best]
+    tmin = tref + scale * u[rows, best]
+    tmin[np.isnan(dmin)] = np.nan
+
+    return (dmin, tmin)
+
+def closeIntervals(xfit1, yfit1, xfit2, yfit2, t1, t2, trange, dist):
+    """
+    Epoch intervals within trange in which the separation of each of
+    N pairs of tracks is at most dist. The interval ends are the roots
+    of (squared separation - dist**2).
+
+    @param xfit1, yfit1, xfit2, yfit2, t1, t2, trange: see minDistance()
+    @param dist: threshold separation, scalar or (N,)
+
+    @return (N, M, 2) array of [start, end] epochs of the intervals of
+        each pair, in time order and NaN-padded. Pairs that never get
+        within dist have only NaN.
+    """
+    (dx, dy, tref, scale) = _separation(xfit1, yfit1, xfit2, yfit2,
+                                        t1, t2, trange)
+    numPairs = len(dx)
+    dist = np.broadcast_to(np.asarray(dist, dtype=float), (numPairs,))
+    uRange = [(trange[0] - tref) / scale, (trange[1] - tref) / scale]
+
+    sep = _polyMul(dx, dx) + _polyMul(dy, dy)
+    sep[:,0] -= dist**2
+
+    # Split the range at every crossing. Spurious breaks from the real
+    # parts of complex roots are merged away below.
+    ucross = polyRoots(sep).real
+    inside = (ucross > uRange[0]) & (ucross < uRange[1])
+    ucross = np.where(inside, ucross, np.nan)
+    breaks = np.sort(np.concatenate((np.full((numPairs, 1), uRange[0]),
+                                     np.full((numPairs, 1), uRange[1]),
+                                     ucross), axis=1), axis=1)
+
+    lo = breaks[:,:-1]
+    hi = breaks[:,1:]
+    close = _distance(dx, dy, 0.5 * (lo + hi)) <= dist[:,np.newaxis]
+
+    # Merge neighboring close segments into intervals
+    prevClose = np.zeros(close.shape, dtype=bool)
+    prevClose[:,1:] = close[:,:-1]
+    nextClose = np.zeros(close.shape, dtype=bool)
+    nextClose[:,:-1] = close[:,1:]
+    starts = close & ~prevClose
+    ends = close & ~nextClose
+
+    slot = np.cumsum(starts, axis=1) - 1
+    numSlots = max(int(starts.sum(axis=1).max(initial=0)), 1)
+    intervals = np.full((numPairs, numSlots, 2), np.nan)
+
+    (rr, cc) = np.nonzero(starts)
+    intervals[rr, slot[rr, cc], 0] = tref + scale * lo[rr, cc]
+    (rr, cc) = np.nonzero(ends)
+    intervals[rr, slot[rr, cc], 1] = tref + scale * hi[rr, cc]
+
+    return intervals
+
+def closeRange(xfit1, yfit1, xfit2, yfit2, t1, t2, trange, dist):
+    """
+    First and last epoch within trange at which each of N pairs of
+    tracks is at most dist apart (the span of closeIntervals()).
+
+    @return (N, 2) array of [first, last] epochs, NaN for pairs that
+        never get within dist
+    """
+    intervals = closeIntervals(xfit1, yfit1, xfit2, yfit2, t1, t2,
+                               trange, dist)
+    numIntervals = np.isfinite(intervals[:,:,0]).sum(axis=1)
+    rows = np.arange(len(intervals))
+
+    span = np.empty((len(intervals), 2))
+    span[:,0] = intervals[:,0,0]
+    span[:,1] = intervals[rows, np.maximum(numIntervals - 1, 0), 1]
+
+    return span
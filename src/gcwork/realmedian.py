@@ -13,7 +13,7 @@ def realMedian(arr, index = False):
 
     # sort the array
     s = np.argsort(arr)
-    ind = s[np.ceil((len(arr)-1)/2.0)]
+    ind = s[int(np.ceil((len(arr)-1)/2.0))]
     medValue = arr[ind]
 
     if index:
@@ -0,0 +1,110 @@
+"""
+Persistent results of analysis stages (e.g. the stages of
+accel_class.accelClass), so a restarted session reuses every stage
+whose inputs did not change:
+
+    store = stagestore.StageStore(rootDir + align, options)
+    key = stagestore.stageKey('accel', files, params, neededKeys)
+    values = store.load('accel', key)     # None if missing or stale
+    store.save('accel', key, values)
+
+A stage's key is built from the fingerprints of the input files, the
+parameters of the stage and the keys of the stages it needs, so a
+change to any of them recomputes the stage and every stage after it.
+The values of each stage (a dictionary) are pickled to
+<cacheDir>/stages/<root key>/<stage>.pkl.
+"""
+import os
+import pickle
+import shutil
+import hashlib
+from gcwork import startable
+
+# Bump whenever a stage computes something different or stores
+# different values.
+STAGE_VERSION = 2
+
+
+def fileFingerprint(fileNames):
+    """List of [file, mtime_ns, size] for the given files. Missing
+    files are recorded with None."""
+    files = []
+    for fileName in fileNames:
+        try:
+            st = os.stat(fileName)
+            files.append([fileName, st.st_mtime_ns, st.st_size])
+        except OSError:
+            files.append([fileName, None, None])
+    return files
+
+def dirFingerprint(dirName):
+    """Sorted list of [name, mtime_ns, size] for the files in a
+    directory (e.g. the .points and .phot files), or None if there
+    is no such directory."""
+    try:
+        entries = list(os.scandir(dirName))
+    except OSError:
+        return None
+
+    files = []
+    for entry in entries:
+        try:
+            st = entry.stat()
+        except OSError:
+            continue
+        files.append([entry.name, st.st_mtime_ns, st.st_size])
+    files.sort()
+    return files
+
+def stageKey(*parts):
+    """Key of a stage from anything that determines its results
+    (fingerprints, parameters, keys of the stages it needs)."""
+    key = repr([STAGE_VERSION] + list(parts))
+    return hashlib.md5(key.encode()).hexdigest()
+
+
+class StageStore(object):
+    """
+    Stage results of one data set (e.g. an align root loaded with
+    some options), one pickle file per stage. Only the latest results
+    of each stage are kept; load() returns None unless they were made
+    with the same key.
+    """
+    def __init__(self, root, options='', cacheDir=None):
+        self.dirName = startable.cachePath(root, options, cacheDir=cacheDir,
+                                           kind='stages')
+
+    def fileName(self, stage):
+        return os.path.join(self.dirName, stage + '.pkl')
+
+    def load(self, stage, key):
+        """Values saved for this stage and key, or None."""
+        try:
+            with open(self.fileName(stage), 'rb') as f:
+                saved = pickle.load(f)
+        except (OSError, EOFError, pickle.UnpicklingError,
+                AttributeError, ImportError):
+            return None
+
+        if saved.get('version') != STAGE_VERSION or saved.get('key') != key:
+            return None
+        return saved['values']
+
+    def save(self, stage, key, values):
+        """Store the values (a dictionary) of a stage. Failures to
+        write (e.g. read-only cache location) are reported but not
+        fatal."""
+        fileName = self.fileName(stage)
+        saved = {'version': STAGE_VERSION, 'key': key, 'values': values}
+        try:
+            os.makedirs(self.dirName, exist_ok=True)
+            tmpName = '%s.tmp%d' % (fileName, os.getpid())
+            with open(tmpName, 'wb') as f:
+                pickle.dump(saved, f, -1)
+            os.replace(tmpName, fileName)
+        except OSError as e:
+            print( 'StageStore: could not write %s: %s' % (fileName, e))
+
+    def clear(self):
+        """Remove all stored stages of this data set."""
+        shutil.rmtree(self.dirName, ignore_errors=True)
@@ -1,9 +1,13 @@
 import os, sys
+import glob
 import math
+import warnings
 import numpy as np
+from concurrent.futures import ThreadPoolExecutor
 from gcwork import objects
 from gcwork import util
 from gcwork import starTables
+from gcwork import startable
 
 class StarSet(object):
     """Object containing align output.
@@ -17,12 +21,26 @@ class StarSet(object):
     verbose - Whether to print info
     relErr - whether to include absolute astrometric errors
     t - Transform object
+
+    By default (columnar=True) the align files are parsed in bulk into
+    a StarTable (see startable.py) and the stars are lightweight
+    proxies over its columns, so getArray() and friends are simple
+    array slices. Use columnar=False for the old line-by-line loader.
+
+    With cache=True the parsed table is kept as a binary snapshot
+    (under cacheDir, default ~/.cache/gcwork) that is reused until any
+    of the align files change. Cached per-epoch columns are memory-mapped;
+    set mmapDir to also keep freshly parsed per-epoch columns (and
+    those added by loadPoints) as memory-mapped files in that directory.
     """
 
-    def __init__(self, root, verbose=0, relErr=0, trans=None):
+    def __init__(self, root, verbose=0, relErr=0, trans=None, columnar=True,
+                 cache=False, cacheDir=None, mmapDir=None):
         self.root = root
         self.verbose = verbose
         self.relErr = relErr
+        self.mmapDir = mmapDir
+        self.fromCache = False
 
         # Set up the default position of Sgr A* from align output.
         # Uses the *.sgra and *.scale files.
@@ -32,8 +50,171 @@ class StarSet(object):
         else:
             self.t = trans
 
+        # Read epochs
+        _date = np.atleast_1d(np.genfromtxt(root + '.date'))
+        years = [_date[i] for i in range(_date.shape[0])]
+        dates = ['%4d' % math.floor(year) for year in years]
+
+        objects.Star.years = years
+
+        self.years = np.array(years)
+        self.dates = np.array(dates)
+
+        if columnar and cache:
+            self._loadCachedColumns(cacheDir)
+        elif columnar:
+            self._loadColumns()
+        else:
+            self._table = None
+            self._loadObjects()
+
+        return
+
+    def _loadCachedColumns(self, cacheDir=None):
+        """Use the binary snapshot of this align root if it is still
+        current, otherwise parse the align files and write one.
+        See startable.loadCache() for the cache location."""
+        # Anything besides the align files that changes the values.
+        options = 'relErr=%s trans=%s' % (self.relErr,
+                                          sorted(vars(self.t).items()))
+
+        table = startable.loadCache(self.root, options, cacheDir=cacheDir)
+        if table is not None:
+            if self.verbose:
+                print( 'StarSet: loaded %s from cache' % self.root)
+            self.fromCache = True
+            table.mmapDir = self.mmapDir
+            self._table = table
+            self.stars = [objects.StarProxy(table, ss)
+                          for ss in range(table.numStars)]
+            return
+
+        files = startable.fingerprint(self.root)
+        self._loadColumns()
+        if self._table is not None:
+            startable.saveCache(self._table, self.root, options,
+                                cacheDir=cacheDir, files=files)
+
+    def _loadColumns(self):
+        """Parse the align files in bulk into a StarTable and
+        hand out Star/Epoch proxies over its columns."""
+        root = self.root
+        numEpochs = len(self.years)
+
+        table = startable.StarTable(self.years, mmapDir=self.mmapDir)
+
         # Load up tables which will have names that start with _*
-        _date = np.genfromtxt(root + '.date')
+        names, _vel = _readTable(root + '.vel')
+        if len(names) == 0:
+            self._table = None
+            self._loadObjects()
+            return
+
+        _mag = _readTable(root + '.mag')[1]
+        _b0 = _readTable(root + '.b0')[1]
+        _pos = _readTable(root + '.pos')[1]
+        _opos = _readTable(root + '.origpos')[1]
+        _err = _readTable(root + '.err')[1]
+        _par = _readTable(root + '.param')[1]
+        _name = _readTable(root + '.name', dtype=str)[1]
+
+        # Column indices below are shifted by one relative to the
+        # line-by-line parser since the name column is split off.
+        table.setStarColumn('name', names)
+        table.setStarColumn('velCnt', _vel[:, 0].astype(int))
+        table.setStarColumn('mag', _mag[:, 0])
+        table.setStarColumn('magerr', _mag[:, 1])
+
+        # Do conversions for these values
+        pt = util.pixTransform(self.t, relErr=self.relErr)
+        (x, y) = pt.position(_vel[:, 2], _vel[:, 3])
+        (vx, vy, vxerr, vyerr) = pt.velocity(_vel[:, 4], _vel[:, 6],
+                                             _vel[:, 5], _vel[:, 7])
+        (v2d, v2derr) = pt.value(_vel[:, 8], _vel[:, 9])
+        table.setStarColumn('x', x)
+        table.setStarColumn('y', y)
+        table.setStarColumn('vx', vx)
+        table.setStarColumn('vxerr', vxerr)
+        table.setStarColumn('vy', vy)
+        table.setStarColumn('vyerr', vyerr)
+        table.setStarColumn('v2d', v2d)
+        table.setStarColumn('v2derr', v2derr)
+
+        # Parse b0 file
+        t0 = _b0[:, 0]
+        x0 = _b0[:, 1]
+        x0err = _b0[:, 2]
+        vx = _b0[:, 3]
+        vxerr = _b0[:, 4]
+        y0 = _b0[:, 7]
+        y0err = _b0[:, 8]
+        vy = _b0[:, 9]
+        vyerr = _b0[:, 10]
+
+        _setFit(table, 'fitpXalign', t0, x0, x0err, vx, vxerr)
+        _setFit(table, 'fitpYalign', t0, y0, y0err, vy, vyerr)
+
+        (x0, y0, x0err, y0err) = pt.position(x0, y0, x0err, y0err)
+        (vx, vy, vxerr, vyerr) = pt.velocity(vx, vy, vxerr, vyerr)
+        _setFit(table, 'fitXalign', t0, x0, x0err, vx, vxerr)
+        _setFit(table, 'fitYalign', t0, y0, y0err, vy, vyerr)
+
+        # Parse err, mag, pos files for all epochs
+        table.setEpochColumn('name', _name[:, :numEpochs])
+        xpix = _pos[:, 0:2*numEpochs:2]
+        ypix = _pos[:, 1:2*numEpochs:2]
+        table.setEpochColumn('xpix', xpix)
+        table.setEpochColumn('ypix', ypix)
+        table.setEpochColumn('xorig', _opos[:, 0:2*numEpochs:2])
+        table.setEpochColumn('yorig', _opos[:, 1:2*numEpochs:2])
+
+        if (_err.shape[1] > numEpochs*2):
+            xpixerr_p = np.clip(_err[:, 0:4*numEpochs:4], 0.0, None)
+            ypixerr_p = np.clip(_err[:, 1:4*numEpochs:4], 0.0, None)
+            xpixerr_a = _err[:, 2:4*numEpochs:4].copy()
+            ypixerr_a = _err[:, 3:4*numEpochs:4].copy()
+        else:
+            xpixerr_p = np.zeros(xpix.shape)
+            ypixerr_p = np.zeros(xpix.shape)
+            xpixerr_a = _err[:, 0:2*numEpochs:2].copy()
+            ypixerr_a = _err[:, 1:2*numEpochs:2].copy()
+
+        # Check for the infinity case
+        inf = (xpixerr_a == float('inf'))
+        xpixerr_a[inf] = 0.0
+        ypixerr_a[inf] = 0.0
+
+        table.setEpochColumn('xpixerr_p', xpixerr_p)
+        table.setEpochColumn('ypixerr_p', ypixerr_p)
+        table.setEpochColumn('xpixerr_a', xpixerr_a)
+        table.setEpochColumn('ypixerr_a', ypixerr_a)
+
+        table.setEpochColumn('mag', _mag[:, 3:3+numEpochs])
+        table.setEpochColumn('snr', _par[:, 0:4*numEpochs:4])
+        table.setEpochColumn('corr', _par[:, 1:4*numEpochs:4])
+        table.setEpochColumn('nframes', _par[:, 2:4*numEpochs:4])
+        table.setEpochColumn('fwhm', _par[:, 3:4*numEpochs:4])
+
+        # Convert stuff into arcseconds
+        (x, y, xerr_p, yerr_p) = pt.position(xpix, ypix,
+                                             xpixerr_p, ypixerr_p)
+        (x, y, xerr_a, yerr_a) = pt.position(xpix, ypix,
+                                             xpixerr_a, ypixerr_a)
+        table.setEpochColumn('x', x)
+        table.setEpochColumn('y', y)
+        table.setEpochColumn('xerr_p', xerr_p)
+        table.setEpochColumn('yerr_p', yerr_p)
+        table.setEpochColumn('xerr_a', xerr_a)
+        table.setEpochColumn('yerr_a', yerr_a)
+
+        self._table = table
+        self.stars = [objects.StarProxy(table, ss)
+                      for ss in range(table.numStars)]
+
+    def _loadObjects(self):
+        """Parse the align files line by line into Star and Epoch
+        objects."""
+        root = self.root
         f_pos = open(root + '.pos', 'r')
         f_err = open(root + '.err', 'r')
         f_mag = open(root + '.mag', 'r')
@@ -43,20 +224,11 @@ class StarSet(object):
         f_opos = open(root + '.origpos', 'r')
         f_b0 = open(root + '.b0', 'r')
 
-        numEpochs = _date.shape[0]
+        numEpochs = len(self.years)
 
         # Make an infinity float to compare against
         Inf = float('inf')
 
-        # Read epochs
-        years = [_date[i] for i in range(numEpochs)]
-        dates = ['%4d' % math.floor(year) for year in years]
-
-        objects.Star.years = years
-
-        self.years = np.array(years)
-        self.dates = np.array(dates)
-
         self.stars = []    
         for line in f_pos:
             _pos = line.split()
@@ -209,9 +381,13 @@ class StarSet(object):
 
         # Make a "isUsed" variable on every star in every epoch.
         # Start with value = False.
-        for star in self.stars:
-            for ep in star.e:
-                ep.isUsed = False
+        if self._tableRows() is not None:
+            self._table.setEpochColumn('isUsed',
+                np.zeros((self._table.numStars, len(self.years)), dtype=bool))
+        else:
+            for star in self.stars:
+                for ep in star.e:
+                    ep.isUsed = False
 
         for line in _used:
             parts = line.split()
@@ -233,7 +409,7 @@ class StarSet(object):
 
         return
         
-    def loadPoints(self, pointsDir, useMJD=False):
+    def loadPoints(self, pointsDir, useMJD=False, bundle=None, threads=8):
         """
         Loads .points and .phot files. The following variables are 
         created for each star:
@@ -260,148 +436,109 @@ class StarSet(object):
         in align may not be the same as in the points file as we
         have a number of codes that modify (or trim out) data from the
         points files.
+
+        The files are read with a pool of threads (set threads=1 to
+        read them one at a time). Alternatively pass the name of a
+        bundle written by packPoints() to read everything
+        from that single file instead of pointsDir.
         """
         self.pointsDir = pointsDir
 
+        numEpochs = len(self.years)
+        names = [star.name for star in self.stars]
+
+        if bundle is not None:
+            (allPnts, allPhot) = _readPointsBundle(bundle, names)
+        else:
+            (allPnts, allPhot) = _readPointsDir(pointsDir, names,
+                                                threads=threads)
+
+        # Epoch dates as they appear in the points files.
+        if useMJD:
+            # Handle points files with MJD if necessary.
+            epochDates = ((self.years - 1999.0) * 365.242) + 51179.0
+            tol = 0.1
+        else:
+            epochDates = self.years
+            tol = 0.001
+
+        # Epochs sharing a date take successive matching rows.
+        dupRank = _duplicateRank(self.years)
+
+        # When the stars are backed by a StarTable the values go
+        # straight into (stars, epochs) columns.
+        rows = self._tableRows()
+        if rows is not None:
+            table = self._table
+            rows = np.arange(table.numStars)[rows]
+            table.setStarColumn('pointsCnt', np.zeros(table.numStars, dtype=int))
+            for name in _pntNames + _photNames:
+                table.newEpochColumn(name, fill=-1000.0)
+
         for ss in range(len(self.stars)):
             star = self.stars[ss]
-        
+            _pnts = allPnts[ss]
+            _phot = allPhot[ss]
+
             # Number of Epochs Detected should be corrected
             # for epochs trimmed out of the *.points files.
-            pntsFile = '%s%s.points' % (pointsDir, star.name)
-            _pnts = np.genfromtxt(pntsFile)
+            star.pointsCnt = len(_pnts)
 
-            photFile = '%s%s.phot' % (pointsDir, star.name)
-            _phot = np.genfromtxt(photFile)
+            # Row in the points/phot file used for each epoch (-1 = none)
+            pntIdx = _matchEpochs(_pnts[:, 0], epochDates, dupRank, tol)
+            photIdx = _matchEpochs(_phot[:, 0], epochDates, dupRank, tol)
 
-            star.pointsCnt = len(_pnts)
-            ## Account for the case that points count = 1
-            if len(_pnts.shape) == 1 and _pnts.shape[0] != 0:
-                star.pointsCnt = 1
-                
-                _pnts = np.array([_pnts])
-                _phot = np.array([_phot])
-            
-            if star.pointsCnt == 0:
-                pntDate = np.array([])
-                pntX = np.array([])
-                pntY = np.array([])
-                pntXe = np.array([])
-                pntYe = np.array([])
-                
-                photDate = np.array([])
-                photR = np.array([])
-                photX = np.array([])
-                photY = np.array([])
-                photXe = np.array([])
-                photYe = np.array([])
-                photM = np.array([])
-                photMe = np.array([])
-            else:
-                pntDate = _pnts[:,0]
-                pntX = _pnts[:,1]
-                pntY = _pnts[:,2]
-                pntXe = _pnts[:,3]
-                pntYe = _pnts[:,4]
-
-                photDate = _phot[:,0]
-                photR = _phot[:,1]
-                photX = _phot[:,2]
-                photY = _phot[:,3]
-                photXe = _phot[:,4]
-                photYe = _phot[:,5]
-                photM = _phot[:,6]
-                photMe = _phot[:,7]
-
-
-            # Load up data from the points files.
-            ## Dictionaries to store lowest index already used for same epoch year
-            multPoint_sameEpoch_pnts = {}
-            multPoint_sameEpoch_phot = {}
-            
-            for ee in range(len(star.years)):
-                if useMJD:
-                    # Handle points files with MJD if necessary.
-                    mjd = ((star.years[ee] - 1999.0) * 365.242) + 51179.0
-                    ttPnts = (np.where(abs(pntDate - mjd) < 0.1))[0]
-                    ttPhot = (np.where(abs(photDate - mjd) < 0.1))[0]
-                else:
-                    ttPnts = (np.where(abs(pntDate - star.years[ee]) < 0.001))[0]
-                    ttPhot = (np.where(abs(photDate - star.years[ee]) < 0.001))[0]
-                
-                
-                
-                if (len(ttPnts) == 0):
-                    star.e[ee].pnt_t = -1000.0
-                    star.e[ee].pnt_x = -1000.0
-                    star.e[ee].pnt_y = -1000.0
-                    star.e[ee].pnt_xe = -1000.0
-                    star.e[ee].pnt_ye = -1000.0
-                elif (len(ttPnts) > 1):
-                    # Multiple points for a single date, so make sure to go through each index
-                    use_index = 0
-                    
-                    if star.years[ee] in multPoint_sameEpoch_pnts:
-                        multPoint_sameEpoch_pnts[star.years[ee]] += 1
-                        use_index = multPoint_sameEpoch_pnts[star.years[ee]]
+            if rows is not None:
+                _fillColumns(table, rows[ss], _pntNames, _pnts, pntIdx)
+                _fillColumns(table, rows[ss], _photNames, _phot, photIdx)
+                continue
+
+            for ee in range(numEpochs):
+                for cc, name in enumerate(_pntNames):
+                    if pntIdx[ee] < 0:
+                        setattr(star.e[ee], name, -1000.0)
                     else:
-                        multPoint_sameEpoch_pnts[star.years[ee]] = use_index
-                    
-                    ttPnts = ttPnts[use_index]
-                    star.e[ee].pnt_t = pntDate[ttPnts]
-                    star.e[ee].pnt_x = pntX[ttPnts]
-                    star.e[ee].pnt_y = pntY[ttPnts]
-                    star.e[ee].pnt_xe = pntXe[ttPnts]
-                    star.e[ee].pnt_ye = pntYe[ttPnts]
-                else:
-                    ttPnts = ttPnts[0]
-                    star.e[ee].pnt_t = pntDate[ttPnts]
-                    star.e[ee].pnt_x = pntX[ttPnts]
-                    star.e[ee].pnt_y = pntY[ttPnts]
-                    star.e[ee].pnt_xe = pntXe[ttPnts]
-                    star.e[ee].pnt_ye = pntYe[ttPnts]
-                
-                if (len(ttPhot) == 0):
-                    star.e[ee].phot_t = -1000.0
-                    star.e[ee].phot_r = -1000.0
-                    star.e[ee].phot_x = -1000.0
-                    star.e[ee].phot_y = -1000.0
-                    star.e[ee].phot_xe = -1000.0
-                    star.e[ee].phot_ye = -1000.0
-                    star.e[ee].phot_mag = -1000.0
-                    star.e[ee].phot_mage = -1000.0
-                elif (len(ttPhot) > 1):
-                    # Multiple points for a single date, so make sure to go through each index
-                    use_index = 0
-                    
-                    if star.years[ee] in multPoint_sameEpoch_phot:
-                        multPoint_sameEpoch_phot[star.years[ee]] += 1
-                        use_index = multPoint_sameEpoch_phot[star.years[ee]]
+                        setattr(star.e[ee], name, _pnts[pntIdx[ee], cc])
+                for cc, name in enumerate(_photNames):
+                    if photIdx[ee] < 0:
+                        setattr(star.e[ee], name, -1000.0)
                     else:
-                        multPoint_sameEpoch_phot[star.years[ee]] = use_index
-                    
-                    ttPhot = ttPhot[use_index]
-                    star.e[ee].phot_t = photDate[ttPhot]
-                    star.e[ee].phot_r = photR[ttPhot]
-                    star.e[ee].phot_x = photX[ttPhot]
-                    star.e[ee].phot_y = photY[ttPhot]
-                    star.e[ee].phot_xe = photXe[ttPhot]
-                    star.e[ee].phot_ye = photYe[ttPhot]
-                    star.e[ee].phot_mag = photM[ttPhot]
-                    star.e[ee].phot_mage = photMe[ttPhot]
-                else:
-                    ttPhot = ttPhot[0]
-                    star.e[ee].phot_t = photDate[ttPhot]
-                    star.e[ee].phot_r = photR[ttPhot]
-                    star.e[ee].phot_x = photX[ttPhot]
-                    star.e[ee].phot_y = photY[ttPhot]
-                    star.e[ee].phot_xe = photXe[ttPhot]
-                    star.e[ee].phot_ye = photYe[ttPhot]
-                    star.e[ee].phot_mag = photM[ttPhot]
-                    star.e[ee].phot_mage = photMe[ttPhot]
+                        setattr(star.e[ee], name, _phot[photIdx[ee], cc])
 
         return
 
+    def trimPoints(self, mask):
+        """
+        Drop points loaded by loadPoints(), as if they had been trimmed
+        out of the .points and .phot files: their pnt_* and phot_*
+        values are set to -1000 and pointsCnt is lowered.
+
+        @param mask: (stars, epochs) bool array of the points to drop
+        @return the number of points dropped for each star
+        """
+        mask = np.asarray(mask, dtype=bool)
+        found = self.getArrayFromAllEpochs('pnt_t').T > -1000
+        numTrimmed = (mask & found).sum(axis=1)
+
+        rows = self._tableRows()
+        if rows is not None:
+            table = self._table
+            rows = np.arange(table.numStars)[rows]
+            for name in _pntNames + _photNames:
+                col = table.epoch[name]
+                values = col[rows]
+                values[mask] = -1000.0
+                col[rows] = values
+        else:
+            for ss, ee in zip(*np.where(mask)):
+                for name in _pntNames + _photNames:
+                    setattr(self.stars[ss].e[ee], name, -1000.0)
+
+        for ss in np.where(numTrimmed > 0)[0]:
+            self.stars[ss].pointsCnt -= numTrimmed[ss]
+
+        return numTrimmed
+
 
     def loadPolyfit(self, fitRoot, accel=0, arcsec=0, trimUnfound=True, silent=True):
         fitFile = fitRoot + '.linearFormal'
@@ -419,6 +556,7 @@ class StarSet(object):
         
         alignIdx = 0
         keepIdx = []
+        fits = []    # (fitx, fity) of every star, for the arcsec conversion
 
         for line in f_fit:
             _fit = line.split()
@@ -523,30 +661,135 @@ class StarSet(object):
             if fitpy.dof > 0:
                 fitpy.chi2red = fitpy.chi2 / fitpy.dof
 
-            if (arcsec):
-                (fitx.p, fity.p, fitx.perr, fity.perr) = \
-                         util.rerrPix2Arc(fitx.p, fity.p, fitx.perr, fity.perr, 
-                      self.t, relErr=self.relErr)
-
-
-                (fitx.v, fity.v, fitx.verr, fity.verr) = \
-                         util.verrPix2Arc(fitx.v, fity.v, fitx.verr, fity.verr, 
-                      self.t, relErr=self.relErr)
-
-                if (accel == 1):
-                    (fitx.a, fity.a, fitx.aerr, fity.aerr) = \
-                             util.aerrPix2Arc(fitx.a, fity.a, fitx.aerr, 
-                          fity.aerr,
-                          self.t, relErr = self.relErr)
+            fits.append((fitx, fity))
 
         f_fit.close()
         f_t0.close()
 
+        if (arcsec) and len(fits) > 0:
+            # Convert the fits of all stars at once
+            self._fitsPix2Arc(fits, accel=accel)
+
         if trimUnfound and len(keepIdx) > 0:
             # Trim stars down to just those with polyfit information
             newStars = [self.stars[ss] for ss in keepIdx]
             self.stars = newStars
 
+    def _fitsPix2Arc(self, fits, accel=0):
+        """Convert the (fitx, fity) pairs of polyfit fits from pixels
+        to arcsec in place, as whole arrays."""
+        pt = util.pixTransform(self.t, relErr=self.relErr)
+        fitx = [fit[0] for fit in fits]
+        fity = [fit[1] for fit in fits]
+
+        def values(objs, name):
+            return np.array([getattr(obj, name) for obj in objs], dtype=float)
+
+        def store(objs, name, vals):
+            for (obj, val) in zip(objs, vals.tolist()):
+                setattr(obj, name, val)
+
+        terms = [('p', 'perr', pt.position), ('v', 'verr', pt.velocity)]
+        if (accel == 1):
+            terms.append(('a', 'aerr', pt.acceleration))
+
+        for (name, errName, convert) in terms:
+            (x, y, xerr, yerr) = convert(values(fitx, name), values(fity, name),
+                                         values(fitx, errName), values(fity, errName))
+            store(fitx, name, x)
+            store(fity, name, y)
+            store(fitx, errName, xerr)
+            store(fity, errName, yerr)
+
+    def fitPoints(self, orders, mask=None):
+        """
+        Fit polynomials of the given orders to the x and y positions
+        in the points files loaded by loadPoints(), for all stars at
+        once (see polyfit/batchfit.py). As in polyfit, t0 is the
+        error-weighted mean epoch, separately for x and y.
+
+        @param orders: list of polynomial orders, e.g. [1, 2]
+        @kwparam mask: optional (stars, epochs) bool array of points to
+            use, on top of skipping epochs missing from the points files
+        @return (fitsX, fitsY): dictionaries of order -> PolyfitResult
+            with one row per star in self.stars
+        """
+        # scipy is only needed here, so keep it out of StarSet imports
+        from gcwork.polyfit import batchfit
+
+        t = self.getArrayFromAllEpochs('pnt_t').T
+        x = self.getArrayFromAllEpochs('pnt_x').T
+        y = self.getArrayFromAllEpochs('pnt_y').T
+        xe = self.getArrayFromAllEpochs('pnt_xe').T
+        ye = self.getArrayFromAllEpochs('pnt_ye').T
+
+        found = (t > -1000) & (x > -1000) & (y > -1000)
+        if mask is not None:
+            found &= mask
+
+        fitsX = batchfit.fitOrders(t, x, xe, orders, mask=found)
+        fitsY = batchfit.fitOrders(t, y, ye, orders, mask=found)
+
+        return (fitsX, fitsY)
+
+    def computePolyfit(self, accel=0):
+        """
+        In-process alternative to running polyfit and loadPolyfit():
+        fit the points loaded by loadPoints() and store the results as
+        fitXv/fitYv (and fitpXv/fitpYv), or fitXa/fitYa (and
+        fitpXa/fitpYa) with accel=1. Points files are in arcsec, so no
+        conversion from pixels is done. Stars with too few points get
+        NaN fits.
+
+        Each fit also gets chi2, q, dof and chi2red, with dof based on
+        the number of points used.
+        """
+        order = 2 if accel == 1 else 1
+        (fitsX, fitsY) = self.fitPoints([order])
+
+        suffix = 'a' if accel == 1 else 'v'
+        for fitName, res in [('fitX', fitsX[order]), ('fitY', fitsY[order]),
+                             ('fitpX', fitsX[order]), ('fitpY', fitsY[order])]:
+            self._storeFit(fitName + suffix, res)
+
+    def _storeFit(self, fitName, res):
+        """Save a batchfit.PolyfitResult (order 1 or 2) as the fit
+        named fitName (e.g. 'fitXa') of every star."""
+        values = {'t0': res.t0, 'p': res.coeffs[:,0], 'perr': res.coeffErr[:,0],
+                  'v': res.coeffs[:,1], 'verr': res.coeffErr[:,1]}
+        if res.order >= 2:
+            values['a'] = res.coeffs[:,2]
+            values['aerr'] = res.coeffErr[:,2]
+        values['chi2'] = res.chi2
+        values['q'] = res.q
+        values['dof'] = res.dof
+        values['chi2red'] = res.chi2red
+
+        rows = self._tableRows()
+        if rows is not None:
+            table = self._table
+            for key, value in values.items():
+                col = np.zeros(table.numStars, dtype=np.asarray(value).dtype)
+                col[rows] = value
+                table.setStarColumn(fitName + '.' + key, col)
+
+            # Drop fits set earlier on the star objects themselves, so
+            # they read the new columns.
+            for star in self.stars:
+                star.__dict__.pop('_Star__' + fitName, None)
+            return
+
+        setFit = 'set' + fitName[0].upper() + fitName[1:]
+        for ss, star in enumerate(self.stars):
+            args = [values['t0'][ss], values['p'][ss], values['perr'][ss],
+                    values['v'][ss], values['verr'][ss]]
+            if res.order >= 2:
+                args += [values['a'][ss], values['aerr'][ss]]
+            getattr(star, setFit)(*args)
+
+            fit = getattr(star, fitName)
+            for key in ['chi2', 'q', 'dof', 'chi2red']:
+                setattr(fit, key, values[key][ss])
 
     def loadEfitResults(self, efitRoot, trimStars=0, orbitsOnly=0):
         accelFile = efitRoot + '.acclim'
@@ -662,6 +905,27 @@ class StarSet(object):
         print( 'Found %d young stars.' % len(stars))
 
 
+    def _tableRows(self):
+        """Row indices into the columnar StarTable for the current
+        list of stars, a plain slice if the list is untouched, or None
+        if any star is not backed by the table (e.g. legacy loading).
+        """
+        table = getattr(self, '_table', None)
+        if table is None:
+            return None
+
+        rows = np.empty(len(self.stars), dtype=int)
+        for ss, star in enumerate(self.stars):
+            if star.__dict__.get('_table') is not table:
+                return None
+            rows[ss] = star.__dict__['_row']
+
+        if (len(rows) == table.numStars and
+            (rows == np.arange(table.numStars)).all()):
+            return slice(None)
+
+        return rows
+
     def getArray(self, varName):
         """Turn an attribute hanging off the list of stars into
         an array.
@@ -672,6 +936,14 @@ class StarSet(object):
         @return objArray
         @rtype Either list or Numarray array
         """
+        rows = self._tableRows()
+        if rows is not None and varName in self._table.star:
+            objArray = self._table.star[varName][rows]
+            if objArray.dtype.kind == 'U':
+                # Strings shouldn't be numpy arrays
+                return objArray.tolist()
+            return objArray.copy()
+
         objNames = varName.split('.')
 
         objList = self.stars
@@ -701,6 +973,14 @@ class StarSet(object):
         @return objArray
         @rtype Either list or Numarray array
         """
+        rows = self._tableRows()
+        if rows is not None and varName in self._table.epoch:
+            objArray = self._table.epoch[varName][rows, epochIndex]
+            if objArray.dtype.kind == 'U':
+                # Strings shouldn't be numpy arrays
+                return objArray.tolist()
+            return objArray.copy()
+
         objNames = varName.split('.')
 
         objList = [star.e[epochIndex] for star in self.stars]
@@ -724,6 +1004,9 @@ class StarSet(object):
         xpix = s.getArrayFromAllEpochs('xpix')
         print( xpix[epochIdx, starIdx])
 
+        For columnar star sets this is a read-only view of the
+        (possibly memory-mapped) column; use .copy() to modify it.
+
         @type epochIndex integer
         @param epochIndex the zero-based index for the epoch to select from.
         @type varName String
@@ -732,6 +1015,16 @@ class StarSet(object):
         @return objArray
         @rtype Either list or Numarray array
         """
+        rows = self._tableRows()
+        if rows is not None and varName in self._table.epoch:
+            objArray = self._table.epoch[varName][rows].T
+            if isinstance(rows, slice):
+                # Zero-copy view of the column; read-only so callers
+                # can't modify the star data through it by accident.
+                objArray = objArray.view(np.ndarray)
+                objArray.flags.writeable = False
+                return objArray
+            return objArray
 
         objList = []
         for ee in range(len(self.years)):
@@ -742,3 +1035,182 @@ class StarSet(object):
         return objArray
 
 
+
+
+# Columns of the .points and .phot files, in file order.
+_pntNames = ['pnt_t', 'pnt_x', 'pnt_y', 'pnt_xe', 'pnt_ye']
+_photNames = ['phot_t', 'phot_r', 'phot_x', 'phot_y', 'phot_xe', 'phot_ye',
+              'phot_mag', 'phot_mage']
+
+def _readPoints(fileName, numCols):
+    """Read a .points or .phot file into a 2D array with one row per
+    point (an empty file gives shape (0, numCols))."""
+    with warnings.catch_warnings():
+        # Empty points files are normal for trimmed stars.
+        warnings.simplefilter('ignore', UserWarning)
+        data = np.loadtxt(fileName, ndmin=2)
+    if data.size == 0:
+        data = data.reshape((0, numCols))
+    return data
+
+def _readPointsDir(pointsDir, names, threads=8):
+    """Read the .points and .phot files for every star name.
+
+    @return (pnts, phot) lists of 2D arrays in the order of names
+    """
+    def readStar(name):
+        return (_readPoints('%s%s.points' % (pointsDir, name), len(_pntNames)),
+                _readPoints('%s%s.phot' % (pointsDir, name), len(_photNames)))
+
+    if threads > 1:
+        with ThreadPoolExecutor(max_workers=threads) as pool:
+            data = list(pool.map(readStar, names))
+    else:
+        data = [readStar(name) for name in names]
+
+    return ([d[0] for d in data], [d[1] for d in data])
+
+def packPoints(pointsDir, bundleFile=None, threads=8):
+    """Pack all the .points and .phot files in pointsDir into a single
+    .npz bundle that StarSet.loadPoints(pointsDir, bundle=...) reads in
+    one go. The bundle is a snapshot: re-pack after editing points files.
+
+    @param bundleFile: output file (default pointsDir/points_bundle.npz)
+    @return the name of the bundle file
+    """
+    if bundleFile is None:
+        bundleFile = os.path.join(pointsDir, 'points_bundle.npz')
+
+    names = sorted([os.path.basename(f)[:-len('.points')]
+                    for f in glob.glob(pointsDir + '*.points')])
+    (pnts, phot) = _readPointsDir(pointsDir, names, threads=threads)
+
+    pnts = [p[:, :len(_pntNames)] for p in pnts]
+    phot = [p[:, :len(_photNames)] for p in phot]
+
+    np.savez(bundleFile,
+             names=np.array(names, dtype=str),
+             pntOffsets=np.cumsum([0] + [len(p) for p in pnts]),
+             pnt=np.concatenate(pnts + [np.zeros((0, len(_pntNames)))]),
+             photOffsets=np.cumsum([0] + [len(p) for p in phot]),
+             phot=np.concatenate(phot + [np.zeros((0, len(_photNames)))]))
+
+    return bundleFile
+
+def _readPointsBundle(bundleFile, names):
+    """Same as _readPointsDir() but from a bundle made by packPoints()."""
+    _bundle = np.load(bundleFile)
+    rowOf = dict((name, ii) for ii, name in enumerate(_bundle['names']))
+    pntOffsets = _bundle['pntOffsets']
+    photOffsets = _bundle['photOffsets']
+    pnt = _bundle['pnt']
+    phot = _bundle['phot']
+    _bundle.close()
+
+    allPnts = []
+    allPhot = []
+    for name in names:
+        if name not in rowOf:
+            raise IOError('%s: no points for %s' % (bundleFile, name))
+        ii = rowOf[name]
+        allPnts.append(pnt[pntOffsets[ii]:pntOffsets[ii+1]])
+        allPhot.append(phot[photOffsets[ii]:photOffsets[ii+1]])
+
+    return (allPnts, allPhot)
+
+def _duplicateRank(years):
+    """For every epoch, the number of earlier epochs with exactly
+    the same date (0 for unique dates)."""
+    years = np.asarray(years)
+    order = np.argsort(years, kind='stable')
+    sortedYears = years[order]
+
+    # Start of the run of identical dates each sorted entry belongs to
+    newRun = np.concatenate(([True], sortedYears[1:] != sortedYears[:-1]))
+    runStart = np.maximum.accumulate(np.where(newRun, np.arange(len(years)), 0))
+
+    rank = np.empty(len(years), dtype=int)
+    rank[order] = np.arange(len(years)) - runStart
+    return rank
+
+def _matchEpochs(pntDate, epochDates, dupRank, tol):
+    """Find the row of a points file belonging to each epoch, i.e.
+    with abs(pntDate - epochDate) < tol.
+
+    If several rows match, the epoch takes the rows in file order by
+    its dupRank (the 1st epoch with that date takes the 1st row, the
+    2nd epoch the 2nd row, etc.), matching the old per-epoch loop.
+
+    @return array of row indices, -1 where there is no match
+    """
+    numPnts = len(pntDate)
+    idx = np.zeros(len(epochDates), dtype=int) - 1
+    if numPnts == 0:
+        return idx
+
+    order = np.argsort(pntDate, kind='stable')
+    sortedDate = pntDate[order]
+
+    # Loosely bracket the matching rows, then nudge the edges inward
+    # so the result is exactly abs(pntDate - epochDate) < tol.
+    lo = np.searchsorted(sortedDate, epochDates - 2*tol, side='left')
+    hi = np.searchsorted(sortedDate, epochDates + 2*tol, side='right')
+    while True:
+        fix = (lo < hi) & ~(np.abs(sortedDate[np.minimum(lo, numPnts-1)] -
+                                   epochDates) < tol)
+        if not fix.any():
+            break
+        lo[fix] += 1
+    while True:
+        fix = (hi > lo) & ~(np.abs(sortedDate[hi-1] - epochDates) < tol)
+        if not fix.any():
+            break
+        hi[fix] -= 1
+
+    cnt = hi - lo
+
+    one = np.where(cnt == 1)[0]
+    idx[one] = order[lo[one]]
+
+    for ee in np.where(cnt > 1)[0]:
+        # Multiple points for a single date, so make sure to go through each index
+        tt = np.sort(order[lo[ee]:hi[ee]])
+        if dupRank[ee] < len(tt):
+            idx[ee] = tt[dupRank[ee]]
+
+    return idx
+
+def _fillColumns(table, row, names, values, idx):
+    """Copy rows idx of a points/phot array into the epoch columns of
+    one star. Epochs with idx < 0 keep their -1000 fill value."""
+    good = np.where(idx >= 0)[0]
+    if len(good) == 0:
+        return
+    for cc, name in enumerate(names):
+        table.epoch[name][row, good] = values[idx[good], cc]
+
+def _readTable(fileName, dtype=float):
+    """Read an align table whose first column is the star name.
+
+    @return (names, values) where values is a 2D array holding the
+        remaining columns.
+    """
+    f = open(fileName, 'r')
+    numCols = len(f.readline().split())
+    f.close()
+
+    if numCols == 0:
+        return (np.array([], dtype=str), np.zeros((0, 0), dtype=dtype))
+
+    names = np.loadtxt(fileName, dtype=str, usecols=0, ndmin=1)
+    values = np.loadtxt(fileName, dtype=dtype, usecols=range(1, numCols),
+                        ndmin=2)
+
+    return (names, values)
+
+def _setFit(table, fitName, t0, p, perr, v, verr):
+    table.setStarColumn(fitName + '.t0', t0)
+    table.setStarColumn(fitName + '.p', p)
+    table.setStarColumn(fitName + '.perr', perr)
+    table.setStarColumn(fitName + '.v', v)
+    table.setStarColumn(fitName + '.verr', verr)
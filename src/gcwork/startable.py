@@ -0,0 +1,210 @@
+import os
+import json
+import shutil
+import hashlib
+import numpy as np
+
+# Files that make up an align root. A change to any of them
+# invalidates a cached StarTable.
+ALIGN_SUFFIXES = ['.date', '.pos', '.err', '.mag', '.vel', '.param',
+                  '.origpos', '.b0', '.name', '.sgra', '.scale']
+
+# Bump whenever the on-disk layout or the loader output changes.
+CACHE_VERSION = 1
+
+
+class StarTable(object):
+    """Columnar storage for align output.
+
+    Every per-star quantity is kept as a 1D array with one entry per
+    star and every per-epoch quantity is kept as a 2D array with shape
+    (stars, epochs). The Star/Epoch objects handed out by StarSet are
+    thin proxies that read and write these arrays.
+
+    t = StarTable(years)
+    t.star['x']          - array of shape (stars,)
+    t.epoch['xpix']      - array of shape (stars, epochs)
+
+    Fit objects are stored as dotted star columns, e.g. 'fitXalign.p'.
+
+    If mmapDir is set, per-epoch columns are kept as memory-mapped
+    .npy files in that directory instead of in RAM.
+    """
+    def __init__(self, years, mmapDir=None):
+        self.years = np.atleast_1d(np.asarray(years, dtype=float))
+        self.star = {}
+        self.epoch = {}
+        self.mmapDir = mmapDir
+
+    def getNumStars(self):
+        if len(self.star) == 0:
+            return 0
+        return len(next(iter(self.star.values())))
+    numStars = property(fget=getNumStars, doc="Number of stars (rows)")
+
+    def getNumEpochs(self):
+        return len(self.years)
+    numEpochs = property(fget=getNumEpochs, doc="Number of epochs (columns)")
+
+    def hasFit(self, fitName):
+        return (fitName + '.p') in self.star
+
+    def setStarColumn(self, name, value):
+        value = np.asarray(value)
+        if value.shape != (self.numStars,) and len(self.star) > 0:
+            raise ValueError('StarTable: column %s has shape %s, expected %s' %
+                             (name, value.shape, (self.numStars,)))
+        self.star[name] = value
+
+    def setEpochColumn(self, name, value):
+        value = np.asarray(value)
+        if value.shape != (self.numStars, self.numEpochs):
+            raise ValueError('StarTable: column %s has shape %s, expected %s' %
+                             (name, value.shape,
+                              (self.numStars, self.numEpochs)))
+        if self.mmapDir is not None and not isinstance(value, np.memmap):
+            col = self.newEpochColumn(name, dtype=value.dtype)
+            col[:] = value
+            return
+        self.epoch[name] = value
+
+    def newEpochColumn(self, name, fill=0, dtype=float):
+        """Allocate a (stars, epochs) column filled with fill, on disk
+        if mmapDir is set, and return it."""
+        shape = (self.numStars, self.numEpochs)
+        if self.mmapDir is not None:
+            if not os.path.exists(self.mmapDir):
+                os.makedirs(self.mmapDir)
+            fileName = os.path.join(self.mmapDir, 'epoch.%s.npy' % name)
+            col = np.lib.format.open_memmap(fileName, mode='w+',
+                                            dtype=dtype, shape=shape)
+            col[:] = fill
+        else:
+            col = np.full(shape, fill, dtype=dtype)
+        self.epoch[name] = col
+        return col
+
+    def setValue(self, columns, name, idx, value):
+        """Write a single value into an existing column, widening
+        string columns when the new value does not fit."""
+        col = columns[name]
+        if col.dtype.kind == 'U' and isinstance(value, str):
+            width = col.dtype.itemsize // 4
+            if len(value) > width:
+                col = col.astype('U%d' % len(value))
+                columns[name] = col
+        col[idx] = value
+
+    def save(self, dirName, meta=None):
+        """Write every column to its own .npy file in dirName along
+        with a meta.json describing the table. The directory is
+        written under a temporary name and renamed into place."""
+        tmpDir = '%s.tmp%d' % (dirName, os.getpid())
+        if os.path.exists(tmpDir):
+            shutil.rmtree(tmpDir)
+        os.makedirs(tmpDir)
+
+        np.save(os.path.join(tmpDir, 'years.npy'), self.years)
+        for kind in ['star', 'epoch']:
+            for name, col in getattr(self, kind).items():
+                np.save(os.path.join(tmpDir, '%s.%s.npy' % (kind, name)),
+                        np.ascontiguousarray(col))
+
+        info = {'version': CACHE_VERSION,
+                'star': list(self.star.keys()),
+                'epoch': list(self.epoch.keys()),
+                'meta': meta}
+        _f = open(os.path.join(tmpDir, 'meta.json'), 'w')
+        json.dump(info, _f)
+        _f.close()
+
+        if os.path.exists(dirName):
+            shutil.rmtree(dirName)
+        os.rename(tmpDir, dirName)
+
+    def load(cls, dirName, mmap_mode='c'):
+        """Read a table written by save(). Columns are memory-mapped;
+        the default copy-on-write mode lets proxies modify values in
+        memory without touching the files.
+
+        @return (table, meta)
+        """
+        _f = open(os.path.join(dirName, 'meta.json'), 'r')
+        info = json.load(_f)
+        _f.close()
+
+        table = cls(np.load(os.path.join(dirName, 'years.npy')))
+        for kind in ['star', 'epoch']:
+            cols = getattr(table, kind)
+            for name in info[kind]:
+                fileName = os.path.join(dirName, '%s.%s.npy' % (kind, name))
+                cols[name] = np.load(fileName, mmap_mode=mmap_mode)
+
+        return (table, info['meta'])
+    load = classmethod(load)
+
+
+def defaultCacheDir():
+    """Cache location: $GCWORK_CACHE or ~/.cache/gcwork"""
+    cacheDir = os.environ.get('GCWORK_CACHE')
+    if cacheDir is None:
+        cacheDir = os.path.join(os.path.expanduser('~'), '.cache', 'gcwork')
+    return cacheDir
+
+def fingerprint(root, suffixes=ALIGN_SUFFIXES):
+    """List of [suffix, mtime_ns, size] for the files of an align
+    root. Missing files are recorded with None."""
+    files = []
+    for suffix in suffixes:
+        try:
+            st = os.stat(root + suffix)
+            files.append([suffix, st.st_mtime_ns, st.st_size])
+        except OSError:
+            files.append([suffix, None, None])
+    return files
+
+def cachePath(root, options, cacheDir=None, kind='starset'):
+    """Cache directory for an align root loaded with the given
+    options (a string describing anything else that changes the
+    loaded values, e.g. the transform)."""
+    if cacheDir is None:
+        cacheDir = defaultCacheDir()
+    key = os.path.abspath(root) + '\n' + options
+    key = hashlib.md5(key.encode()).hexdigest()
+    return os.path.join(cacheDir, kind, key)
+
+def loadCache(root, options, cacheDir=None):
+    """Return the cached StarTable for this align root, or None if
+    there is none or any of the align files changed since."""
+    dirName = cachePath(root, options, cacheDir=cacheDir)
+    if not os.path.exists(os.path.join(dirName, 'meta.json')):
+        return None
+
+    try:
+        (table, meta) = StarTable.load(dirName)
+    except (OSError, ValueError, KeyError):
+        return None
+
+    if meta is None or meta.get('version') != CACHE_VERSION:
+        return None
+    if meta.get('files') != fingerprint(root):
+        return None
+
+    return table
+
+def saveCache(table, root, options, cacheDir=None, files=None):
+    """Snapshot a StarTable for this align root. Pass the fingerprint
+    taken before parsing as files, so edits made while parsing still
+    invalidate the snapshot. Failures to write (e.g. read-only cache
+    location) are reported but not fatal."""
+    dirName = cachePath(root, options, cacheDir=cacheDir)
+    if files is None:
+        files = fingerprint(root)
+    meta = {'version': CACHE_VERSION,
+            'root': os.path.abspath(root),
+            'files': files}
+    try:
+        os.makedirs(os.path.dirname(dirName), exist_ok=True)
+        table.save(dirName, meta=meta)
+    except OSError as e:
+        print( 'StarTable: could not write cache %s: %s' % (dirName, e))
@@ -18,6 +18,7 @@ from gcwork import analyticOrbits as aorb
 #from gcwork import analyticOrbits2 as aorb
 from gcwork import starTables
 from gcwork import plot_disk_healpix as pdh
+from gcwork import healpix
 from gcwork.plotgc import plotStar
 from gcreduce import gcutil
 import starTables as tabs
@@ -13985,15 +13986,12 @@ def plot_mock_data(simdir='sim_true_isotropic/',numStars=5000):
     nside = 64
     npix = healpy.nside2npix(nside)
     pixIdx = np.arange(0, npix)
-    pdf = np.zeros((npix), dtype=float)
 
     # Determine which pixel in the map each of the
     # points goes (2D histogram)
     incl = i * np.pi / 180.0
     omeg = O * np.pi / 180.0
-    hidx = healpy.ang2pix(nside, incl, omeg)
-    for hh in hidx:
-        pdf[hh] += 1.0
+    pdf = healpix.makeMap(nside, incl, omeg)
     pdf /= numStars
     pdfFile = '%s/iO_healpix.dat' % wdir
     pdf.tofile(pdfFile)
@@ -20562,12 +20560,8 @@ def makePdfHealpix(name, pdf, outroot, ntrials, nside=64, sim=True,
     incl = pdf.i * math.pi / 180.0
     omeg = pdf.o * math.pi / 180.0
 
-    hidx = healpy.ang2pix(nside, incl, omeg)
-
     # Star's PDF
-    pdf = np.zeros(npix, dtype=float)
-    for hh in hidx:
-        pdf[hh] += 1.0  
+    pdf = healpix.makeMap(nside, incl, omeg)
     pdf /= ntrials
 
     py.clf()
@@ -0,0 +1,376 @@
+"""
+accelClass on small synthetic fields: align output written by
+test_starset.write_align() and points files on polynomial tracks,
+fit in-process with computePoly=True.
+"""
+import os
+import numpy as np
+import pytest
+from scipy import stats
+from gcwork import accel_class
+from gcwork.test_starset import write_align
+
+
+YEARS = list(np.arange(2000.5, 2012.5, 1.0))
+
+
+def write_field(rootDir, tracks, years=YEARS, seed=0, numSpeckle=4):
+    """Write align/align_d, points/ and scripts/epochsInfo.txt (the
+    first numSpeckle epochs are speckle, the rest AO) for stars on the
+    given tracks: a ((x0, vx, ax, y0, vy, ay, t0), epochs) pair per
+    star (arcsec, yr), where epochs are the indices of the epochs the
+    star is detected in.
+
+    @return the star names
+    """
+    for subDir in ['align', 'points', 'polyfit', 'scripts']:
+        os.makedirs(rootDir + subDir)
+    names = write_align(rootDir + 'align/align_d', nstars=len(tracks),
+                        years=years, seed=seed)
+
+    with open(rootDir + 'scripts/epochsInfo.txt', 'w') as f:
+        f.write('epoch directory isAO doAlign\n')
+        for ee, year in enumerate(years):
+            f.write('%.1f %d %d 1\n' % (year, ee, ee >= numSpeckle))
+
+    rng = np.random.default_rng(seed)
+    years = np.array(years)
+    for name, track in zip(names, tracks):
+        (fit, epochs) = track
+        (x0, vx, ax, y0, vy, ay, t0) = fit
+        t = years[epochs]
+        dt = t - t0
+        x = x0 + vx * dt + 0.5 * ax * dt**2 + rng.normal(0, 2e-4, len(t))
+        y = y0 + vy * dt + 0.5 * ay * dt**2 + rng.normal(0, 2e-4, len(t))
+        err = np.full(len(t), 2e-4)
+        np.savetxt(rootDir + 'points/' + name + '.points',
+                   np.column_stack((t, x, y, err, err)))
+        np.savetxt(rootDir + 'points/' + name + '.phot',
+                   np.column_stack((t, np.hypot(x, y), x, y, err, err,
+                                    np.full(len(t), 14.0),
+                                    np.full(len(t), 0.02))))
+    return names
+
+
+def field_tracks(numEpochs=len(YEARS)):
+    """Stars spread over a few arcsec, with S0-2 and S0-3 passing
+    within 0.01'' of each other in 2009."""
+    every = list(range(numEpochs))
+    tracks = [((0.5, 0.005, -2e-5, 0.4, 0.0, -1e-5, 2006.0), every),
+              ((1.0, 0.01, 0.0, 1.0, 0.0, 0.0, 2006.0), every),
+              ((1.06, -0.01, 0.0, 1.01, 0.0, 0.0, 2006.0), every),
+              ((-1.2, 0.0, 0.0, 0.3, 0.002, 0.0, 2006.0), every),
+              ((-0.4, -0.003, 0.0, -1.5, 0.0, 0.0, 2006.0), every),
+              ((2.0, 0.0, 0.0, -0.6, 0.004, 0.0, 2006.0), every)]
+    return tracks
+
+
+def make_accel(tmp_path, monkeypatch, tracks, **kwargs):
+    # findNonPhysical writes plots/ into the working directory
+    monkeypatch.chdir(tmp_path)
+    monkeypatch.setenv('GCWORK_CACHE', str(tmp_path / 'cache'))
+    rootDir = str(tmp_path / 'field') + '/'
+    names = write_field(rootDir, tracks)
+    a = accel_class.accelClass(rootDir=rootDir, align='align/align_d',
+                               poly='polyfit/fit', points='points/',
+                               computePoly=True, verbose=False, **kwargs)
+    return (a, names)
+
+
+def test_nearest_stars_with_nan_fits(tmp_path, monkeypatch):
+    # the last star has a single point, so its fits are NaN
+    tracks = field_tracks()
+    tracks.append(((0.52, 0.0, 0.0, 0.41, 0.0, 0.0, 2006.0), [4]))
+    (a, names) = make_accel(tmp_path, monkeypatch, tracks)
+
+    assert list(a.names) == names
+    assert np.isnan(a.x[-1]) and np.isfinite(a.x[:-1]).all()
+
+    srt = a.closestSources(4)
+    assert (srt[-1] == len(names) - 1).all()
+    assert (srt[:-1] != len(names) - 1).all()
+    assert (srt[:-1,0] == np.arange(len(names) - 1)).all()
+
+    # more sources than stars with fits
+    srt = a.closestSources(30)
+    assert srt.shape == (len(names), len(names))
+    assert (srt[:,-1] == np.arange(len(names))).all()
+
+    assert np.isinf(a.nearestStarDist[-1])
+    assert np.isfinite(a.nearestStarDist[:-1]).all()
+    assert a.nearestStarName[1] == names[2]
+    assert a.nearestStarName[2] == names[1]
+    assert a.nearestStarDist[1] < 0.01
+
+    assert a.neighbors[names[-1]] is None
+    assert list(a.neighbors[names[1]]) == [names[2]]
+    assert names[-1] not in a.confusedSources
+    assert names[1] in a.confusedSources and names[2] in a.confusedSources
+
+
+def test_confused_epochs(tmp_path, monkeypatch):
+    # S0-3 isn't detected in 2008.5 and 2009.5, while it is within
+    # 0.1'' of S0-2, so those epochs are confused for S0-2
+    tracks = field_tracks()
+    tracks[2] = (tracks[2][0], [0, 1, 2, 3, 4, 5, 6, 7, 10, 11])
+    fakeDir = tmp_path / 'polyfit_2_s' / 'edge'
+    fakeDir.mkdir(parents=True)
+    np.save(str(fakeDir / 'stars_fake.npy'), np.array(['S0-5']))
+    (a, names) = make_accel(tmp_path, monkeypatch, tracks)
+    assert (a.r2d[1:3] > 0.5).all()
+
+    expected = np.zeros((len(names), len(YEARS)), dtype=bool)
+    expected[1, [8, 9]] = True
+
+    (confused, culprits) = a.findConfusedEpochs()
+    assert np.array_equal(confused, expected)
+    assert list(culprits) == [names[1]]
+    assert list(culprits[names[1]]) == [names[2]]
+
+    # only the stars given in nRange are checked against their neighbors
+    (confused, culprits) = a.findConfusedEpochs(nRange=[0, 3, 4, 5])
+    assert not confused.any() and culprits == {}
+
+    # S0-2 fakes aren't confusing it
+    np.save(str(fakeDir / 'stars_fake.npy'), np.array(['S0-2', 'S0-5']))
+    with open(str(fakeDir / 'star_S0-2_fake.txt'), 'w') as f:
+        f.write('fake\nS0-3\n')
+    (confused, culprits) = a.findConfusedEpochs()
+    assert not confused.any()
+    np.save(str(fakeDir / 'stars_fake.npy'), np.array(['S0-5']))
+
+    pointsDir = a.rootDir + 'points/'
+    before = open(pointsDir + 'S0-2.points').readlines()
+    a.removeConfusedEpochs(Points='points_c/', inMemory=True)
+
+    # only the points files of S0-2 are rewritten, the rest are links
+    newDir = a.rootDir + 'points_c/'
+    assert sorted(os.listdir(newDir)) == sorted(
+        os.listdir(pointsDir) + ['epochsRemoved.txt', 'confusingSources.txt'])
+    for fileName in os.listdir(pointsDir):
+        rewritten = fileName.startswith('S0-2.')
+        assert os.path.islink(newDir + fileName) != rewritten, fileName
+        if not rewritten:
+            assert (os.path.realpath(newDir + fileName) ==
+                    os.path.realpath(pointsDir + fileName))
+
+    after = open(newDir + 'S0-2.points').readlines()
+    assert after == before[:8] + before[10:]
+    assert len(open(newDir + 'S0-2.phot').readlines()) == 10
+    assert open(newDir + 'epochsRemoved.txt').read() == 'S0-2 2008.5 2009.5\n'
+    assert open(newDir + 'confusingSources.txt').read() == 'S0-2 S0-3\n'
+
+    # the points are dropped in memory and refit
+    assert list(a.starSet.getArray('pointsCnt')) == [12, 10, 10, 12, 12, 12]
+    assert list(a.nEpochs) == [12, 10, 10, 12, 12, 12]
+    pnt_t = a.starSet.getArrayFromAllEpochs('pnt_t')
+    assert (pnt_t[[8, 9], 1] == -1000).all()
+
+
+def test_chi2_add_err_vs_fits(tmp_path, monkeypatch):
+    (a, names) = make_accel(tmp_path, monkeypatch, field_tracks())
+    a.magmax = 0
+    testErr = np.array([-1e-4, 0.0, 2e-4, 1e-3])
+    s = a.starSet
+
+    for data, epochInd in [('both', np.arange(len(YEARS))),
+                           ('speckle', np.arange(4)),
+                           ('ao', np.arange(4, len(YEARS)))]:
+        (chi2, nEpochs) = a.chi2AddErr(testErr, direction='both',
+                                       scaleFactor=2.0, data=data)
+        stars = a.addErrStarsInd
+        assert len(stars) > 0
+        assert nEpochs == len(epochInd)
+        assert chi2.shape == (len(testErr), 2 * len(stars))
+
+        years = np.array(YEARS)[epochInd]
+        for (cc, (coo, sign)) in enumerate([('x', -1.0), ('y', 1.0)]):
+            pos = sign * s.getArrayFromAllEpochs(coo)[epochInd]
+            err2 = (s.getArrayFromAllEpochs(coo + 'err_p')[epochInd]**2 / 4.0 +
+                    s.getArrayFromAllEpochs(coo + 'err_a')[epochInd]**2)
+            for (ee, add) in enumerate(testErr):
+                for (ii, ss) in enumerate(stars):
+                    err = np.sqrt(err2[:,ss] + np.sign(add) * add**2)
+                    fit = np.polyfit(years, pos[:,ss], 1, w=1.0 / err)
+                    res = (pos[:,ss] - np.polyval(fit, years)) / err
+                    assert np.isclose(chi2[ee, cc * len(stars) + ii],
+                                      (res**2).sum(), rtol=1e-7)
+
+        (chi2x, nEpochs) = a.chi2AddErr(testErr, direction='x', data=data,
+                                        scaleFactor=2.0)
+        assert np.array_equal(chi2x, chi2[:, :len(stars)])
+
+
+def test_chi2_hist_diff_vs_histogram():
+    a = accel_class.accelClass(lazy=True)
+    rng = np.random.default_rng(5)
+    nEpochs = 12
+    chi2 = rng.chisquare(nEpochs - 2, (6, 80)) * rng.uniform(0.5, 2, (6, 1))
+    # values on bin edges, outside the histogram and NaN
+    chi2[0, :5] = [0.0, 1.2, 34.8, 36.0, 40.0]
+    chi2[1, :2] = [-1.0, np.nan]
+
+    for maxChi2 in [None, 24.0]:
+        diff = a.chi2HistDiff(chi2, nEpochs, maxChi2=maxChi2)
+        top = 3.0 * nEpochs if maxChi2 is None else maxChi2
+        width = top / 30.0
+        bins = np.arange(0, top, width)
+        for row in range(len(chi2)):
+            (n, edges) = np.histogram(chi2[row][np.isfinite(chi2[row])],
+                                      bins=bins)
+            theory = stats.chi2.pdf(bins, nEpochs - 2.0) * n.sum() * width
+            err = np.sqrt(n)
+            err[n == 0] = 1.0
+            expected = (n - theory[0:-1]) / err
+            assert np.allclose(diff[row], expected)
+            assert np.allclose(a.chi2HistDiff(chi2[row], nEpochs,
+                                              maxChi2=maxChi2), expected)
+
+
+def test_best_add_err_parabola():
+    a = accel_class.accelClass(lazy=True)
+    testErr = np.linspace(0.0, 1e-3, 41)
+    chi2 = ((testErr - 4e-4) / 1e-4)**2
+    (best, lower, upper) = a.bestAddErr(testErr, chi2)
+    assert np.isclose(best, 4e-4)
+    assert np.isclose(lower, 3e-4) and np.isclose(upper, 5e-4)
+
+    # between grid points, the crossings are interpolated (on the
+    # chords, which lie above the parabola)
+    chi2 = ((testErr - 4e-4) / 1.1e-4)**2 + 3.0
+    chi2[5] = np.nan
+    (best, lower, upper) = a.bestAddErr(testErr, chi2)
+    assert np.isclose(best, 4e-4)
+    step = testErr[1] - testErr[0]
+    assert abs(lower - 2.9e-4) < step / 4 and abs(upper - 5.1e-4) < step / 4
+    assert 2.9e-4 < lower < upper < 5.1e-4
+
+    # clipped to the range of testErr
+    chi2 = ((testErr - 0.5e-4) / 1e-4)**2
+    (best, lower, upper) = a.bestAddErr(testErr, chi2)
+    assert np.isclose(best, 0.5e-4)
+    assert lower == 0.0 and np.isclose(upper, 1.5e-4)
+
+
+def find_best_order_loop(a, chix, chiy, nEpochs, p_crit):
+    """The per-star F test loop of the original find_best_order."""
+    orders = a.poly_orders
+    n_par = orders + 1
+    best = np.zeros(chix.shape[1])
+    for idx in range(chix.shape[1]):
+        i = 0
+        for i in range(len(orders)-1):
+            if (a.p_value(chix[i, idx], chix[i+1, idx], nEpochs[idx],
+                          n_par[i], n_par[i+1]) < p_crit) \
+                    and (a.p_value(chiy[i, idx], chiy[i+1, idx], nEpochs[idx],
+                                   n_par[i], n_par[i+1]) < p_crit):
+                best[idx] = orders[i]
+                break
+        else:
+            best[idx] = orders[i+1]
+    return best
+
+
+def test_find_best_orders_vs_loop():
+    a = accel_class.accelClass(lazy=True)
+    orders = a.poly_orders
+    n_par = orders + 1
+    rng = np.random.default_rng(6)
+
+    # chi2 that drops by random amounts with the order
+    nstars = 60
+    nEpochs = rng.integers(8, 20, nstars)
+    drop = rng.uniform(0.2, 1.0, (2, len(orders), nstars))
+    (chix, chiy) = nEpochs * np.cumprod(drop, axis=1)
+    # a star with too few epochs, and one without a fit of order 3
+    nEpochs[4] = 5
+    chix[2, 7] = np.nan
+    chiy[:, 9] = np.nan
+
+    with np.errstate(divide='ignore', invalid='ignore'):
+        Fx = a.p_value(chix[:-1], chix[1:], nEpochs,
+                       n_par[:-1, np.newaxis], n_par[1:, np.newaxis])
+        Fy = a.p_value(chiy[:-1], chiy[1:], nEpochs,
+                       n_par[:-1, np.newaxis], n_par[1:, np.newaxis])
+        assert np.isnan(Fx[1:3, 7]).all() and np.isnan(Fy[:, 9]).all()
+
+        a.Fx_poly, a.Fy_poly = Fx, Fy
+        for p_crit in [0.5, 0.8, 0.95]:
+            loop = find_best_order_loop(a, chix, chiy, nEpochs, p_crit)
+            best = a.find_best_orders(p_crit)
+            assert np.array_equal(best, loop)
+            assert len(np.unique(best)) > 2
+            assert [a.find_best_order(idx, p_crit)
+                    for idx in range(nstars)] == list(loop)
+            # NaN p-values never stop the search
+            assert best[9] == orders[-1]
+
+    # a small matrix of 1-p values
+    Fx = np.array([[0.1, 0.9, 0.9, np.nan, 0.1],
+                   [0.1, 0.1, 0.9, 0.1, np.nan],
+                   [0.9, 0.9, np.nan, 0.1, 0.1],
+                   [0.1, 0.1, 0.9, 0.1, 0.1]])
+    Fy = np.array([[0.9, 0.1, 0.1, 0.1, 0.1],
+                   [0.1, 0.1, 0.9, 0.1, 0.1],
+                   [0.1, 0.1, 0.1, np.nan, 0.1],
+                   [0.1, 0.1, 0.1, 0.1, 0.1]])
+    with np.errstate(invalid='ignore'):
+        best = a.find_best_orders(0.5, Fx=Fx, Fy=Fy)
+    assert list(best) == [2, 2, 5, 2, 1]
+
+
+def test_lazy_cached_stages(tmp_path, monkeypatch, capsys):
+    cacheDir = str(tmp_path / 'stages')
+    (a, names) = make_accel(tmp_path, monkeypatch, field_tracks(),
+                            lazy=True, cache=True, cacheDir=cacheDir)
+    assert a.stagesDone == {}
+
+    # reading ar only runs the stages it needs
+    ar = a.ar.copy()
+    assert sorted(a.stagesDone) == ['accel', 'fits', 'load']
+    assert 'nearestStarDist' not in a.__dict__
+    assert len(ar) == len(names)
+
+    nearest = a.nearestStarName.copy()
+    assert sorted(a.stagesDone) == ['accel', 'fits', 'load', 'nearestStar']
+
+    # a second object loads the results from the store, without
+    # parsing align or fitting the points
+    def fail(self):
+        raise AssertionError('load stage ran')
+    monkeypatch.setattr(accel_class.accelClass, '_stageLoad', fail)
+    capsys.readouterr()
+
+    b = accel_class.accelClass(rootDir=a.rootDir, align='align/align_d',
+                               poly='polyfit/fit', points='points/',
+                               computePoly=True, lazy=True, cache=True,
+                               cacheDir=cacheDir)
+    assert np.array_equal(b.ar, ar)
+    assert list(b.nearestStarName) == list(nearest)
+    assert sorted(b.stagesDone) == ['accel', 'nearestStar']
+    assert 'starSet' not in b.__dict__
+    out = capsys.readouterr().out
+    assert 'loaded stage accel from the stage store' in out
+    assert 'loaded stage nearestStar from the stage store' in out
+
+    # a changed parameter recomputes the stage, from the stored
+    # results of the stages before it
+    c = accel_class.accelClass(rootDir=a.rootDir, align='align/align_d',
+                               poly='polyfit/fit', points='points/',
+                               computePoly=True, lazy=True, cache=True,
+                               cacheDir=cacheDir, sigma=3)
+    assert np.array_equal(c.ar, ar)
+    assert sorted(c.stagesDone) == ['accel', 'fits']
+    out = capsys.readouterr().out
+    assert 'loaded stage fits from the stage store' in out
+    assert 'loaded stage accel' not in out
+
+    # as do changed points files, which need the load stage again
+    with open(a.rootDir + 'points/S0-1.points', 'a') as f:
+        f.write('2012.6 0.53 0.35 0.001 0.001\n')
+    d = accel_class.accelClass(rootDir=a.rootDir, align='align/align_d',
+                               poly='polyfit/fit', points='points/',
+                               computePoly=True, lazy=True, cache=True,
+                               cacheDir=cacheDir)
+    with pytest.raises(AssertionError, match='load stage ran'):
+        d.ar
@@ -0,0 +1,88 @@
+import math
+import numpy as np
+from gcwork import diskdensity
+from gcwork import healpix
+
+
+def make_trials(nstars=40, trials=7, seed=0):
+    rng = np.random.default_rng(seed)
+    # half of the stars on a common plane, like the clockwise disk
+    incl = np.arccos(rng.uniform(-1, 1, (nstars, trials)))
+    omeg = rng.uniform(0, 2 * math.pi, (nstars, trials))
+    incl[::2] = np.radians(rng.normal(130.0, 5.0, (nstars // 2, trials)))
+    omeg[::2] = np.radians(rng.normal(96.0, 5.0, (nstars // 2, trials)))
+    return (incl, omeg)
+
+
+def brute_force(incl, omeg, ipix, opix, neighbors, angCut):
+    """The offset table and sort of the original Disk.densityPDF."""
+    factor = 2.0 * math.pi * (180.0 / math.pi)**2
+    angCutArea = factor * (1 - math.cos(angCut))
+
+    cosodiff = np.cos(opix[np.newaxis, :] - omeg[:, np.newaxis])
+    angOff = np.arccos(np.clip(np.outer(np.sin(incl), np.sin(ipix)) * cosodiff
+                               + np.outer(np.cos(incl), np.cos(ipix)), -1, 1))
+    angOff.sort(axis=0)
+
+    maps = [nth / (factor * (1.0 - np.cos(angOff[nth-1, :])))
+            for nth in neighbors]
+    aperture = (angOff < angCut).sum(axis=0) / angCutArea
+    return (np.array(maps), aperture)
+
+
+def test_density_chunk_vs_brute_force():
+    (incl, omeg) = make_trials()
+    nside = 8
+    (ipix, opix) = healpix.pix2ang(nside, np.arange(healpix.nside2npix(nside)))
+    neighbors = [1, 4, 5, 6, 7]
+    angCut = 0.1047
+
+    diskdensity.densityInit(ipix, opix, neighbors, angCut)
+    res = diskdensity.densityChunk((incl, omeg))
+
+    mapSum = 0.0
+    apSum = 0.0
+    for ii in range(incl.shape[1]):
+        (maps, aperture) = brute_force(incl[:, ii], omeg[:, ii], ipix, opix,
+                                       neighbors, angCut)
+        mapSum = mapSum + maps
+        apSum = apSum + aperture
+
+        assert np.allclose(res['peakDensity'][:, ii], maps.max(axis=1),
+                           rtol=1e-6)
+        assert np.allclose(res['nnMaps'][ii], maps[2], rtol=1e-6)
+        assert np.allclose(res['apMaps'][ii], aperture, rtol=1e-6)
+        assert np.isclose(res['peakDensityAp'][ii], aperture.max())
+
+    assert np.allclose(res['neighborSum'], mapSum, rtol=1e-6)
+    assert np.allclose(res['apertureSum'], apSum)
+
+
+def test_density_maps_pool_and_files(tmp_path):
+    (incl, omeg) = make_trials(trials=25, seed=1)
+    nside = 4
+    (ipix, opix) = healpix.pix2ang(nside, np.arange(healpix.nside2npix(nside)))
+    neighbors = [4, 5, 6, 7]
+
+    diskdensity.densityInit(ipix, opix, neighbors, 0.2)
+    whole = diskdensity.densityChunk((incl, omeg))
+
+    for processes in [1, 2]:
+        nnFile = str(tmp_path / ('nn%d.dat' % processes))
+        apFile = str(tmp_path / ('ap%d.dat' % processes))
+        with open(nnFile, 'wb') as nnOut, open(apFile, 'wb') as apOut:
+            res = diskdensity.densityMaps(incl, omeg, ipix, opix, neighbors,
+                                          angCut=0.2, processes=processes,
+                                          chunkSize=10, nnOut=nnOut,
+                                          apOut=apOut, verbose=False)
+
+        for name in ['neighborSum', 'neighborSumSq', 'apertureSum']:
+            assert np.allclose(res[name], whole[name])
+        for name in ['peakDensity', 'peakPix', 'peakDensityAp', 'peakPixAp']:
+            assert np.array_equal(res[name], whole[name])
+
+        nnMaps = np.fromfile(nnFile, dtype=np.float32).reshape(25, -1)
+        apMaps = np.fromfile(apFile, dtype=np.float32).reshape(25, -1)
+        assert np.array_equal(nnMaps, whole['nnMaps'])
+        assert np.array_equal(apMaps, whole['apMaps'])
+
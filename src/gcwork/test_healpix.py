@@ -0,0 +1,75 @@
+import math
+import numpy as np
+from gcwork import healpix
+
+
+def test_pix2ang_round_trip():
+    for nside in [1, 2, 3, 8, 64]:
+        pix = np.arange(healpix.nside2npix(nside))
+        (theta, phi) = healpix.pix2ang(nside, pix)
+        assert np.array_equal(healpix.ang2pix(nside, theta, phi), pix)
+
+    # a sample of the pixels of a fine map
+    nside = 2048
+    pix = np.random.default_rng(0).integers(0, healpix.nside2npix(nside),
+                                            100000)
+    pix = np.concatenate([pix, np.arange(100), healpix.nside2npix(nside) -
+                          1 - np.arange(100)])
+    (theta, phi) = healpix.pix2ang(nside, pix)
+    assert np.array_equal(healpix.ang2pix(nside, theta, phi), pix)
+
+
+def test_nside1_centers():
+    (theta, phi) = healpix.pix2ang(1, np.arange(12))
+    assert np.allclose(np.degrees(theta),
+                       [48.19] * 4 + [90.0] * 4 + [131.81] * 4, atol=0.01)
+    assert np.allclose(np.degrees(phi),
+                       [45, 135, 225, 315, 0, 90, 180, 270,
+                        45, 135, 225, 315])
+
+
+def test_vs_scalar_versions():
+    rng = np.random.default_rng(1)
+    theta = np.arccos(rng.uniform(-1, 1, 300))
+    phi = rng.uniform(0, 2 * math.pi, 300)
+    # close to the poles too
+    theta[:20] = rng.uniform(0, 0.05, 20)
+    theta[20:40] = math.pi - rng.uniform(0, 0.05, 20)
+
+    for nside in [1, 4, 16]:
+        pix = healpix.ang2pix(nside, theta, phi)
+        for tt, pp, ip in zip(theta, phi, pix):
+            assert healpix.ang2pix_ring(nside, tt, pp) == ip
+            assert np.allclose(healpix.pix2ang_ring(nside, ip),
+                               [a[()] for a in healpix.pix2ang(nside, ip)])
+
+
+def test_make_maps():
+    rng = np.random.default_rng(2)
+    nside = 4
+    theta = np.arccos(rng.uniform(-1, 1, (3, 500)))
+    phi = rng.uniform(0, 2 * math.pi, (3, 500))
+    theta[1, ::7] = np.nan
+    weights = rng.uniform(0, 1, (3, 500))
+
+    maps = healpix.makeMaps(nside, theta, phi, weights=weights)
+    loop = np.zeros((3, healpix.nside2npix(nside)))
+    for mm in range(3):
+        for tt, pp, ww in zip(theta[mm], phi[mm], weights[mm]):
+            if np.isnan(tt):
+                continue
+            loop[mm, healpix.ang2pix_ring(nside, tt, pp)] += ww
+    assert np.allclose(maps, loop)
+
+    counts = healpix.makeMaps(nside, theta, phi)
+    assert np.array_equal(counts.sum(axis=1), [500, 500 - 72, 500])
+
+    # sparse maps give the same maps back
+    (rows, pix, values) = healpix.makeSparseMaps(nside, theta, phi,
+                                                 weights=weights)
+    assert (values > 0).all()
+    assert np.allclose(healpix.sparseToMaps(nside, rows, pix, values), maps)
+
+    (pix, values) = healpix.makeSparseMap(nside, theta[0], phi[0])
+    assert np.array_equal(healpix.sparseToMap(nside, pix, values),
+                          healpix.makeMap(nside, theta[0], phi[0]))
@@ -0,0 +1,30 @@
+import math
+import numpy as np
+from gcwork import kepler
+
+
+def test_eccentric_anomaly_vs_previous():
+    # same solutions as the previous Orbit.eccen_anomaly, up to e = 0.995
+    rng = np.random.default_rng(1)
+    M = rng.uniform(-3 * math.pi, 3 * math.pi, 2000)
+    M[:500] = rng.uniform(-0.1, 0.1, 500)
+
+    for ecc in [0.0, 0.1, 0.5, 0.88, 0.97, 0.995]:
+        E = kepler.eccentricAnomaly(M, ecc)
+        Eprev = kepler._eccenAnomalyPrevious(M, ecc)
+
+        assert np.abs(kepler._wrap(E - Eprev)).max() < 1e-9
+        assert np.abs(E - ecc * np.sin(E) - M).max() <= 1e-10
+
+
+def test_eccentric_anomaly_batch():
+    # one call for many orbits equals one call per orbit
+    rng = np.random.default_rng(2)
+    e = rng.uniform(0.0, 0.995, 50)
+    M = rng.uniform(-math.pi, math.pi, (50, 30))
+
+    E = kepler.eccentricAnomaly(M, e[:, np.newaxis])
+    assert E.shape == (50, 30)
+    for oo in range(50):
+        Eone = kepler.eccentricAnomaly(M[oo], e[oo])
+        assert np.abs(E[oo] - Eone).max() < 1e-12
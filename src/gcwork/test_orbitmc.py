@@ -0,0 +1,125 @@
+import numpy as np
+import scipy.integrate
+from gcwork import objects
+from gcwork import orbitmc
+
+
+class FakeStar(object):
+    """Measured kinematics as StarOrbitsMC reads them off a star,
+    in the (scale = 1) pixel units of StarOrbitsMC._initTransform."""
+    def __init__(self, z=0.1):
+        self.name = 'S0-fake'
+        self.sigma = 3.0
+
+        self.x_dat = 0.12      # arcsec (+x west)
+        self.y_dat = 0.15
+        self.xerr_dat = 0.001
+        self.yerr_dat = 0.001
+        self.vx_dat = 0.008    # arcsec/yr
+        self.vy_dat = -0.005
+        self.vxerr_dat = 0.0002
+        self.vyerr_dat = 0.0002
+        self.vz_dat = 300.0    # km/s
+        self.vzerr_dat = 30.0
+
+        # radial acceleration for a star at z, pointing at Sgr A*
+        r = np.hypot(self.x_dat, self.y_dat)
+        ar = orbitmc.z2acc(self.x_dat, self.y_dat, z, 7960.0, 4.1e6) / 1000.0
+        self.ax_dat = ar * self.x_dat / r   # arcsec/yr^2
+        self.ay_dat = ar * self.y_dat / r
+        self.axerr_dat = abs(ar) * 0.1
+        self.ayerr_dat = abs(ar) * 0.1
+
+        self.trans = objects.Transform()
+        self.trans.scale = 1.0
+        self.trans.scaleErr = 0.0
+        self.trans.sgra = [-0.001, -0.005]
+        self.trans.sgraErr = [0.0, 0.0]
+        self.trans.angle = 0.0
+        self.trans.angleErr = 0.0
+
+
+def test_sample_trials_bound():
+    cc = objects.Constants()
+    for zfrom in orbitmc.zfromModes:
+        mc = orbitmc.sampleTrials(FakeStar(), 2000, np.random.default_rng(1),
+                                  zfrom=zfrom, verbose=False)
+        for name in ['x', 'y', 'z', 'vx', 'vy', 'vz', 'ar', 'mass', 'dist']:
+            assert mc[name].shape == (2000,)
+            assert np.isfinite(mc[name]).all(), (zfrom, name)
+
+        # every accepted trial is on a bound orbit
+        assert ((mc['ar'] > mc['amin']) & (mc['ar'] < mc['amax'])).all()
+        assert (mc['z'] >= 0).all() and (mc['z'] <= mc['zmax']).all()
+        rcgs = np.sqrt(mc['x']**2 + mc['y']**2 + mc['z']**2)
+        rcgs *= mc['dist'] * cc.cm_in_au
+        v2 = (mc['vx']**2 + mc['vy']**2 + mc['vz']**2) * 1.0e10
+        assert (v2 < 2.0 * cc.G * mc['mass'] * cc.msun / rcgs).all()
+
+        ar = orbitmc.z2acc(mc['x'], mc['y'], mc['z'], mc['dist'], mc['mass'])
+        assert np.allclose(ar, mc['ar'])
+
+
+def test_sample_trials_seed():
+    one = orbitmc.sampleTrials(FakeStar(), 500, np.random.default_rng(7),
+                               verbose=False)
+    two = orbitmc.sampleTrials(FakeStar(), 500, np.random.default_rng(7),
+                               verbose=False)
+    for name in one:
+        assert np.array_equal(one[name], two[name])
+
+    # measured acceleration, so z lands near the true z = 0.1
+    assert abs(np.median(one['z']) - 0.1) < 0.02
+
+
+class SlowRng(object):
+    """Uniform draws that stay out of range for the first 499 loops,
+    then all fall in at once."""
+    def __init__(self):
+        self.calls = 0
+
+    def uniform(self, low, high):
+        self.calls += 1
+        if self.calls < 500:
+            return high
+        return (low + high) / 2.0
+
+
+def test_sample_acc_problem_message():
+    star = FakeStar()
+    mc = orbitmc.sampleBound(star, np.arange(10), np.random.default_rng(2),
+                             None, 'all', None, False)
+    ar = orbitmc.sampleAcc(star, mc, SlowRng(), 'all', True)
+    assert np.allclose(ar, (mc['amin'] + mc['amax']) / 2.0)
+
+
+def test_potentials_extended_mass():
+    class Draws(object):
+        m = np.array([4.0e6, 4.2e6])
+        r0 = np.array([7900.0, 8100.0])
+        x0 = np.array([-0.001, 0.002])
+        y0 = np.array([-0.005, 0.001])
+        rho0 = np.array([1.0e5, 3.0e5])
+
+    x = np.array([0.5, 3.0])
+    y = np.array([-0.2, 12.0])
+    trials = np.arange(2)
+
+    (mass, dist, x0, y0) = orbitmc.potentials(None, trials)
+    assert np.allclose(mass, 4.1e6) and np.allclose(dist, 7960.0)
+
+    # the analytic integrals match the quad() of StarOrbitsMC._getPotential
+    for mExt in ['trippe', Draws()]:
+        (mass, dist, x0, y0) = orbitmc.potentials(Draws(), trials, mExt, x, y)
+        for tt in trials:
+            r2d = np.hypot(x[tt], y[tt]) * Draws.r0[tt] / 206265.
+            if mExt == 'trippe':
+                Rb = 8.9 * Draws.r0[tt] / 206265.
+                rho0 = 2.1e6
+                func = lambda r: r**2 / (1 + (r / Rb)**2)
+            else:
+                rho0 = Draws.rho0[tt]
+                func = lambda r: (r / 5.0)**(-1.0) * r**2
+            Mext = 4.0 * np.pi * rho0 * scipy.integrate.quad(func, 0, r2d)[0]
+            assert np.isclose(mass[tt], Draws.m[tt] + Mext, rtol=1e-10)
+            assert dist[tt] == Draws.r0[tt] and x0[tt] == Draws.x0[tt]
@@ -0,0 +1,67 @@
+import numpy as np
+from gcwork import orbits
+
+
+def test_xyz2kep_batch_vs_xyz2kep():
+    rng = np.random.default_rng(0)
+    r = rng.normal(0, 0.3, (50, 3))
+    v = rng.normal(0, 600, (50, 3))
+    re = np.abs(r) * 0.01
+    ve = np.abs(v) * 0.01
+
+    before = np.geterr()
+    orb = orbits.xyz2kepBatch(r, v, re, ve, 2005.0)
+    assert np.geterr() == before
+    assert (~orb.bound).any() and orb.bound.any()
+
+    names = ['i', 'ie', 'e', 'ee', 'w', 'we', 'o', 'oe',
+             'p', 'pe', 't0', 't0e', 'ph', 'phe', 'a']
+    for nn in range(len(r)):
+        one = orbits.Orbit()
+        try:
+            # xyz2kep() scales r and re in place
+            one.xyz2kep(r[nn].copy(), v[nn].copy(), re[nn].copy(),
+                        ve[nn].copy(), 2005.0)
+        except ValueError:
+            assert not orb.bound[nn]
+            assert np.isnan(orb.e[nn])
+            continue
+
+        assert orb.bound[nn]
+        for name in names:
+            assert np.isclose(getattr(orb, name)[nn], getattr(one, name),
+                              rtol=1e-8, equal_nan=True), name
+
+
+def test_kep2xyz_batch_vs_kep2xyz():
+    rng = np.random.default_rng(1)
+    nn = 12
+    p = rng.uniform(10, 200, nn)
+    t0 = rng.uniform(1990, 2020, nn)
+    e = np.array([0.0, 0.1, 0.3, 0.5, 0.7, 0.85, 0.9, 0.93, 0.95, 0.97,
+                  0.98, 0.995])
+    i = rng.uniform(0, 180, nn)
+    o = rng.uniform(0, 360, nn)
+    w = rng.uniform(0, 360, nn)
+    epochs = np.linspace(1995.0, 2025.0, 301)
+    mass = rng.uniform(3.5e6, 4.5e6, nn)
+    dist = rng.uniform(7500.0, 8500.0, nn)
+
+    for (mm, dd) in [(None, None), (4.0e6, 8000.0), (mass, dist)]:
+        (r, v, a) = orbits.kep2xyzBatch(p, t0, e, i, o, w, epochs,
+                                        mass=mm, dist=dd)
+        assert r.shape == v.shape == a.shape == (nn, len(epochs), 3)
+
+        for kk in range(nn):
+            orb = orbits.Orbit()
+            (orb.p, orb.t0, orb.e) = (p[kk], t0[kk], e[kk])
+            (orb.i, orb.o, orb.w) = (i[kk], o[kk], w[kk])
+            kwargs = {}
+            if mm is not None:
+                kwargs['mass'] = np.atleast_1d(mm)[kk % np.size(mm)]
+                kwargs['dist'] = np.atleast_1d(dd)[kk % np.size(dd)]
+            (r1, v1, a1) = orb.kep2xyz(epochs, **kwargs)
+
+            assert np.allclose(r[kk], r1, rtol=1e-8, atol=1e-12)
+            assert np.allclose(v[kk], v1, rtol=1e-8, atol=1e-9)
+            assert np.allclose(a[kk], a1, rtol=1e-8, atol=1e-12)
@@ -0,0 +1,70 @@
+import numpy as np
+from gcwork import orbits
+from gcwork import orbittracks
+
+
+ELEMENTS = [[15.9, 2002.3, 0.88, 134.0, 227.0, 66.0],
+            [94.1, 2009.3, 0.50, 24.0, 101.0, 235.0],
+            [9.9, 2009.0, 0.97, 50.0, 300.0, 10.0],
+            [300.0, 1980.0, 0.0, 90.0, 0.0, 0.0]]
+
+
+def write_orbits(fileName, elements):
+    with open(fileName, 'w') as f:
+        for nn, (p, t0, e, i, o, w) in enumerate(elements):
+            f.write('S0-%d %r 0.1 %r %r %r %r %r\n' %
+                    (nn + 1, p, t0, e, i, o, w))
+
+
+def test_adaptive_track_vs_kep2xyz_batch():
+    for elements in ELEMENTS:
+        for (mass, dist) in [(None, None), (4.3e6, 8200.0)]:
+            (t, xy) = orbittracks.adaptiveTrack(*elements, tStart=1994.,
+                                                tEnd=2020., mass=mass,
+                                                dist=dist)
+            (r, v, a) = orbits.kep2xyzBatch(*[[x] for x in elements],
+                                            epochs=t, mass=mass, dist=dist)
+            assert np.allclose(xy, r[0, :, 0:2], rtol=1e-8, atol=1e-10)
+
+            # at most one revolution, starting at tStart
+            assert np.isclose(t[0], 1994.)
+            assert (np.diff(t) > 0).all()
+            assert t[-1] <= min(2020., 1994. + elements[0]) + 1e-8
+
+
+def test_store_invalidation(tmp_path):
+    orbitsFile = str(tmp_path / 'orbits.dat')
+    cacheDir = str(tmp_path / 'cache')
+    write_orbits(orbitsFile, ELEMENTS)
+
+    store = orbittracks.OrbitTrackStore(cacheDir=cacheDir)
+    (tracks, names) = store.load(orbitsFile)
+    assert names == ['S0-1', 'S0-2', 'S0-3', 'S0-4']
+    assert store.numComputed == 4
+
+    # a new store reads them back from disk
+    store = orbittracks.OrbitTrackStore(cacheDir=cacheDir)
+    (again, names) = store.load(orbitsFile)
+    assert store.numComputed == 0
+    for one, two in zip(tracks, again):
+        assert np.array_equal(one, two)
+
+    # only the star whose elements changed is recomputed
+    for col in range(6):
+        edited = [list(row) for row in ELEMENTS]
+        edited[1][col] *= 1.01
+        write_orbits(orbitsFile, edited)
+        (changed, names) = store.load(orbitsFile)
+        assert store.numComputed == 1, col
+        assert not np.array_equal(changed[1], tracks[1])
+        assert np.array_equal(changed[0], tracks[0])
+
+    # a different mass or distance recomputes every track
+    write_orbits(orbitsFile, ELEMENTS)
+    for kwargs in [{'mass': 4.3e6}, {'dist': 8200.0}]:
+        store = orbittracks.OrbitTrackStore(cacheDir=cacheDir, **kwargs)
+        (other, names) = store.load(orbitsFile)
+        assert store.numComputed == 4
+        assert not np.array_equal(other[0], tracks[0])
+        store.load(orbitsFile)
+        assert store.numComputed == 0
@@ -0,0 +1,75 @@
+import os
+from gcwork import stagestore
+
+
+def write(fileName, text, bump=0):
+    with open(fileName, 'w') as f:
+        f.write(text)
+    if bump:
+        st = os.stat(fileName)
+        os.utime(fileName, ns=(st.st_atime_ns, st.st_mtime_ns + bump))
+
+
+def test_stage_invalidation(tmp_path):
+    polyFile = str(tmp_path / 'fit.accelFormal')
+    write(polyFile, 'S0-1 1 2 3\n')
+    store = stagestore.StageStore(str(tmp_path / 'align_d'), 'abs',
+                                  cacheDir=str(tmp_path / 'cache'))
+
+    def keys(params):
+        accel = stagestore.stageKey('accel',
+                                    stagestore.fileFingerprint([polyFile]),
+                                    params)
+        chi2 = stagestore.stageKey('chi2', {}, accel)
+        return (accel, chi2)
+
+    (accelKey, chi2Key) = keys({'sigma': 5})
+    assert store.load('accel', accelKey) is None
+    store.save('accel', accelKey, {'ax': [1.0, 2.0]})
+    store.save('chi2', chi2Key, {'chi2': [3.0]})
+
+    assert store.load('accel', accelKey) == {'ax': [1.0, 2.0]}
+    assert store.load('chi2', chi2Key) == {'chi2': [3.0]}
+
+    # a new parameter recomputes the stage and everything after it
+    (accelKey2, chi2Key2) = keys({'sigma': 3})
+    assert store.load('accel', accelKey2) is None
+    assert store.load('chi2', chi2Key2) is None
+
+    # so does a changed input file
+    write(polyFile, 'S0-1 1 2 4\n', bump=10**9)
+    (accelKey3, chi2Key3) = keys({'sigma': 5})
+    assert accelKey3 != accelKey
+    assert store.load('accel', accelKey3) is None
+    assert store.load('chi2', chi2Key3) is None
+
+    # a missing file has its own fingerprint
+    os.remove(polyFile)
+    assert stagestore.fileFingerprint([polyFile]) == [[polyFile, None, None]]
+
+    store.clear()
+    assert store.load('accel', accelKey) is None
+
+
+def test_dir_fingerprint(tmp_path):
+    pointsDir = tmp_path / 'points'
+    assert stagestore.dirFingerprint(str(pointsDir)) is None
+
+    pointsDir.mkdir()
+    write(str(pointsDir / 'S0-2.points'), '2005.5 0.1 0.2\n')
+    before = stagestore.dirFingerprint(str(pointsDir))
+    assert [entry[0] for entry in before] == ['S0-2.points']
+
+    write(str(pointsDir / 'S0-1.points'), '2005.5 0.1 0.2\n')
+    after = stagestore.dirFingerprint(str(pointsDir))
+    assert [entry[0] for entry in after] == ['S0-1.points', 'S0-2.points']
+    assert stagestore.stageKey(before) != stagestore.stageKey(after)
+
+
+def test_corrupt_stage_file(tmp_path):
+    store = stagestore.StageStore(str(tmp_path / 'align_d'),
+                                  cacheDir=str(tmp_path / 'cache'))
+    key = stagestore.stageKey('accel')
+    store.save('accel', key, {'ax': 1})
+    write(store.fileName('accel'), 'not a pickle')
+    assert store.load('accel', key) is None
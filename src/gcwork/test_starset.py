@@ -0,0 +1,214 @@
+import numpy as np
+import pytest
+from gcwork import starset
+
+
+YEARS = [2004.5, 2005.5, 2005.5, 2006.5, 2007.5]
+
+STAR_FIELDS = ['velCnt', 'mag', 'magerr', 'x', 'y', 'vx', 'vxerr', 'vy',
+               'vyerr', 'v2d', 'v2derr', 'r2d']
+FIT_FIELDS = ['t0', 'p', 'perr', 'v', 'verr']
+EPOCH_FIELDS = ['xpix', 'ypix', 'xorig', 'yorig', 'xpixerr_p', 'ypixerr_p',
+                'xpixerr_a', 'ypixerr_a', 'mag', 'snr', 'corr', 'nframes',
+                'fwhm', 'x', 'y', 'xerr_p', 'yerr_p', 'xerr_a', 'yerr_a']
+
+
+def write_align(root, nstars=6, years=YEARS, seed=0, scale=0.00995):
+    """Write a small, random align output (root.date, root.pos, ...).
+    Every star is missing from some epochs (-1000 positions), one star
+    has a negative positional error and one an infinite alignment
+    error."""
+    rng = np.random.default_rng(seed)
+    nep = len(years)
+    names = ['S0-%d' % (ss + 1) for ss in range(nstars)]
+
+    xpix = rng.uniform(-400, 400, (nstars, nep))
+    ypix = rng.uniform(-400, 400, (nstars, nep))
+    missing = rng.uniform(0, 1, (nstars, nep)) < 0.2
+    missing[:, 0] = False
+    missing[np.arange(nstars), 1 + np.arange(nstars) % (nep - 1)] = True
+    xpix[missing] = -1000.0
+    ypix[missing] = -1000.0
+
+    err = rng.uniform(0.01, 0.2, (nstars, nep, 4))
+    err[0, 1, 0] = -0.05
+    err[1, 2, 2] = np.inf
+
+    def table(suffix, rows, fmt='%.10g'):
+        with open(root + suffix, 'w') as f:
+            for name, row in zip(names, rows):
+                f.write(' '.join([name] + [fmt % v for v in row]) + '\n')
+
+    with open(root + '.date', 'w') as f:
+        f.write(' '.join(str(year) for year in years) + '\n')
+    with open(root + '.sgra', 'w') as f:
+        f.write('1.5 -2.0 0.3 0.0\n')
+    with open(root + '.scale', 'w') as f:
+        f.write('%g\n' % scale)
+
+    table('.pos', np.stack((xpix, ypix), axis=2).reshape(nstars, -1))
+    table('.origpos', np.stack((xpix + 0.5, ypix - 0.5),
+                               axis=2).reshape(nstars, -1))
+    table('.err', err.reshape(nstars, -1))
+    table('.mag', np.column_stack((rng.uniform(9, 17, nstars),
+                                   rng.uniform(0, 0.1, (nstars, 2)),
+                                   rng.uniform(9, 17, (nstars, nep)))))
+    table('.vel', np.column_stack(((~missing).sum(axis=1), np.ones(nstars),
+                                   xpix[:, 0], ypix[:, 0],
+                                   rng.normal(0, 1, (nstars, 6)))))
+    table('.b0', np.column_stack((np.full(nstars, 2006.0),
+                                  rng.normal(0, 100, (nstars, 4)),
+                                  np.zeros((nstars, 2)),
+                                  rng.normal(0, 100, (nstars, 4)),
+                                  np.zeros((nstars, 2)))))
+    table('.param', rng.uniform(0, 10, (nstars, 4 * nep)))
+    table('.name', [['%s_%d' % (name, ee) for ee in range(nep)]
+                    for name in names], fmt='%s')
+
+    return names
+
+
+def assert_same(one, two):
+    one = np.asarray(one)
+    two = np.asarray(two)
+    assert one.shape == two.shape
+    if one.dtype.kind in 'US':
+        assert (one == two).all()
+    else:
+        assert np.allclose(one, two, rtol=1e-12, atol=0, equal_nan=True)
+
+
+def test_columnar_vs_objects(tmp_path):
+    root = str(tmp_path / 'align_d')
+    names = write_align(root)
+
+    col = starset.StarSet(root)
+    obj = starset.StarSet(root, columnar=False)
+    assert col._table is not None and obj._table is None
+
+    assert col.getArray('name') == obj.getArray('name') == names
+    for field in STAR_FIELDS:
+        assert_same(col.getArray(field), obj.getArray(field))
+    for fit in ['fitXalign', 'fitYalign', 'fitpXalign', 'fitpYalign']:
+        for field in FIT_FIELDS:
+            assert_same(col.getArray(fit + '.' + field),
+                        obj.getArray(fit + '.' + field))
+
+    for field in EPOCH_FIELDS + ['name']:
+        assert_same(col.getArrayFromAllEpochs(field),
+                    obj.getArrayFromAllEpochs(field))
+        for ee in range(len(YEARS)):
+            assert_same(col.getArrayFromEpoch(ee, field),
+                        obj.getArrayFromEpoch(ee, field))
+
+    # the -1000 sentinels and the clipped and infinite errors
+    xpix = col.getArrayFromAllEpochs('xpix')
+    assert (xpix == -1000).sum() >= len(names)
+    assert col.stars[0].e[1].xpixerr_p == obj.stars[0].e[1].xpixerr_p == 0
+    assert col.stars[1].e[2].xpixerr_a == obj.stars[1].e[2].xpixerr_a == 0
+    assert col.stars[1].e[2].ypixerr_a == obj.stars[1].e[2].ypixerr_a == 0
+
+
+def test_all_epochs_read_only(tmp_path):
+    root = str(tmp_path / 'align_d')
+    write_align(root)
+    s = starset.StarSet(root)
+
+    x = s.getArrayFromAllEpochs('x')
+    assert not x.flags.writeable
+    with pytest.raises(ValueError):
+        x[0, 0] = 1.0
+    assert np.shares_memory(x, s._table.epoch['x'])
+
+    # a trimmed star list gives a copy that can be changed
+    s.stars = s.stars[::2]
+    x = s.getArrayFromAllEpochs('x')
+    x[0, 0] = 1.0
+    assert s.stars[0].e[0].x != 1.0
+
+
+def match_loop(pntDate, epochDates, tol):
+    """The per-epoch matching that loadPoints used to do."""
+    idx = np.zeros(len(epochDates), dtype=int) - 1
+    for ee, date in enumerate(epochDates):
+        rows = np.where(abs(pntDate - date) < tol)[0]
+        nth = list(epochDates[:ee]).count(date)
+        if len(rows) == 1:
+            idx[ee] = rows[0]
+        elif nth < len(rows):
+            idx[ee] = rows[nth]
+    return idx
+
+
+def test_match_epochs():
+    years = np.array(YEARS)
+    dupRank = starset._duplicateRank(years)
+    assert list(dupRank) == [0, 0, 1, 0, 0]
+
+    cases = [[2004.5, 2005.5, 2005.5, 2006.5, 2007.5],
+             # two rows on a date, out of order, with one close by
+             [2007.5, 2005.5, 2004.5, 2005.5, 2005.5004, 2006.5],
+             # one row for the two epochs on 2005.5
+             [2005.5, 2007.5],
+             # more rows than epochs on a date, and none that match
+             [2005.5, 2005.5, 2005.5],
+             [2003.0, 2008.0],
+             []]
+    for dates in cases:
+        pntDate = np.array(dates, dtype=float)
+        idx = starset._matchEpochs(pntDate, years, dupRank, 0.001)
+        assert list(idx) == list(match_loop(pntDate, years, 0.001)), dates
+
+    idx = starset._matchEpochs(np.array(cases[1]), years, dupRank, 0.001)
+    assert list(idx) == [2, 1, 3, 5, 0]
+
+
+def write_points(pointsDir, name, dates, rng):
+    pnts = np.column_stack((dates, rng.normal(0, 1, (len(dates), 2)),
+                            rng.uniform(0, 0.01, (len(dates), 2))))
+    phot = np.column_stack((dates, rng.normal(0, 1, (len(dates), 7))))
+    np.savetxt(pointsDir + name + '.points', pnts)
+    np.savetxt(pointsDir + name + '.phot', phot)
+    return pnts
+
+
+def test_load_points_dir_and_bundle(tmp_path):
+    root = str(tmp_path / 'align_d')
+    names = write_align(root, nstars=4)
+    pointsDir = str(tmp_path / 'points') + '/'
+    (tmp_path / 'points').mkdir()
+
+    rng = np.random.default_rng(4)
+    # two rows on 2005.5, missing epochs, and no points at all
+    pnts = [write_points(pointsDir, names[0],
+                         [2004.5, 2005.5, 2005.5, 2006.5, 2007.5], rng),
+            write_points(pointsDir, names[1], [2004.5, 2007.5], rng),
+            write_points(pointsDir, names[2], [2005.5, 2006.5], rng),
+            write_points(pointsDir, names[3], [], rng)]
+
+    bundle = starset.packPoints(pointsDir, str(tmp_path / 'points.npz'))
+
+    fields = starset._pntNames + starset._photNames
+    loaded = []
+    for columnar in [True, False]:
+        for kwargs in [{}, {'threads': 1}, {'bundle': bundle}]:
+            s = starset.StarSet(root, columnar=columnar)
+            s.loadPoints(pointsDir, **kwargs)
+            loaded.append(s)
+
+    s = loaded[0]
+    assert list(s.getArray('pointsCnt')) == [5, 2, 2, 0]
+    pnt_x = s.getArrayFromAllEpochs('pnt_x')
+    assert list(pnt_x[:, 0]) == list(pnts[0][:, 1])
+    assert list(pnt_x[:, 1]) == [pnts[1][0, 1], -1000, -1000, -1000,
+                                 pnts[1][1, 1]]
+    # both 2005.5 epochs take the only 2005.5 row
+    assert list(pnt_x[:, 2]) == [-1000, pnts[2][0, 1], pnts[2][0, 1],
+                                 pnts[2][1, 1], -1000]
+    assert (pnt_x[:, 3] == -1000).all()
+
+    for other in loaded[1:]:
+        assert list(other.getArray('pointsCnt')) == [5, 2, 2, 0]
+        for field in fields:
+            assert np.array_equal(other.getArrayFromAllEpochs(field),
+                                  s.getArrayFromAllEpochs(field)), field
@@ -0,0 +1,77 @@
+import numpy as np
+import pytest
+from gcwork import startable
+
+
+def make_table(mmapDir=None):
+    t = startable.StarTable([2005.5, 2006.5, 2007.5], mmapDir=mmapDir)
+    t.setStarColumn('name', np.array(['S0-1', 'S0-2']))
+    t.setStarColumn('mag', np.array([14.5, 13.9]))
+    t.setEpochColumn('xpix', np.arange(6, dtype=float).reshape((2, 3)))
+    return t
+
+
+def test_star_table_columns():
+    t = make_table()
+    assert t.numStars == 2
+    assert t.numEpochs == 3
+
+    with pytest.raises(ValueError):
+        t.setStarColumn('r', np.zeros(3))
+    with pytest.raises(ValueError):
+        t.setEpochColumn('ypix', np.zeros((2, 2)))
+
+    # string columns widen instead of truncating
+    t.setValue(t.star, 'name', 0, 'S0-102')
+    assert t.star['name'][0] == 'S0-102'
+
+
+def test_star_table_mmap(tmp_path):
+    t = make_table(mmapDir=str(tmp_path / 'cols'))
+    assert isinstance(t.epoch['xpix'], np.memmap)
+    assert (np.asarray(t.epoch['xpix']) == np.arange(6).reshape((2, 3))).all()
+
+
+def test_star_table_save_load(tmp_path):
+    t = make_table()
+    t.save(str(tmp_path / 'table'), meta={'root': 'align'})
+
+    (t2, meta) = startable.StarTable.load(str(tmp_path / 'table'))
+    assert meta == {'root': 'align'}
+    assert (t2.years == t.years).all()
+    assert sorted(t2.star.keys()) == sorted(t.star.keys())
+    for name in t.star:
+        assert (t2.star[name] == t.star[name]).all()
+    assert (t2.epoch['xpix'] == t.epoch['xpix']).all()
+
+    # copy-on-write: changes stay in memory
+    t2.epoch['xpix'][0, 0] = -1.0
+    (t3, meta) = startable.StarTable.load(str(tmp_path / 'table'))
+    assert t3.epoch['xpix'][0, 0] == 0.0
+
+
+def write_align(root, text):
+    for suffix in startable.ALIGN_SUFFIXES:
+        with open(root + suffix, 'w') as f:
+            f.write(text)
+
+
+def test_snapshot_cache(tmp_path):
+    root = str(tmp_path / 'align_d')
+    cacheDir = str(tmp_path / 'cache')
+    write_align(root, '1 2 3\n')
+
+    assert startable.loadCache(root, 'abs', cacheDir=cacheDir) is None
+    startable.saveCache(make_table(), root, 'abs', cacheDir=cacheDir)
+
+    cached = startable.loadCache(root, 'abs', cacheDir=cacheDir)
+    assert cached is not None
+    assert (cached.epoch['xpix'] == make_table().epoch['xpix']).all()
+
+    # other load options have their own snapshot
+    assert startable.loadCache(root, 'rel', cacheDir=cacheDir) is None
+
+    # any change to an align file invalidates the snapshot
+    with open(root + '.pos', 'w') as f:
+        f.write('1 2 3 4\n')
+    assert startable.loadCache(root, 'abs', cacheDir=cacheDir) is None
@@ -0,0 +1,63 @@
+import numpy as np
+from gcwork import util
+
+
+class FakeTransform(object):
+    def __init__(self):
+        self.scale = 0.00995
+        self.scaleErr = 0.00005
+        self.angle = np.radians(0.3)
+        self.angleErr = np.radians(0.05)
+        self.sgra = [512.3, 511.8]
+        self.sgraErr = [0.2, 0.3]
+
+
+def make_pixels(num=200, seed=0):
+    rng = np.random.default_rng(seed)
+    xpix = rng.uniform(0, 1024, num)
+    ypix = rng.uniform(0, 1024, num)
+    xerr = rng.uniform(0.01, 0.5, num)
+    yerr = rng.uniform(0.01, 0.5, num)
+
+    # missing data place holders
+    xpix[::17] = -100000.0
+    ypix[::17] = -100000.0
+    return (xpix, ypix, xerr, yerr)
+
+
+def check_scalar_vs_array(func, *values, **kwargs):
+    arrays = func(*values, **kwargs)
+    for ii in range(len(values[0])):
+        one = func(*[float(val[ii]) for val in values], **kwargs)
+        assert all(isinstance(val, float) for val in one)
+        assert np.allclose(one, [arr[ii] for arr in arrays], rtol=1e-12)
+
+
+def test_pix2arc_scalar_vs_array():
+    trans = FakeTransform()
+    (xpix, ypix, xerr, yerr) = make_pixels()
+    for absolute in [0, 1]:
+        for relErr in [0, 1]:
+            kw = dict(absolute=absolute, relErr=relErr)
+            check_scalar_vs_array(util.rPix2Arc, xpix, ypix, trans=trans, **kw)
+            check_scalar_vs_array(util.rerrPix2Arc, xpix, ypix, xerr, yerr,
+                                  trans=trans, **kw)
+            check_scalar_vs_array(util.vPix2Arc, xerr, yerr, trans=trans, **kw)
+            check_scalar_vs_array(util.verrPix2Arc, xerr, yerr, xerr, yerr,
+                                  trans=trans, **kw)
+            check_scalar_vs_array(util.aerrPix2Arc, xerr, yerr, xerr, yerr,
+                                  trans=trans, **kw)
+        check_scalar_vs_array(util.errPix2Arc, xerr, yerr, trans=trans,
+                              relErr=relErr)
+
+
+def test_pix2arc_place_holders():
+    trans = FakeTransform()
+    assert util.rPix2Arc(-100000.0, -100000.0, trans) == (-100000.0, -100000.0)
+    assert (util.rerrPix2Arc(-1000.0, -1000.0, 0.1, 0.2, trans) ==
+            (-1000.0, -1000.0, 0.1, 0.2))
+
+    (x, y) = util.rPix2Arc([-1000.0, -100000.0], [-1000.0, -100000.0], trans)
+    assert x[0] != -1000.0 and x[1] == -100000.0
+    (x, y, xe, ye) = util.rerrPix2Arc([-1000.0], [-1000.0], [0.1], [0.2], trans)
+    assert (x[0], y[0], xe[0], ye[0]) == (-1000.0, -1000.0, 0.1, 0.2)
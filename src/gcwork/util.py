@@ -2,9 +2,196 @@ import os, sys, math
 import numpy as np
 import pylab as py
 
+
+class PixTransform(object):
+    """Pixel to arcsec conversions of whole arrays for one
+    objects.Transform. The scale and rotation terms are worked out
+    once, so converting all stars and epochs of an align is a few
+    array operations:
+
+        pt = util.pixTransform(s.t, relErr=s.relErr)
+        (x, y, xerr, yerr) = pt.position(xpix, ypix, xpixErr, ypixErr)
+
+    Positions are offsets from Sgr A* (+x east, +y north). Positions
+    below the -1000 place holder for missing data are passed through
+    unchanged. Inputs may be scalars or arrays of any (matching) shape.
+
+    @param trans: The Transform.class object that holds coordinate
+        transformation information.
+    @param absolute: Set to 1 in order to rotate coordinates
+    @param relErr: Set to 1 to only exclude absolute astrometric errors.
+    """
+    def __init__(self, trans, absolute=0, relErr=1):
+        self.state = transformState(trans)
+        self.scale = trans.scale
+        self.sgra = trans.sgra
+        self.absolute = absolute
+        self.relErr = relErr
+
+        if relErr != 1:
+            self.scaleErr = trans.scaleErr
+            self.sgraErr = trans.sgraErr
+            self.angleErr = trans.angleErr
+
+        # Rotation, but only if requested by absolute=1
+        if absolute == 1:
+            self.cosa = math.cos(trans.angle)
+            self.sina = math.sin(trans.angle)
+
+    def _rotate(self, x2, y2, xerr2=None, yerr2=None):
+        """Rotate the scaled values and the squared errors."""
+        if self.absolute != 1:
+            return (x2, y2, xerr2, yerr2)
+
+        cosa = self.cosa
+        sina = self.sina
+        x3 = (x2 * cosa) + (y2 * sina)
+        y3 = -(x2 * sina) + (y2 * cosa)
+        if xerr2 is None:
+            return (x3, y3, None, None)
+
+        xerr3 = (xerr2 * cosa**2) + (yerr2 * sina**2)
+        yerr3 = (xerr2 * sina**2) + (yerr2 * cosa**2)
+        if self.relErr != 1:
+            xerr3 = xerr3 + (self.angleErr * y2)**2
+            yerr3 = yerr3 + (self.angleErr * x2)**2
+        return (x3, y3, xerr3, yerr3)
+
+    def position(self, xpix, ypix, xpixErr=None, ypixErr=None):
+        """
+        Positions (and errors) in arcsec offset from Sgr A*.
+
+        @return (x, y), or (x, y, xerr, yerr) if errors are given
+        """
+        xpix = np.asarray(xpix, dtype=float)
+        ypix = np.asarray(ypix, dtype=float)
+
+        # Handle converting into Sgr A* = 0,0 frame and scaling
+        x1 = xpix - self.sgra[0]
+        y1 = ypix - self.sgra[1]
+        x2 = x1 * -self.scale
+        y2 = y1 * self.scale
+
+        if xpixErr is None:
+            bad = (xpix < -1000) & (ypix < -1000)
+            (x3, y3, e1, e2) = self._rotate(x2, y2)
+            return (_keep(bad, xpix, x3), _keep(bad, ypix, y3))
+
+        # Invalid data with errors is <= -1000, as it always was
+        bad = (xpix <= -1000) & (ypix <= -1000)
+        xpixErr = np.asarray(xpixErr, dtype=float)
+        ypixErr = np.asarray(ypixErr, dtype=float)
+
+        xerr1 = xpixErr**2
+        yerr1 = ypixErr**2
+        if self.relErr != 1:
+            xerr1 = xerr1 + self.sgraErr[0]**2
+            yerr1 = yerr1 + self.sgraErr[1]**2
+
+        xerr2 = xerr1 * self.scale**2
+        yerr2 = yerr1 * self.scale**2
+        if self.relErr != 1:
+            xerr2 = xerr2 + (x1 * self.scaleErr)**2
+            yerr2 = yerr2 + (y1 * self.scaleErr)**2
+
+        (x3, y3, xerr3, yerr3) = self._rotate(x2, y2, xerr2, yerr2)
+
+        return (_keep(bad, xpix, x3), _keep(bad, ypix, y3),
+                _keep(bad, xpixErr, np.sqrt(xerr3)),
+                _keep(bad, ypixErr, np.sqrt(yerr3)))
+
+    def velocity(self, xpix, ypix, xpixErr=None, ypixErr=None):
+        """
+        Velocities (or accelerations) and errors in arcsec/yr
+        (arcsec/yr^2).
+
+        @return (vx, vy), or (vx, vy, vxerr, vyerr) if errors are given
+        """
+        xpix = np.asarray(xpix, dtype=float)
+        ypix = np.asarray(ypix, dtype=float)
+
+        # Now handle scaling
+        x2 = xpix * -self.scale
+        y2 = ypix * self.scale
+
+        if xpixErr is None:
+            (x3, y3, e1, e2) = self._rotate(x2, y2)
+            return (_scalar(x3), _scalar(y3))
+
+        xerr2 = (np.asarray(xpixErr, dtype=float) * self.scale)**2
+        yerr2 = (np.asarray(ypixErr, dtype=float) * self.scale)**2
+        if self.relErr != 1:
+            xerr2 = xerr2 + (xpix * self.scaleErr)**2
+            yerr2 = yerr2 + (ypix * self.scaleErr)**2
+
+        (x3, y3, xerr3, yerr3) = self._rotate(x2, y2, xerr2, yerr2)
+
+        return (_scalar(x3), _scalar(y3),
+                _scalar(np.sqrt(xerr3)), _scalar(np.sqrt(yerr3)))
+
+    acceleration = velocity
+
+    def value(self, value, error):
+        """
+        Scale a (non-directional) value and its error, e.g. the 2D
+        velocity, from pixels to arcsec.
+
+        @return (value, error)
+        """
+        value = np.asarray(value, dtype=float)
+        newval = value * self.scale
+        newerr = (np.asarray(error, dtype=float) * self.scale)**2
+        if self.relErr != 1:
+            newerr = newerr + (value * self.scaleErr)**2
+
+        return (_scalar(newval), _scalar(np.sqrt(newerr)))
+
+
+def _scalar(val):
+    """Plain floats for scalar input, so the scalar wrappers return
+    what they always did."""
+    if np.ndim(val) == 0:
+        return float(val)
+    return val
+
+def _keep(bad, old, new):
+    """new, except for the invalid entries, which keep the old value"""
+    if np.ndim(new) == 0:
+        return float(old) if bad else float(new)
+    return np.where(bad, old, new)
+
+def _isScalar(*values):
+    """True if all values are plain numbers. The scalar conversions
+    keep their plain float math; anything else goes to PixTransform."""
+    for val in values:
+        if not np.isscalar(val):
+            return False
+    return True
+
+def transformState(trans):
+    """Everything in a Transform that the conversions depend on."""
+    return (trans.scale, getattr(trans, 'scaleErr', None),
+            getattr(trans, 'angle', None), getattr(trans, 'angleErr', None),
+            tuple(trans.sgra), tuple(getattr(trans, 'sgraErr', ())))
+
+def pixTransform(trans, absolute=0, relErr=1):
+    """
+    The PixTransform for a Transform, cached on the Transform object.
+    A cached one is only reused as long as the scale, angle and Sgr A*
+    position of the Transform haven't changed.
+    """
+    cache = trans.__dict__.setdefault('_pixTransforms', {})
+    key = (absolute, relErr)
+    pt = cache.get(key)
+    if pt is None or pt.state != transformState(trans):
+        pt = PixTransform(trans, absolute=absolute, relErr=relErr)
+        cache[key] = pt
+    return pt
+
 def rPix2Arc(xpix, ypix, trans, absolute=0, relErr=1):
     """Convert positional pixel value to positions in arcseconds
-    offset from Sgr A*.
+    offset from Sgr A*. Works on scalars or arrays (see
+    PixTransform.position).
 
     @param xpix: X position in pixels
     @type xpix: float
@@ -18,6 +205,9 @@ def rPix2Arc(xpix, ypix, trans, absolute=0, relErr=1):
     @param relErr: Set to 1 to only exclude absolute astrometric errors.
     @type relErr: boolean or integer
     """
+    if not _isScalar(xpix, ypix):
+        return pixTransform(trans, absolute, relErr).position(xpix, ypix)
+
     # Check that this epoch has valid data.
     # If invalid, then just return the same place holder values.
     if (xpix < -1000 and ypix < -1000):
@@ -48,9 +238,11 @@ def rPix2Arc(xpix, ypix, trans, absolute=0, relErr=1):
 
     return (x, y)
 
+
 def rerrPix2Arc(xpix, ypix, xpixErr, ypixErr, trans, absolute=0, relErr=1):
     """Convert positional pixel values (and errors) to positions/errors
-    in arcseconds offset from Sgr A*.
+    in arcseconds offset from Sgr A*. Works on scalars or arrays (see
+    PixTransform.position).
 
     @param xpix: X position in pixels
     @type xpix: float
@@ -68,6 +260,10 @@ def rerrPix2Arc(xpix, ypix, xpixErr, ypixErr, trans, absolute=0, relErr=1):
     @param relErr: Set to 1 to only exclude absolute astrometric errors.
     @type relErr: boolean or integer
     """
+    if not _isScalar(xpix, ypix, xpixErr, ypixErr):
+        return pixTransform(trans, absolute, relErr).position(xpix, ypix,
+                                                              xpixErr, ypixErr)
+
     # Check that this epoch has valid data.
     # If invalid, then just return the same place holder values.
     if (xpix <= -1000 and ypix <= -1000):
@@ -123,8 +319,11 @@ def rerrPix2Arc(xpix, ypix, xpixErr, ypixErr, trans, absolute=0, relErr=1):
 
 
 def vPix2Arc(xpix, ypix, trans, absolute=0, relErr=1):
-    """Convert positional pixel value to positions in arcseconds
-    offset from Sgr A*"""
+    """Convert velocities in pixels to arcsec (scalars or arrays, see
+    PixTransform.velocity)"""
+    if not _isScalar(xpix, ypix):
+        return pixTransform(trans, absolute, relErr).velocity(xpix, ypix)
+
     # Setup
     x1 = xpix
     y1 = ypix
@@ -150,7 +349,14 @@ def vPix2Arc(xpix, ypix, trans, absolute=0, relErr=1):
 
     return (x, y)
 
+
 def verrPix2Arc(xpix, ypix, xpixErr, ypixErr, trans, absolute=0, relErr=1):
+    """Convert velocities and errors in pixels to arcsec (scalars or
+    arrays, see PixTransform.velocity)"""
+    if not _isScalar(xpix, ypix, xpixErr, ypixErr):
+        return pixTransform(trans, absolute, relErr).velocity(xpix, ypix,
+                                                              xpixErr, ypixErr)
+
     # Setup
     x1 = xpix
     y1 = ypix
@@ -194,7 +400,14 @@ def verrPix2Arc(xpix, ypix, xpixErr, ypixErr, trans, absolute=0, relErr=1):
 
     return (x, y, xerr, yerr)
 
+
 def aerrPix2Arc(xpix, ypix, xpixErr, ypixErr, trans, absolute=0, relErr=1):
+    """Convert accelerations and errors in pixels to arcsec (scalars
+    or arrays, see PixTransform.acceleration)"""
+    if not _isScalar(xpix, ypix, xpixErr, ypixErr):
+        return pixTransform(trans, absolute, relErr).acceleration(
+            xpix, ypix, xpixErr, ypixErr)
+
     # Setup
     x1 = xpix
     y1 = ypix
@@ -240,6 +453,11 @@ def aerrPix2Arc(xpix, ypix, xpixErr, ypixErr, trans, absolute=0, relErr=1):
 
 
 def errPix2Arc(value, error, trans, relErr=1):
+    """Convert a value and its error in pixels to arcsec (scalars or
+    arrays, see PixTransform.value)"""
+    if not _isScalar(value, error):
+        return pixTransform(trans, relErr=relErr).value(value, error)
+
     newval = value * trans.scale
     newerr = (error * trans.scale)**2
     if relErr != 1:
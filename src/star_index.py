@@ -0,0 +1,158 @@
+import numpy as np
+
+
+class StarIndex:
+    """
+    Spatial index over the star positions of a loaded align, plus a
+    name -> row map.
+
+    Stars are bucketed into a uniform grid with a few stars per cell,
+    stored as one array of rows sorted by cell. Neighbor queries only
+    look at the cells around the query point, so they cost roughly
+    O(k) instead of O(N).
+    """
+
+    def __init__(
+        self,
+        names: list[str],
+        x: list[float],
+        y: list[float],
+        stars_per_cell: float = 4.0
+    ) -> None:
+        self.names = list(names)
+        self.x = np.asarray(x, dtype=float)
+        self.y = np.asarray(y, dtype=float)
+
+        # Keep the first row for duplicated names, like list.index
+        self.rows: dict[str, int] = {}
+        for idx, name in enumerate(self.names):
+            self.rows.setdefault(name, idx)
+
+        good = np.isfinite(self.x) & np.isfinite(self.y)
+        n_good = max(int(good.sum()), 1)
+
+        if good.any():
+            self.x0 = self.x[good].min()
+            self.y0 = self.y[good].min()
+            span_x = self.x[good].max() - self.x0
+            span_y = self.y[good].max() - self.y0
+        else:
+            self.x0 = self.y0 = span_x = span_y = 0.0
+
+        area = max(span_x * span_y, max(span_x, span_y, 1e-6)**2 / n_good)
+        self.cell = np.sqrt(area * stars_per_cell / n_good)
+        self.nx = int(span_x / self.cell) + 1
+        self.ny = int(span_y / self.cell) + 1
+
+        rows = np.flatnonzero(good)
+        ix, iy = self._cell_of(self.x[rows], self.y[rows])
+        cell_id = iy * self.nx + ix
+
+        order = np.argsort(cell_id, kind="stable")
+        self._rows = rows[order]
+        self._starts = np.searchsorted(
+            cell_id[order], np.arange(self.nx * self.ny + 1)
+        )
+
+    def __len__(self) -> int:
+        return len(self.names)
+
+    def _cell_of(
+        self, x: np.ndarray, y: np.ndarray
+    ) -> tuple[np.ndarray, np.ndarray]:
+        ix = np.clip(((x - self.x0) / self.cell).astype(int), 0, self.nx - 1)
+        iy = np.clip(((y - self.y0) / self.cell).astype(int), 0, self.ny - 1)
+        return ix, iy
+
+    def _window(self, ix0: int, ix1: int, iy0: int, iy1: int) -> np.ndarray:
+        """
+        Rows of all stars in cells ix0..ix1, iy0..iy1 (inclusive).
+        Cells along a grid row are contiguous in the sorted rows.
+        """
+        ix0 = max(ix0, 0)
+        iy0 = max(iy0, 0)
+        ix1 = min(ix1, self.nx - 1)
+        iy1 = min(iy1, self.ny - 1)
+        if ix0 > ix1 or iy0 > iy1:
+            return np.empty(0, dtype=int)
+
+        chunks = [
+            self._rows[self._starts[iy * self.nx + ix0]:
+                       self._starts[iy * self.nx + ix1 + 1]]
+            for iy in range(iy0, iy1 + 1)
+        ]
+        return np.concatenate(chunks)
+
+    def row(self, name: str) -> int | None:
+        """
+        Row of a star by name, or None
+        """
+        return self.rows.get(name)
+
+    def query_radius(
+        self, x: float, y: float, radius: float
+    ) -> tuple[np.ndarray, np.ndarray]:
+        """
+        Rows and distances of all stars within radius of (x, y),
+        sorted by distance
+        """
+        ix0, iy0 = self._cell_of(np.array(x - radius), np.array(y - radius))
+        ix1, iy1 = self._cell_of(np.array(x + radius), np.array(y + radius))
+        cand = self._window(int(ix0), int(ix1), int(iy0), int(iy1))
+
+        dist = np.hypot(self.x[cand] - x, self.y[cand] - y)
+        keep = dist <= radius
+        cand, dist = cand[keep], dist[keep]
+
+        order = np.argsort(dist, kind="stable")
+        return cand[order], dist[order]
+
+    def query_box(
+        self, x_min: float, x_max: float, y_min: float, y_max: float
+    ) -> np.ndarray:
+        """
+        Rows of all stars with x_min <= x <= x_max and y_min <= y <= y_max
+        """
+        ix0, iy0 = self._cell_of(np.array(x_min), np.array(y_min))
+        ix1, iy1 = self._cell_of(np.array(x_max), np.array(y_max))
+        cand = self._window(int(ix0), int(ix1), int(iy0), int(iy1))
+
+        cx = self.x[cand]
+        cy = self.y[cand]
+        keep = (cx >= x_min) & (cx <= x_max) & (cy >= y_min) & (cy <= y_max)
+        return cand[keep]
+
+    def query_nearest(
+        self, x: float, y: float, k: int, exclude: int | None = None
+    ) -> tuple[np.ndarray, np.ndarray]:
+        """
+        Rows and distances of the k stars nearest to (x, y), sorted by
+        distance. The row given as exclude (e.g. the reference star
+        itself) is left out.
+        """
+        if k <= 0:
+            return np.empty(0, dtype=int), np.empty(0)
+
+        cx, cy = self._cell_of(np.array(x), np.array(y))
+        cx, cy = int(cx), int(cy)
+        max_ring = max(self.nx, self.ny)
+
+        # Grow a square window of cells around (x, y) until it holds k
+        # stars that are all closer than anything outside the window.
+        ring = 0
+        while True:
+            cand = self._window(cx - ring, cx + ring, cy - ring, cy + ring)
+            if exclude is not None:
+                cand = cand[cand != exclude]
+
+            dist = np.hypot(self.x[cand] - x, self.y[cand] - y)
+            if ring >= max_ring:
+                break
+            if len(cand) >= k:
+                kth = np.partition(dist, k - 1)[k - 1]
+                if kth <= ring * self.cell:
+                    break
+            ring = max(1, 2 * ring)
+
+        order = np.argsort(dist, kind="stable")[:k]
+        return cand[order], dist[order]
@@ -0,0 +1,54 @@
+from app import relayout_ranges
+
+
+REFRESH = [[-2.0, 2.0], [-3.0, 3.0]]
+FIGURE = {"layout": {"xaxis": {"range": [-1.0, 1.0]},
+                     "yaxis": {"range": [0.5, 1.5]}}}
+
+
+def test_relayout_zoom_and_pan():
+    relayout = {"xaxis.range[0]": -0.5, "xaxis.range[1]": 0.25,
+                "yaxis.range[0]": 0.0, "yaxis.range[1]": 0.75}
+    assert relayout_ranges(relayout, FIGURE, REFRESH) == [
+        [-0.5, 0.25], [0.0, 0.75]
+    ]
+
+    relayout = {"xaxis.range": [-0.5, 0.25], "yaxis.range": [0.0, 0.75]}
+    assert relayout_ranges(relayout, FIGURE, REFRESH) == [
+        [-0.5, 0.25], [0.0, 0.75]
+    ]
+
+
+def test_relayout_single_axis():
+    # the other axis keeps its range from the figure
+    relayout = {"xaxis.range[0]": -0.5, "xaxis.range[1]": 0.25}
+    assert relayout_ranges(relayout, FIGURE, REFRESH) == [
+        [-0.5, 0.25], [0.5, 1.5]
+    ]
+    relayout = {"yaxis.range[0]": 0.0, "yaxis.range[1]": 0.75}
+    assert relayout_ranges(relayout, FIGURE, REFRESH) == [
+        [-1.0, 1.0], [0.0, 0.75]
+    ]
+
+    # or the refresh range if the figure has none
+    assert relayout_ranges(relayout, {"data": []}, REFRESH) == [
+        [-2.0, 2.0], [0.0, 0.75]
+    ]
+    assert relayout_ranges(relayout, None, REFRESH) == [
+        [-2.0, 2.0], [0.0, 0.75]
+    ]
+
+
+def test_relayout_autorange():
+    relayout = {"xaxis.autorange": True, "yaxis.autorange": True}
+    assert relayout_ranges(relayout, FIGURE, REFRESH) == REFRESH
+
+    relayout = {"xaxis.autorange": True}
+    assert relayout_ranges(relayout, FIGURE, REFRESH) == [
+        [-2.0, 2.0], [0.5, 1.5]
+    ]
+
+
+def test_relayout_without_view_change():
+    assert relayout_ranges({"dragmode": "zoom"}, FIGURE, REFRESH) is None
+    assert relayout_ranges({"autosize": True}, FIGURE, REFRESH) is None
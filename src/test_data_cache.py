@@ -0,0 +1,82 @@
+import os
+import threading
+import time
+
+from data_cache import DataCache
+
+
+def write(path: str, text: str) -> None:
+    with open(path, "w") as f:
+        f.write(text)
+
+
+def test_lru_eviction_order(tmp_path):
+    paths = [str(tmp_path / ("star%d.txt" % i)) for i in range(4)]
+    for path in paths:
+        write(path, path)
+
+    loads = []
+
+    def loader(path: str) -> str:
+        loads.append(path)
+        return open(path).read()
+
+    cache = DataCache(max_entries=3)
+    for path in paths[:3]:
+        cache.get("stars", path, loader)
+
+    # touch the oldest entry, so the second one is now least recent
+    assert cache.get("stars", paths[0], loader) == paths[0]
+    cache.get("stars", paths[3], loader)
+    assert cache.stats()["evictions"] == 1
+
+    loads.clear()
+    for path in [paths[0], paths[2], paths[3]]:
+        cache.get("stars", path, loader)
+    assert loads == []
+
+    cache.get("stars", paths[1], loader)
+    assert loads == [paths[1]]
+
+
+def test_reload_after_file_change(tmp_path):
+    path = str(tmp_path / "align.pos")
+    write(path, "old")
+
+    cache = DataCache()
+    read = lambda p: open(p).read()
+    assert cache.get("pos", path, read) == "old"
+
+    write(path, "changed")
+    st = os.stat(path)
+    os.utime(path, ns=(st.st_atime_ns, st.st_mtime_ns + 10**9))
+    assert cache.get("pos", path, read) == "changed"
+    assert cache.stats()["misses"] == 2
+
+
+def test_single_load_for_concurrent_requests(tmp_path):
+    path = str(tmp_path / "align.pos")
+    write(path, "data")
+
+    calls = []
+
+    def slow_loader(p: str) -> str:
+        calls.append(p)
+        time.sleep(0.2)
+        return "loaded"
+
+    cache = DataCache()
+    results = []
+    threads = [
+        threading.Thread(
+            target=lambda: results.append(cache.get("pos", path, slow_loader))
+        )
+        for i in range(5)
+    ]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+
+    assert results == ["loaded"] * 5
+    assert len(calls) == 1
@@ -0,0 +1,69 @@
+import numpy as np
+
+from star_index import StarIndex
+
+
+def make_index(n: int = 2000, seed: int = 0) -> StarIndex:
+    rng = np.random.default_rng(seed)
+    # clustered like the central stars, plus NaN positions
+    x = np.concatenate([rng.normal(0, 1, n // 2), rng.uniform(-10, 10, n // 2)])
+    y = np.concatenate([rng.normal(0, 1, n // 2), rng.uniform(-10, 10, n // 2)])
+    x[::97] = np.nan
+    names = ["star%d" % i for i in range(n)]
+    return StarIndex(names, x, y)
+
+
+def test_query_radius_vs_brute_force():
+    index = make_index()
+    rng = np.random.default_rng(1)
+    for x, y, radius in zip(
+        rng.uniform(-12, 12, 50), rng.uniform(-12, 12, 50), rng.uniform(0, 4, 50)
+    ):
+        rows, dist = index.query_radius(x, y, radius)
+
+        all_dist = np.hypot(index.x - x, index.y - y)
+        expected = np.flatnonzero(all_dist <= radius)
+        assert sorted(rows) == sorted(expected)
+        assert np.allclose(dist, all_dist[rows])
+        assert (np.diff(dist) >= 0).all()
+
+
+def test_query_box_vs_brute_force():
+    index = make_index()
+    rng = np.random.default_rng(2)
+    for _ in range(50):
+        x_min, x_max = np.sort(rng.uniform(-12, 12, 2))
+        y_min, y_max = np.sort(rng.uniform(-12, 12, 2))
+        rows = index.query_box(x_min, x_max, y_min, y_max)
+
+        inside = (
+            (index.x >= x_min) & (index.x <= x_max)
+            & (index.y >= y_min) & (index.y <= y_max)
+        )
+        assert sorted(rows) == list(np.flatnonzero(inside))
+
+
+def test_query_nearest_vs_brute_force():
+    index = make_index()
+    good = np.isfinite(index.x) & np.isfinite(index.y)
+    rng = np.random.default_rng(3)
+    for x, y, k in zip(
+        rng.uniform(-15, 15, 50), rng.uniform(-15, 15, 50), rng.integers(1, 40, 50)
+    ):
+        exclude = int(rng.integers(0, len(index)))
+        rows, dist = index.query_nearest(x, y, int(k), exclude=exclude)
+
+        all_dist = np.hypot(index.x - x, index.y - y)
+        all_dist[~good] = np.inf
+        all_dist[exclude] = np.inf
+        expected = np.sort(all_dist)[:k]
+        assert len(rows) == k
+        assert exclude not in rows
+        assert np.allclose(dist, expected)
+
+
+def test_row_by_name():
+    index = StarIndex(["S0-1", "S0-2", "S0-1"], [0.0, 1.0, 2.0], [0.0, 1.0, 2.0])
+    assert index.row("S0-1") == 0
+    assert index.row("S0-2") == 1
+    assert index.row("S0-99") is None